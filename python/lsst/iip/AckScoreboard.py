@@ -1,12 +1,14 @@
 import redis
-from toolsmod import get_timestamp
-from toolsmod import get_epoch_timestamp
+from timemod import get_timestamp
+from timemod import get_epoch_timestamp
 from toolsmod import L1RedisError
 from toolsmod import L1RabbitConnectionError
-import yaml
+import ScoreboardCodec
 import copy
 import datetime
 import logging
+import threading
+import time
 from time import sleep
 from const import *
 from Scoreboard import Scoreboard
@@ -33,6 +35,43 @@ class AckScoreboard(Scoreboard):
     ACK_IDS = 'ACK_IDS'
     DB_TYPE = ""
     DB_INSTANCE = None
+    PENDING_ACKS = 'PENDING_ACKS'
+    MISSING_NONBLOCK_ACKS = 'MISSING_NONBLOCK_ACKS'
+
+    # Ack rows expire ACK_TTL seconds after their last ack arrives, which
+    # is far longer than any foreman waits on them.
+    ACK_TTL = 3600
+    SWEEP_INTERVAL = 1.0
+    SWEEP_BATCH = 100
+
+    # Pops up to ARGV[2] pending acks whose expiry score is <= ARGV[1].
+    # Those whose ack row never appeared go on the missing list.
+    # KEYS: PENDING_ACKS, MISSING_NONBLOCK_ACKS
+    # Returns the ACK_IDs found missing.
+    RESOLVE_PENDING_SCRIPT = """
+        local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+        local missing = {}
+        for _, ack_id in ipairs(due) do
+            redis.call('ZREM', KEYS[1], ack_id)
+            if redis.call('EXISTS', ack_id) == 0 then
+                redis.call('LPUSH', KEYS[2], ack_id)
+                missing[#missing + 1] = ack_id
+            end
+        end
+        return missing
+    """
+
+    # Python version of the script above, for the in-memory backend
+    @staticmethod
+    def resolve_pending_locally(client, keys, args):
+        due = client.zrangebyscore(keys[0], '-inf', args[0], start=0, num=int(args[1]))
+        missing = []
+        for ack_id in due:
+            client.zrem(keys[0], ack_id)
+            if not client.exists(ack_id):
+                client.lpush(keys[1], ack_id)
+                missing.append(ack_id)
+        return missing
   
 
     def __init__(self, db_type, db_instance):
@@ -54,54 +93,26 @@ class AckScoreboard(Scoreboard):
             Scoreboard.__init__(self)
         except L1RabbitConnectionError as e:
             LOGGER.error('Failed to make connection to Message Broker:  ', e.arg)
-            print("No Auditing for YOU")
+            LOGGER.error("No Auditing for YOU")
             raise L1Error('Calling super.init in AckScoreboard init caused: ', e.arg)
 
+        # In-process waiters, keyed by ACK_ID, each holding the set of
+        # component names that have acked so far. Redis remains the record;
+        # this only lets a blocked foreman wake as soon as its acks are in.
+        self._ack_waiters = {}
+        self._ack_condition = threading.Condition()
+
+        self._sweeper = None
+        self._sweeper_stop = threading.Event()
+
         self._redis = self.connect()
-        self._redis.flushdb()
+        self.start_db()
+        self._resolve_pending = self.register_script(self.RESOLVE_PENDING_SCRIPT,
+                                                     self.resolve_pending_locally)
         #DEBUG_ONLY:
         #self.charge_database()
     
 
-    def connect(self):
-        #pool = redis.ConnectionPool(host='localhost', port=6379, db=self.DB_INSTANCE)
-        #return redis.Redis(connection_pool=pool) 
-        try:
-            sconn = redis.StrictRedis(host='localhost',port='6379', \
-                                      charset='utf-8', db=self.DB_INSTANCE, \
-                                      decode_responses=True)
-            sconn.ping()
-            LOGGER.info("Redis connected. Connection details are: %s", sconn)
-            return sconn
-        except Exception as e:
-            LOGGER.critical("Redis connection error: %s", e)
-            LOGGER.critical("Exiting due to Redis connection failure.")
-            sys.exit(100)
-
-
-    def check_connection(self):
-        ok_flag = False
-        for i in range (1,4):
-          try:
-            #response = self._redis.client_list()
-            response = self._redis.ping()
-            ok_flag = True
-            break
-          except redis.ConnectionError:
-            self.connect()
-
-        if ok_flag:
-            if i == 1:
-                return True
-            else:
-                LOGGER.info('In ACK Scoreboard, had to reconnect to Redis - all set now')
-                return True
-        else: 
-            LOGGER.info('In ACK Scoreboard, could not reconnect to Redis after 3 attempts')
-            return False
-
-
-
     def add_timed_ack(self, ack_msg_body):
         """The first time that a new ACK_ID is encountered, the ACK row is created.
            From then on, new ACKS for a particular ACK_ID are added here. 
@@ -115,7 +126,11 @@ class AckScoreboard(Scoreboard):
         ack_sub_type = ack_msg_body['MSG_TYPE']
       
         if self.check_connection():
-            self._redis.hset(ack_id_string, ack_component_name, yaml.dump(ack_msg_body))
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.hset(ack_id_string, ack_component_name, ScoreboardCodec.dumps(ack_msg_body))
+            pipe.expire(ack_id_string, self.ACK_TTL)
+            pipe.zrem(self.PENDING_ACKS, ack_id_string)
+            pipe.execute()
         #    l = []
         #    if self._redis.hget(ack_id_string, 'COMPONENTS') == None:
         #        # Make the list structure and add component name to list and yaml
@@ -143,6 +158,58 @@ class AckScoreboard(Scoreboard):
             
         else:
             LOGGER.error('Unable to add new ACK; Redis connection unavailable')
+            return
+
+        self.signal_ack_waiters(ack_id_string, ack_component_name)
+
+
+    def signal_ack_waiters(self, ack_id, component):
+        """Record that component has acked ack_id and wake any thread
+           blocked in wait_for_timed_acks on that ACK_ID.
+
+           :param str ack_id: The ACK_ID the ack was sent for.
+           :param str component: Name of the acking component.
+        """
+        with self._ack_condition:
+            if ack_id in self._ack_waiters:
+                self._ack_waiters[ack_id].add(component)
+                self._ack_condition.notify_all()
+
+
+    def wait_for_timed_acks(self, ack_id, expected_replies, seconds):
+        """Block until expected_replies components have acked ack_id, or
+           until seconds have elapsed, whichever comes first.
+
+           Acks that reached Redis before this call are counted as well, so
+           it is safe to call this after the messages have been published.
+
+           :param str ack_id: The ACK_ID to wait for.
+           :param int expected_replies: Number of components expected to ack.
+           :param float seconds: Maximum time to wait.
+           :rtype dict of component acks read back from Redis if all
+               expected replies arrived in time, otherwise None
+        """
+        deadline = time.monotonic() + seconds
+        with self._ack_condition:
+            components = self._ack_waiters.setdefault(ack_id, set())
+            # Seed from Redis while holding the condition so an ack landing
+            # between the HSET and signal_ack_waiters is not lost.
+            response = self.get_components_for_timed_ack(ack_id)
+            if response != None:
+                components.update(list(response.keys()))
+            try:
+                while len(components) < expected_replies:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._ack_condition.wait(remaining)
+            finally:
+                self._ack_waiters.pop(ack_id, None)
+
+            if len(components) < expected_replies:
+                return None
+
+        return self.get_components_for_timed_ack(ack_id)
 
 
     def get_components_for_timed_ack(self, timed_ack):
@@ -154,12 +221,13 @@ class AckScoreboard(Scoreboard):
         """
 
         if self.check_connection():
-            exists = self._redis.exists(timed_ack)
-            if exists:
+            # HGETALL of a missing key is an empty dict, so this one read
+            # answers both whether the row exists and what it holds
+            acks = self._redis.hgetall(timed_ack)
+            if acks:
                 component_dict = {}
-                keys = self._redis.hkeys(timed_ack)
-                for key in keys:
-                   component_dict[key] = yaml.load(self._redis.hget(timed_ack, key))
+                for key, val in acks.items():
+                   component_dict[key] = ScoreboardCodec.loads(val)
 
                 return component_dict
                 
@@ -173,29 +241,89 @@ class AckScoreboard(Scoreboard):
 
 
     def add_pending_nonblock_ack(self, params):
+        """Start watching for a non-blocking ack. If no ack with this
+           ACK_ID has arrived by EXPIRY_TIME, the sweeper moves the ACK_ID
+           to MISSING_NONBLOCK_ACKS.
+
+           :param dict params: A PENDING_ACK message; EXPIRY_TIME is epoch
+               seconds, or a time of day from older senders.
+        """
         ack_id_string = params['ACK_ID']
         if self.check_connection():
-            self._redis.hset('PENDING_ACKS', ack_id_string, params['EXPIRY_TIME'])
-
-
-    def resolve_pending_nonblock_acks(self):
-        # For ack_ids in pending acks,
-        #     check for ack by calling get_timed_ack with ack_id
-        #     If there, grab it and remove entry from pending acks with HDEL
-        #         If more than one component, there is a problem - pending acks are all unique components and IDs
-        #     If not there and EXPIRY time exceeded, raise 'no ack' alarm 
-        if self._redis.exists('PENDING_ACKS'):
-            keez = self._redis.hkeys('PENDING_ACKS')
-            for kee in keez:
-                if self._redis.exists(kee): # ack is here - don't check time
-                    self._redis.hdel('PENDING_ACKS', kee) # Remove so we don't check again
-                else:
-                    expiry = self._redis.hget('PENDING_ACKS', kee)
-                    now = datetime.datetime.now().time()
-                    if now > expiry:  # if timeout is expired...else do nothing and check next time
-                        self._redis.lpush('MISSING_NONBLOCK_ACKS', kee) # handled by self.check_missing_acks()
-                        self._redis.hdel('PENDING_ACKS', kee)
+            expiry = self.expiry_epoch(params['EXPIRY_TIME'])
+            self._redis.zadd(self.PENDING_ACKS, {ack_id_string: expiry})
+
 
+    def expiry_epoch(self, expiry_time):
+        """Return expiry_time as epoch seconds. A datetime.time or an
+           'HH:MM:SS' string is taken as today, or as tomorrow when that
+           is more than twelve hours past, as happens across midnight.
+        """
+        if isinstance(expiry_time, (int, float)):
+            return float(expiry_time)
+        if isinstance(expiry_time, str):
+            try:
+                return float(expiry_time)
+            except ValueError:
+                expiry_time = datetime.time.fromisoformat(expiry_time)
+        now = datetime.datetime.now()
+        expiry = datetime.datetime.combine(now.date(), expiry_time)
+        if expiry < now - datetime.timedelta(hours=12):
+            expiry += datetime.timedelta(days=1)
+        return expiry.timestamp()
+
+
+    def resolve_pending_nonblock_acks(self, now=None):
+        """Pop the pending acks that have expired. Any of them whose ack
+           never arrived is pushed to MISSING_NONBLOCK_ACKS; acks that
+           arrive in time were already dropped from PENDING_ACKS by
+           add_timed_ack.
+
+           :param float now: Epoch seconds; defaults to the current time.
+           :rtype list of ACK_IDs found missing
+        """
+        if now is None:
+            now = time.time()
+        missing = []
+        while True:
+            batch = self._resolve_pending(keys=[self.PENDING_ACKS, self.MISSING_NONBLOCK_ACKS],
+                                          args=[now, self.SWEEP_BATCH])
+            missing.extend(batch)
+            if len(batch) < self.SWEEP_BATCH:
+                break
+        if missing:
+            LOGGER.warning("Non-blocking acks never arrived: %s", missing)
+        return missing
+
+
+    def start_ack_sweeper(self, interval=None):
+        """Resolve expired pending acks every interval seconds on a
+           daemon thread, until stop_ack_sweeper is called.
+        """
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        if interval is None:
+            interval = self.SWEEP_INTERVAL
+        self._sweeper_stop.clear()
+        self._sweeper = threading.Thread(target=self._sweep, args=(interval,),
+                                         name='Thread-%s_ack_sweeper' % self.DB_TYPE)
+        self._sweeper.daemon = True
+        self._sweeper.start()
+
+
+    def stop_ack_sweeper(self):
+        self._sweeper_stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
+
+
+    def _sweep(self, interval):
+        while not self._sweeper_stop.wait(interval):
+            try:
+                self.resolve_pending_nonblock_acks()
+            except redis.RedisError as e:
+                LOGGER.error("Ack sweeper unable to resolve pending acks: %s", e)
 
 
     def check_missing_acks(self):
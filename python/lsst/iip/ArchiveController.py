@@ -4,12 +4,14 @@ import hashlib
 import yaml
 from Consumer import Consumer
 from SimplePublisher import SimplePublisher
+import AuditEmitter
 from ThreadManager import ThreadManager 
 from const import *
 import toolsmod  # here so reader knows where intake yaml method resides
 from toolsmod import *
 import _thread
 import logging
+import logmod
 import threading
 
 
@@ -56,6 +58,8 @@ class ArchiveController:
         if 'BASE_MSG_FORMAT' in cdm[ROOT]:
             self._base_msg_format = cdm[ROOT][BASE_MSG_FORMAT]
 
+        self._audit_settings = cdm[ROOT].get('AUDIT')
+
         self._base_broker_url = "amqp://" + self._archive_name + ":" + self._archive_passwd + "@" + str(self._base_broker_addr)
 
         LOGGER.info('Building _base_broker_url connection string for Archive Controller. Result is %s', 
@@ -93,7 +97,8 @@ class ArchiveController:
     def setup_publisher(self):
         LOGGER.info('Setting up Archive publisher on %s using %s', self._base_broker_url, self._base_msg_format)
         self._archive_publisher = SimplePublisher(self._base_broker_url, self._base_msg_format)
-        #self._audit_publisher = SimplePublisher(self._base_broker_url, self._base_msg_format)
+        self._audit_emitter = AuditEmitter.get_emitter(self._base_broker_url, self._base_msg_format,
+                                                       self._audit_settings)
 
 
 
@@ -196,7 +201,7 @@ class ArchiveController:
         audit_params['SUB_TYPE'] = str(prefix) + str(params['MSG_TYPE']) + "_msg"
         audit_params['DATA_TYPE'] = self._name
         audit_params['TIME'] = get_epoch_timestamp()
-        self._archive_publisher.publish_message(self.AUDIT_CONSUME, audit_params)
+        self._audit_emitter.emit(audit_params)
 
 
 
@@ -256,7 +261,7 @@ class ArchiveController:
 
 
 def main():
-    logging.basicConfig(filename='logs/BaseForeman.log', level=logging.INFO, format=LOG_FORMAT)
+    logmod.setup_logging(filename='logs/BaseForeman.log', level=logging.INFO)
     a_c = ArchiveController()
     print("Beginning ArchiveController event loop...")
     try:
@@ -2,8 +2,10 @@
 ### JOB SCOREBOARD should store te ARCHIVE file destination/path and resend to each forwarder for readout.
 
 import toolsmod
-from toolsmod import get_timestamp
+from timemod import get_timestamp
 import logging
+import logmod
+from logmod import LazyPformat
 import pika
 import redis
 import yaml
@@ -41,6 +43,7 @@ class ArchiveDevice:
     AR_FOREMAN_ACK_PUBLISH = "ar_foreman_ack_publish"
     START_INTEGRATION_XFER_PARAMS = {}
     CFG_FILE = 'L1SystemCfg.yaml'
+    WARM_START_JOB = 'WARM_START'
     prp = toolsmod.prp
     DP = toolsmod.DP
 
@@ -97,6 +100,9 @@ class ArchiveDevice:
         self.thread_manager = None
         self.setup_consumer_threads()
 
+        if self.FWD_SCBD.warm_started:
+            self.reconcile_forwarders()
+
         LOGGER.info('Archive Foreman Init complete')
 
 
@@ -168,9 +174,7 @@ class ArchiveDevice:
         msg_dict = body 
         LOGGER.info('In ACK message callback')
         LOGGER.info('Message from ACK callback message body is: %s', str(msg_dict))
-        print("In AR_DEV ack handler, msg is: ")
-        self.prp.pprint(body)
-        print("--------------------------- ")
+        LOGGER.debug("In AR_DEV ack handler, msg is:\n%s", LazyPformat(body))
 
         handler = self._msg_actions.get(msg_dict[MSG_TYPE])
         result = handler(msg_dict)
@@ -201,24 +205,25 @@ class ArchiveDevice:
 
         # next, run health check
         health_check_ack_id = self.get_next_timed_ack_id('AR_FWDR_HEALTH_ACK')
-        num_fwdrs_checked = self.fwdr_health_check(health_check_ack_id)
+        num_fwdrs_checked = self.fwdr_health_check(health_check_ack_id, job_number)
 
         # Add job scbd entry
         self.JOB_SCBD.add_job(job_number, visit_id, raft_list, raft_ccd_list)
-        self.JOB_SCBD.set_value_for_job(job_number, 'VISIT_ID', visit_id)
         self.ack_timer(1.5)
 
         healthy_fwdrs = self.ACK_SCBD.get_components_for_timed_ack(health_check_ack_id)
         if healthy_fwdrs == None:
+            self.FWD_SCBD.release_forwarders(job_number)
             self.refuse_job(params, "No forwarders available")
-            self.JOB_SCBD.set_job_state(job_number, 'SCRUBBED')
-            self.JOB_SCBD.set_job_status(job_number, 'INACTIVE')
+            self.JOB_SCBD.set_job_state(job_number, 'SCRUBBED', status='INACTIVE')
             ### FIX send error code for this...
             return
 
-        for forwarder in healthy_fwdrs:
-            self.FWD_SCBD.set_forwarder_state(forwarder, 'BUSY')
-            self.FWD_SCBD.set_forwarder_status(forwarder, 'HEALTHY')
+        # Forwarders that did not answer go back to the pool, still UNKNOWN
+        silent = [f for f in self.FWD_SCBD.get_leased_forwarders(job_number) if f not in healthy_fwdrs]
+        if silent:
+            self.FWD_SCBD.release_forwarders(job_number, silent)
+        self.FWD_SCBD.set_forwarder_params(healthy_fwdrs, {'STATE': 'BUSY', 'STATUS': 'HEALTHY'})
 
         # send new_archive_item msg to archive controller
         new_items_params = {}
@@ -238,7 +243,7 @@ class ArchiveDevice:
 
         if ar_response == None:
            # FIXME raise L1 exception and bail out
-           print("B-B-BAD Trouble; no ar_response")
+           LOGGER.error("B-B-BAD Trouble; no ar_response")
            
        
         #target_location = ar_response['ARCHIVE_CTRL']['TARGET_LOCATION']
@@ -249,21 +254,18 @@ class ArchiveDevice:
 
         # divide image fetch across forwarders
         list_of_fwdrs = list(healthy_fwdrs.keys())
-        print("Just before divide_work...list_of_fwdrs is:")
-        self.prp.pprint(list_of_fwdrs)
-        print("------------------------------")
+        LOGGER.debug("Just before divide_work...list_of_fwdrs is:\n%s", LazyPformat(list_of_fwdrs))
         work_schedule = self.divide_work(list_of_fwdrs, raft_list, raft_ccd_list)
-        if self.DP:
-            print("Here is the work schedule hot off of the divide_work stack:")
-            self.prp.pprint(work_schedule) 
-            print("------------- Done Printing Work Schedule --------------")
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("Here is the work schedule hot off of the divide_work stack:\n%s", LazyPformat(work_schedule))
+            LOGGER.debug("------------- Done Printing Work Schedule --------------")
 
         # send target dir, and job, session,visit and work to do to healthy forwarders
         self.JOB_SCBD.set_value_for_job(job_number, 'STATE','SENDING_XFER_PARAMS')
         set_sched_result = self.JOB_SCBD.set_work_schedule_for_job(job_number, work_schedule)
         if set_sched_result == False:
             # FIXME Raise L1 exception and bail
-            print("BIG PROBLEM - CANNOT SET WORK SCHED IN SCBD")
+            LOGGER.error("BIG PROBLEM - CANNOT SET WORK SCHED IN SCBD")
       
 
         xfer_params_ack_id = self.get_next_timed_ack_id("AR_FWDR_PARAMS_ACK") 
@@ -280,6 +282,9 @@ class ArchiveDevice:
         fwdr_new_target_params['TARGET_LOCATION'] = final_target_location
 
         len_fwdrs_list = len(work_schedule['FORWARDER_LIST'])
+        xfer_params_batch = []
+        work_by_fwdr = {}
+        route_keys = self.FWD_SCBD.get_routing_keys(work_schedule['FORWARDER_LIST'])
         for i in range (0, len_fwdrs_list):
             fwdr = work_schedule['FORWARDER_LIST'][i]
             xfer_params_dict = {}
@@ -290,15 +295,21 @@ class ArchiveDevice:
             #fwdr_new_target_params['RAFT_CCD_LIST'] = work_schedule['RAFT_CCD_LIST'][i]
 
             # record work order in scoreboard
-            self.FWD_SCBD.set_work_by_job(fwdr, job_number, xfer_params_dict)
+            work_by_fwdr[fwdr] = dict(xfer_params_dict)
             xfer_params_dict['AR_FWDR'] = fwdr
-            fwdr_new_target_params['XFER_PARAMS'] = xfer_params_dict
-            route_key = self.FWD_SCBD.get_value_for_forwarder(fwdr, "CONSUME_QUEUE")
-            print(" sending xfer_params...route_key is %s" % route_key)
-            print(" sending xfer_params...fwdr is %s" % fwdr)
-            print ("Publishing string xfger params... %s" % str(fwdr_new_target_params)) 
-            self._publisher.publish_message(route_key, fwdr_new_target_params)
-       
+            fwdr_msg = dict(fwdr_new_target_params)
+            fwdr_msg['XFER_PARAMS'] = xfer_params_dict
+            route_key = route_keys[i]
+            LOGGER.debug(" sending xfer_params...route_key is %s", route_key)
+            LOGGER.debug(" sending xfer_params...fwdr is %s", fwdr)
+            LOGGER.debug("Publishing string xfger params... %s", str(fwdr_msg))
+            xfer_params_batch.append((route_key, fwdr_msg))
+
+        self.FWD_SCBD.set_work_for_forwarders(job_number, work_by_fwdr)
+        if not self._publisher.publish_many(xfer_params_batch):
+            LOGGER.critical('Unable to send xfer params for job %s. Heading for exit...', job_number)
+            self.FWD_SCBD.release_forwarders(job_number)
+            sys.exit(105)
 
         
 
@@ -324,12 +335,14 @@ class ArchiveDevice:
         self.FWD_SCBD.set_forwarder_params(healthy_fwdrs, fscbd_params)
 
 
-    def fwdr_health_check(self, ack_id):
+    def fwdr_health_check(self, ack_id, job_number):
         """ Send AR_FWDR_HEALTH_CHECK message to ar_foreman_ack_publish queue.
-            Retrieve available forwarders from ForwarderScoreboard, set their state to
-            HEALTH_CHECK, status to UNKNOWN, and publish the message.
+            Lease the available forwarders for the job from ForwarderScoreboard,
+            so no other foreman can take them, set their state to HEALTH_CHECK,
+            status to UNKNOWN, and publish the message.
 
             :params ack_id: Ack id for AR forwarder health check.
+            :params job_number: Job the forwarders are leased to.
 
             :return: Number of health checks sent.
         """
@@ -338,14 +351,46 @@ class ArchiveDevice:
         msg_params[ACK_ID] = ack_id
         msg_params[REPLY_QUEUE] = self.AR_FOREMAN_ACK_PUBLISH
 
-        forwarders = self.FWD_SCBD.return_available_forwarders_list()
+        forwarders = self.FWD_SCBD.lease_forwarders(None, job_number)
         state_status = {"STATE": "HEALTH_CHECK", "STATUS": "UNKNOWN"}
         self.FWD_SCBD.set_forwarder_params(forwarders, state_status)
-        for forwarder in forwarders:
-            self._publisher.publish_message(self.FWD_SCBD.get_value_for_forwarder(forwarder,"CONSUME_QUEUE"), msg_params)
+        batch = []
+        for route_key in self.FWD_SCBD.get_routing_keys(forwarders):
+            batch.append((route_key, msg_params))
+        if not self._publisher.publish_many(batch):
+            LOGGER.critical('Unable to send forwarder health checks for job %s. Heading for exit...',
+                            job_number)
+            self.FWD_SCBD.release_forwarders(job_number)
+            sys.exit(105)
         return len(forwarders)
 
 
+    def reconcile_forwarders(self):
+        """ After a warm start, bring the kept forwarder rows in line with
+            the forwarders that are actually there. Leases held by jobs that
+            are no longer live are released, then every available forwarder
+            is health checked; those that do not answer are left UNKNOWN, so
+            no job is given them.
+
+            :return: List of forwarders that answered.
+        """
+        released = self.FWD_SCBD.clear_stale_leases(self.JOB_SCBD.get_live_jobs())
+        if released:
+            LOGGER.info("Warm start released forwarders %s", released)
+
+        ack_id = self.get_next_timed_ack_id('AR_FWDR_HEALTH_ACK')
+        checked = self.fwdr_health_check(ack_id, self.WARM_START_JOB)
+        if checked == 0:
+            return []
+        # On timeout, keep whichever forwarders did answer
+        healthy = self.ACK_SCBD.wait_for_timed_acks(ack_id, checked, 1.5) \
+                  or self.ACK_SCBD.get_components_for_timed_ack(ack_id) or {}
+        self.FWD_SCBD.release_forwarders(self.WARM_START_JOB)
+        healthy = sorted(healthy)
+        self.FWD_SCBD.set_forwarder_params(healthy, {'STATUS': 'HEALTHY'})
+        return healthy
+
+
     def divide_work(self, fwdrs_list, raft_list, raft_ccd_list):
         """ Divide work (ccds) among forwarders.
 
@@ -382,10 +427,9 @@ class ArchiveDevice:
             schedule['FORWARDER_LIST'] = FORWARDER_LIST
             schedule['RAFT_LIST'] = RAFT_LIST
             schedule['RAFT_CCD_LIST'] = RAFT_CCD_LIST
-            if self.DP:
-                print("In divide work one fwdr case, finished schedule is:")
-                self.prp.pprint(schedule)
-                print("Finished divide work one fwdr case")
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug("In divide work one fwdr case, finished schedule is:\n%s", LazyPformat(schedule))
+                LOGGER.debug("Finished divide work one fwdr case")
             return schedule
 
         if num_rafts <= num_fwdrs:
@@ -425,10 +469,9 @@ class ArchiveDevice:
             schedule['RAFT_LIST'] = RAFT_LIST
             schedule['RAFT_CCD_LIST'] = RAFT_CCD_LIST
 
-        if self.DP:
-            print("In divide work one fwdr case, finished schedule is:")
-            self.prp.pprint(schedule)
-            print("Finished divide work one fwdr case")
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug("In divide work one fwdr case, finished schedule is:\n%s", LazyPformat(schedule))
+            LOGGER.debug("Finished divide work one fwdr case")
         return schedule
 
 
@@ -476,8 +519,7 @@ class ArchiveDevice:
         msg = {}
         msg['MSG_TYPE'] = 'AR_FWDR_TAKE_IMAGES'
         msg['NUM_IMAGES'] = num_images
-        for fwdr in fwdrs:
-            route_key = self.FWD_SCBD.get_value_for_forwarder(fwdr, 'CONSUME_QUEUE')
+        for route_key in self.FWD_SCBD.get_routing_keys(fwdrs):
             self._publisher.publish_message(route_key, msg)
 
     #################################################################### 
@@ -492,8 +534,7 @@ class ArchiveDevice:
         work_sched = self.JOB_SCBD.get_work_schedule_for_job(job_num)
 
         fwdrs = work_sched['FORWARDER_LIST']
-        for fwdr in fwdrs:
-            route_key = self.FWD_SCBD.get_value_for_forwarder(fwdr, 'CONSUME_QUEUE')
+        for route_key in self.FWD_SCBD.get_routing_keys(fwdrs):
             self._publisher.publish_message(route_key, msg)
         
 
@@ -555,8 +596,7 @@ class ArchiveDevice:
         msg[MSG_TYPE] = 'AR_FWDR_END_READOUT'
         msg[JOB_NUM] = job_number
         msg[IMAGE_ID] = image_id
-        for i in range (0, len_fwdrs):
-            route_key = self.FWD_SCBD.get_value_for_forwarder(fwdrs[i], 'CONSUME_QUEUE')
+        for route_key in self.FWD_SCBD.get_routing_keys(fwdrs):
             self._publisher.publish_message(route_key, msg)
 
 
@@ -627,8 +667,7 @@ class ArchiveDevice:
         ack_msg['ACK_BOOL'] = True
         ack_msg['RESULT_LIST'] = results
         self._publisher.publish_message(reply_queue, ack_msg)
-
-        ### FIXME Set state as complete for Job
+        self.JOB_SCBD.set_job_state(job_number, 'COMPLETE', status='INACTIVE')
 
 
                    
@@ -650,8 +689,7 @@ class ArchiveDevice:
         ro_params['IMAGE_ID'] = params['IMAGE_ID']
         ro_params['ACK_ID'] = readout_ack
         ro_params['REPLY_QUEUE'] = self.AR_FOREMAN_ACK_PUBLISH 
-        for fwdr in fwdrs:
-            route_key = self.FWD_SCBD.get_value_for_forwarder(fwdr, "CONSUME_QUEUE")
+        for route_key in self.FWD_SCBD.get_routing_keys(fwdrs):
             self._publisher.publish_message(route_key, ro_params)
 
 
@@ -669,18 +707,20 @@ class ArchiveDevice:
         msg[JOB_NUM] = job_number
         msg['REPLY_QUEUE'] = self.AR_FOREMAN_ACK_PUBLISH 
         msg[ACK_ID] = fwdr_readout_ack
-        for i in range (0, len_fwdrs):
-            route_key = self.FWD_SCBD.get_value_for_forwarder(fwdrs[i], 'CONSUME_QUEUE')
+        for route_key in self.FWD_SCBD.get_routing_keys(fwdrs):
             self._publisher.publish_message(route_key, msg)
 
         ### FIX Check Archive Controller
         # wait up to 15 sec for readout responses
         fwdr_readout_responses = self.progressive_ack_timer(fwdr_readout_ack, len_fwdrs, 15.0)
-        fwdr_responses = list(fwdr_readout_responses.keys())
+        # The forwarders are done with this job
+        self.FWD_SCBD.release_forwarders(job_number)
+        fwdr_responses = list(fwdr_readout_responses.values())
         RESULT_SET = {}
         RESULT_SET['IMAGE_ID_LIST'] = []
+        RESULT_SET['RAFT_PLUS_CCD_LIST'] = []
         RESULT_SET['CHECKSUM_LIST'] = []
-        RESULT_SET['FILENAME_LIST'] = {}
+        RESULT_SET['FILENAME_LIST'] = []
         for fwdr_comp in fwdr_responses:
             RESULT_SET['RAFT_PLUS_CCD_LIST'] += fwdr_comp['RESULT_SET']['RAFT_PLUS_CCD_LIST']
             RESULT_SET['CHECKSUM_LIST'] += fwdr_comp['RESULT_SET']['CHECKSUM_LIST']
@@ -701,13 +741,14 @@ class ArchiveDevice:
         #send result set to DMCS
         #num_images - 
         dmcs_msg = {}
-        dmcs_msg['AR_TAKE_IMAGES_DONE_ACK']
+        dmcs_msg[MSG_TYPE] = 'AR_TAKE_IMAGES_DONE_ACK'
         dmcs_msg['ACK_ID'] = readout_ack_id
         dmcs_msg['ACK_BOOL'] = True
         dmcs_msg['JOB_NUM'] = job_number
         dmcs_msg['COMPONENT'] = self.COMPONENT_NAME
         dmcs_msg['RESULT_SET'] = ar_ctrl_response['RESULT_SET']
         self._publisher.publish_message(reply_queue, dmcs_msg)
+        self.JOB_SCBD.set_job_state(job_number, 'COMPLETE', status='INACTIVE')
 
  
     def process_ack(self, params):
@@ -805,7 +846,7 @@ class ArchiveDevice:
 
 
     def progressive_ack_timer(self, ack_id, expected_replies, seconds):
-        """ Sleeps for user-defined seconds, or less if everyone has reported back in.
+        """ Waits up to user-defined seconds, or less if everyone has reported back in.
 
             :params ack_id: Ack ID to wait for.
 
@@ -814,28 +855,10 @@ class ArchiveDevice:
             :params seconds: Maximum time to wait in seconds.
 
             :return: The dictionary that represents the responses from the components ack'ing.
-                     Note: If only one component will ack, this method breaks out of its
-                           loop after the one ack shows up - effectively beating the maximum
-                           wait time.
+                     Note: The Ack Scoreboard wakes this call as soon as the last expected
+                           ack is checked in, rather than at the end of the maximum wait time.
         """
-        counter = 0.0
-        while (counter < seconds):
-            counter = counter + 0.5
-            sleep(0.5)
-            response = self.ACK_SCBD.get_components_for_timed_ack(ack_id)
-            if response == None:
-                continue
-            if len(list(response.keys())) == expected_replies:
-                return response
-
-        ## Try one final time
-        response = self.ACK_SCBD.get_components_for_timed_ack(ack_id)
-        if response == None:
-            return None
-        elif len(list(response.keys())) == expected_replies:
-            return response
-        else:
-            return None
+        return self.ACK_SCBD.wait_for_timed_acks(ack_id, expected_replies, seconds)
 
 
     def extract_config_values(self):
@@ -870,8 +893,8 @@ class ArchiveDevice:
             self.archive_name = cdm[ROOT]['ARCHIVE']['ARCHIVE_LOGIN']
             self.archive_ip = cdm[ROOT]['ARCHIVE']['ARCHIVE_IP']
         except KeyError as e:
-            print("Dictionary error")
-            print("Bailing out...")
+            LOGGER.error("Dictionary error")
+            LOGGER.error("Bailing out...")
             sys.exit(99)
 
         self._base_msg_format = 'YAML'
@@ -926,7 +949,7 @@ class ArchiveDevice:
         md['test_val'] = 'test_it'
         kws[md['name']] = md
 
-        self.thread_manager = ThreadManager('thread-manager', kws, self.shutdown_event)
+        self.thread_manager = ThreadManager('thread-manager', kws, self.shutdown_event, multiplex=True)
         self.thread_manager.start()
 
     def setup_scoreboards(self):
@@ -947,12 +970,11 @@ class ArchiveDevice:
         LOGGER.info("Shutting down Consumer threads.")
         self.shutdown_event.set()
         LOGGER.debug("Thread Manager shutting down and app exiting...")
-        print("\n")
         os._exit(0)
 
 
 def main():
-    logging.basicConfig(filename='logs/BaseForeman.log', level=logging.INFO, format=LOG_FORMAT)
+    logmod.setup_logging(filename='logs/BaseForeman.log', level=logging.INFO)
     a_fm = ArchiveDevice()
     print("Beginning ArchiveForeman event loop...")
     try:
@@ -0,0 +1,188 @@
+"""asyncio counterpart of Consumer.
+
+   Consumer runs one pika SelectConnection ioloop per queue on its own
+   thread. AsyncConsumer instead uses pika's AsyncioConnection, so any
+   number of consumers (and AsyncPublishers) can share a single asyncio
+   event loop on one thread.
+
+   Callback semantics match Consumer: the callback is called as
+   callback(ch, method, properties, body) with body already decoded to a
+   dictionary by the codec named in the message content_type, or by the
+   configured format for messages without one. A callback may also be a
+   coroutine function, in which case it is scheduled as a task on the loop.
+   The consumer keeps a reference to each such task until it finishes;
+   stop() waits up to DRAIN_TIMEOUT seconds for them, then cancels the rest.
+"""
+
+
+import asyncio
+import logging
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+import MessageCodecs
+from toolsmod import L1ConsumerError
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+class AsyncConsumer:
+
+    RECONNECT_DELAY = 5
+    DRAIN_TIMEOUT = 5
+
+    def __init__(self, amqp_url, queue, name, callback, formatOptions,
+                 loop=None, prefetch=None):
+        """Create a new AsyncConsumer.
+
+        :param str amqp_url: The AMQP url to connect with
+        :param str queue: The queue name that the consumer listens to
+        :param str name: Name used in log messages
+        :param callback: Plain function or coroutine function taking
+            (ch, method, properties, body)
+        :param str formatOptions: Fallback codec for messages without a
+            content_type
+        :param loop: asyncio event loop to run on; defaults to the
+            running loop when start() is awaited
+        :param int prefetch: basic_qos prefetch count, or None for no limit
+
+        """
+        self._url = amqp_url
+        self.QUEUE = queue
+        self.name = name
+        self._consumer_callback = callback
+        self._is_coroutine = asyncio.iscoroutinefunction(callback)
+        self._format_options = formatOptions
+        self._default_handler = MessageCodecs.get_handler(formatOptions)
+        self._loop = loop
+        self._prefetch = prefetch
+        self._connection = None
+        self._channel = None
+        self._consumer_tag = None
+        self._closing = False
+        self._ready = None
+        self._closed = None
+        self._tasks = set()
+
+    async def start(self):
+        """Connect, open a channel and issue basic_consume. Returns once
+        the consumer is ready to receive deliveries.
+
+        """
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        self._closing = False
+        self._ready = self._loop.create_future()
+        self._closed = self._loop.create_future()
+        self.connect()
+        await self._ready
+
+    def connect(self):
+        LOGGER.info('%s connecting to %s', self.name, self._url)
+        self._connection = AsyncioConnection(pika.URLParameters(self._url),
+                                             on_open_callback=self.on_connection_open,
+                                             on_open_error_callback=self.on_connection_open_error,
+                                             on_close_callback=self.on_connection_closed,
+                                             custom_ioloop=self._loop)
+
+    def on_connection_open(self, unused_connection):
+        LOGGER.info('%s connection opened', self.name)
+        self._connection.channel(on_open_callback=self.on_channel_open)
+
+    def on_connection_open_error(self, unused_connection, error=None):
+        LOGGER.error('%s could not connect to %s: %s', self.name, self._url, error)
+        if self._ready is not None and not self._ready.done():
+            self._ready.set_exception(L1ConsumerError('Cannot connect to %s' % self._url))
+
+    def on_connection_closed(self, connection, *reason):
+        """Reconnect after RECONNECT_DELAY unless we are shutting down.
+
+        """
+        self._channel = None
+        if self._closing:
+            if not self._closed.done():
+                self._closed.set_result(True)
+        else:
+            LOGGER.warning('%s connection closed, reopening in %d seconds: %s',
+                           self.name, self.RECONNECT_DELAY, reason)
+            self._loop.call_later(self.RECONNECT_DELAY, self.connect)
+
+    def on_channel_open(self, channel):
+        LOGGER.info('%s channel opened', self.name)
+        self._channel = channel
+        self._channel.add_on_close_callback(self.on_channel_closed)
+        if self._prefetch:
+            self._channel.basic_qos(prefetch_count=self._prefetch)
+        self._channel.add_callback(self.on_consume_ok, [pika.spec.Basic.ConsumeOk])
+        self._consumer_tag = self._channel.basic_consume(self.on_encoded_message, self.QUEUE)
+
+    def on_consume_ok(self, method_frame):
+        """Invoked by pika when RabbitMQ accepts the Basic.Consume; only
+        now can deliveries arrive, so start returns.
+
+        """
+        LOGGER.info('%s is consuming from %s', self.name, self.QUEUE)
+        if self._ready is not None and not self._ready.done():
+            self._ready.set_result(True)
+
+    def on_channel_closed(self, channel, *reason):
+        LOGGER.warning('%s channel %s was closed: %s', self.name, channel, reason)
+        if self._connection.is_open:
+            self._connection.close()
+
+    def on_encoded_message(self, channel, basic_deliver, properties, body):
+        """Decode the delivery with the codec named by its content_type and
+        pass the dictionary to the callback.
+
+        """
+        content_type = properties.content_type
+        if content_type:
+            handler = MessageCodecs.get_handler_for_content_type(content_type,
+                                                                 self._format_options)
+        else:
+            handler = self._default_handler
+        pydict = handler.decode_message(body)
+        if self._is_coroutine:
+            task = self._loop.create_task(self._consumer_callback(channel, basic_deliver,
+                                                                  properties, pydict))
+            self._tasks.add(task)
+            task.add_done_callback(self.on_task_done)
+        else:
+            self._consumer_callback(channel, basic_deliver, properties, pydict)
+
+    def on_task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            LOGGER.error('%s callback failed', self.name, exc_info=task.exception())
+
+    async def drain(self, timeout):
+        """Wait up to timeout seconds for callback tasks still running,
+        then cancel any that have not finished.
+
+        """
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if pending:
+            LOGGER.warning('%s cancelling %d unfinished callbacks', self.name, len(pending))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def stop(self, timeout=None):
+        """Cancel the consumer, finish or cancel callback tasks, and close
+        the connection.
+
+        :param timeout: Seconds to wait for callback tasks; DRAIN_TIMEOUT
+            if None
+        """
+        LOGGER.info('%s stopping', self.name)
+        self._closing = True
+        if self._channel is not None and self._channel.is_open:
+            self._channel.basic_cancel(consumer_tag=self._consumer_tag)
+        await self.drain(self.DRAIN_TIMEOUT if timeout is None else timeout)
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+            await self._closed
+        LOGGER.info('%s stopped', self.name)
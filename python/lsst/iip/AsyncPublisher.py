@@ -0,0 +1,159 @@
+"""asyncio counterpart of SimplePublisher.
+
+   AsyncPublisher publishes over pika's AsyncioConnection on the caller's
+   event loop, so publishing never blocks the loop the way a
+   BlockingConnection would. Messages are encoded with the same codec
+   registry as SimplePublisher and carry the same content_type header.
+
+   The channel runs in publisher-confirm mode. Because nothing here blocks,
+   confirms can be pipelined: publish_many writes every frame and then
+   awaits all of the broker's acks together.
+"""
+
+
+import asyncio
+import logging
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+import MessageCodecs
+from toolsmod import L1PublisherError
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+class AsyncPublisher:
+
+    EXCHANGE = 'message'
+
+    def __init__(self, amqp_url, formatOptions=None, loop=None):
+        self._url = amqp_url
+        self._format_options = formatOptions
+        self._loop = loop
+        self._message_handler = MessageCodecs.get_handler(formatOptions)
+        self._properties = pika.BasicProperties(
+                               content_type=MessageCodecs.content_type_for(formatOptions))
+        self._connection = None
+        self._channel = None
+        self._ready = None
+        self._closed = None
+        self._closing = False
+        self._delivery_tag = 0
+        self._pending_confirms = {}  # delivery tag -> future
+
+    async def connect(self):
+        """Open the connection and a confirm-mode channel, if not already open.
+
+        """
+        if self._channel is not None and self._channel.is_open:
+            return
+        if self._ready is not None and not self._ready.done():
+            await self._ready
+            return
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        self._closing = False
+        self._ready = self._loop.create_future()
+        self._closed = self._loop.create_future()
+        LOGGER.info('Connecting to %s', self._url)
+        self._connection = AsyncioConnection(pika.URLParameters(self._url),
+                                             on_open_callback=self.on_connection_open,
+                                             on_open_error_callback=self.on_connection_open_error,
+                                             on_close_callback=self.on_connection_closed,
+                                             custom_ioloop=self._loop)
+        await self._ready
+
+    def on_connection_open(self, unused_connection):
+        self._connection.channel(on_open_callback=self.on_channel_open)
+
+    def on_connection_open_error(self, unused_connection, error=None):
+        LOGGER.error('Could not connect to %s: %s', self._url, error)
+        if not self._ready.done():
+            self._ready.set_exception(L1PublisherError('Cannot connect to %s' % self._url))
+
+    def on_connection_closed(self, connection, *reason):
+        """Fail everything still waiting for a confirm; the next publish
+        reconnects.
+
+        """
+        if not self._closing:
+            LOGGER.warning('Publisher connection to %s closed: %s', self._url, reason)
+        self._channel = None
+        self.fail_pending_confirms()
+        if not self._closed.done():
+            self._closed.set_result(True)
+
+    def on_channel_open(self, channel):
+        self._channel = channel
+        self._delivery_tag = 0
+        self._channel.confirm_delivery(self.on_delivery_confirmation)
+        if not self._ready.done():
+            self._ready.set_result(True)
+
+    def on_delivery_confirmation(self, method_frame):
+        """Resolve the futures covered by a Basic.Ack or Basic.Nack. A
+        multiple flag covers every tag up to and including delivery_tag.
+
+        """
+        method = method_frame.method
+        acked = method.NAME == 'Basic.Ack'
+        if method.multiple:
+            tags = [tag for tag in self._pending_confirms if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        for tag in tags:
+            future = self._pending_confirms.pop(tag, None)
+            if future is not None and not future.done():
+                future.set_result(acked)
+
+    def fail_pending_confirms(self):
+        for future in self._pending_confirms.values():
+            if not future.done():
+                future.set_result(False)
+        self._pending_confirms = {}
+
+    def send(self, route_key, body):
+        self._channel.basic_publish(exchange=self.EXCHANGE, routing_key=route_key,
+                                    body=body, properties=self._properties)
+        self._delivery_tag += 1
+        future = self._loop.create_future()
+        self._pending_confirms[self._delivery_tag] = future
+        return future
+
+    async def publish_message(self, route_key, msg):
+        """Encode and publish one message.
+
+        :return: True once the broker has confirmed it, False if it was
+                 nacked or the connection dropped first.
+        """
+        LOGGER.debug("Sending msg to %s", route_key)
+        body = self._message_handler.encode_message(msg)
+        await self.connect()
+        return await self.send(route_key, body)
+
+    async def publish_many(self, route_key_msg_list):
+        """Encode every (route_key, msg) pair, publish them back to back,
+        then wait for all the confirms at once.
+
+        :return: True if the broker confirmed every message.
+        """
+        if not route_key_msg_list:
+            return True
+        frames = [(route_key, self._message_handler.encode_message(msg))
+                  for route_key, msg in route_key_msg_list]
+        await self.connect()
+        futures = [self.send(route_key, body) for route_key, body in frames]
+        results = await asyncio.gather(*futures)
+        return all(results)
+
+    async def close(self):
+        """Close the connection and wait until it has closed. Messages
+        still awaiting a confirm resolve to False.
+
+        """
+        self._closing = True
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+            await self._closed
+        self.fail_pending_confirms()
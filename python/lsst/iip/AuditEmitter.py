@@ -0,0 +1,230 @@
+""" Asynchronous, batched publishing of audit records.
+
+    Scoreboards and controllers used to publish every audit record to
+    audit_consume on the thread that changed the state, so each state
+    change inside a consumer callback waited on a broker publish. An
+    AuditEmitter instead puts the record on a bounded in-memory queue and
+    returns. A background thread takes records off the queue and publishes
+    them with SimplePublisher.publish_many, one broker transaction per
+    batch. A batch goes out once BATCH_SIZE records are waiting, or
+    FLUSH_INTERVAL seconds after its first record arrived.
+
+    When the queue is full, POLICY decides what emit does:
+
+        DROP    the record is dropped at once and counted (the default;
+                auditing never slows the visit path)
+        BLOCK   the caller waits up to BLOCK_TIMEOUT seconds for room, then
+                drops and counts the record
+
+    Settings come from the AUDIT section of L1SystemCfg.yaml:
+
+        AUDIT:
+          QUEUE_SIZE: 10000
+          BATCH_SIZE: 100
+          FLUSH_INTERVAL: 0.5
+          POLICY: DROP
+          BLOCK_TIMEOUT: 0.05
+
+    get_emitter shares one emitter, and so one flusher thread, among every
+    scoreboard in a process that audits to the same broker in the same
+    format.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from SimplePublisher import SimplePublisher
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+AUDIT_QUEUE = 'audit_consume'
+DROP = 'DROP'
+BLOCK = 'BLOCK'
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_BLOCK_TIMEOUT = 0.05
+
+_CLOSE = object()
+_emitters = {}
+_emitters_lock = threading.Lock()
+
+
+def get_emitter(amqp_url, msg_format, settings=None):
+    """ Return the process emitter for amqp_url and msg_format, creating it
+        and its SimplePublisher on first use.
+
+        :param dict settings: The AUDIT cfg section; only used when the
+                              emitter is created.
+    """
+    with _emitters_lock:
+        emitter = _emitters.get((amqp_url, msg_format))
+        if emitter is None:
+            emitter = AuditEmitter.from_settings(SimplePublisher(amqp_url, msg_format),
+                                                 settings or {})
+            _emitters[(amqp_url, msg_format)] = emitter
+        return emitter
+
+
+def close_all():
+    """ Publish every queued record and stop the flusher threads. """
+    with _emitters_lock:
+        emitters = list(_emitters.values())
+        _emitters.clear()
+    for emitter in emitters:
+        emitter.close()
+
+
+atexit.register(close_all)
+
+
+class AuditEmitter:
+    def __init__(self, publisher, route_key=AUDIT_QUEUE, queue_size=DEFAULT_QUEUE_SIZE,
+                 batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 policy=DROP, block_timeout=DEFAULT_BLOCK_TIMEOUT):
+        """
+           :param publisher: Anything with publish_many([(route_key, msg), ...]).
+           :param str policy: DROP or BLOCK, for when the queue is full.
+        """
+        policy = policy.upper()
+        if policy not in (DROP, BLOCK):
+            raise ValueError("Unknown audit queue policy %s" % policy)
+        self._publisher = publisher
+        self._route_key = route_key
+        self._queue = queue.Queue(queue_size)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._policy = policy
+        self._block_timeout = block_timeout
+
+        self._counts_lock = threading.Lock()
+        self._counts = {'EMITTED': 0, 'PUBLISHED': 0, 'DROPPED': 0, 'FAILED': 0, 'BATCHES': 0}
+        self._closing = threading.Event()
+        self._flusher = threading.Thread(target=self._run, name='Thread-audit_emitter')
+        self._flusher.daemon = True
+        self._flusher.start()
+
+
+    @classmethod
+    def from_settings(cls, publisher, settings):
+        return cls(publisher,
+                   queue_size=int(settings.get('QUEUE_SIZE', DEFAULT_QUEUE_SIZE)),
+                   batch_size=int(settings.get('BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+                   flush_interval=float(settings.get('FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)),
+                   policy=settings.get('POLICY', DROP),
+                   block_timeout=float(settings.get('BLOCK_TIMEOUT', DEFAULT_BLOCK_TIMEOUT)))
+
+
+    def emit(self, record):
+        """ Queue record for publishing.
+
+            :rtype bool: False if the record was dropped.
+        """
+        try:
+            if self._policy == BLOCK:
+                self._queue.put(record, timeout=self._block_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            self._count('DROPPED')
+            dropped = self.counters()['DROPPED']
+            if dropped == 1 or dropped % 1000 == 0:
+                LOGGER.warning("Audit queue full; %d audit records dropped so far", dropped)
+            return False
+        self._count('EMITTED')
+        return True
+
+
+    def counters(self):
+        """ Records emitted, published, dropped (queue full) and failed
+            (broker refused the batch), the batches sent, and the records
+            still queued.
+        """
+        with self._counts_lock:
+            counts = dict(self._counts)
+        counts['QUEUED'] = self._queue.qsize()
+        return counts
+
+
+    def flush(self, timeout=None):
+        """ Wait until every record queued so far has been published or
+            failed, or timeout seconds have passed.
+
+            :rtype bool: True if the queue drained.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+
+    def close(self, timeout=5.0):
+        """ Publish what is queued, then stop the flusher thread. """
+        self._closing.set()
+        try:
+            # Wake the flusher if it is waiting on an empty queue
+            self._queue.put_nowait(_CLOSE)
+        except queue.Full:
+            pass
+        self._flusher.join(timeout)
+
+
+    def _count(self, name, n=1):
+        with self._counts_lock:
+            self._counts[name] += n
+
+
+    def _take(self, timeout):
+        """ Return the next record, or None if there is none within timeout
+            or the emitter is closing and the queue is empty.
+        """
+        try:
+            if self._closing.is_set():
+                record = self._queue.get_nowait()
+            else:
+                record = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if record is _CLOSE:
+            self._queue.task_done()
+            return self._take(0)
+        return record
+
+
+    def _run(self):
+        while not (self._closing.is_set() and self._queue.empty()):
+            first = self._take(self._flush_interval)
+            if first is None:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self._flush_interval
+            while len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                record = self._take(remaining)
+                if record is None:
+                    break
+                batch.append(record)
+            self._publish(batch)
+
+
+    def _publish(self, batch):
+        try:
+            ok = self._publisher.publish_many([(self._route_key, record) for record in batch])
+        except Exception as e:
+            LOGGER.error("Unable to publish %d audit records: %s", len(batch), e)
+            ok = False
+        self._count('BATCHES')
+        self._count('PUBLISHED' if ok else 'FAILED', len(batch))
+        for _ in batch:
+            self._queue.task_done()
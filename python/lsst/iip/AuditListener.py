@@ -1,14 +1,19 @@
 from const import *
 import toolsmod
-from toolsmod import get_timestamp
+from timemod import get_timestamp
 from Consumer import Consumer
 import yaml
 import time
 import _thread
 import os
 import sys
+import logging
 from influxdb import InfluxDBClient
 
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
 
 class AuditListener:
 
@@ -18,7 +23,7 @@ class AuditListener:
         try:
             f = open(file)
         except IOError:
-            print("Can't open %s" % file)
+            LOGGER.error("Can't open %s", file)
             raise L1Error
 
         self.cdm = yaml.safe_load(f)
@@ -209,7 +214,7 @@ class AuditListener:
         pass
 
     def run(self):
-        print("Starting AuditListener...")
+        LOGGER.debug("Starting AuditListener...")
         while (1):
             pass
 
@@ -2,8 +2,9 @@
 ### JOB SCOREBOARD should store te ARCHIVE file destination/path and resend to each forwarder for readout.
 
 import toolsmod
-from toolsmod import get_timestamp
+from timemod import get_timestamp
 import logging
+import logmod
 import pika
 import redis
 import yaml
@@ -130,7 +131,7 @@ class AuxDevice:
         msg_dict = body 
         LOGGER.info('In AUX Foreman message callback')
         LOGGER.info('Message from DMCS to AUX Foreman callback message body is: %s', str(msg_dict))
-        print("Incoming AUX msg is: %s" % msg_dict)
+        LOGGER.debug("Incoming AUX msg is: %s", msg_dict)
         handler = self._msg_actions.get(msg_dict[MSG_TYPE])
         result = handler(msg_dict)
     
@@ -165,14 +166,8 @@ class AuxDevice:
         """
         ch.basic_ack(method.delivery_tag) 
         msg_dict = body 
-        print("")
-        print("")
-        print("")
-        print( "RECEIVING ack MESSAGE:")
-        print(msg_dict)
-        print("")
-        print("")
-        print("")
+        LOGGER.debug("RECEIVING ack MESSAGE:")
+        LOGGER.debug("%s", msg_dict)
 
         # XXX FIX Ignoring all log messages
         return
@@ -200,7 +195,7 @@ class AuxDevice:
         # These next three lines must have WFS and Guide sensor info added
         start_int_ack_id = params[ACK_ID]
 
-        print("Incoming AUX AT_Start Int msg")
+        LOGGER.debug("Incoming AUX AT_Start Int msg")
         # next, run health check
         self.ACK_QUEUE = {}
         health_check_ack_id = self.get_next_timed_ack_id('AUX_FWDR_HEALTH_ACK')
@@ -450,7 +445,7 @@ class AuxDevice:
 
             :return: None.
         """
-        print("Incoming AUX AT_END_READOUT msg")
+        LOGGER.debug("Incoming AUX AT_END_READOUT msg")
         reply_queue = params['REPLY_QUEUE']
         readout_ack_id = params[ACK_ID]
         #job_number = params[JOB_NUM]
@@ -592,10 +587,11 @@ class AuxDevice:
         msg[JOB_NUM] = job_number
         msg[ACK_ID] = fwdr_readout_ack
         for i in range (0, len_fwdrs):
-            route_key = self.FWDR_SCBD.get_value_for_forwarder(fwdrs[i], 'CONSUME_QUEUE')
+            route_key = self.FWD_SCBD.get_value_for_forwarder(fwdrs[i], 'CONSUME_QUEUE')
             self._publisher.publish_message(route_key, msg)
 
         ### FIX Add Final Response to DMCS
+        self.JOB_SCBD.set_job_state(job_number, 'COMPLETE', status='INACTIVE')
 
  
     def process_ack(self, params):
@@ -695,7 +691,7 @@ class AuxDevice:
 
 
     def progressive_ack_timer(self, ack_id, expected_replies, seconds):
-        """ Sleeps for user-defined seconds, or less if everyone has reported back in.
+        """ Waits up to user-defined seconds, or less if everyone has reported back in.
 
             :params ack_id: Ack ID to wait for.
 
@@ -704,28 +700,10 @@ class AuxDevice:
             :params seconds: Maximum time to wait in seconds.
 
             :return: The dictionary that represents the responses from the components ack'ing.
-                     Note: If only one component will ack, this method breaks out of its
-                           loop after the one ack shows up - effectively beating the maximum
-                           wait time.
+                     Note: The Ack Scoreboard wakes this call as soon as the last expected
+                           ack is checked in, rather than at the end of the maximum wait time.
         """
-        counter = 0.0
-        while (counter < seconds):
-            counter = counter + 0.5
-            sleep(0.5)
-            response = self.ACK_SCBD.get_components_for_timed_ack(ack_id)
-            if response == None:
-                continue
-            if len(list(response.keys())) == expected_replies:
-                return response
-
-        ## Try one final time
-        response = self.ACK_SCBD.get_components_for_timed_ack(ack_id)
-        if response == None:
-            return None
-        elif len(list(response.keys())) == expected_replies:
-            return response
-        else:
-            return None
+        return self.ACK_SCBD.wait_for_timed_acks(ack_id, expected_replies, seconds)
 
 
     def extract_config_values(self):
@@ -758,8 +736,8 @@ class AuxDevice:
             self.archive_ip = cdm[ROOT]['ARCHIVE']['ARCHIVE_IP']
             self.archive_xfer_root = cdm[ROOT]['ARCHIVE']['ARCHIVE_XFER_ROOT']
         except KeyError as e:
-            print("Dictionary error")
-            print("Bailing out...")
+            LOGGER.error("Dictionary error")
+            LOGGER.error("Bailing out...")
             sys.exit(99)
 
         self._base_msg_format = 'YAML'
@@ -814,7 +792,7 @@ class AuxDevice:
         md['test_val'] = 'test_it'
         kws[md['name']] = md
 
-        self.thread_manager = ThreadManager('thread-manager', kws, self.shutdown_event)
+        self.thread_manager = ThreadManager('thread-manager', kws, self.shutdown_event, multiplex=True)
         self.thread_manager.start()
 
 
@@ -823,12 +801,11 @@ class AuxDevice:
         LOGGER.info("Shutting down Consumer threads.")
         self.shutdown_event.set()
         LOGGER.debug("Thread Manager shutting down and app exiting...")
-        print("\n")
         os._exit(0)
 
 
 def main():
-    logging.basicConfig(filename='logs/BaseForeman.log', level=logging.INFO, format=LOG_FORMAT)
+    logmod.setup_logging(filename='logs/BaseForeman.log', level=logging.INFO)
     a_fm = AuxDevice()
     print("Beginning AuxForeman event loop...")
     try:
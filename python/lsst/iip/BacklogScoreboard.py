@@ -1,6 +1,6 @@
 import redis
-from toolsmod import get_timestamp
-from toolsmod import get_epoch_timestamp
+from timemod import get_timestamp
+from timemod import get_epoch_timestamp
 from toolsmod import L1RedisError
 from toolsmod import L1RabbitConnectionError
 import yaml
@@ -47,45 +47,17 @@ class BacklogScoreboard(Scoreboard):
             Scoreboard.__init__(self)
         except L1RabbitConnectionError as e:
             LOGGER.error('Failed to make connection to Message Broker:  ', e.arg)
-            print("No Monitoring for YOU")
+            LOGGER.error("No Monitoring for YOU")
             raise L1Error('Calling super.init in StateScoreboard init caused: ', e.arg)
 
         try:
             self._redis = self.connect()
         except L1RedisError as e:
             LOGGER.error("Cannot make connection to Redis:  " , e)  
-            print("No Redis for YOU")
+            LOGGER.error("No Redis for YOU")
             raise L1Error('Calling redis connect in StateScoreboard init caused:  ', e.arg)
 
-        self._redis.flushdb()
-
-
-
-    def connect(self):
-        pool = redis.ConnectionPool(host='localhost', port=6379, db=self.DB_INSTANCE)
-        return redis.Redis(connection_pool=pool) 
-
-
-    def check_connection(self):
-        ok_flag = False
-        for i in range (1,4):
-            try:
-                response = self._redis.client_list()
-                ok_flag = True
-                break
-            except redis.ConnectionError:
-                self.connect()
-
-        if ok_flag:
-            if i == 1:
-                return True
-            else:
-                LOGGER.info('In add_job, had to reconnect to Redis - all set now')
-                return True
-        else: 
-            LOGGER.info('In add_job, could not reconnect to Redis after 3 attempts')
-            raise L1RedisError
-            return False
+        self.start_db()
 
 
 
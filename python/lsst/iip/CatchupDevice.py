@@ -1,6 +1,7 @@
 import toolsmod
-from toolsmod import get_timestamp
+from timemod import get_timestamp
 import logging
+import logmod
 import pika
 import redis
 import yaml
@@ -48,8 +49,8 @@ class BaseForeman:
             self._ncsa_broker_addr = cdm[ROOT][NCSA_BROKER_ADDR]
             forwarder_dict = cdm[ROOT][XFER_COMPONENTS][FORWARDERS]
         except KeyError as e:
-            print("Dictionary error")
-            print("Bailing out...")
+            LOGGER.error("Dictionary error")
+            LOGGER.error("Bailing out...")
             sys.exit(99)
 
         if 'QUEUE_PURGES' in cdm[ROOT]:
@@ -532,7 +533,7 @@ class BaseForeman:
 
 
 def main():
-    logging.basicConfig(filename='logs/BaseForeman.log', level=logging.INFO, format=LOG_FORMAT)
+    logmod.setup_logging(filename='logs/BaseForeman.log', level=logging.INFO)
     b_fm = BaseForeman()
     print("Beginning BaseForeman event loop...")
     try:
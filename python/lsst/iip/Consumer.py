@@ -8,12 +8,16 @@
 
 
 import logging
+import logmod
 import pika
 import threading
+import time
 from time import sleep
 from SimplePublisher import SimplePublisher
-from XMLHandler import *
-from YamlHandler import *
+import MessageCodecs
+import Tracing
+from MessageAuthority import MessageAuthority
+from OrderedDispatcher import OrderedDispatcher, IoloopChannel
 
 LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
               '-35s %(lineno) -5d: %(message)s')
@@ -39,13 +43,21 @@ class Consumer(threading.Thread):
     QUEUE = 'text'
     ROUTING_KEY = 'example.text'
 
-    def __init__(self, amqp_url, queue, name, callback, formatOptions):
+    def __init__(self, amqp_url, queue, name, callback, formatOptions,
+                 workers=0, prefetch=None, order_key=None, shape_check_rate=None):
         threading.Thread.__init__(self, group=None, target=None, name=name)
         """Create a new instance of the consumer class, passing in the AMQP
         URL used to connect to RabbitMQ.
 
         :param str amqp_url: The AMQP url to connect with
         :param str queue: The queue name that the consumer listens to
+        :param int workers: If non-zero, run the callback on a pool of this
+            many threads instead of on the ioloop thread
+        :param int prefetch: basic_qos prefetch count, or None for no limit
+        :param str order_key: Message key whose value orders dispatch, such
+            as JOB_NUM; messages sharing a value are handled one at a time
+        :param float shape_check_rate: Fraction of incoming messages checked
+            against messages.yaml; mismatches are logged, not dropped
 
         """
         self._connection = None
@@ -54,20 +66,27 @@ class Consumer(threading.Thread):
         self._consumer_tag = None
         self._publisher = None
         self._url = amqp_url
-        self._message_callback = callback
-        #self._message_callback = None
+        self._consumer_callback = callback
         self.name = name
         self.QUEUE = queue
         self.ROUTING_KEY = queue
-        self._xml_handler = None 
-        self._yaml_handler = None 
+        # formatOptions is only the fallback for messages published without
+        # a content_type; otherwise each message names its own codec.
         self._format_options = formatOptions
-        if self._format_options == "XML":
-            self._xml_handler = XMLHandler(callback)
-            self._message_callback = self._xml_handler.xmlcallback  
-        else:
-            self._yaml_handler = YamlHandler(callback)
-            self._message_callback = self._yaml_handler.yaml_callback  
+        self._default_handler = MessageCodecs.get_handler(formatOptions)
+        self._message_callback = self.on_encoded_message
+        self._prefetch = prefetch
+        self._order_key = order_key
+        self._dispatcher = None
+        if workers:
+            self._dispatcher = OrderedDispatcher(workers, name + '-worker')
+        self._shape_check_rate = shape_check_rate
+        self._msg_authority = None
+        if shape_check_rate:
+            self._msg_authority = MessageAuthority()
+        # Set once the broker has confirmed basic_consume; see ThreadManager
+        self.ready_event = threading.Event()
+        self._on_exit_callback = None
 
     def connect(self):
         """This method connects to RabbitMQ, returning the connection handle.
@@ -157,6 +176,9 @@ class Consumer(threading.Thread):
         LOGGER.info('Channel opened')
         self._channel = channel
         self.add_on_channel_close_callback()
+        if self._prefetch:
+            LOGGER.info('Setting prefetch count to %d', self._prefetch)
+            self._channel.basic_qos(prefetch_count=self._prefetch)
         self.setup_exchange(self.EXCHANGE)
 
     def add_on_channel_close_callback(self):
@@ -257,9 +279,20 @@ class Consumer(threading.Thread):
         """
         LOGGER.info('Issuing consumer related RPC commands')
         self.add_on_cancel_callback()
+        self._channel.add_callback(self.on_consume_ok, [pika.spec.Basic.ConsumeOk])
         #self._consumer_tag = self._channel.basic_consume(self.on_message, self.QUEUE)
         self._consumer_tag = self._channel.basic_consume(self._message_callback, self.QUEUE)
 
+    def on_consume_ok(self, method_frame):
+        """Invoked by pika when RabbitMQ accepts the Basic.Consume. Only
+        now can deliveries arrive, so this is when the consumer is ready.
+
+        :param pika.frame.Method method_frame: The Basic.ConsumeOk frame
+
+        """
+        LOGGER.info('Consuming from queue %s', self.QUEUE)
+        self.ready_event.set()
+
     def add_on_cancel_callback(self):
         """Add a callback that will be invoked if RabbitMQ cancels the consumer
         for some reason. If RabbitMQ does cancel the consumer,
@@ -300,6 +333,43 @@ class Consumer(threading.Thread):
 
         self.acknowledge_message(basic_deliver.delivery_tag)
 
+    def on_encoded_message(self, channel, basic_deliver, properties, body):
+        """Invoked by pika for each delivery. Picks the decoder named by the
+        message content_type, falling back to the configured format for
+        publishers that do not set one, and hands the resulting dictionary
+        to the consumer callback.
+
+        :param pika.channel.Channel channel: The channel object
+        :param pika.Spec.Basic.Deliver: basic_deliver method
+        :param pika.Spec.BasicProperties: properties
+        :param str|bytes body: The encoded message body
+
+        """
+        received_at = time.time()
+        content_type = properties.content_type
+        if content_type:
+            handler = MessageCodecs.get_handler_for_content_type(content_type,
+                                                                 self._format_options)
+        else:
+            handler = self._default_handler
+        pydict = handler.decode_message(body)
+        if self._msg_authority is not None:
+            self._msg_authority.sample_check(pydict, self._shape_check_rate, self.name)
+        if self._dispatcher is None:
+            Tracing.run_traced(self.name, received_at, self._consumer_callback,
+                               channel, basic_deliver, properties, pydict)
+            return
+
+        # The handler runs on a worker thread, so it gets a channel whose
+        # acks are handed back to this ioloop thread.
+        key = None
+        if self._order_key is not None and isinstance(pydict, dict):
+            key = pydict.get(self._order_key)
+        self._dispatcher.submit(key, Tracing.run_traced, self.name, received_at,
+                                self._consumer_callback,
+                                IoloopChannel(self._connection, channel),
+                                basic_deliver, properties, pydict)
+
     def acknowledge_message(self, delivery_tag):
         """Acknowledge the message delivery from RabbitMQ by sending a
         Basic.Ack RPC method for the delivery tag.
@@ -339,13 +409,24 @@ class Consumer(threading.Thread):
         LOGGER.info('Closing the channel')
         self._channel.close()
 
+    def add_on_exit_callback(self, callback):
+        """Register callback(consumer) to be invoked on this thread when
+        run() returns or raises, so a supervisor learns of the exit at once.
+
+        """
+        self._on_exit_callback = callback
+
     def run(self):
         """Run the example consumer by connecting to RabbitMQ and then
         starting the IOLoop to block and allow the SelectConnection to operate.
 
         """
-        self._connection = self.connect()
-        self._connection.ioloop.start()
+        try:
+            self._connection = self.connect()
+            self._connection.ioloop.start()
+        finally:
+            if self._on_exit_callback is not None:
+                self._on_exit_callback(self)
 
     def stop(self):
         """Cleanly shutdown the connection to RabbitMQ by stopping the consumer
@@ -362,6 +443,8 @@ class Consumer(threading.Thread):
         self._closing = True
         self.stop_consuming()
         self._connection.ioloop.start()
+        if self._dispatcher is not None:
+            self._dispatcher.shutdown()
         LOGGER.info('Stopped')
 
     def close_connection(self):
@@ -370,7 +453,7 @@ class Consumer(threading.Thread):
         self._connection.close()
 
 def main():
-    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    logmod.setup_logging(level=logging.INFO)
     example = Consumer('amqp://Fm:Fm@141.142.208.191:5672/%2Fbunny')
     try:
         example.run()
@@ -1,6 +1,8 @@
 import toolsmod
-from toolsmod import get_timestamp
+from timemod import get_timestamp
 import logging
+import logmod
+from logmod import LazyPformat
 import pika
 import redis
 import yaml
@@ -8,7 +10,6 @@ import sys, traceback
 import os, os.path
 from subprocess import call
 import time
-import datetime
 from time import sleep
 from threading import ThreadError
 import threading
@@ -28,7 +29,6 @@ from toolsmod import L1RabbitConnectionError
 LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
               '-35s %(lineno) -5d: %(message)s')
 LOGGER = logging.getLogger(__name__)
-logging.basicConfig(filename='logs/DMCS.log', level=logging.DEBUG, format=LOG_FORMAT)
 
 
 class DMCS:
@@ -178,7 +178,6 @@ class DMCS:
                 self._next_timed_ack_id =  current_id
         except Exception as e: 
             LOGGER.error("DMCS unable to get init_ack_id: %s" % e.args) 
-            print("DMCS unable to get init_ack_id: %s" % e.args) 
             raise L1Error("DMCS unable to get init_ack_id: %s" % e.args) 
 
     def setup_publishers(self):
@@ -200,11 +199,9 @@ class DMCS:
             self._publisher = SimplePublisher(self.pub_base_broker_url, YAML)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to setup_publishers: %s" % e.args) 
-            print("DMCS unable to setup_publishers: %s" % e.args) 
             sys.exit(self.ERROR_CODE_PREFIX + 11)
         except Exception as e: 
             LOGGER.error("DMCS unable to setup_publishers: %s" % e.args) 
-            print("DMCS unable to setup_publishers: %s" % e.args) 
             sys.exit(self.ERROR_CODE_PREFIX + 11)
         
 
@@ -220,7 +217,7 @@ class DMCS:
 
             :return: None.
         """
-        print("In On OCS Msg, msg is: %s" % msg_dict)
+        LOGGER.debug("In On OCS Msg, msg is: %s", msg_dict)
         try: 
             ch.basic_ack(method.delivery_tag)
             LOGGER.info('Processing message in OCS message callback')
@@ -233,12 +230,11 @@ class DMCS:
             result = handler(msg_dict)
         except KeyError as e:
             LOGGER.error("DMCS received unrecognized message type: %s" % e.args)
-            if self.DP: 
-                print("DMCS received unrecognized message type: %s" % e.args)
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug("DMCS received unrecognized message type: %s", e.args)
             raise L1Error("DMCS ecountering Error Code %s. %s" % (str(self.ERROR_CODE_PREFIX + 35), e.args))
         except Exception as e: 
             LOGGER.error("DMCS unable to on_ocs_message: %s" % e.args) 
-            print("DMCS unable to on_ocs_message: %s" % e.args) 
             raise L1Error("DMCS unable to on_ocs_message: %s" % e.args) 
     
 
@@ -265,12 +261,11 @@ class DMCS:
             result = handler(msg_dict)
         except KeyError as e:
             LOGGER.error("DMCS received unrecognized message type: %s" % e.args)
-            if self.DP: 
-                print("DMCS received unrecognized message type: %s" % e.args)
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug("DMCS received unrecognized message type: %s", e.args)
             raise L1Error("DMCS ecountering Error Code %s. %s" % (str(self.ERROR_CODE_PREFIX + 35), e.args))
         except Exception as e: 
             LOGGER.error("DMCS unable to on_ack_message: %s" % e.args) 
-            print("DMCS unable to on_ack_message: %s" % e.args) 
             raise L1Error("DMCS unable to on_ack_message: %s" % e.args) 
 
 
@@ -290,7 +285,6 @@ class DMCS:
             transition_check = self.validate_transition(new_state, msg)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_enter_control_command: %s" % e.args) 
-            print("DMCS unable to process_enter_control_command: %s" % e.args) 
             raise L1Error("DMCS unable to process_enter_control_command: %s" % e.args) 
 
 
@@ -307,7 +301,6 @@ class DMCS:
             transition_check = self.validate_transition(new_state, msg)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_start_command: %s" % e.args) 
-            print("DMCS unable to process_start_command: %s" % e.args) 
             raise L1Error("DMCS unable to process_start_command: %s" % e.args) 
 
 
@@ -330,11 +323,9 @@ class DMCS:
                 self.send_new_session_msg(session_id)
         except L1RedisError as e: 
             LOGGER.error("DMCS unable to process_standby_command - No redis connection: %s" % e.args) 
-            print("DMCS unable to process_standby_command - No redis connection: %s" % e.args) 
             raise L1Error("DMCS unable to process_standby_command - No redis connection: %s" % e.args) 
         except Exception as e: 
             LOGGER.error("DMCS unable to process_standby_command: %s" % e.args) 
-            print("DMCS unable to process_standby_command: %s" % e.args) 
             raise L1Error("DMCS unable to process_standby_command: %s" % e.args) 
 
     def process_disable_command(self, msg):
@@ -350,7 +341,6 @@ class DMCS:
             transition_check = self.validate_transition(new_state, msg)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_disable_command: %s" % e.args) 
-            print("DMCS unable to process_disable_command: %s" % e.args) 
             raise L1Error("DMCS unable to process_disable_command: %s" % e.args) 
 
 
@@ -367,7 +357,6 @@ class DMCS:
             transition_check = self.validate_transition(new_state, msg)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_disable_command: %s" % e.args) 
-            print("DMCS unable to process_disable_command: %s" % e.args) 
             raise L1Error("DMCS unable to process_disable_command: %s" % e.args) 
 
 
@@ -405,15 +394,12 @@ class DMCS:
             self._publisher.publish_message(self.DMCS_OCS_PUBLISH, ack_msg)
         except L1RedisError as e: 
             LOGGER.error("DMCS unable to process_set_value_command - No redis connection: %s" % e.args) 
-            print("DMCS unable to process_set_value_command - No redis connection: %s" % e.args) 
             raise L1Error("DMCS unable to process_set_value_command - No redis connection: %s" % e.args) 
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to process_set_value_command - No rabbit connection: %s" % e.args) 
-            print("DMCS unable to process_set_value_command - No rabbit connection: %s" % e.args) 
             raise L1Error("DMCS unable to process_set_value_command - No rabbit connection: %s" % e.args) 
         except Exception as e: 
             LOGGER.error("DMCS unable to process_set_value_command: %s" % e.args) 
-            print("DMCS unable to process_set_value_command: %s" % e.args) 
             raise L1Error("DMCS unable to process_set_value_command: %s" % e.args) 
 
 
@@ -441,7 +427,6 @@ class DMCS:
             transition_check = self.validate_transition(new_state, msg)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_exit_control_command: %s" % e.args) 
-            print("DMCS unable to process_exit_control_command: %s" % e.args) 
             raise L1Error("DMCS unable to process_exit_control_command: %s" % e.args) 
 
 
@@ -459,7 +444,6 @@ class DMCS:
             transition_check = self.validate_transition(new_state, msg)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_abort_command: %s" % e.args) 
-            print("DMCS unable to process_abort_command: %s" % e.args) 
             raise L1Error("DMCS unable to process_abort_command: %s" % e.args) 
 
 
@@ -476,7 +460,6 @@ class DMCS:
             transition_check = self.validate_transition(new_state, msg)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_stop_command: %s" % e.args) 
-            print("DMCS unable to process_stop_command: %s" % e.args) 
             raise L1Error("DMCS unable to process_stop_command: %s" % e.args) 
             
 
@@ -502,8 +485,8 @@ class DMCS:
             acks = []
             for k in list(enabled_devices.keys()):
                 consume_queue = self.STATE_SCBD.get_device_consume_queue(enabled_devices[k])
-                if self.DP:
-                  print("Consume queue for device %s is %s" % (enabled_devices[k], consume_queue)) 
+                if LOGGER.isEnabledFor(logging.DEBUG):
+                  LOGGER.debug("Consume queue for device %s is %s", enabled_devices[k], consume_queue)
                 ## FIXME - Must each enabled device use its own ack_id? Or
                 ## can we use the same method for broadcasting Forwarder messages?  
                 ack = self.get_next_timed_ack_id(k + "_NEXT_VISIT_ACK")
@@ -533,15 +516,12 @@ class DMCS:
                     pass
         except L1RedisError as e: 
             LOGGER.error("DMCS unable to process_next_visit_event - No redis connection: %s" % e.args)
-            print("DMCS unable to process_next_visit_event - No redis connection: %s" % e.args)
             raise L1Error("DMCS unable to process_next_visit_event - No redis connection: %s" % e.args)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to process_next_visit_event - No rabbit connection: %s" % e.args)
-            print("DMCS unable to process_next_visit_event - No rabbit connection: %s" % e.args)
             raise L1Error("DMCS unable to process_next_visit_event - No rabbit connection: %s" % e.args)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_next_visit_event: %s" % e.args)
-            print("DMCS unable to process_next_visit_event: %s" % e.args)
             raise L1Error("DMCS unable to process_next_visit_event: %s" % e.args)
             
             
@@ -592,15 +572,12 @@ class DMCS:
             self.set_pending_nonblock_acks(acks, wait_time)
         except L1RedisError as e: 
             LOGGER.error("DMCS unable to process_start_integration_event - No redis connection: %s" % e.args)
-            print("DMCS unable to process_start_integration_event - No redis connection: %s" % e.args)
             raise L1Error("DMCS unable to process_start_integration_event - No redis connection: %s" % e.args)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to process_start_integration_event - No rabbit connection: %s" % e.args)
-            print("DMCS unable to process_start_integration_event - No rabbit connection: %s" % e.args)
             raise L1Error("DMCS unable to process_start_integration_event - No rabbit connection: %s" % e.args)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_start_integration_event: %s" % e.args)
-            print("DMCS unable to process_start_integration_event: %s" % e.args)
             raise L1Error("DMCS unable to process_start_integration_event: %s" % e.args)
 
  
@@ -613,7 +590,7 @@ class DMCS:
 
             :return: None.
         """
-        print("In On at_start_intg, msg is: %s" % params)
+        LOGGER.debug("In On at_start_intg, msg is: %s", params)
         try: 
             msg_params = {}
             # visit_id and image_id msg_params *could* be set in one line, BUT: the values are needed again below...
@@ -636,7 +613,7 @@ class DMCS:
             #msg_params[JOB_NUM] = job_num
             msg_params[ACK_ID] = ack_id
             rkey = self.STATE_SCBD.get_device_consume_queue('AT')
-            print("publishing start_int to: %s" % rkey) 
+            LOGGER.debug("publishing start_int to: %s", rkey)
             self._publisher.publish_message(self.STATE_SCBD.get_device_consume_queue('AT'), msg_params)
 
 
@@ -644,15 +621,12 @@ class DMCS:
             self.set_pending_nonblock_acks(acks, wait_time)
         except L1RedisError as e: 
             LOGGER.error("DMCS unable to process_start_integration_event - No redis connection: %s" % e.args)
-            print("DMCS unable to process_start_integration_event - No redis connection: %s" % e.args)
             raise L1Error("DMCS unable to process_start_integration_event - No redis connection: %s" % e.args)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to process_start_integration_event - No rabbit connection: %s" % e.args)
-            print("DMCS unable to process_start_integration_event - No rabbit connection: %s" % e.args)
             raise L1Error("DMCS unable to process_start_integration_event - No rabbit connection: %s" % e.args)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_start_integration_event: %s" % e.args)
-            print("DMCS unable to process_start_integration_event: %s" % e.args)
             raise L1Error("DMCS unable to process_start_integration_event: %s" % e.args)
 
 
@@ -694,11 +668,9 @@ class DMCS:
             self.set_pending_nonblock_acks(acks, wait_time)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to process_readout_event - No rabbit connection: %s" % e.args)
-            print("DMCS unable to process_readout_event - No rabbit connection: %s" % e.args)
             raise L1Error("DMCS unable to process_readout_event - No rabbit connection: %s" % e.args)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_readout_event: %s" % e.args)
-            print("DMCS unable to process_readout_event: %s" % e.args)
             raise L1Error("DMCS unable to process_readout_event: %s" % e.args)
         # add in two additional acks for format and transfer complete
 
@@ -733,7 +705,7 @@ class DMCS:
             #msg_params[JOB_NUM] = job_num
             #self.STATE_SCBD.set_job_state(job_num, "READOUT")
             rkey = self.STATE_SCBD.get_device_consume_queue('AT')
-            print("publishing end readout to: %s" % rkey) 
+            LOGGER.debug("publishing end readout to: %s", rkey)
             self._publisher.publish_message(self.STATE_SCBD.get_device_consume_queue('AT'), msg_params)
 
 
@@ -741,11 +713,9 @@ class DMCS:
             self.set_pending_nonblock_acks(acks, wait_time)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to process_readout_event - No rabbit connection: %s" % e.args)
-            print("DMCS unable to process_readout_event - No rabbit connection: %s" % e.args)
             raise L1Error("DMCS unable to process_readout_event - No rabbit connection: %s" % e.args)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_readout_event: %s" % e.args)
-            print("DMCS unable to process_readout_event: %s" % e.args)
             raise L1Error("DMCS unable to process_readout_event: %s" % e.args)
         # add in two additional acks for format and transfer complete
 
@@ -753,27 +723,19 @@ class DMCS:
 
 
     def process_ccs_start_int_event(self, params):
-        print("Incoming message to process_ccs_start_int_event: ")
-        self.prp.pprint(params) 
-        print("------------------------------\n\n")
+        LOGGER.debug("Incoming message to process_ccs_start_int_event:\n%s", LazyPformat(params))
 
     def process_ccs_readout_event(self, params):
-        print("Incoming message to process_ccs_readout_event: ")
-        self.prp.pprint(params) 
-        print("------------------------------\n\n")
+        LOGGER.debug("Incoming message to process_ccs_readout_event:\n%s", LazyPformat(params))
 
        
 
 
     def process_ccs_shutter_close_event(self, params):
-        print("Incoming message to process_ccs_shutter_close_event: ")
-        self.prp.pprint(params) 
-        print("------------------------------\n\n")
+        LOGGER.debug("Incoming message to process_ccs_shutter_close_event:\n%s", LazyPformat(params))
 
     def process_ccs_shutter_open_event(self, params):
-        print("Incoming message to process_ccs_shutter_open_event: ")
-        self.prp.pprint(params) 
-        print("------------------------------\n\n")
+        LOGGER.debug("Incoming message to process_ccs_shutter_open_event:\n%s", LazyPformat(params))
 
     def process_target_visit_event(self, params):
         try:
@@ -831,15 +793,12 @@ class DMCS:
                     pass
         except L1RedisError as e:
             LOGGER.error("DMCS unable to process_next_visit_event - No redis connection: %s" % e.args)
-            print("DMCS unable to process_next_visit_event - No redis connection: %s" % e.args)
             raise L1Error("DMCS unable to process_next_visit_event - No redis connection: %s" % e.args)
         except L1RabbitConnectionError as e:
             LOGGER.error("DMCS unable to process_next_visit_event - No rabbit connection: %s" % e.args)
-            print("DMCS unable to process_next_visit_event - No rabbit connection: %s" % e.args)
             raise L1Error("DMCS unable to process_next_visit_event - No rabbit connection: %s" % e.args)
         except Exception as e:
             LOGGER.error("DMCS unable to process_next_visit_event: %s" % e.args)
-            print("DMCS unable to process_next_visit_event: %s" % e.args)
             raise L1Error("DMCS unable to process_next_visit_event: %s" % e.args)
 
 
@@ -860,11 +819,9 @@ class DMCS:
 
         except L1RedisError as e:
             LOGGER.error("DMCS unable to process_ccs_take_images_event - No redis connection: %s" % e.args)
-            print("DMCS unable to process_start_integration_event - No redis connection: %s" % e.args)
             raise L1Error("DMCS unable to process_start_integration_event - No redis connection: %s" % e.args)
         except Exception as e:
             LOGGER.error("DMCS unable to process_ccs_take_images_event: %s" % e.args)
-            print("DMCS unable to process_ccs_take_images_event: %s" % e.args)
             raise L1Error("DMCS unable to process_ccs_take_images_event: %s" % e.args)
 
 
@@ -896,11 +853,9 @@ class DMCS:
             self.set_pending_nonblock_acks(acks, wait_time)
         except L1RabbitConnectionError as e:
             LOGGER.error("DMCS unable to process_readout_event - No rabbit connection: %s" % e.args)
-            print("DMCS unable to process_readout_event - No rabbit connection: %s" % e.args)
             raise L1Error("DMCS unable to process_readout_event - No rabbit connection: %s" % e.args)
         except Exception as e:
             LOGGER.error("DMCS unable to process_readout_event: %s" % e.args)
-            print("DMCS unable to process_readout_event: %s" % e.args)
             raise L1Error("DMCS unable to process_readout_event: %s" % e.args)
         # add in two additional acks for format and transfer complete
 
@@ -972,7 +927,6 @@ class DMCS:
             self.ACK_SCBD.add_timed_ack(params)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_ack: %s" % e.args)
-            print("DMCS unable to process_ack: %s" % e.args)
             raise L1Error("DMCS unable to process_ack: %s" % e.args)
             
 
@@ -988,7 +942,6 @@ class DMCS:
             self.ACK_SCBD.add_pending_nonblock_ack(params)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_pending_ack: %s" % e.args)
-            print("DMCS unable to process_pending_ack: %s" % e.args)
             raise L1Error("DMCS unable to process_pending_ack: %s" % e.args)
             
 
@@ -1023,7 +976,6 @@ class DMCS:
                 self.BACKLOG_SCBD.add_ccds_by_job(job_num, failed_list, params)
         except Exception as e: 
             LOGGER.error("DMCS unable to process_readout_results_ack: %s" % e.args) 
-            print("DMCS unable to process_readout_results_ack: %s" % e.args) 
             raise L1Error("DMCS unable to process_readout_results_ack: %s" % e.args) 
 
 
@@ -1085,7 +1037,6 @@ class DMCS:
             self.set_pending_nonblock_acks(ack_ids, wait_time)
         except Exception as e: 
             LOGGER.error("DMCS unable to send_new_seesion_msg: %s" % e.args) 
-            print("DMCS unable to send_new_seesion_msg: %s" % e.args) 
             raise L1Error("DMCS unable to send_new_seesion_msg: %s" % e.args) 
 
 
@@ -1124,7 +1075,6 @@ class DMCS:
                         return False
         except Exception as e: 
             LOGGER.error("DMCS unable to validate_transaction - can't use cfgkey: %s" % e.args) 
-            print("DMCS unable to validate_transaction - can't use cfgkey: %s" % e.args) 
             raise L1Error("DMCS unable to validate_transaction - can't use cfgkey") 
         
 
@@ -1136,13 +1086,12 @@ class DMCS:
                 response = response + cfg_response
                 self.send_ocs_ack(transition_is_valid, response, msg_in)
             else:
-                print("DMCS - BAD Device Transition from %s  to %s" % (current_state, new_state))
+                LOGGER.error("DMCS - BAD Device Transition from %s  to %s", current_state, new_state)
                 response = "Invalid transition: " + str(current_state) + " to " + new_state
                 #response = response + ". Device remaining in " + current_state + " state."
                 self.send_ocs_ack(transition_is_valid, response, msg_in)
         except Exception as e: 
             LOGGER.error("DMCS unable to validate_transaction - can't check scoreboards: %s" % e.args) 
-            print("DMCS unable to validate_transaction - can't check scoreboards: %s" % e.args) 
             raise L1Error("DMCS unable to validate_transaction - can't check scoreboards: %s" % e.args) 
             
 
@@ -1154,13 +1103,13 @@ class DMCS:
             expiry_time.
 
             :params acks: List of ack_id to send pending_ack message to.
-            :params wait_time: expiry_time in seconds.
+            :params wait_time: Seconds from now until the ack is overdue;
+                EXPIRY_TIME is sent as epoch seconds.
 
             :return: None.
         """
         try: 
-            start_time = datetime.datetime.now().time()
-            expiry_time = self.add_seconds(start_time, wait_time)
+            expiry_time = time.time() + wait_time
             ack_msg = {}
             ack_msg[MSG_TYPE] = 'PENDING_ACK'
             ack_msg['EXPIRY_TIME'] = expiry_time
@@ -1169,11 +1118,9 @@ class DMCS:
                 self._publisher.publish_message("dmcs_ack_consume", ack_msg)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to send_pending_nonblock_acks: %s" % e.args)
-            print("DMCS unable to send_pending_nonblock_acks: %s" % e.args)
             raise L1Error("DMCS unable to send_pending_nonblock_acks: %s" % e.args) 
         except Exception as e: 
             LOGGER.error("DMCS unable to send_pending_nonblock_acks: %s" % e.args)
-            print("DMCS unable to send_pending_nonblock_acks: %s" % e.args) 
             raise L1Error("DMCS unable to send_pending_nonblock_acks: %s" % e.args)
         
 
@@ -1201,11 +1148,9 @@ class DMCS:
             self._publisher.publish_message(self.DMCS_OCS_PUBLISH, message) 
         except L1RabbitConnnectionError as e: 
             LOGGER.error("DMCS unable to send_ocs_ack: %s" % e.args) 
-            print("DMCS unable to send_ocs_ack: %s" % e.args) 
             raise L1Error("DMCS unable to send_ocs_ack: %s" % e.args) 
         except Exception as e: 
             LOGGER.error("DMCS unable to send_ocs_ack: %s" % e.args) 
-            print("DMCS unable to send_ocs_ack: %s" % e.args)
             raise L1Error("DMCS unable to send_ocs_ack - Rabbit Problem?: %s" % e.args)
 
         if transition_check:
@@ -1256,11 +1201,9 @@ class DMCS:
             self._publisher.publish_message(self.DMCS_OCS_PUBLISH, message)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to send_summary_state_event: %s" % e.args)
-            print("DMCS unable to send_summary_state_event: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 11)
         except Exception as e: 
             LOGGER.error("DMCS unable to send_summary_state_event: %s" % e.args)
-            print("DMCS unable to send_summary_state_event: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 10)
 
 
@@ -1280,11 +1223,9 @@ class DMCS:
             self._publisher.publish_message(self.DMCS_OCS_PUBLISH, message)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to send_recommended_settings_version_event: %s" % e.args)
-            print("DMCS unable to send_recommended_settings_version_event: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 11)
         except Exception as e: 
             LOGGER.error("DMCS unable to send_recommended_settings_version_event: %s" % e.args)
-            print("DMCS unable to send_recommended_settings_version_event: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 10)
 
 
@@ -1303,11 +1244,9 @@ class DMCS:
             self._publisher.publish_message(self.DMCS_OCS_PUBLISH, message)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to send_setting_applied_event: %s" % e.args)
-            print("DMCS unable to send_setting_applied_event: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 11)
         except Exception as e: 
             LOGGER.error("DMCS unable to send_setting_applied_event: %s" % e.args)
-            print("DMCS unable to send_setting_applied_event: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 10)
         
 
@@ -1327,11 +1266,9 @@ class DMCS:
             self._publisher.publish_message(self.DMCS_OCS_PUBLISH, message)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to send_applied_setting_match_start_event: %s" % e.args)
-            print("DMCS unable to send_applied_setting_match_start_event: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 11)
         except Exception as e: 
             LOGGER.error("DMCS unable to send_applied_setting_match_start_event: %s" % e.args)
-            print("DMCS unable to send_applied_setting_match_start_event: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 10)
 
 
@@ -1350,11 +1287,9 @@ class DMCS:
             self._publisher.publish_message(self.DMCS_OCS_PUBLISH, message)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to send_error_code_event: %s" % e.args)
-            print("DMCS unable to send_error_code_event: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 11)
         except Exception as e: 
             LOGGER.error("DMCS unable to send_error_code_event: %s" % e.args)
-            print("DMCS unable to send_error_code_event: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 10)
         
 
@@ -1374,11 +1309,9 @@ class DMCS:
             retval = ack_type + "_" + str(self._next_timed_ack_id).zfill(6)
         except KeyError as e: 
             LOGGER.error("DMCS unable to get_next_timed_ack_id: %s" % e.args)
-            print("DMCS unable to get_next_timed_ack_id: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 2); 
         except Exception as e: 
             LOGGER.error("DMCS unable to get_next_timed_ack_id: %s" % e.args)
-            print("DMCS unable to get_next_timed_ack_id: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 3); 
 
         return retval 
@@ -1396,7 +1329,7 @@ class DMCS:
 
 
     def progressive_ack_timer(self, ack_id, expected_replies, seconds):
-        """ Sleeps for user-defined seconds, or less if everyone has reported back in.
+        """ Waits up to user-defined seconds, or less if everyone has reported back in.
 
             :params ack_id: Ack ID to wait for.
 
@@ -1405,28 +1338,10 @@ class DMCS:
             :params seconds: Maximum time to wait in seconds.
 
             :return: The dictionary that represents the responses from the components ack'ing.
-                     Note: If only one component will ack, this method breaks out of its
-                           loop after the one ack shows up - effectively beating the maximum
-                           wait time.
+                     Note: The Ack Scoreboard wakes this call as soon as the last expected
+                           ack is checked in, rather than at the end of the maximum wait time.
         """
-        counter = 0.0
-        while (counter < seconds):
-            counter = counter + 0.5
-            sleep(0.5)
-            response = self.ACK_SCBD.get_components_for_timed_ack(ack_id)
-            if response == None:
-                continue
-            if len(list(response.keys())) == expected_replies:
-                return response
-
-        ## Try one final time
-        response = self.ACK_SCBD.get_components_for_timed_ack(ack_id)
-        if response == None:
-            return None
-        elif len(list(response.keys())) == expected_replies:
-            return response
-        else:
-            return None
+        return self.ACK_SCBD.wait_for_timed_acks(ack_id, expected_replies, seconds)
 
 
     def extract_config_values(self):
@@ -1473,7 +1388,7 @@ class DMCS:
         base_broker_url = "amqp://" + self._msg_name + ":" + \
                                             self._msg_passwd + "@" + \
                                             str(self._base_broker_addr)
-        print("CONSUMER THREADS: %s" % base_broker_url)
+        LOGGER.debug("CONSUMER THREADS: %s", base_broker_url)
         LOGGER.info('Building _base_broker_url. Result is %s', base_broker_url)
 
         self.shutdown_event = threading.Event()
@@ -1502,14 +1417,12 @@ class DMCS:
             md['test_val'] = None
             kws[md['name']] = md
 
-            self.thread_manager = ThreadManager('thread-manager', kws, self.shutdown_event)
+            self.thread_manager = ThreadManager('thread-manager', kws, self.shutdown_event, multiplex=True)
         except ThreadError as e:
             LOGGER.error("DMCS unable to launch Consumers - Thread Error: %s" % e.args)
-            print("DMCS unable to launch Consumers - Thread Error: %s" % e.args)
             raise L1ConsumerError("Thread problem preventing Consumer launch: %s" % e.args)
         except Exception as e: 
             LOGGER.error("DMCS unable to launch Consumers: %s" % e.args)
-            print("DMCS unable to launch Consumers: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 1) 
 
         self.thread_manager.start()
@@ -1520,19 +1433,17 @@ class DMCS:
             LOGGER.info('Setting up DMCS Scoreboards')
             self.BACKLOG_SCBD = BacklogScoreboard('DMCS_BACKLOG_SCBD', self.backlog_db_instance)
             self.ACK_SCBD = AckScoreboard('DMCS_ACK_SCBD', self.ack_db_instance)
-            print("In init of DMCS, rdict fresh from CFG file is: ")
-            self.prp.pprint(self.rdict)
-            print("Done in init")
+            self.ACK_SCBD.start_ack_sweeper()
+            LOGGER.debug("In init of DMCS, rdict fresh from CFG file is:\n%s", LazyPformat(self.rdict))
+            LOGGER.debug("Done in init")
             self.STATE_SCBD = StateScoreboard('DMCS_STATE_SCBD', self.state_db_instance, self.ddict, self.rdict)
         except L1RabbitConnectionError as e: 
             LOGGER.error("DMCS unable to complete setup_scoreboards - No Rabbit Connect: %s" % e.args)
         except L1RedisError as e: 
             LOGGER.error("DMCS unable to complete setup_scoreboards - No Redis connect: %s" % e.args)
-            print("DMCS unable to complete setup_scoreboards - No Redis connection: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 12)
         except Exception as e: 
             LOGGER.error("DMCS init unable to complete setup_scoreboards: %s" % e.args)
-            print("DMCS unable to complete setup_scoreboards: %s" % e.args)
             sys.exit(self.ERROR_CODE_PREFIX + 10)
 
         try: 
@@ -1563,17 +1474,10 @@ class DMCS:
             self.send_appropriate_events_by_state('AT', 'OFFLINE')
         except Exception as e: 
             LOGGER.error("DMCS init unable to complete setup_scoreboards - Cannot set scoreboards: %s" % e.args)
-            print("DMCS init unable to complete setup_scoreboards - Cannot set scoreboards: %s" % e.args) 
             sys.exit(self.ERROR_CODE_PREFIX + 10) 
         LOGGER.info('DMCS Scoreboard Init complete')
 
 
-    def add_seconds(self, intime, secs):
-        basetime = datetime.datetime(100, 1, 1, intime.hour, intime.minute, intime.second)
-        newtime = basetime + datetime.timedelta(seconds=secs)
-        return newtime.time()
-
-
     def purge_broker(self, vhost, queues):
         for q in queues:
             cmd = "sudo rabbitmqctl -p " + vhost + " purge_queue " + q
@@ -1595,23 +1499,22 @@ class DMCS:
         self.shutdown_event.set()
         LOGGER.debug("Thread Manager shutting down and app exiting...")
         #sys.exit(0)
-        print("\n")
         os._exit(0)
 
     def process_take_image_done(self, params):
-        print("xxxxxxxxxxxxxxxxxxxxx")
-        print("[x] TAKE_IMAGE_DONE") 
-        print("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        LOGGER.debug("xxxxxxxxxxxxxxxxxxxxx")
+        LOGGER.debug("[x] TAKE_IMAGE_DONE")
+        LOGGER.debug("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
 
     def process_target_visit_done(self, params): 
-        print("[x] TARGET_VISIT_DONE")
+        LOGGER.debug("[x] TARGET_VISIT_DONE")
 
     def process_target_visit_accept(self, params):
-        print("[x] TARGET_VISIT_ACCEPT")
+        LOGGER.debug("[x] TARGET_VISIT_ACCEPT")
 
 
 def main():
-    logging.basicConfig(filename='logs/DMCS.log', level=logging.INFO, format=LOG_FORMAT)
+    logmod.setup_logging(filename='logs/DMCS.log', level=logging.INFO)
     dmsc = DMCS()
     print("DMCS seems to be working")
     try:
@@ -1,16 +1,17 @@
+import asyncio
 import pika
 from Scratchpad import Scratchpad
-from toolsmod import get_timestamp
+from timemod import get_timestamp
 import yaml
 import sys
 import time
 import logging
+import logmod
 import os
 import subprocess
-import _thread
 from const import *
-from Consumer import Consumer
-from SimplePublisher import SimplePublisher
+from AsyncConsumer import AsyncConsumer
+from AsyncPublisher import AsyncPublisher
 
 LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
              '-35s %(lineno) -5d: %(message)s')
@@ -25,6 +26,9 @@ class Distributor:
        parent class for both may be a better approach... but at this
        point, they are separate classes until it is certain that
        individual classes are definetely not necessary.
+
+       The consumer and the publisher share one asyncio event loop, which
+       run() drives on the calling thread.
     """
 
     def __init__(self):
@@ -47,8 +51,8 @@ class Distributor:
             self._sentinel_file = cdm[SENTINEL_FILE]
         except KeyError as e:
             LOGGER.critical(e)
-            print("Key error reading cfg file.")
-            print("Bailing out...")
+            LOGGER.error("Key error reading cfg file.")
+            LOGGER.error("Bailing out...")
             sys.exit(99)
 
 
@@ -59,63 +63,73 @@ class Distributor:
                               DISTRIBUTOR_JOB_PARAMS: self.process_job_params,
                               DISTRIBUTOR_READOUT: self.process_foreman_readout }
 
+        self._loop = asyncio.new_event_loop()
         self.setup_publishers()
         self.setup_consumers()
         self._job_scratchpad = Scratchpad(self._ncsa_broker_url)
 
     def setup_publishers(self):
         LOGGER.info('Setting up publisher for Distributor on %s', self._ncsa_broker_url)
-        self._publisher = SimplePublisher(self._ncsa_broker_url)
+        self._publisher = AsyncPublisher(self._ncsa_broker_url, loop=self._loop)
 
 
     def setup_consumers(self):
         LOGGER.info('Distributor %s setting up consumer on %s', self._name, self._ncsa_broker_url)
-        LOGGER.info('Starting new thread on consumer method')
-        threadname = "thread-" + self._consume_queue
+        self._consumer = AsyncConsumer(self._ncsa_broker_url, self._consume_queue, self._name,
+                                       self.on_message, None, loop=self._loop)
+
+
+    def run(self):
+        """ Consume until the loop is stopped, e.g. by KeyboardInterrupt. """
+        self._loop.run_until_complete(self._consumer.start())
+        LOGGER.info('Distributor %s consuming from %s', self._name, self._consume_queue)
+        self._loop.run_forever()
 
-        self._consumer = Consumer(self._ncsa_broker_url, self._consume_queue)
-        try:
-            _thread.start_new_thread(self.run_consumer, (threadname, 2,) )
-            LOGGER.info('Started distributor consumer thread %s', threadname)
-        except:
-            LOGGER.critical('Cannot start Distributor consumer thread, exiting...')
-            sys.exit(107)
 
+    def shutdown(self):
+        """ Stop consuming, let handlers in progress finish or cancel them,
+            then close the publisher.
+        """
+        self._loop.run_until_complete(self._consumer.stop())
+        self._loop.run_until_complete(self._publisher.close())
+        self._loop.close()
 
-    def run_consumer(self, threadname, delay):
-        self._consumer.run(self.on_message)
 
-    def on_message(self, ch, method, properties, body):
+    async def on_message(self, ch, method, properties, msg_dict):
         ch.basic_ack(method.delivery_tag) 
-        msg_dict = yaml.load(body)
         LOGGER.info('In %s message callback', self._name)
-        LOGGER.debug('Thread in %s callback is %s', self._name, _thread.get_ident())
         LOGGER.debug('%s callback message body is: %s', self._name, str(msg_dict))
 
         handler = self._msg_actions.get(msg_dict[MSG_TYPE])
-        result = handler(msg_dict)
+        result = await handler(msg_dict)
 
 
-    def process_health_check(self, params):
+    async def process_health_check(self, params):
         job_number = params[JOB_NUM]
         self._job_scratchpad.set_job_value(job_number, "STATE", "ADD_JOB")
         self._job_scratchpad.set_job_value(job_number, "ADD_JOB_TIME", get_timestamp())
-        self.send_ack_response("DISTRIBUTOR_HEALTH_ACK", params)
+        await self.send_ack_response("DISTRIBUTOR_HEALTH_ACK", params)
 
 
-    def process_job_params(self, params):
-        transfer_params = params[TRANSFER_PARAMS]
-        self._job_scratchpad.set_job_transfer_params(params[JOB_NUM], transfer_params)
+    async def process_job_params(self, params):
+        job_number = params[JOB_NUM]
+        transfer_params = params["TRANSFER_PARAMS"]
+        self._job_scratchpad.set_job_transfer_params(job_number, transfer_params)
         self._job_scratchpad.set_job_value(job_number, "STATE", "READY_WITH_PARAMS")
         self._job_scratchpad.set_job_value(job_number, "READY_WITH_PARAMS_TIME", get_timestamp())
-        self.send_ack_response(DISTRIBUTOR_JOB_PARAMS_ACK, params)
+        await self.send_ack_response(DISTRIBUTOR_JOB_PARAMS_ACK, params)
+
+
+    async def check_output(self, cmd):
+        """ Run a shell command off the event loop and return its output. """
+        return await self._loop.run_in_executor(None, lambda: subprocess.check_output(cmd, shell=True))
 
 
-    def process_foreman_readout(self, params):
+    async def process_foreman_readout(self, params):
         LOGGER.info('At Top of Distributor readout')
         job_number = params[JOB_NUM]
         cmd = self._target_dir + "check_sentinel.sh"
-        result = subprocess.check_output(cmd, shell=True)
+        result = await self.check_output(cmd)
         LOGGER.info('check_sentinel test is complete')
         # xfer complete
         #xfer_time = ""
@@ -125,7 +139,7 @@ class Distributor:
 ####  Checking for and processing image file goes here
         """
         command = "cat " + self._target_dir + "rcv_logg.test"
-        cat_result = subprocess.check_output(command, shell=True)
+        cat_result = await self.check_output(command)
 
         #filename = self._target_dir + "rcv_logg.test"
         #f = open(filename, 'r')
@@ -139,7 +153,7 @@ class Distributor:
         msg['COMMENT1'] = "Result from xfer command is: %s" % result
         msg['COMMENT2'] = "cat_result is -->  %s" % cat_result
         msg['COMMENT3'] = "Command used to call check_sentinel.sh is %s" % cmd
-        self._publisher.publish_message("reports", yaml.dump(msg))
+        await self._publisher.publish_message("reports", msg)
 
         readout_dict = {}
         readout_dict[MSG_TYPE] = "DISTRIBUTOR_READOUT_ACK"
@@ -147,9 +161,9 @@ class Distributor:
         readout_dict["COMPONENT"] = self._fqn_name
         readout_dict["ACK_BOOL"] = True
         readout_dict["ACK_ID"] = params["TIMED_ACK_ID"]
-        self._publisher.publish_message(self._publish_queue, yaml.dump(readout_dict))
+        await self._publisher.publish_message(self._publish_queue, readout_dict)
 
-    def send_ack_response(self, type, params):
+    async def send_ack_response(self, type, params):
         timed_ack = params.get("TIMED_ACK_ID")
         job_num = params.get(JOB_NUM)
         if timed_ack is None:
@@ -162,8 +176,8 @@ class Distributor:
             msg_params[JOB_NUM] = job_num
             msg_params[NAME] = "DISTRIBUTOR_" + self._name
             msg_params[ACK_BOOL] = "TRUE"
-            msg_params[TIMED_ACK] = timed_ack
-            self._publisher.publish_message("reports", yaml.dump(msg_params))
+            msg_params[ACK_ID] = timed_ack
+            await self._publisher.publish_message("reports", msg_params)
             LOGGER.info('%s sent for ACK ID: %s and JOB_NUM: %s', type, timed_ack, job_num)
 
 
@@ -179,14 +193,14 @@ class Distributor:
 
 
 def main():
-    logging.basicConfig(filename='logs/distributor.log', level=logging.INFO, format=LOG_FORMAT)
+    logmod.setup_logging(filename='logs/distributor.log', level=logging.INFO)
     dist = Distributor()
     print("Starting Distributor event loop...")
     try:
-        while 1:
-            pass
+        dist.run()
     except KeyboardInterrupt:
         pass
+    dist.shutdown()
 
     print("")
     print("Distributor Finished")
@@ -2,10 +2,11 @@
 ## STATUS Column: { HEALTHY, UNHEALTHY, UNKNOWN }
 
 import logging
+import logmod
 import redis
 import time
 import sys
-from toolsmod import get_epoch_timestamp
+from timemod import get_epoch_timestamp
 from toolsmod import L1RedisError
 from toolsmod import L1RabbitConnectionError
 from Scoreboard import Scoreboard
@@ -21,6 +22,10 @@ class DistributorScoreboard(Scoreboard):
     PUBLISH_QUEUE = 'distributor_publish'
     DB_TYPE = ""
     DB_INSTANCE = None
+    INDEXED_FIELDS = ('STATE', 'STATUS')
+    INDEX_PREFIX = 'distributor_index:'
+    STATIC_FIELDS = ('NAME', 'HOSTNAME', 'IP_ADDR', 'TARGET_DIR', 'CONSUME_QUEUE',
+                     'ROUTING_KEY', 'XFER_LOGIN')
 
     def __init__(self, db_type, db_instance, ddict):
         LOGGER.info('Setting up DistributorScoreboard')
@@ -31,57 +36,46 @@ class DistributorScoreboard(Scoreboard):
             Scoreboard.__init__(self)
         except L1RabbitConnectionError as e:
             LOGGER.error('Failed to make connection to Message Broker: %s', e.arg)
-            print("No Monitoring for YOU")
+            LOGGER.error("No Monitoring for YOU")
             raise L1Error('Calling super.init in DistScoreboard init caused: %s', e.arg)
 
         try:
             self._redis = self.connect()
         except L1RedisError as e:
             LOGGER.error('Failed to make connection to Redis: %s', e.arg)
-            print("No Redis for YOU")
+            LOGGER.error("No Redis for YOU")
             raise L1Error('Calling Redis connect in Distributor Scoreboard init caused: %s', e.arg)
 
-        self._redis.flushdb()
-
-        distributors = list(ddict.keys())
-        for distributor in distributors:
-            fields = ddict[distributor]
-            name = fields['NAME']
-            ip_addr = fields['IP_ADDR']
-            target_dir = fields['TARGET_DIR']
-            xfer_login = name + "@" + ip_addr 
-            routing_key = fields['CONSUME_QUEUE']
-            publish_queue = "distributor_publish"
-
-            for field in fields:
-                self._redis.hset(distributor, field, fields[field])
-                self._redis.hset(distributor, 'XFER_LOGIN', xfer_login)
-                self._redis.hset(distributor, 'STATUS', 'HEALTHY')
-                self._redis.hset(distributor, 'ROUTING_KEY', routing_key)
-                self._redis.hset(distributor, 'MATE', 'NONE')
-  
-
-            self._redis.lpush(self.DISTRIBUTOR_ROWS, distributor)
+        self._set_indexed = self.register_script(self.SET_INDEXED_FIELDS_SCRIPT,
+                                                 self.set_indexed_fields_locally)
+        warm = self.start_db()
+
+        rows = {}
+        for distributor in ddict:
+            fields = dict(ddict[distributor])
+            fields['XFER_LOGIN'] = fields['NAME'] + "@" + fields['IP_ADDR']
+            fields['STATUS'] = 'HEALTHY'
+            fields['ROUTING_KEY'] = fields['CONSUME_QUEUE']
+            fields['MATE'] = 'NONE'
+            rows[distributor] = fields
+
+        if warm:
+            self.reconcile_rows(self.DISTRIBUTOR_ROWS, rows)
+            pipe = self._redis.pipeline()
+        else:
+            pipe = self._redis.pipeline()
+            for distributor, fields in rows.items():
+                pipe.hset(distributor, mapping=fields)
+                pipe.lpush(self.DISTRIBUTOR_ROWS, distributor)
+                for field in self.INDEXED_FIELDS:
+                    if field in fields:
+                        pipe.sadd(self.index_key(field, fields[field]), distributor)
+        self.bump_static_version(pipe)
+        pipe.execute()
         
         #self.persist_snapshot(self._redis)
 
 
-    def connect(self):
-        #pool = redis.ConnectionPool(host='localhost', port=6379, db=self.DB_INSTANCE)
-        #self._redis = redis.Redis(connection_pool=pool)
-        try:
-            sconn = redis.StrictRedis(host='localhost',port='6379', \
-                                      charset='utf-8', db=self.DB_INSTANCE, \
-                                      decode_responses=True)
-            sconn.ping()
-            LOGGER.info("Redis connected. Connection details are: %s", sconn)
-            return sconn
-        except Exception as e:
-            LOGGER.critical("Redis connection error: %s", e)
-            LOGGER.critical("Exiting due to Redis connection failure.")
-            sys.exit(100)
-
-    
     def print_all(self):
         all_distributors = self.return_distributors_list()
         for distributor in all_distributors:
@@ -97,15 +91,7 @@ class DistributorScoreboard(Scoreboard):
 
 
     def get_healthy_distributors_list(self): 
-        healthy_distributors = []
-        distributors = self._redis.lrange(self.DISTRIBUTOR_ROWS, 0, -1)
-        for distributor in distributors:
-            print("Checking health")
-            if self._redis.hget(distributor, 'STATUS') == 'HEALTHY':
-                print("Found a healthy distributor")
-                healthy_distributors.append(distributor)
-
-        return healthy_distributors
+        return sorted(self._redis.smembers(self.index_key('STATUS', 'HEALTHY')))
 
 
     def set_distributor_params(self, distributor, params):
@@ -113,46 +99,41 @@ class DistributorScoreboard(Scoreboard):
            qualified name, such as DISTRIBUTOR_2
 
         """
-        for kee in list(params.keys()):
-            self._redis.hset(distributor, kee, params[kee])
+        self.set_indexed_fields([distributor], params)
         #self.persist_snapshot(self._redis, "distributorscoreboard") 
 
 
     def set_value_for_multiple_distributors(self, distributors, kee, val):
-        for distributor in distributors:
-            self._redis.hset(distributor, kee, val)
+        self.set_params_for_multiple_distributors(distributors, {kee: val})
         #self.persist_snapshot(self._redis, "distributorscoreboard") 
 
 
     def set_params_for_multiple_distributors(self, distributors, params):
-        for distributor in distributors:
-            kees = list(params.keys())
-            for kee in kees:
-                self._redis.hset(distributor, kee, params[kee])
+        self.set_indexed_fields(distributors, params)
         #self.persist_snapshot(self._redis, "distributorscoreboard") 
 
 
     def get_value_for_distributor(self, distributor, kee):
-        return self._redis.hget(distributor, kee)
+        return self.get_static_field(distributor, kee)
 
 
     def set_distributor_state(self, distributor, state):
-        self._redis.hset(distributor,'STATE', state)
+        self.set_indexed_fields([distributor], {'STATE': state})
         #self.persist_snapshot(self._redis, "distributorscoreboard") 
 
 
     def set_distributor_status(self, distributor, status):
-        self._redis.hset(distributor,'STATUS', status)
+        self.set_indexed_fields([distributor], {'STATUS': status})
         #self.persist_snapshot(self._redis, "distributorscoreboard") 
 
 
     def get_routing_key(self, distributor):
-        return self._redis.hget(distributor,'ROUTING_KEY')
+        return self.get_static_field(distributor, 'ROUTING_KEY')
 
 
 
 def main():
-    logging.basicConfig(filename='logs/DistributorScoreboard.log', level=logging.INFO, format=LOG_FORMAT)
+    logmod.setup_logging(filename='logs/DistributorScoreboard.log', level=logging.INFO)
 
     f = open('L1SystemCfg.yaml')
 
@@ -1,7 +1,7 @@
 import pika
 from Scratchpad import Scratchpad
-from toolsmod import get_timestamp
-from toolsmod import get_epoch_timestamp
+from timemod import get_timestamp
+from timemod import get_epoch_timestamp
 import yaml
 import sys
 import time
@@ -18,6 +18,9 @@ from const import *
 from Consumer import Consumer
 from SimplePublisher import SimplePublisher
 
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
 
 class Forwarder:
     """Presents a vanilla L1 Forwarder personality. In
@@ -43,7 +46,7 @@ class Forwarder:
             ## XXX FIX: Put in config file
             self.CHECKSUM_ENABLED = False 
         except KeyError as e:
-            print("Missing base keywords in yaml file... Bailing out...")
+            LOGGER.error("Missing base keywords in yaml file... Bailing out...")
             sys.exit(99)
 
         #self._DAQ_PATH = "/home/F1/xfer_dir/"
@@ -67,12 +70,12 @@ class Forwarder:
  
     def setup_consumers(self):
         threadname = "thread-" + self._consume_queue
-        print("Threadname is %s" % threadname)
+        LOGGER.debug("Threadname is %s", threadname)
 
         self._consumer = Consumer(self._base_broker_url, self._consume_queue)
         try:
             _thread.start_new_thread( self.run_consumer, (threadname, 2,) )
-            print("Started Consumer Thread")
+            LOGGER.debug("Started Consumer Thread")
         except:
             sys.exit(99)
 
@@ -83,7 +86,7 @@ class Forwarder:
 
     def on_message(self, ch, method, properties, body):
         ch.basic_ack(delivery_tag) 
-        print("INcoming PARAMS, body is:\n%s" % body)
+        LOGGER.debug("INcoming PARAMS, body is:\n%s", body)
         msg_dict = body
 
         handler = self._msg_actions.get(msg_dict[MSG_TYPE])
@@ -140,7 +143,7 @@ class Forwarder:
         s_params['TARGET_DIR'] = target_dir
         s_params['FILENAME_STUB'] = filename_stub
 
-        print("S_params are: %s" % s_params)
+        LOGGER.debug("S_params are: %s", s_params)
         
         # Now, s_params should have all we need for job. Place as value for job_num key 
         self._job_scratchpad.set_job_transfer_params(params[JOB_NUM], s_params)
@@ -185,7 +188,7 @@ class Forwarder:
             filename = "ccd_" + str(ccd) + ".data"
             raw_files_dict[ccd] = filename
 
-        print("In Forwarder Fetch method, raw_files_dict is: \n%s" % raw_files_dict)
+        LOGGER.debug("In Forwarder Fetch method, raw_files_dict is: \n%s", raw_files_dict)
         return raw_files_dict
 
 
@@ -217,28 +220,28 @@ class Forwarder:
         for kee in keez:
             final_filename = filename_stub + "_" + kee + ".fits"
             target = self._DAQ_PATH + final_filename
-            print("Final filename is %s" % final_filename) 
-            print("target is %s" % target) 
+            LOGGER.debug("Final filename is %s", final_filename)
+            LOGGER.debug("target is %s", target)
             cmd1 = 'cat ' + self._DAQ_PATH + "ccd.header" + " >> " + target
             cmd2 = 'cat ' + self._DAQ_PATH + raw_files_dict[kee] + " >> " + target
             dte = get_epoch_timestamp()
-            print("DTE IS %s" % dte)
+            LOGGER.debug("DTE IS %s", dte)
             cmd3 = 'echo ' + str(dte) +  " >> " + target
-            print("cmd1 is %s" % cmd1)
-            print("cmd2 is %s" % cmd2)
+            LOGGER.debug("cmd1 is %s", cmd1)
+            LOGGER.debug("cmd2 is %s", cmd2)
             os.system(cmd1)
             os.system(cmd2)
             os.system(cmd3)
             final_filenames[kee] = final_filename 
             
-            print("Done in format()...file list is: %s" % final_filenames)
+            LOGGER.debug("Done in format()...file list is: %s", final_filenames)
 
-        print("In format method, final_filenames are:\n%s" % final_filenames)
+        LOGGER.debug("In format method, final_filenames are:\n%s", final_filenames)
         return final_filenames        
 
 
     def forward(self, job_num, final_filenames):
-        print("Start Time of READOUT IS: %s" % get_timestamp())
+        LOGGER.debug("Start Time of READOUT IS: %s", get_timestamp())
         login_str = self._job_scratchpad.get_job_value(job_num, 'LOGIN_STR')
         target_dir = self._job_scratchpad.get_job_value(job_num, 'TARGET_DIR')
         results = {}
@@ -260,15 +263,15 @@ class Forwarder:
                 CHECKSUM_LIST.append(resulting_md5)
                 FILENAME_LIST.append(target_dir + final_file)
                 cmd = 'scp ' + pathway + " " + login_str + target_dir + final_file
-                print("Finish Time of SCP'ing %s IS: %s" % (pathway, get_timestamp()))
-                print("In forward() method, cmd is %s" % cmd)
+                LOGGER.debug("Finish Time of SCP'ing %s IS: %s", pathway, get_timestamp())
+                LOGGER.debug("In forward() method, cmd is %s", cmd)
                 os.system(cmd)
                 results['CCD_LIST'] = CCD_LIST
                 results['FILENAME_LIST'] = FILENAME_LIST
                 results['CHECKSUM_LIST'] = CHECKSUM_LIST
 
-        print("END Time of READOUT XFER IS: %s" % get_timestamp())
-        print("In forward method, results are: \n%s" % results)
+        LOGGER.debug("END Time of READOUT XFER IS: %s", get_timestamp())
+        LOGGER.debug("In forward method, results are: \n%s", results)
         return results
             
         #cmd = 'cd ~/xfer_dir && scp -r $(ls -t)' + ' ' + str(self._xfer_login) + ':xfer_dir'
@@ -1,7 +1,7 @@
 from Scoreboard import Scoreboard
 import redis
 import sys
-import yaml
+import ScoreboardCodec
 import logging
 from const import * 
 
@@ -15,6 +15,110 @@ class ForwarderScoreboard(Scoreboard):
     PUBLISH_QUEUE = 'forwarder_publish'
     DB_TYPE = ""
     DB_INSTANCE = None
+    INDEXED_FIELDS = ('STATE', 'STATUS')
+    INDEX_PREFIX = 'forwarder_index:'
+    LEASE_PREFIX = 'forwarder_lease:'
+    STATIC_FIELDS = ('NAME', 'HOSTNAME', 'IP_ADDR', 'CONSUME_QUEUE')
+
+    LEASE_ATTEMPTS = 3
+
+    # Atomically takes ARGV[1] of the candidate forwarders that are still
+    # both IDLE and HEALTHY, marks them BUSY with JOB_NUM set to ARGV[2]
+    # and records them in the job's lease set. Takes none if fewer than
+    # ARGV[1] candidates are still available.
+    # KEYS: STATE:IDLE index, STATE:BUSY index, STATUS:HEALTHY index,
+    #       the job's lease set, then the candidate forwarder rows
+    # ARGV: n, job number
+    LEASE_SCRIPT = """
+        local n, job = tonumber(ARGV[1]), ARGV[2]
+        local leased = {}
+        for i = 5, #KEYS do
+            if #leased == n then
+                break
+            end
+            if redis.call('SISMEMBER', KEYS[1], KEYS[i]) == 1
+                    and redis.call('SISMEMBER', KEYS[3], KEYS[i]) == 1 then
+                leased[#leased + 1] = KEYS[i]
+            end
+        end
+        if #leased < n then
+            return {}
+        end
+        for _, forwarder in ipairs(leased) do
+            redis.call('SMOVE', KEYS[1], KEYS[2], forwarder)
+            redis.call('HSET', forwarder, 'STATE', 'BUSY', 'JOB_NUM', job)
+            redis.call('SADD', KEYS[4], forwarder)
+        end
+        return leased
+    """
+
+    # Returns forwarders leased to job ARGV[1] to IDLE, unless one has
+    # since been taken by another job, and drops them from the lease. Each
+    # forwarder comes with the index set of the state it was read in; if
+    # any has changed state since, nothing is done and false is returned.
+    # KEYS: the job's lease set, STATE:IDLE index, then pairs of forwarder
+    #       row and its STATE index set
+    # ARGV: job number, then the state each forwarder was read in
+    RELEASE_SCRIPT = """
+        local job = ARGV[1]
+        for i = 3, #KEYS, 2 do
+            if redis.call('HGET', KEYS[i], 'JOB_NUM') == job
+                    and (redis.call('HGET', KEYS[i], 'STATE') or '') ~= ARGV[(i - 1) / 2 + 1] then
+                return false
+            end
+        end
+        local released = {}
+        for i = 3, #KEYS, 2 do
+            local forwarder = KEYS[i]
+            if redis.call('HGET', forwarder, 'JOB_NUM') == job then
+                redis.call('SREM', KEYS[i + 1], forwarder)
+                redis.call('SADD', KEYS[2], forwarder)
+                redis.call('HSET', forwarder, 'STATE', 'IDLE')
+                redis.call('HDEL', forwarder, 'JOB_NUM')
+                released[#released + 1] = forwarder
+            end
+            redis.call('SREM', KEYS[1], forwarder)
+        end
+        return released
+    """
+
+    # Python versions of the scripts above, for the in-memory backend
+
+    @staticmethod
+    def lease_locally(client, keys, args):
+        n, job = int(args[0]), args[1]
+        idle, busy, healthy, lease = keys[:4]
+        leased = []
+        for forwarder in keys[4:]:
+            if len(leased) == n:
+                break
+            if client.sismember(idle, forwarder) and client.sismember(healthy, forwarder):
+                leased.append(forwarder)
+        if len(leased) < n:
+            return []
+        for forwarder in leased:
+            client.smove(idle, busy, forwarder)
+            client.hset(forwarder, mapping={'STATE': 'BUSY', 'JOB_NUM': job})
+            client.sadd(lease, forwarder)
+        return leased
+
+    @staticmethod
+    def release_locally(client, keys, args):
+        job = args[0]
+        pairs = list(zip(keys[2::2], keys[3::2], args[1:]))
+        for forwarder, state_index, state in pairs:
+            if client.hget(forwarder, 'JOB_NUM') == job and (client.hget(forwarder, 'STATE') or '') != state:
+                return None
+        released = []
+        for forwarder, state_index, state in pairs:
+            if client.hget(forwarder, 'JOB_NUM') == job:
+                client.srem(state_index, forwarder)
+                client.sadd(keys[1], forwarder)
+                client.hset(forwarder, 'STATE', 'IDLE')
+                client.hdel(forwarder, 'JOB_NUM')
+                released.append(forwarder)
+            client.srem(keys[0], forwarder)
+        return released
   
 
     def __init__(self, db_type, db_instance, fdict):
@@ -22,71 +126,142 @@ class ForwarderScoreboard(Scoreboard):
         self.DB_TYPE = db_type
         self.DB_INSTANCE = db_instance
         self._redis = self.connect()
-        self._redis.flushdb()
-
-        forwarders = list(fdict.keys()) 
-        for forwarder in forwarders:
-            fields = fdict[forwarder]
-            name = fields['NAME']
-            routing_key = fields['CONSUME_QUEUE']
-      
-    
-            for field in fields:
-                self._redis.hset(forwarder, field, fields[field])
-                self._redis.hset(forwarder, 'STATE', 'IDLE')
-                self._redis.hset(forwarder, 'STATUS', 'HEALTHY')
-                self._redis.hset(forwarder, 'CONSUME_QUEUE', routing_key)
-      
-            self._redis.lpush(self.FORWARDER_ROWS, forwarder)
+        warm = self.start_db()
+        self._set_indexed = self.register_script(self.SET_INDEXED_FIELDS_SCRIPT,
+                                                 self.set_indexed_fields_locally)
+        self._lease = self.register_script(self.LEASE_SCRIPT, self.lease_locally)
+        self._release = self.register_script(self.RELEASE_SCRIPT, self.release_locally)
+
+        rows = {}
+        for forwarder in fdict:
+            fields = dict(fdict[forwarder])
+            fields['STATE'] = 'IDLE'
+            fields['STATUS'] = 'HEALTHY'
+            rows[forwarder] = fields
+
+        if warm:
+            # Forwarders keep their state and leases; the foreman then
+            # clears leases of dead jobs and health checks the rest
+            self.reconcile_rows(self.FORWARDER_ROWS, rows)
+            pipe = self._redis.pipeline()
+        else:
+            pipe = self._redis.pipeline()
+            for forwarder, fields in rows.items():
+                pipe.hset(forwarder, mapping=fields)
+                pipe.lpush(self.FORWARDER_ROWS, forwarder)
+                for field in self.INDEXED_FIELDS:
+                    pipe.sadd(self.index_key(field, fields[field]), forwarder)
+        self.bump_static_version(pipe)
+        pipe.execute()
     
       #self.persist_snapshot(self._redis)
 
 
-    def connect(self):
-        #pool = redis.ConnectionPool(host='localhost', port=6379, db=self.DB_INSTANCE)
-        #return redis.Redis(connection_pool=pool)
-        try:
-            sconn = redis.StrictRedis(host='localhost',port='6379', \
-                                      charset='utf-8', db=self.DB_INSTANCE, \
-                                      decode_responses=True)
-            sconn.ping()
-            LOGGER.info("Redis connected. Connection details are: %s", sconn)
-            return sconn
-        except Exception as e:
-            LOGGER.critical("Redis connection error: %s", e)
-            LOGGER.critical("Exiting due to Redis connection failure.")
-            sys.exit(100)
-
-
     def return_forwarders_list(self):
         all_forwarders = self._redis.lrange(self.FORWARDER_ROWS, 0, -1)
         return all_forwarders
 
 
-    def return_healthy_forwarders_list(self):
-        healthy_forwarders = []
-        forwarders = self._redis.lrange(self.FORWARDER_ROWS, 0, -1)
-        for forwarder in forwarders:
-            if self._redis.hget(forwarder, 'STATUS') == 'HEALTHY':
-                healthy_forwarders.append(forwarder)
+    def get_forwarders_by(self, **fields):
+        """Forwarders whose indexed fields have the given values, e.g.
+           get_forwarders_by(STATE='IDLE', STATUS='HEALTHY'), from one SINTER.
+        """
+        keys = [self.index_key(field, val) for field, val in fields.items()]
+        return sorted(self._redis.sinter(keys))
 
-        return healthy_forwarders
+
+    def return_healthy_forwarders_list(self):
+        return self.get_forwarders_by(STATUS='HEALTHY')
 
 
     def return_available_forwarders_list(self):
-        available_forwarders = []
-        forwarders = self._redis.lrange(self.FORWARDER_ROWS, 0, -1)
-        for forwarder in forwarders:
-            if ((self._redis.hget(forwarder, 'STATUS')) == 'HEALTHY') and ((self._redis.hget(forwarder, 'STATE'))  == 'IDLE'):
-                available_forwarders.append(forwarder)
+        return self.get_forwarders_by(STATE='IDLE', STATUS='HEALTHY')
+
+
+    def lease_forwarders(self, n, job_num):
+        """Atomically take n available (IDLE and HEALTHY) forwarders for
+           job_num and mark them BUSY, so two foremen sharing the pool
+           cannot both take the same one. The candidates are read first and
+           passed to the script, which takes only those still available; if
+           another foreman took some in between, the lease is tried again.
 
-        return available_forwarders
+           :param int n: Number of forwarders wanted, or None for all
+                         that are available.
+           :param str job_num: Job the forwarders are leased to.
+           :rtype list of forwarder names; empty if fewer than n were available.
+        """
+        keys = [self.index_key('STATE', 'IDLE'), self.index_key('STATE', 'BUSY'),
+                self.index_key('STATUS', 'HEALTHY'), self.LEASE_PREFIX + str(job_num)]
+        for attempt in range(self.LEASE_ATTEMPTS):
+            candidates = self.return_available_forwarders_list()
+            wanted = len(candidates) if n is None else int(n)
+            if wanted == 0 or len(candidates) < wanted:
+                return []
+            leased = self._lease(keys=keys + candidates, args=[wanted, job_num])
+            if leased:
+                return leased
+        LOGGER.warning("Could not lease %s forwarders for job %s in %d attempts",
+                       n, job_num, self.LEASE_ATTEMPTS)
+        return []
+
+
+    def get_leased_forwarders(self, job_num):
+        return sorted(self._redis.smembers(self.LEASE_PREFIX + str(job_num)))
+
+
+    def release_forwarders(self, job_num, forwarders=None):
+        """Return forwarders leased to job_num to IDLE and drop them from
+           its lease: all of them, or only those in forwarders.
+
+           :rtype list of the forwarders released.
+        """
+        job_num = str(job_num)
+        lease = self.LEASE_PREFIX + job_num
+        for attempt in range(self.LEASE_ATTEMPTS):
+            leased = self.get_leased_forwarders(job_num)
+            if forwarders is not None:
+                leased = [f for f in leased if f in forwarders]
+            if not leased:
+                return []
+            pipe = self._redis.pipeline(transaction=False)
+            for forwarder in leased:
+                pipe.hget(forwarder, 'STATE')
+            states = [state or '' for state in pipe.execute()]
+            keys = [lease, self.index_key('STATE', 'IDLE')]
+            for forwarder, state in zip(leased, states):
+                keys.extend((forwarder, self.index_key('STATE', state)))
+            released = self._release(keys=keys, args=[job_num] + states)
+            if released is not None:
+                return released
+        LOGGER.warning("Could not release the forwarders of job %s in %d attempts",
+                       job_num, self.LEASE_ATTEMPTS)
+        return []
+
+
+    def get_lease_jobs(self):
+        """Jobs that hold a forwarder lease."""
+        return sorted(key[len(self.LEASE_PREFIX):]
+                      for key in self._redis.scan_iter(match=self.LEASE_PREFIX + '*'))
+
+
+    def clear_stale_leases(self, live_jobs):
+        """After a warm start, release the forwarders leased to any job not
+           in live_jobs; the foreman that held them stopped with the job
+           unfinished, and nothing else would ever release them.
+
+           :rtype list of the forwarders released.
+        """
+        live_jobs = set(str(job) for job in live_jobs)
+        released = []
+        for job_num in self.get_lease_jobs():
+            if job_num not in live_jobs:
+                LOGGER.info("Releasing the forwarders of job %s; it is no longer live", job_num)
+                released.extend(self.release_forwarders(job_num))
+        return released
 
 
     def setall_forwarders_status(self, status):
-        forwarders = self._redis.lrange(self.FORWARDER_ROWS, 0, -1)
-        for forwarder in forwarders:
-            self._redis.hset(forwarder, 'STATUS', status)
+        self.setall_forwarder_params({'STATUS': status})
         #self.persist_snapshot(self._redis, "forwarderscoreboard")
 
 
@@ -95,42 +270,54 @@ class ForwarderScoreboard(Scoreboard):
            :param list forwarders: One or many forwarders can be set, depending on size of list in this arg.           
            :param dict params: One or many fields can be set depending on number of entries in this arg.
         """
-        for forwarder in forwarders:
-            kees = list(params.keys())
-            for kee in kees:
-                self._redis.hset(forwarder, kee, params[kee])
+        self.set_indexed_fields(forwarders, params)
         #self.persist_snapshot(self._redis, "forwarderscoreboard")
 
 
     def setall_forwarder_params(self, params):
-        forwarders = self._redis.lrange(self.FORWARDER_ROWS, 0, -1)
-        self.set_forwarder_params(forwarders, params)
+        self.set_indexed_fields([], params, row_list=self.FORWARDER_ROWS)
 
     def get_value_for_forwarder(self, forwarder, kee):
-        return self._redis.hget(forwarder, kee)
+        return self.get_static_field(forwarder, kee)
 
 
     def set_forwarder_state(self, forwarder, state):
-        self._redis.hset(forwarder, 'STATE', state)
+        self.set_indexed_fields([forwarder], {'STATE': state})
         #self.persist_snapshot(self._redis, "forwarderscoreboard")
 
 
     def set_forwarder_status(self, forwarder, status):
-        self._redis.hset(forwarder, 'STATUS', status)
+        self.set_indexed_fields([forwarder], {'STATUS': status})
         #self.persist_snapshot(self._redis, "forwarderscoreboard")
 
 
     def get_routing_key(self, forwarder):
-        return self._redis.hget(forwarder,'CONSUME_QUEUE')
+        return self.get_static_field(forwarder, 'CONSUME_QUEUE')
+
+
+    def get_routing_keys(self, forwarders):
+        """Return the CONSUME_QUEUE of each forwarder, in the same order."""
+        return self.get_static_field_for_rows(forwarders, 'CONSUME_QUEUE')
 
 
     def set_work_by_job(self, forwarder, job_num, work_schedule):
-        self._redis.hset(forwarder, job_num, yaml.dump(work_schedule))
+        self._redis.hset(forwarder, job_num, ScoreboardCodec.dumps(work_schedule))
+
+
+    def set_work_for_forwarders(self, job_num, work_by_forwarder):
+        """Record a work order for several forwarders at once.
+
+           :param dict work_by_forwarder: forwarder name -> work schedule.
+        """
+        pipe = self._redis.pipeline(transaction=False)
+        for forwarder, work_schedule in work_by_forwarder.items():
+            pipe.hset(forwarder, job_num, ScoreboardCodec.dumps(work_schedule))
+        pipe.execute()
 
 
     def get_work_by_job(self, forwarder, job_num):
         work_schedule = self._redis.hget(forwarder, job_num)
-        return yaml.load(work_schedule)
+        return ScoreboardCodec.loads(work_schedule)
 
 
     def print_all(self):
@@ -0,0 +1,268 @@
+""" Time-ordered index of scoreboard jobs, and retirement of finished jobs.
+
+    JobScoreboard and StateScoreboard once LPUSHed every job number onto an
+    unbounded JOBS list and kept each job hash forever. A JobIndex instead
+    keeps sorted sets in the scoreboard's DB:
+
+        JOB_INDEX               every job, scored by the epoch second it was added
+        VISIT_JOBS:<visit_id>   the jobs of one visit, scored the same way
+        RETIRED_JOBS            retired jobs, scored by the epoch second they expire
+
+    Queries read pages of these in creation order, so no call reads more
+    than one page of rows, however many jobs the DB holds. A page leaves
+    out jobs that have expired, so it may be short; the next page still
+    starts at offset + count.
+
+    When a job reaches a terminal state it is retired: its hash and its
+    other rows are given a TTL, and with POLICY ARCHIVE it is first
+    appended as one compact JSON line to ARCHIVE_DIR/<DB_TYPE>_<date>.jsonl.
+    Each retirement also drops from the index a batch of the retired jobs
+    whose TTL has run out, so live jobs never hold up pruning and the index
+    stays about as large as the live jobs plus one TTL's worth of finished
+    ones. The JOB_RETENTION section of L1SystemCfg.yaml sets this up:
+
+        JOB_RETENTION:
+          POLICY: EXPIRE          # or ARCHIVE
+          TTL: 86400              # seconds a finished job stays in Redis
+          ARCHIVE_DIR: job_archive
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import yaml
+import ScoreboardCodec
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+CFG_FILE = 'L1SystemCfg.yaml'
+EXPIRE = 'EXPIRE'
+ARCHIVE = 'ARCHIVE'
+DEFAULT_TTL = 86400
+DEFAULT_ARCHIVE_DIR = 'job_archive'
+JOB_INDEX = 'JOB_INDEX'
+RETIRED_JOBS = 'RETIRED_JOBS'
+VISIT_JOBS_PREFIX = 'VISIT_JOBS:'
+PAGE_SIZE = 100
+PRUNE_BATCH = 50
+
+_settings = None
+_settings_lock = threading.Lock()
+_archive_lock = threading.Lock()
+
+
+def load_settings(cfg_file=CFG_FILE):
+    """ Return the ROOT/JOB_RETENTION section of cfg_file, or {}. """
+    try:
+        with open(cfg_file) as f:
+            cdm = yaml.safe_load(f)
+    except IOError:
+        LOGGER.warning("Can't open %s; finished jobs expire after %d seconds",
+                       cfg_file, DEFAULT_TTL)
+        return {}
+    return cdm.get('ROOT', {}).get('JOB_RETENTION') or {}
+
+
+def configure(settings):
+    """ Use settings, a dict shaped like the cfg section, from now on. """
+    global _settings
+    with _settings_lock:
+        _settings = dict(settings)
+        return _settings
+
+
+def get_settings():
+    global _settings
+    with _settings_lock:
+        if _settings is None:
+            _settings = load_settings()
+        return _settings
+
+
+def archive_path(db_type, when=None):
+    day = time.strftime('%Y%m%d', time.gmtime(when))
+    directory = get_settings().get('ARCHIVE_DIR', DEFAULT_ARCHIVE_DIR)
+    return os.path.join(directory, '%s_%s.jsonl' % (db_type, day))
+
+
+def read_archive(path):
+    """ Yield the archived jobs in path, oldest first, each a dict with JOB,
+        CREATED, RETIRED, ROW and any other rows the scoreboard archived.
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class JobIndex:
+    def __init__(self, client, db_type):
+        """
+           :param client: Client for the scoreboard's DB.
+           :param str db_type: Names the scoreboard's archive files.
+        """
+        self._redis = client
+        self._db_type = db_type
+
+
+    def add(self, pipe, job, visit_id):
+        """ Queue, on pipe, the index entries for a new job. """
+        created = time.time()
+        pipe.zadd(JOB_INDEX, {job: created})
+        if visit_id is not None:
+            pipe.zadd(VISIT_JOBS_PREFIX + str(visit_id), {job: created})
+
+
+    def remove(self, job, extra_keys=()):
+        """ Drop a job's rows and index entries at once. """
+        visit_id = self._redis.hget(job, 'VISIT_ID')
+        pipe = self._redis.pipeline()
+        pipe.delete(job, *extra_keys)
+        pipe.zrem(JOB_INDEX, job)
+        pipe.zrem(RETIRED_JOBS, job)
+        if visit_id is not None:
+            pipe.zrem(VISIT_JOBS_PREFIX + visit_id, job)
+        pipe.execute()
+
+
+    def retire(self, job, extra_keys=()):
+        """ Give a job that reached a terminal state, and extra_keys (its
+            other rows, which are lists), the configured TTL, archiving
+            them first if POLICY is ARCHIVE, and enter it in RETIRED_JOBS.
+            Then prune a batch of expired jobs.
+        """
+        settings = get_settings()
+        ttl = int(settings.get('TTL', DEFAULT_TTL))
+        keys = [job] + list(extra_keys)
+        if str(settings.get('POLICY', EXPIRE)).upper() == ARCHIVE:
+            self.archive(job, extra_keys)
+
+        visit_id = self._redis.hget(job, 'VISIT_ID')
+        pipe = self._redis.pipeline()
+        for key in keys:
+            pipe.expire(key, ttl)
+        pipe.zadd(RETIRED_JOBS, {job: time.time() + ttl})
+        if visit_id is not None:
+            # The visit's index lives as long as its last finished job
+            pipe.expire(VISIT_JOBS_PREFIX + visit_id, ttl)
+        pipe.execute()
+        self.prune()
+
+
+    def archive(self, job, extra_keys=()):
+        pipe = self._redis.pipeline()
+        pipe.zscore(JOB_INDEX, job)
+        pipe.hgetall(job)
+        for key in extra_keys:
+            pipe.lrange(key, 0, -1)
+        replies = pipe.execute()
+        now = time.time()
+        record = {'JOB': job, 'CREATED': replies[0], 'RETIRED': now, 'ROW': replies[1]}
+        for key, values in zip(extra_keys, replies[2:]):
+            record[key[len(job):].lstrip('_') or key] = [ScoreboardCodec.loads(v) for v in values]
+
+        path = archive_path(self._db_type, now)
+        try:
+            with _archive_lock:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(path, 'a') as f:
+                    f.write(json.dumps(record, separators=(',', ':'), default=str) + '\n')
+        except IOError as e:
+            LOGGER.error("Unable to archive job %s to %s: %s", job, path, e)
+
+
+    def prune(self, count=PRUNE_BATCH, now=None):
+        """ Remove the index entries of up to count retired jobs whose TTL
+            ran out by now (epoch seconds, default the present).
+
+            :return: The number of jobs removed.
+        """
+        now = time.time() if now is None else now
+        gone = self._redis.zrangebyscore(RETIRED_JOBS, '-inf', now, start=0, num=count)
+        if not gone:
+            return 0
+        # A visit's own set expires with its last finished job (see retire)
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.zrem(JOB_INDEX, *gone)
+        pipe.zrem(RETIRED_JOBS, *gone)
+        pipe.execute()
+        return len(gone)
+
+
+    def count(self):
+        return self._redis.zcard(JOB_INDEX)
+
+
+    def page(self, since=None, until=None, offset=0, count=PAGE_SIZE):
+        """ Job numbers added between since and until (epoch seconds,
+            inclusive, either open), oldest first: count of them, after
+            skipping offset.
+        """
+        return self._page(JOB_INDEX, since, until, offset, count)
+
+
+    def page_for_visit(self, visit_id, offset=0, count=PAGE_SIZE):
+        return self._page(VISIT_JOBS_PREFIX + str(visit_id), None, None, offset, count)
+
+
+    def page_in_state(self, state, since=None, until=None, offset=0, count=PAGE_SIZE):
+        """ As page, counting only jobs whose STATE is state. Index pages
+            are read and filtered until count matching jobs are found; as
+            finished jobs expire, the jobs left to read are mostly live ones.
+        """
+        matches = []
+        scanned = 0
+        while len(matches) < offset + count:
+            jobs = self._range(JOB_INDEX, since, until, scanned, count)
+            if not jobs:
+                break
+            scanned += len(jobs)
+            pipe = self._redis.pipeline(transaction=False)
+            for job in jobs:
+                pipe.hget(job, 'STATE')
+            for job, job_state in zip(jobs, pipe.execute()):
+                if job_state == state:
+                    matches.append(job)
+        return matches[offset:offset + count]
+
+
+    def live(self, terminal_states):
+        """ Every job whose STATE is not one of terminal_states, oldest
+            first, read a page at a time. Expired jobs are left out.
+        """
+        live = []
+        offset = 0
+        while True:
+            jobs = self._range(JOB_INDEX, None, None, offset, PAGE_SIZE)
+            if not jobs:
+                return live
+            offset += len(jobs)
+            pipe = self._redis.pipeline(transaction=False)
+            for job in jobs:
+                pipe.hget(job, 'STATE')
+            live.extend(job for job, state in zip(jobs, pipe.execute())
+                        if state is not None and state not in terminal_states)
+
+
+    def _range(self, key, since, until, offset, count):
+        low = '-inf' if since is None else since
+        high = '+inf' if until is None else until
+        return self._redis.zrangebyscore(key, low, high, start=offset, num=count)
+
+
+    def _page(self, key, since, until, offset, count):
+        jobs = self._range(key, since, until, offset, count)
+        if not jobs:
+            return jobs
+        pipe = self._redis.pipeline(transaction=False)
+        for job in jobs:
+            pipe.exists(job)
+        # Expired entries are left for prune, so later offsets still hold
+        return [job for job, exists in zip(jobs, pipe.execute()) if exists]
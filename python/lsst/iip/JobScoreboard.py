@@ -1,14 +1,17 @@
 import redis
 import toolsmod
-from toolsmod import get_timestamp
-from toolsmod import get_epoch_timestamp
+from timemod import get_timestamp
+from timemod import get_epoch_timestamp
 from toolsmod import L1RedisError
 from toolsmod import L1RabbitConnectionError
 import yaml
+import ScoreboardCodec
+import json
 import logging
 import time
 import subprocess
 from Scoreboard import Scoreboard
+import JobIndex
 from const import *
 
 LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
@@ -25,7 +28,6 @@ class JobScoreboard(Scoreboard):
        assigned to Redis's rdDatabase instance 8. Redis launches with a default 
        15 separate database instances.
     """
-    JOBS = 'JOBS'
     SESSIONS = 'SESSIONS'
     VISIT_ID_LIST = 'VISIT_ID_LIST'
     JOB_NUM = 'JOB_NUM'
@@ -47,6 +49,96 @@ class JobScoreboard(Scoreboard):
     PP = 'PP'
     CU = 'CU'
     prp = toolsmod.prp
+    JOB_TRANSITIONS_KEY = 'JOB_TRANSITIONS'
+    TRANSITIONS_SUFFIX = '_TRANSITIONS'
+
+    # The job state machine: each state and the states a job may move to
+    # from it. Archive (AR), auxiliary (AT), prompt processing (PP) and
+    # catch up (CU) jobs all start in NEW. Every state not in
+    # TERMINAL_STATES may also move to one of ABORT_STATES, and a job may
+    # always repeat its current state (READOUT once per image, say).
+    JOB_TRANSITIONS = {
+        'NEW': ('AR_NEW_ITEM_QUERY', 'XFER_PARAMS_SENT', 'HEALTH_CHECK',
+                'BASE_RESOURCE_QUERY'),
+        # AR
+        'AR_NEW_ITEM_QUERY': ('AR_NEW_ITEM_RESPONSE',),
+        'AR_NEW_ITEM_RESPONSE': ('SENDING_XFER_PARAMS',),
+        'SENDING_XFER_PARAMS': ('XFER_PARAMS_SENT',),
+        'XFER_PARAMS_SENT': ('JOB_ACCEPTED',),
+        'JOB_ACCEPTED': ('PREPARE_READOUT', 'READOUT', 'TAKE_IMAGES_DONE', 'COMPLETE'),
+        'PREPARE_READOUT': ('READOUT_STARTED',),
+        'READOUT_STARTED': ('READOUT', 'TAKE_IMAGES_DONE', 'COMPLETE'),
+        'READOUT': ('TAKE_IMAGES_DONE', 'COMPLETE'),
+        'TAKE_IMAGES_DONE': ('COMPLETE',),
+        # PP
+        'HEALTH_CHECK': ('NCSA_START_INT_SENT',),
+        'NCSA_START_INT_SENT': ('FWDR_PARAMS_RECEIVED',),
+        'FWDR_PARAMS_RECEIVED': ('JOB_ACCEPTED',),
+        # CU
+        'BASE_RESOURCE_QUERY': ('NCSA_RESOURCES_QUERY_SENT',),
+        'NCSA_RESOURCES_QUERY_SENT': ('BASE_TASK_PARAMS_SENT',),
+        'BASE_TASK_PARAMS_SENT': ('JOB_ACCEPTED',),
+        # A refused job is scrubbed once its refusal has been sent
+        'JOB_REFUSED': ('SCRUBBED',),
+    }
+    ABORT_STATES = ('SCRUBBED', 'JOB_REFUSED', 'JOB_ABORTED')
+    TERMINAL_STATES = ('COMPLETE', 'SCRUBBED', 'JOB_ABORTED')
+
+    # Moves a job to a new state if the transition table allows it, in the
+    # same step setting its status and any other fields and appending a
+    # record of the transition to the job's history list.
+    # KEYS: job row, its history list, the transition table hash
+    # ARGV: new state, new status or '', epoch timestamp, then field, value...
+    # Returns {1, old state} on success, {0, old state} if refused.
+    JOB_TRANSITION_SCRIPT = """
+        local state = ARGV[1]
+        local old = redis.call('HGET', KEYS[1], 'STATE')
+        if not old then
+            return {0, ''}
+        end
+        if old ~= state then
+            local allowed = redis.call('HGET', KEYS[3], old) or ''
+            if not string.find(' ' .. allowed .. ' ', ' ' .. state .. ' ', 1, true) then
+                return {0, old}
+            end
+        end
+        redis.call('HSET', KEYS[1], 'STATE', state)
+        local status = ARGV[2]
+        if status ~= '' then
+            redis.call('HSET', KEYS[1], 'STATUS', status)
+        else
+            status = redis.call('HGET', KEYS[1], 'STATUS') or ''
+        end
+        for i = 4, #ARGV, 2 do
+            redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+        end
+        redis.call('RPUSH', KEYS[2], cjson.encode({TIME = ARGV[3], FROM = old,
+                                                    TO = state, STATUS = status}))
+        return {1, old}
+    """
+
+    # Python version of the script above, for the in-memory backend
+    @staticmethod
+    def transition_locally(client, keys, args):
+        state = args[0]
+        old = client.hget(keys[0], 'STATE')
+        if old is None:
+            return [0, '']
+        if old != state:
+            allowed = (client.hget(keys[2], old) or '').split()
+            if state not in allowed:
+                return [0, old]
+        client.hset(keys[0], 'STATE', state)
+        status = args[1]
+        if status != '':
+            client.hset(keys[0], 'STATUS', status)
+        else:
+            status = client.hget(keys[0], 'STATUS') or ''
+        for field, value in zip(args[3::2], args[4::2]):
+            client.hset(keys[0], field, value)
+        client.rpush(keys[1], json.dumps({'TIME': args[2], 'FROM': old,
+                                          'TO': state, 'STATUS': status}))
+        return [1, old]
   
 
     def __init__(self, db_type, db_instance):
@@ -55,19 +147,11 @@ class JobScoreboard(Scoreboard):
            for a clean start. A 'charge_database' method is 
            included for testing the module.
 
-           Each job will be tracked in one of these states: 
-           NEW 
-           BASE_RESOURCES_QUERY
-           BASE_INSUFFICIENT_RESOURCES
-           NCSA_RESOURCES_QUERY
-           NCSA_INSUFFICIENT_RESOURCES
-           BASE_EVENT_PARAMS_SENT
-           READY_FOR_EVENT
-           READOUT
-           READOUT_COMPLETE
-           DELIVERY_COMPLETE
-           SCRUBBED
-           COMPLETE
+           Each job is tracked through the states of JOB_TRANSITIONS,
+           from NEW to one of TERMINAL_STATES; set_job_state refuses any
+           move the table does not allow. Jobs are indexed by the time
+           they were added, and a job in a terminal state, with its
+           history, expires or is archived (see JobIndex).
 
            In addition, each job will have an assigned status:
            ACTIVE
@@ -82,19 +166,26 @@ class JobScoreboard(Scoreboard):
             Scoreboard.__init__(self)
         except Exception as e:
             LOGGER.error('Job SCBD Auditor Failed to make connection to Message Broker:  ', e.arg)
-            print("No Auditing for YOU")
+            LOGGER.error("No Auditing for YOU")
             raise L1RabbitConnectionError('Calling super.init() in JobScoreboard init caused: ', e.arg)
 
         try:
             self._redis = self.connect()
         except Exception as e:
             LOGGER.error("Cannot make connection to Redis: %s." % e.arg)  
-            print("Job SCBD: No Redis for YOU:")
+            LOGGER.error("Job SCBD: No Redis for YOU:")
             raise L1RedisError('Calling redis connect in JobScoreboard init caused:  ', e.arg)
 
-        self._redis.flushdb()
+        # On a warm start, jobs in flight keep their rows and history
+        self.start_db()
+        self._jobs = JobIndex.JobIndex(self._redis, self.DB_TYPE)
+        self._transition = self.register_script(self.JOB_TRANSITION_SCRIPT,
+                                                self.transition_locally)
 
-        self._redis.set(self.CURRENT_SESSION_ID, "session_100")
+        pipe = self._redis.pipeline()
+        pipe.set(self.CURRENT_SESSION_ID, "session_100", nx=True)
+        pipe.hset(self.JOB_TRANSITIONS_KEY, mapping=self.transition_table())
+        pipe.execute()
 
 #        weekday = subprocess.check_output('date +"%u"', shell=True)
 #        job_num_seed = str(weekday) + "000"
@@ -104,46 +195,6 @@ class JobScoreboard(Scoreboard):
         LOGGER.info('JobScoreboard initialization is complete')
     
 
-    def connect(self):
-        #pool = redis.ConnectionPool(host='localhost', port=6379, db=self.DB_INSTANCE)
-        #return redis.Redis(connection_pool=pool)
-        try:
-            sconn = redis.StrictRedis(host='localhost',port='6379', \
-                                      charset='utf-8', db=self.DB_INSTANCE, \
-                                      decode_responses=True)
-            sconn.ping()
-            LOGGER.info("Redis connected. Connection details are: %s", sconn)
-            return sconn
-        except Exception as e:
-            LOGGER.critical("Redis connection error: %s", e)
-            LOGGER.critical("Exiting due to Redis connection failure.")
-            sys.exit(100)
-
-
-    def check_connection(self):
-        ok_flag = False
-        for i in range (1,4):
-            try:
-                #response = self._redis.client_list()
-                response = self._redis.ping()
-                ok_flag = True
-                break
-            except redis.ConnectionError:
-                self.connect()
-
-        if ok_flag:
-            if i == 1:
-                return True
-            else:
-                LOGGER.info('Attempting to reconnect to Redis - all set now')
-                return True
-        else: 
-            LOGGER.info('In add_job, could not reconnect to Redis after 3 attempts')
-            raise L1RedisError
-            return False
-
-
-
     def add_job(self, job_number, visit_id, raft_list, raft_ccd_list):
         """All job rows created in the scoreboard begin with this method
            where initial attributes are inserted.
@@ -152,12 +203,20 @@ class JobScoreboard(Scoreboard):
            :param int rafts: The number of 'sub-jobs' to be handled within a job.
         """
         # XXX Needs try, catch block
+        rafts = {}
+        rafts['RAFT_LIST'] = raft_list
+        rafts['RAFT_CCD_LIST'] = raft_ccd_list
         if self.check_connection():
-            self._redis.hset(job_number, 'VISIT_ID', visit_id)
-            self._redis.lpush(self.JOBS, job_number)
-            self.set_rafts_for_job(job_number, raft_list, raft_ccd_list)
-            self.set_job_state(job_number, 'NEW')
-            self.set_job_status(job_number, 'ACTIVE')
+            pipe = self._redis.pipeline()
+            pipe.hset(job_number, mapping={'VISIT_ID': visit_id,
+                                           'RAFTS': ScoreboardCodec.dumps(rafts),
+                                           STATE: 'NEW',
+                                           self.STATUS: 'ACTIVE'})
+            self._jobs.add(pipe, job_number, visit_id)
+            pipe.rpush(str(job_number) + self.TRANSITIONS_SUFFIX,
+                       json.dumps({'TIME': get_epoch_timestamp(), 'FROM': '',
+                                   'TO': 'NEW', 'STATUS': 'ACTIVE'}))
+            pipe.execute()
         else:
             LOGGER.error('Unable to add new job; Redis connection unavailable')
 
@@ -169,8 +228,12 @@ class JobScoreboard(Scoreboard):
            :param dict params: A python dict of key/value pairs.
         """  
         if self.check_connection():
-            for kee in list(in_params.keys()):
-                self._redis.hset(job_number, kee, in_params[kee])
+            params = dict(in_params)
+            state = params.pop(STATE, None)
+            if state is not None:
+                return self.set_job_state(job_number, state, fields=params)
+            if params:
+                self._redis.hset(job_number, mapping=params)
 
             #params = {}
             #params[JOB_NUM] = job_number
@@ -182,9 +245,42 @@ class JobScoreboard(Scoreboard):
             LOGGER.error('Unable to set job params; Redis connection unavailable')
             return False
 
-    def set_job_state(self, job_number, state):
+    @classmethod
+    def transition_table(cls):
+        """JOB_TRANSITIONS with the abort states added, as the hash the
+           transition script reads: state -> space separated next states.
+        """
+        table = {}
+        for state, next_states in cls.JOB_TRANSITIONS.items():
+            table[state] = ' '.join(next_states + cls.ABORT_STATES)
+        return table
+
+
+    def set_job_state(self, job_number, state, status=None, fields=None):
+        """Move a job to state, if JOB_TRANSITIONS allows it from the job's
+           current state, and record the transition in its history. Status
+           and any other fields are set in the same round trip.
+
+           :param str job_number: The job to move.
+           :param str state: The new state.
+           :param str status: Optional new STATUS.
+           :param dict fields: Optional other fields to set.
+           :rtype bool False if the transition was refused.
+        """
         if self.check_connection():
-            self._redis.hset(job_number, STATE, state)
+            job = str(job_number)
+            args = [state, status or '', get_epoch_timestamp()]
+            for kee, val in (fields or {}).items():
+                args.extend((kee, val))
+            ok, old = self._transition(keys=[job, job + self.TRANSITIONS_SUFFIX,
+                                             self.JOB_TRANSITIONS_KEY], args=args)
+            if not ok:
+                LOGGER.error("Refused job %s transition from %s to %s",
+                             job, old or 'no such job', state)
+                return False
+            if state in self.TERMINAL_STATES:
+                self._jobs.retire(job, [job + self.TRANSITIONS_SUFFIX])
+            return True
             #params = {}
             #params[JOB_NUM] = job_number
             #params['SUB_TYPE'] = self.JOB_STATE
@@ -198,6 +294,57 @@ class JobScoreboard(Scoreboard):
             return self._redis.hget(job_number, STATE)
 
 
+    def get_job_transitions(self, job_number):
+        """The recorded transitions of a job, oldest first, each a dict
+           with TIME (epoch nanoseconds), FROM, TO and STATUS.
+        """
+        if self.check_connection():
+            records = self._redis.lrange(str(job_number) + self.TRANSITIONS_SUFFIX, 0, -1)
+            transitions = []
+            for record in records:
+                transition = json.loads(record)
+                transition['TIME'] = int(transition['TIME'])
+                transitions.append(transition)
+            return transitions
+
+
+    def get_state_durations(self, job_number):
+        """Seconds the job spent in each state it has left, in order, as a
+           list of (state, seconds) built from its transition history.
+        """
+        transitions = self.get_job_transitions(job_number) or []
+        durations = []
+        for prev, cur in zip(transitions, transitions[1:]):
+            durations.append((prev['TO'], (cur['TIME'] - prev['TIME']) / 1e9))
+        return durations
+
+
+    def get_jobs(self, since=None, until=None, offset=0, count=JobIndex.PAGE_SIZE):
+        """Job numbers added between since and until (epoch seconds,
+           inclusive, either left open), oldest first, one page at a time:
+           count of them after skipping offset.
+        """
+        if self.check_connection():
+            return self._jobs.page(since, until, offset, count)
+
+
+    def get_jobs_for_visit(self, visit_id, offset=0, count=JobIndex.PAGE_SIZE):
+        if self.check_connection():
+            return self._jobs.page_for_visit(visit_id, offset, count)
+
+
+    def get_jobs_in_state(self, state, since=None, until=None, offset=0,
+                          count=JobIndex.PAGE_SIZE):
+        if self.check_connection():
+            return self._jobs.page_in_state(state, since, until, offset, count)
+
+
+    def get_live_jobs(self):
+        """Every job not yet in one of TERMINAL_STATES, oldest first."""
+        if self.check_connection():
+            return self._jobs.live(self.TERMINAL_STATES)
+
+
     def set_job_status(self, job_number, status):
         if self.check_connection():
             job = str(job_number)
@@ -221,7 +368,7 @@ class JobScoreboard(Scoreboard):
         if self.check_connection():
             job = str(job_number) 
             if kee == 'STATE':
-                self.set_job_state(job, val)
+                return self.set_job_state(job, val)
             elif kee == 'STATUS':
                 self.set_job_status(job, val)
             else:
@@ -244,18 +391,17 @@ class JobScoreboard(Scoreboard):
 
     def set_pairs_for_job(self, job_number, pairs):
         """Pairs is a temporary relationship between Forwarders 
-           and Distributors that lasts for one job. Note the use of yaml...
-           Unlike python dicts, Redis is not a nested level database. For a 
-           field to have a dict attached to it, it is necessary to serialize 
-           the dict using yaml, json, or pickle. Pyyaml is already in use 
-           for conf files.
+           and Distributors that lasts for one job. Note the serialization...
+           Unlike python dicts, Redis is not a nested level database. For a
+           field to have a dict attached to it, it is necessary to serialize
+           the dict; ScoreboardCodec writes it as JSON.
 
            :param str job_number: cast as str below just to make certain.
            :param  dict pairs: Forwarders and Distributors arranged in a
            dictionary.
         """
         if self.check_connection():
-            self._redis.hset(str(job_number), 'PAIRS', yaml.dump(pairs))
+            self._redis.hset(str(job_number), 'PAIRS', ScoreboardCodec.dumps(pairs))
             return True
         else:
             return False
@@ -271,7 +417,7 @@ class JobScoreboard(Scoreboard):
             pairs =  self._redis.hget(str(job_number), 'PAIRS')
         ### XXX FIX - Check for existence of pairs...
         if pairs:
-            return yaml.load(pairs)
+            return ScoreboardCodec.loads(pairs)
         else:
             LOGGER.critical("ERROR: No pairs associated with JOB %s" % job_number)
             return None
@@ -281,7 +427,7 @@ class JobScoreboard(Scoreboard):
         rafts['RAFT_LIST'] = raft_list
         rafts['RAFT_CCD_LIST'] = raft_ccd_list
         if self.check_connection():
-            self._redis.hset(str(job_number), 'RAFTS', yaml.dump(rafts))
+            self._redis.hset(str(job_number), 'RAFTS', ScoreboardCodec.dumps(rafts))
             return True
         else:
             return False
@@ -292,18 +438,17 @@ class JobScoreboard(Scoreboard):
             rafts =  self._redis.hget(str(job_number), 'RAFTS')
         ### XXX FIX - Check for existence of pairs...
         if rafts:
-            return yaml.load(rafts)
+            return ScoreboardCodec.loads(rafts)
         else:
             return None
 
 
     def set_work_schedule_for_job(self, job_number, schedule):
         """The work schedule is a temporary relationship between Forwarders 
-           and CCDs that lasts for one job. Note the use of yaml...
-           Unlike python dicts, Redis is not a nested level database. For a 
-           field to have a dict attached to it, it is necessary to serialize 
-           the dict using yaml, json, or pickle. Pyyaml is already in use 
-           for conf files.
+           and CCDs that lasts for one job. Note the serialization...
+           Unlike python dicts, Redis is not a nested level database. For a
+           field to have a dict attached to it, it is necessary to serialize
+           the dict; ScoreboardCodec writes it as JSON.
 
            :param str job_number: cast as str below just to make certain.
            :param  dict schedule: A dictionary with two items - a 'FORWARDER_LIST']
@@ -311,9 +456,9 @@ class JobScoreboard(Scoreboard):
                                   index in 'FORWARDER_LIST' matches an index position in
                                   'CCD_LIST' which contains a list of CCDs.
         """
-        print("Setting work schedule...")
+        LOGGER.debug("Setting work schedule...")
         if self.check_connection():
-            self._redis.hset(str(job_number), 'WORK_SCHEDULE', yaml.dump(schedule))
+            self._redis.hset(str(job_number), 'WORK_SCHEDULE', ScoreboardCodec.dumps(schedule))
             return True
         else:
             return False
@@ -324,14 +469,14 @@ class JobScoreboard(Scoreboard):
             sched =  self._redis.hget(str(job_number), 'WORK_SCHEDULE')
 
         if sched:
-            return yaml.load(sched)
+            return ScoreboardCodec.loads(sched)
         else:
             return None
 
 
     def set_results_for_job(self, job_number, results):
         if self.check_connection():
-            self._redis.hset(str(job_number), 'RESULTS', yaml.dump(results))
+            self._redis.hset(str(job_number), 'RESULTS', ScoreboardCodec.dumps(results))
             return True
         else:
             return False
@@ -341,7 +486,7 @@ class JobScoreboard(Scoreboard):
         if self.check_connection():
             results =  self._redis.hget(str(job_number), 'RESULTS')
         if results:
-            return yaml.load(results)
+            return ScoreboardCodec.loads(results)
         else:
             return None
 
@@ -361,11 +506,11 @@ class JobScoreboard(Scoreboard):
 
     def set_visit_id(self, visit_id, ra, dec, angle):
         if self.check_connection():
-            print("In job scbd, setting visit ID")
-            self._redis.lpush(self.VISIT_ID_LIST, visit_id)
-            self._redis.hset(visit_id, self.RA, ra)
-            self._redis.hset(visit_id, self.DEC, dec)
-            self._redis.hset(visit_id, self.ANGLE, angle)
+            LOGGER.debug("In job scbd, setting visit ID")
+            pipe = self._redis.pipeline()
+            pipe.lpush(self.VISIT_ID_LIST, visit_id)
+            pipe.hset(visit_id, mapping={self.RA: ra, self.DEC: dec, self.ANGLE: angle})
+            pipe.execute()
             #params = {}
             #params['SUB_TYPE'] = 'VISIT'
             #params['VISIT_ID'] = visit_id
@@ -384,8 +529,8 @@ class JobScoreboard(Scoreboard):
 
              
     def delete_job(self, job_number):
-        #self._redis.hdel(self.JOBS, str(job_number))
-        self._redis.lrem(self.JOBS, 0, str(job_number))
+        job = str(job_number)
+        self._jobs.remove(job, [job + self.TRANSITIONS_SUFFIX])
 
 
     def build_monitor_data(self, params):
@@ -393,8 +538,10 @@ class JobScoreboard(Scoreboard):
         keez = list(params.keys())
         for kee in keez:
             monitor_data[kee] = params[kee]
-        monitor_data['SESSION_ID'] = self.get_current_session()
-        monitor_data['VISIT_ID'] = self.get_current_visit()
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.get(self.CURRENT_SESSION_ID)
+        pipe.lindex(self.VISIT_ID_LIST, 0)
+        monitor_data['SESSION_ID'], monitor_data['VISIT_ID'] = pipe.execute()
         monitor_data['TIME'] = get_timestamp()
         monitor_data['DATA_TYPE'] = self.DB_TYPE
         return monitor_data
@@ -423,10 +570,11 @@ class JobScoreboard(Scoreboard):
     def print_all(self):
         dump_dict = {}
         f = open("dump", 'w')
-        jobs = self._redis.lrange(self.JOBS, 0, -1)
-        for job in jobs:
-            x = self._redis.hgetall(job)
-            dump_dict[job] = x
+        # Page on the index itself: a page of expired jobs comes back empty
+        total = self._jobs.count()
+        for offset in range(0, total, JobIndex.PAGE_SIZE):
+            for job in self.get_jobs(offset=offset):
+                dump_dict[job] = self._redis.hgetall(job)
 
         f.write(yaml.dump(dump_dict))
         print(dump_dict)
@@ -0,0 +1,28 @@
+from const import *
+import json
+import sys
+
+
+class JsonHandler:
+    def __init__(self, callback=None):
+        self._consumer_callback = callback
+
+
+    def json_callback(self, ch, method, properties, body): 
+        """ Decode the message body before consuming
+            Setting the consumer callback function
+        """
+        pydict = self.decode_message(body)
+        self._consumer_callback(ch, method, properties, pydict)
+
+
+    def encode_message(self, dictValue):
+        json_body = json.dumps(dictValue, separators=(',', ':'), default=str)
+        return json_body
+
+
+    def decode_message(self, body):
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        tmpdict = json.loads(body) 
+        return tmpdict
@@ -1,13 +1,66 @@
 import toolsmod
 import yaml
 import logging
+import logmod
 import pprint
+import random
+import sys
+import threading
 import traceback
 
 LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
               '-35s %(lineno) -5d: %(message)s')
 LOGGER = logging.getLogger(__name__)
-logging.basicConfig(filename='logs/MessageAuthority.log', level=logging.DEBUG, format=LOG_FORMAT)
+
+
+
+class ShapeValidator:
+    """ The shape of one messages.yaml entry, compiled for fast checking.
+        KEYS holds every key the entry defines, LEAVES the ones whose value
+        is a plain value, and NESTED a ShapeValidator for each key whose
+        value is itself a dictionary. A message matches when it has
+        exactly these keys at every level, which is the same test as
+        comparing the two get_dict_shape results, without building either.
+    """
+
+    def __init__(self, template):
+        self.KEYS = frozenset(template)
+        self.NESTED = {k: ShapeValidator(v) for k, v in template.items() if isinstance(v, dict)}
+        self.LEAVES = self.KEYS.difference(self.NESTED)
+
+
+    def matches(self, msg):
+        if not isinstance(msg, dict) or msg.keys() != self.KEYS:
+            return False
+        for k in self.LEAVES:
+            if isinstance(msg[k], dict):
+                return False
+        for k, validator in self.NESTED.items():
+            if not validator.matches(msg[k]):
+                return False
+        return True
+
+
+    def differences(self, msg, prefix=''):
+        """ Return (missing, extra): sorted lists of the dotted key paths the
+            reference entry has and msg lacks, and the reverse.
+        """
+        missing = []
+        extra = []
+        keys = msg.keys() if isinstance(msg, dict) else ()
+        for k in self.KEYS.difference(keys):
+            missing.append(prefix + k)
+        for k in set(keys).difference(self.KEYS):
+            extra.append(prefix + k)
+        for k in self.LEAVES.intersection(keys):
+            if isinstance(msg[k], dict):
+                extra.extend(prefix + k + '.' + kk for kk in msg[k])
+        for k, validator in self.NESTED.items():
+            if k in keys:
+                m, e = validator.differences(msg[k], prefix + k + '.')
+                missing.extend(m)
+                extra.extend(e)
+        return sorted(missing), sorted(extra)
 
 
 
@@ -15,33 +68,81 @@ class MessageAuthority:
 
     MSG_DICT = None
 
+    # messages.yaml file name -> (MSG_DICT, {MSG_TYPE: ShapeValidator}), shared
+    # by every MessageAuthority in the process so each file is compiled once
+    _compiled = {}
+    _compiled_lock = threading.Lock()
+
     def __init__(self, filename=None):
        self.prp = pprint.PrettyPrinter(indent=4) 
        self._message_dictionary_file = './messages.yaml'
        if filename != None:
            self._message_dictionary_file = filename
 
+       with self._compiled_lock:
+           compiled = self._compiled.get(self._message_dictionary_file)
+           if compiled is None:
+               LOGGER.info('Reading YAML message dictionary file %s' % self._message_dictionary_file)
 
-       LOGGER.info('Reading YAML message dictionary file %s' % self._message_dictionary_file)
+               try:
+                   msg_dict = toolsmod.intake_yaml_file(self._message_dictionary_file)
+               except (IOError, toolsmod.L1Error) as e:
+                   trace = traceback.format_exc()
+                   emsg = "Unable to find Message Dictionary Yaml file %s\n" % self._message_dictionary_file
+                   LOGGER.critical(emsg + trace)
+                   sys.exit(101)
 
-       try:
-           self.MSG_DICT = toolsmod.intake_yaml_file(self._message_dictionary_file)
-       except IOError as e:
-           trace = traceback.print_exc()
-           emsg = "Unable to find Message Dictionary Yaml file %s\n" % self._message_dictionary_file
-           LOGGER.critical(emsg + trace)
-           sys.exit(101)
+               validators = {msg_type: ShapeValidator(entry)
+                             for msg_type, entry in msg_dict['ROOT'].items()
+                             if isinstance(entry, dict)}
+               compiled = (msg_dict, validators)
+               self._compiled[self._message_dictionary_file] = compiled
 
+       self.MSG_DICT, self._validators = compiled
 
-    def check_message_shape(self, msg):
+
+    def get_validator(self, msg):
         try:
             msg_type = msg['MSG_TYPE']
-            sovereign_msg = self.MSG_DICT['ROOT'][msg_type]
+            return self._validators[msg_type]
         except KeyError as e:
-            emsg = "MSG_TYPE %s is not found in the Message Authority. Msg body is %s\n" % (msg_type, msg)
+            emsg = "MSG_TYPE %s is not found in the Message Authority. Msg body is %s\n" % (msg.get('MSG_TYPE'), msg)
             raise Exception(str(e) + "\n" + emsg)
 
-        return self.dicts_shape_is_equal(msg, sovereign_msg)
+
+    def check_message_shape(self, msg):
+        return self.get_validator(msg).matches(msg)
+
+
+    def check_message(self, msg):
+        """ Compare msg with its messages.yaml entry.
+            :return: (missing, extra) lists of dotted key paths; both are
+                     empty when the shapes match.
+        """
+        validator = self.get_validator(msg)
+        if validator.matches(msg):
+            return [], []
+        return validator.differences(msg)
+
+
+    def sample_check(self, msg, rate, source=''):
+        """ Check a rate fraction of the messages passed in, logging any
+            mismatch with the keys that are missing and extra. Meant for
+            consumers, so it never raises.
+            :return: True unless the message was checked and did not match.
+        """
+        if rate < 1.0 and random.random() >= rate:
+            return True
+        try:
+            missing, extra = self.check_message(msg)
+        except Exception as e:
+            LOGGER.warning("%s received a message with no Message Authority entry: %s" % (source, e))
+            return False
+        if missing or extra:
+            LOGGER.warning("%s received a malformed %s message. Missing keys: %s Extra keys: %s"
+                           % (source, msg.get('MSG_TYPE'), missing, extra))
+            return False
+        return True
 
 
     def get_dict_shape(self, d):
@@ -66,6 +167,7 @@ class MessageAuthority:
 
 
 def main():
+    logmod.setup_logging(filename='logs/MessageAuthority.log', level=logging.INFO)
     ma = MessageAuthority()
     print("Beginning MessageAuthority event loop...")
     try:
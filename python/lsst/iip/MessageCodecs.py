@@ -0,0 +1,180 @@
+""" Registry of message codecs shared by SimplePublisher and Consumer.
+
+    Each codec is a handler class with encode_message(dict) and
+    decode_message(body) methods, registered under a message format name
+    (the value used for BASE_MSG_FORMAT and friends in L1SystemCfg.yaml)
+    and an AMQP content_type. Publishers stamp the content_type on every
+    message, and consumers pick the decoder per message from it. Messages
+    without a content_type come from publishers that predate the registry,
+    so they are decoded with the consumer's configured format.
+
+    A codec may also register a setup function, called with its section of
+    ROOT/MESSAGE_CODECS in L1SystemCfg.yaml before the shared handler is
+    created, e.g. to set how often XML messages are checked against the
+    schema:
+
+        MESSAGE_CODECS:
+          XML:
+            VALIDATION: SAMPLED     # ALWAYS, SAMPLED or OFF
+            SAMPLE_RATE: 0.1
+"""
+
+import logging
+import threading
+import yaml
+from toolsmod import L1ConfigKeyError
+from YamlHandler import YamlHandler
+from JsonHandler import JsonHandler
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+YAML_CONTENT_TYPE = 'application/x-yaml'
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPE = 'application/x-msgpack'
+XML_CONTENT_TYPE = 'application/xml'
+
+DEFAULT_FORMAT = 'YAML'
+CFG_FILE = 'L1SystemCfg.yaml'
+
+_format_registry = {}        # format name -> (content_type, handler class)
+_content_type_registry = {}  # content_type -> format name
+_setups = {}                 # format name -> setup function
+_handlers = {}               # format name -> shared handler instance
+_lock = threading.Lock()
+_settings = None
+_settings_lock = threading.Lock()
+
+
+def load_settings(cfg_file=CFG_FILE):
+    """ Return the ROOT/MESSAGE_CODECS section of cfg_file, or {}. """
+    try:
+        with open(cfg_file) as f:
+            cdm = yaml.safe_load(f)
+    except IOError:
+        LOGGER.warning("Can't open %s; message codecs use their defaults", cfg_file)
+        return {}
+    return cdm.get('ROOT', {}).get('MESSAGE_CODECS') or {}
+
+
+def configure(settings):
+    """ Use settings, a dict shaped like the cfg section, from now on.
+        Shared handlers already created are dropped, so the next
+        get_handler builds them with the new settings.
+    """
+    global _settings
+    with _settings_lock:
+        _settings = dict(settings)
+    with _lock:
+        _handlers.clear()
+    return _settings
+
+
+def get_settings():
+    global _settings
+    with _settings_lock:
+        if _settings is None:
+            _settings = load_settings()
+        return _settings
+
+
+def register_codec(format_name, content_type, handler_class, setup=None):
+    """ Make a handler class available under a format name and content_type.
+
+        :param format_name: Name used in config files, such as 'JSON'.
+        :param content_type: AMQP content_type header value for this codec.
+        :param handler_class: Class providing encode_message and decode_message.
+        :param setup: Optional function called with the format's cfg section
+            (a dict, maybe empty) before its shared handler is created.
+    """
+    with _lock:
+        _format_registry[format_name] = (content_type, handler_class)
+        _content_type_registry[content_type] = format_name
+        _handlers.pop(format_name, None)
+        if setup is None:
+            _setups.pop(format_name, None)
+        else:
+            _setups[format_name] = setup
+
+
+def available_formats():
+    return list(_format_registry.keys())
+
+
+def content_type_for(format_name):
+    """ Return the content_type a publisher should stamp for format_name.
+    """
+    format_name = normalize_format(format_name)
+    try:
+        return _format_registry[format_name][0]
+    except KeyError:
+        raise L1ConfigKeyError("Message format %s is unknown or its codec is not installed"
+                               % format_name)
+
+
+def get_handler(format_name):
+    """ Return the process-wide handler instance for format_name.
+        Handlers are created on first use so that, for example, the XML
+        schema is only compiled by processes that actually speak XML.
+    """
+    format_name = normalize_format(format_name)
+    settings = get_settings().get(format_name) or {}
+    with _lock:
+        handler = _handlers.get(format_name)
+        if handler is None:
+            try:
+                handler_class = _format_registry[format_name][1]
+            except KeyError:
+                raise L1ConfigKeyError("Message format %s is unknown or its codec is not installed"
+                                       % format_name)
+            setup = _setups.get(format_name)
+            if setup is not None:
+                setup(settings)
+            handler = handler_class()
+            _handlers[format_name] = handler
+    return handler
+
+
+def get_handler_for_content_type(content_type, default_format=None):
+    """ Return the handler that decodes messages of content_type.
+        Falls back to default_format for messages published without a
+        content_type, i.e. by components not yet using the registry.
+    """
+    if content_type:
+        format_name = _content_type_registry.get(content_type)
+        if format_name is not None:
+            return get_handler(format_name)
+        LOGGER.warning('No codec registered for content_type %s, using %s',
+                       content_type, normalize_format(default_format))
+    return get_handler(default_format)
+
+
+def normalize_format(format_name):
+    if format_name is None:
+        return DEFAULT_FORMAT
+    return format_name.upper()
+
+
+register_codec('YAML', YAML_CONTENT_TYPE, YamlHandler)
+register_codec('JSON', JSON_CONTENT_TYPE, JsonHandler)
+
+try:
+    from MsgpackHandler import MsgpackHandler
+    register_codec('MSGPACK', MSGPACK_CONTENT_TYPE, MsgpackHandler)
+except ImportError:
+    LOGGER.info('msgpack not installed; MSGPACK message format unavailable')
+
+
+def setup_xml(settings):
+    """ Set the process-wide XML validation policy from the XML section. """
+    XMLHandler.set_validation(settings.get('VALIDATION', XMLHandler.VALIDATE_ALWAYS),
+                              settings.get('SAMPLE_RATE'))
+
+
+try:
+    import XMLHandler
+    register_codec('XML', XML_CONTENT_TYPE, XMLHandler.XMLHandler, setup=setup_xml)
+except ImportError:
+    LOGGER.info('lxml not installed; XML message format unavailable')
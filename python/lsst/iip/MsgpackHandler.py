@@ -0,0 +1,26 @@
+from const import *
+import msgpack
+import sys
+
+
+class MsgpackHandler:
+    def __init__(self, callback=None):
+        self._consumer_callback = callback
+
+
+    def msgpack_callback(self, ch, method, properties, body): 
+        """ Decode the message body before consuming
+            Setting the consumer callback function
+        """
+        pydict = self.decode_message(body)
+        self._consumer_callback(ch, method, properties, pydict)
+
+
+    def encode_message(self, dictValue):
+        msgpack_body = msgpack.packb(dictValue, use_bin_type=True, default=str)
+        return msgpack_body
+
+
+    def decode_message(self, body):
+        tmpdict = msgpack.unpackb(body, raw=False) 
+        return tmpdict
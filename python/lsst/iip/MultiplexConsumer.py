@@ -0,0 +1,224 @@
+"""A Consumer that serves several queues over one connection.
+
+   Consumer opens a connection, an ioloop and a thread per queue.
+   MultiplexConsumer opens a single SelectConnection and one channel per
+   queue on it, and routes each queue's deliveries to that queue's callback.
+   ThreadManager supervises it as one thread.
+
+   Because every queue shares the one ioloop thread, callbacks never run on
+   it: a foreman handler blocked waiting for acks would otherwise stop the
+   acks themselves from being delivered. Each queue gets its own
+   OrderedDispatcher (one worker unless configured otherwise, which keeps
+   the one-message-at-a-time behaviour of a dedicated Consumer thread) and
+   acks are handed back to the ioloop through IoloopChannel.
+
+   A queue's channel can be closed by the broker on its own, e.g. with a
+   404 when its queue does not exist; it is reopened after RECONNECT_DELAY
+   seconds while the connection stays up.
+"""
+
+
+import logging
+import pika
+import threading
+import time
+import MessageCodecs
+import Tracing
+from OrderedDispatcher import OrderedDispatcher, IoloopChannel
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+class QueueChannel:
+    """One queue's channel, codec fallback and dispatcher within a
+    MultiplexConsumer.
+
+    """
+
+    def __init__(self, queue, name, callback, formatOptions,
+                 workers=1, prefetch=None, order_key=None, on_consuming=None,
+                 shape_check_rate=None, on_closed=None):
+        self.QUEUE = queue
+        self.name = name
+        self._consumer_callback = callback
+        self._format_options = formatOptions
+        self._default_handler = MessageCodecs.get_handler(formatOptions)
+        self._prefetch = prefetch
+        self._order_key = order_key
+        self._dispatcher = OrderedDispatcher(workers or 1, name + '-worker')
+        self._connection = None
+        self._channel = None
+        self._consumer_tag = None
+        self._on_consuming = on_consuming
+        self._on_closed = on_closed
+        self._shape_check_rate = shape_check_rate
+        self._msg_authority = None
+        if shape_check_rate:
+            from MessageAuthority import MessageAuthority
+            self._msg_authority = MessageAuthority()
+
+    def open_channel(self, connection):
+        self._connection = connection
+        connection.channel(on_open_callback=self.on_channel_open)
+
+    def on_channel_open(self, channel):
+        LOGGER.info('Channel opened for queue %s', self.QUEUE)
+        self._channel = channel
+        self._channel.add_on_close_callback(self.on_channel_closed)
+        if self._prefetch:
+            self._channel.basic_qos(prefetch_count=self._prefetch)
+        self._channel.add_callback(self.on_consume_ok, [pika.spec.Basic.ConsumeOk])
+        self._consumer_tag = self._channel.basic_consume(self.on_encoded_message, self.QUEUE)
+
+    def on_consume_ok(self, method_frame):
+        """The broker has accepted basic_consume; deliveries can start."""
+        LOGGER.info('Consuming from queue %s', self.QUEUE)
+        if self._on_consuming is not None:
+            self._on_consuming(self)
+
+    def on_channel_closed(self, channel, reply_code, reply_text):
+        self._channel = None
+        if self._on_closed is not None:
+            self._on_closed(self, reply_code, reply_text)
+
+    def on_encoded_message(self, channel, basic_deliver, properties, body):
+        received_at = time.time()
+        content_type = properties.content_type
+        if content_type:
+            handler = MessageCodecs.get_handler_for_content_type(content_type,
+                                                                 self._format_options)
+        else:
+            handler = self._default_handler
+        pydict = handler.decode_message(body)
+        if self._msg_authority is not None:
+            self._msg_authority.sample_check(pydict, self._shape_check_rate, self.name)
+        key = None
+        if self._order_key is not None and isinstance(pydict, dict):
+            key = pydict.get(self._order_key)
+        self._dispatcher.submit(key, Tracing.run_traced, self.name, received_at,
+                                self._consumer_callback,
+                                IoloopChannel(self._connection, channel),
+                                basic_deliver, properties, pydict)
+
+    def stop_consuming(self):
+        if self._channel is not None and self._channel.is_open:
+            LOGGER.info('Cancelling consumer on queue %s', self.QUEUE)
+            self._channel.basic_cancel(consumer_tag=self._consumer_tag)
+
+    def shutdown(self):
+        self._dispatcher.shutdown()
+
+
+class MultiplexConsumer(threading.Thread):
+
+    RECONNECT_DELAY = 5
+
+    def __init__(self, amqp_url, name, queue_params):
+        """Create a MultiplexConsumer.
+
+        :param str amqp_url: The AMQP url to connect with
+        :param str name: Thread name
+        :param list queue_params: One dict per queue, with the same keys
+            ThreadManager takes for a Consumer: name, queue, callback,
+            format, and optionally workers, prefetch, order_key and
+            shape_check_rate
+
+        """
+        threading.Thread.__init__(self, group=None, target=None, name=name)
+        self._url = amqp_url
+        self._connection = None
+        self._closing = False
+        # Set once the broker has confirmed every queue's basic_consume
+        self.ready_event = threading.Event()
+        self._consuming = set()
+        self._on_exit_callback = None
+        self.queue_channels = []
+        for params in queue_params:
+            self.queue_channels.append(QueueChannel(params['queue'], params['name'],
+                                                    params['callback'], params['format'],
+                                                    params.get('workers', 1),
+                                                    params.get('prefetch', None),
+                                                    params.get('order_key', None),
+                                                    self.on_queue_consuming,
+                                                    params.get('shape_check_rate', None),
+                                                    self.on_queue_closed))
+
+    def on_queue_consuming(self, queue_channel):
+        self._consuming.add(queue_channel.QUEUE)
+        if len(self._consuming) == len(self.queue_channels):
+            self.ready_event.set()
+
+    def on_queue_closed(self, queue_channel, reply_code, reply_text):
+        """One queue's channel was closed. Unless we are stopping, or the
+        whole connection went (on_connection_closed reopens everything
+        then), reopen it after RECONNECT_DELAY seconds.
+
+        """
+        self._consuming.discard(queue_channel.QUEUE)
+        self.ready_event.clear()
+        connection = self._connection
+        if self._closing or connection is None or not connection.is_open:
+            return
+        LOGGER.warning('Channel for queue %s was closed: (%s) %s; reopening in %d seconds',
+                       queue_channel.QUEUE, reply_code, reply_text, self.RECONNECT_DELAY)
+
+        def reopen():
+            if not self._closing and self._connection is connection and connection.is_open:
+                queue_channel.open_channel(connection)
+
+        connection.add_timeout(self.RECONNECT_DELAY, reopen)
+
+    def add_on_exit_callback(self, callback):
+        self._on_exit_callback = callback
+
+    def connect(self):
+        LOGGER.info('Connecting to %s', self._url)
+        return pika.SelectConnection(pika.URLParameters(self._url),
+                                     self.on_connection_open,
+                                     stop_ioloop_on_close=False)
+
+    def on_connection_open(self, unused_connection):
+        LOGGER.info('Connection opened; opening %d queue channels', len(self.queue_channels))
+        self._connection.add_on_close_callback(self.on_connection_closed)
+        for queue_channel in self.queue_channels:
+            queue_channel.open_channel(self._connection)
+
+    def on_connection_closed(self, connection, reply_code, reply_text):
+        if self._closing:
+            self._connection.ioloop.stop()
+        else:
+            LOGGER.warning('Connection closed, reopening in %d seconds: (%s) %s',
+                           self.RECONNECT_DELAY, reply_code, reply_text)
+            self._connection.add_timeout(self.RECONNECT_DELAY, self.reconnect)
+
+    def reconnect(self):
+        self._connection.ioloop.stop()
+        if not self._closing:
+            self._connection = self.connect()
+            self._connection.ioloop.start()
+
+    def run(self):
+        try:
+            self._connection = self.connect()
+            self._connection.ioloop.start()
+        finally:
+            if self._on_exit_callback is not None:
+                self._on_exit_callback(self)
+
+    def stop(self):
+        """Cancel every queue's consumer and close the connection from the
+        ioloop thread; run() returns once the connection has closed.
+
+        """
+        LOGGER.info('Stopping')
+        self._closing = True
+        self._connection.ioloop.add_callback_threadsafe(self.close_from_ioloop)
+        for queue_channel in self.queue_channels:
+            queue_channel.shutdown()
+
+    def close_from_ioloop(self):
+        for queue_channel in self.queue_channels:
+            queue_channel.stop_consuming()
+        self._connection.close()
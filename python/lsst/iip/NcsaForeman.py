@@ -1,6 +1,7 @@
 import toolsmod
-from toolsmod import get_timestamp
+from timemod import get_timestamp
 import logging
+import logmod
 import pika
 import redis
 import yaml
@@ -20,7 +21,6 @@ from SimplePublisher import SimplePublisher
 
 LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
               '-35s %(lineno) -5d: %(message)s')
-logging.basicConfig(filename='logs/NcsaForeman.log', level=logging.INFO, format=LOG_FORMAT)
 LOGGER = logging.getLogger(__name__)
 
 
@@ -186,7 +186,7 @@ class NcsaForeman:
 
         num_healthy_distributors = len(healthy_distributors)
         if len_forwarders_list > num_healthy_distributors:
-            print("Cannot Do Job - more fwdrs than dists")
+            LOGGER.error("Cannot Do Job - more fwdrs than dists")
             # send response msg to base refusing job
             LOGGER.info('Reporting to base insufficient healthy distributors for job #%s', job_num)
             ncsa_params = {}
@@ -223,7 +223,7 @@ class NcsaForeman:
             dist_params_response = self.progressive_ack_timer(job_params_ack, num_healthy_distributors, 2.0)
 
             if dist_params_response == None:
-                print("RECEIVED NO ACK RESPONSES FROM DISTRIBUTORS AFTER SENDING XFER PARAMS")
+                LOGGER.debug("RECEIVED NO ACK RESPONSES FROM DISTRIBUTORS AFTER SENDING XFER PARAMS")
                 pass  #Do something such as raise a system wide exception 
 
 
@@ -260,10 +260,8 @@ class NcsaForeman:
             tmp_dict['DISTRIBUTOR'] = {}
             distributor = healthy_distributors[i]
             sub_dict['FQN'] = distributor
-            sub_dict['HOSTNAME'] = self.DIST_SCBD.get_value_for_distributor(distributor, HOSTNAME)
-            sub_dict['NAME'] = self.DIST_SCBD.get_value_for_distributor(distributor, NAME)
-            sub_dict['IP_ADDR'] = self.DIST_SCBD.get_value_for_distributor(distributor, IP_ADDR)
-            sub_dict['TARGET_DIR'] = self.DIST_SCBD.get_value_for_distributor(distributor, TARGET_DIR)
+            sub_dict.update(self.DIST_SCBD.get_static_fields(distributor,
+                                                             (HOSTNAME, NAME, IP_ADDR, TARGET_DIR)))
             tmp_dict['DISTRIBUTOR'] = sub_dict
             PAIRS.append(tmp_dict)
 
@@ -281,6 +279,7 @@ class NcsaForeman:
         # The following line extracts the distributor FQNs from pairs dict using
         # list comprehension values; faster than for loops
         # distributors = [v['FQN'] for v in list(pairs.values())]
+        readout_batch = []
         for i in range(0, len_pairs):  # Pairs is a list of dictionaries
             distributor = pairs[i]['DISTRIBUTOR']['FQN']
             msg_params = {}
@@ -290,7 +289,10 @@ class NcsaForeman:
             msg_params[ACK_ID] = ack_id
             routing_key = self.DIST_SCBD.get_routing_key(distributor)
             self.DIST_SCBD.set_distributor_state(distributor, 'START_READOUT')
-            self._ncsa_publisher.publish_message(routing_key, msg_params)
+            readout_batch.append((routing_key, msg_params))
+        if not self._ncsa_publisher.publish_many(readout_batch):
+            LOGGER.critical('Unable to send readout for job %s. Heading for exit...', job_number)
+            sys.exit(105)
 
         distributor_responses = self.progressive_ack_timer(ack_id, len_pairs, 24)
 
@@ -350,24 +352,19 @@ class NcsaForeman:
         return True
 
     def progressive_ack_timer(self, ack_id, expected_replies, seconds):
-        counter = 0.0
-        while (counter < seconds):
-            counter = counter + 0.5
-            sleep(0.5)
-            response = self.ACK_SCBD.get_components_for_timed_ack(ack_id)
-            if response == None:
-                continue
-            if len(list(response.keys())) == expected_replies:
-                return response
-
-        ## Try one final time
-        response = self.ACK_SCBD.get_components_for_timed_ack(ack_id)
-        if response == None:
-            return None
-        elif len(list(response.keys())) == expected_replies:
-            return response
-        else:
-            return None
+        """ Waits up to user-defined seconds, or less if everyone has reported back in.
+
+            :params ack_id: Ack ID to wait for.
+
+            :params expected_replies: Number of components expected to ack..
+
+            :params seconds: Maximum time to wait in seconds.
+
+            :return: The dictionary that represents the responses from the components ack'ing.
+                     Note: The Ack Scoreboard wakes this call as soon as the last expected
+                           ack is checked in, rather than at the end of the maximum wait time.
+        """
+        return self.ACK_SCBD.wait_for_timed_acks(ack_id, expected_replies, seconds)
 
 
     def extract_config_values(self):
@@ -443,7 +440,7 @@ class NcsaForeman:
         md['test_val'] = 'test_it'
         kws[md['name']] = md
 
-        self.thread_manager = ThreadManager('thread-manager', kws, self.shutdown_event)
+        self.thread_manager = ThreadManager('thread-manager', kws, self.shutdown_event, multiplex=True)
         self.thread_manager.start()
 
 
@@ -460,12 +457,11 @@ class NcsaForeman:
         LOGGER.debug("NCSA Foreman: Shutting down Consumer threads.")
         self.shutdown_event.set()
         LOGGER.debug("Thread Manager shutting down and app exiting...")
-        print("\n")
         os._exit(0)
 
 
 def main():
-    logging.basicConfig(filename='logs/NcsaForeman.log', level=logging.INFO, format=LOG_FORMAT)
+    logmod.setup_logging(filename='logs/NcsaForeman.log', level=logging.INFO)
     n_fm = NcsaForeman()
     print("Beginning BaseForeman event loop...")
     try:
@@ -0,0 +1,102 @@
+""" Thread pool dispatch for Consumer deliveries.
+
+    OrderedDispatcher runs message handlers on a bounded pool of worker
+    threads while keeping handlers that share a key (for example JOB_NUM)
+    strictly in arrival order. Messages with different keys, or no key at
+    all, run concurrently, so one slow job does not hold up the others.
+
+    IoloopChannel stands in for the pika channel handed to a handler that
+    runs on a worker thread. pika channels may only be used from their
+    ioloop thread, so acks, nacks and rejects are scheduled back onto it.
+"""
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+class OrderedDispatcher:
+
+    def __init__(self, workers, name='dispatch'):
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix=name)
+        self._pending = {}  # key -> deque of handlers waiting behind the running one
+        self._lock = threading.Lock()
+
+
+    def submit(self, key, fn, *args):
+        """ Queue fn(*args). Calls with the same key run one at a time in
+            submission order; a key of None is not ordered against anything.
+        """
+        if key is None:
+            self._executor.submit(self.run_handler, fn, args)
+            return
+
+        with self._lock:
+            waiting = self._pending.get(key)
+            if waiting is not None:
+                waiting.append((fn, args))
+                return
+            self._pending[key] = deque()
+        self._executor.submit(self.drain_key, key, fn, args)
+
+
+    def drain_key(self, key, fn, args):
+        while True:
+            self.run_handler(fn, args)
+            with self._lock:
+                waiting = self._pending[key]
+                if not waiting:
+                    del self._pending[key]
+                    return
+                fn, args = waiting.popleft()
+
+
+    def run_handler(self, fn, args):
+        try:
+            fn(*args)
+        except Exception:
+            LOGGER.exception('Message handler raised an exception')
+
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class IoloopChannel:
+
+    def __init__(self, connection, channel):
+        self._connection = connection
+        self._channel = channel
+
+
+    def on_ioloop(self, fn, *args):
+        channel = self._channel
+
+        def call():
+            # Delivery tags belong to the channel they arrived on; after a
+            # reconnect they are meaningless, so drop the call.
+            if channel.is_open:
+                fn(*args)
+        self._connection.ioloop.add_callback_threadsafe(call)
+
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self.on_ioloop(self._channel.basic_ack, delivery_tag, multiple)
+
+
+    def basic_nack(self, delivery_tag=None, multiple=False, requeue=True):
+        self.on_ioloop(self._channel.basic_nack, delivery_tag, multiple, requeue)
+
+
+    def basic_reject(self, delivery_tag=None, requeue=True):
+        self.on_ioloop(self._channel.basic_reject, delivery_tag, requeue)
+
+
+    def __getattr__(self, name):
+        return getattr(self._channel, name)
@@ -1,6 +1,7 @@
 import toolsmod
-from toolsmod import get_timestamp
+from timemod import get_timestamp
 import logging
+import logmod
 import pprint
 import pika
 import redis
@@ -8,7 +9,6 @@ import yaml
 import sys
 import os
 import time
-import datetime
 from time import sleep
 import threading
 from const import *
@@ -55,7 +55,7 @@ class PromptProcessDevice:
             self.extract_config_values()
         except Exception as e:
             LOGGER.error("PP_Device problem configuring with file %s: %s" % (self._config_file, e.arg))
-            print("PP_Device unable to read Config file %s: %s" % (self._config_file, e.arg))
+            LOGGER.error("PP_Device unable to read Config file %s: %s", self._config_file, e.arg)
             sys.exit(self.ErrorCodePrefix + 20)
 
 
@@ -83,7 +83,6 @@ class PromptProcessDevice:
             self.setup_publishers()
         except L1PublisherError as e:
             LOGGER.error("PP_Device unable to start Publishers: %s" % e.arg)
-            print("PP_Device unable to start Publishers: %s" % e.arg)
             sys.exit(self.ErrorCodePrefix + 31)
 
         self.setup_scoreboards()
@@ -94,7 +93,6 @@ class PromptProcessDevice:
             self.setup_consumer_threads()
         except L1Exception as e:
             LOGGER.error("PP_Device unable to launch ThreadManager: %s" % e.arg)
-            print("PP_Device unable to launch ThreadManager: %s" % e.arg)
             sys.exit(self.ErrorCodePrefix + 1)
 
         LOGGER.info('Prompt Process Foreman Init complete')
@@ -119,7 +117,6 @@ class PromptProcessDevice:
             self._ncsa_publisher = SimplePublisher(self._pub_ncsa_broker_url, self._ncsa_msg_format)
         except Exception as e:
             LOGGER.error("PP_Device unable to start Publishers: %s" % e.arg)
-            print("PP_Device unable to start Publishers: %s" % e.arg)
             raise L1PublisherError("Critical Error: Unable to create Publishers: %s" % e.arg)
 
 
@@ -236,8 +233,7 @@ class PromptProcessDevice:
         healthy_forwarders = self.ACK_SCBD.get_components_for_timed_ack(ack_id)
 
         if healthy_forwarders == None:
-            self.JOB_SCBD.set_job_state(job_number, 'SCRUBBED')
-            self.JOB_SCBD.set_job_status(job_number, 'INACTIVE')
+            self.JOB_SCBD.set_job_state(job_num, 'SCRUBBED', status='INACTIVE')
             self.send_fault("No Response From Forwarders", 
                             self.FORWARDER_NO_RESPONSE, job_num, self.COMPONENT_NAME)
             raise L1ForwarderError("No response from any Forwarder when sending job params")
@@ -466,6 +462,10 @@ class PromptProcessDevice:
                     dmcs_params['ACK_BOOL'] = True
                     dmcs_params['ACK_ID'] = params['ACK_ID']
                     self._base_publisher.publish_message(params['REPLY_QUEUE'], dmcs_params)
+                    self.JOB_SCBD.set_job_state(job_number, 'COMPLETE', status='INACTIVE')
+                else:
+                    LOGGER.error("No forwarder readout response for job %s", job_number)
+                    self.JOB_SCBD.set_job_state(job_number, 'JOB_ABORTED', status='INACTIVE')
                     
             else:
                 #send problem with ncsa to DMCS
@@ -476,6 +476,7 @@ class PromptProcessDevice:
                 dmcs_params['ACK_BOOL'] = False
                 dmcs_params['ACK_ID'] = params['ACK_ID']
                 self._base_publisher.publish_message('dmcs_ack_consume', dmcs_params)
+                self.JOB_SCBD.set_job_state(job_number, 'JOB_ABORTED', status='INACTIVE')
                     
         else:
             #send 'no response from ncsa' to DMCS               )
@@ -486,6 +487,7 @@ class PromptProcessDevice:
             dmcs_params['ACK_BOOL'] = False
             dmcs_params['ACK_ID'] = params['ACK_ID']
             self._base_publisher.publish_message(params['REPLY_QUEUE'], dmcs_params)
+            self.JOB_SCBD.set_job_state(job_number, 'JOB_ABORTED', status='INACTIVE')
                     
         
 
@@ -504,29 +506,23 @@ class PromptProcessDevice:
 
 
     def progressive_ack_timer(self, ack_id, expected_replies, seconds):
-        counter = 0.0
-        while (counter < seconds):
-            counter = counter + 0.5
-            sleep(0.5)
-            response = self.ACK_SCBD.get_components_for_timed_ack(ack_id)
-            if response == None:
-                continue
-            if len(list(response.keys())) == expected_replies:
-                return response
-
-        ## Try one final time 
-        response = self.ACK_SCBD.get_components_for_timed_ack(ack_id)
-        if response == None:
-            return None
-        elif len(list(response.keys())) == expected_replies:
-            return response
-        else:
-            return None
+        """ Waits up to user-defined seconds, or less if everyone has reported back in.
+
+            :params ack_id: Ack ID to wait for.
+
+            :params expected_replies: Number of components expected to ack..
+
+            :params seconds: Maximum time to wait in seconds.
+
+            :return: The dictionary that represents the responses from the components ack'ing.
+                     Note: The Ack Scoreboard wakes this call as soon as the last expected
+                           ack is checked in, rather than at the end of the maximum wait time.
+        """
+        return self.ACK_SCBD.wait_for_timed_acks(ack_id, expected_replies, seconds)
 
 
     def set_pending_nonblock_acks(self, acks, wait_time):
-        start_time = datetime.datetime.now().time()
-        expiry_time = self.add_seconds(start_time, wait_time)
+        expiry_time = time.time() + wait_time
         ack_msg = {}
         ack_msg[MSG_TYPE] = 'PENDING_ACK'
         ack_msg['EXPIRY_TIME'] = expiry_time
@@ -539,20 +535,12 @@ class PromptProcessDevice:
         self.ACK_SCBD.add_pending_nonblock_ack(params)
 
 
-    def add_seconds(self, intime, secs):
-        basetime = datetime.datetime(100, 1, 1, intime.hour, intime.minute, intime.second)
-        newtime = basetime + datetime.timedelta(seconds=secs)
-        return newtime.time()
-
-
-
     def extract_config_values(self):
         LOGGER.info('Reading YAML Config file %s' % self._config_file)
         try:
             cdm = toolsmod.intake_yaml_file(self._config_file)
         except IOError as e:
             LOGGER.critical("Unable to find CFG Yaml file %s\n" % self._config_file)
-            print("Unable to find CFG Yaml file %s\n" % self._config_file)
             raise L1ConfigIOError("Trouble opening CFG Yaml file %s: %s" % (self._config_file, e.arg))
 
         try:
@@ -574,7 +562,7 @@ class PromptProcessDevice:
             LOGGER.critical("CDM Dictionary Key error")
             LOGGER.critical("Offending Key is %s", str(e)) 
             LOGGER.critical("Bailing out...")
-            print("KeyError when reading CFG file. Check logs...exiting...")
+            LOGGER.error("KeyError when reading CFG file. Check logs...exiting...")
             raise L1ConfigKeyError("Key Error when reading config file: %s" % e.arg)
  
         self._base_msg_format = 'YAML'
@@ -631,15 +619,13 @@ class PromptProcessDevice:
         kws[md['name']] = md
 
         try:
-            self.thread_manager = ThreadManager('thread-manager', kws, self.shutdown_event)
+            self.thread_manager = ThreadManager('thread-manager', kws, self.shutdown_event, multiplex=True)
             self.thread_manager.start()
         except ThreadError as e:
             LOGGER.error("PP_Device unable to launch Consumers - Thread Error: %s" % e.arg)
-            print("PP_Device unable to launch Consumers - Thread Error: %s" % e.arg)
             raise L1ConsumerError("Thread problem preventing Consumer launch: %s" % e.arg)
         except Exception as e:
             LOGGER.error("PP_Device unable to launch Consumers: %s" % e.arg)
-            print("PP_Device unable to launch Consumers: %s" % e.arg)
             raise L1Error("PP_Device unable to launch Consumers - Rabbit Problem?: %s" % e.arg)
 
 
@@ -651,17 +637,18 @@ class PromptProcessDevice:
                                                 self._forwarder_dict)
             self.JOB_SCBD = JobScoreboard('PP_JOB_SCBD', self._scbd_dict['PP_JOB_SCBD'])
             self.ACK_SCBD = AckScoreboard('PP_ACK_SCBD', self._scbd_dict['PP_ACK_SCBD'])
+            self.ACK_SCBD.start_ack_sweeper()
         except L1RabbitConnectionError as e:
             LOGGER.error("PP_Device unable to complete setup_scoreboards-No Rabbit Connect: %s" % e.arg)
-            print("PP_Device unable to complete setup_scoreboards - No Rabbit Connection: %s" % e.arg)
+            LOGGER.error("PP_Device unable to complete setup_scoreboards - No Rabbit Connection: %s", e.arg)
             sys.exit(self.ErrorCodePrefix + 11)
         except L1RedisError as e:
             LOGGER.error("PP_Device unable to complete setup_scoreboards - no Redis connect: %s" % e.arg)
-            print("PP_Device unable to complete setup_scoreboards - no Redis connection: %s" % e.arg)
+            LOGGER.error("PP_Device unable to complete setup_scoreboards - no Redis connection: %s", e.arg)
             sys.exit(self.ErrorCodePrefix + 12)
         except Exception as e:
             LOGGER.error("PP_Device init unable to complete setup_scoreboards: %s" % e.arg)
-            print("PP_Device unable to complete setup_scoreboards: %s" % e.arg)
+            LOGGER.error("PP_Device unable to complete setup_scoreboards: %s", e.arg)
             sys.exit(self.ErrorCodePrefix + 10)
 
     def send_fault(error_string, error_code, job_num, component_name):
@@ -684,12 +671,11 @@ class PromptProcessDevice:
         LOGGER.debug("PromptProcessDevice: Shutting down Consumer threads.")
         self.shutdown_event.set()
         LOGGER.debug("Thread Manager shutting down and app exiting...")
-        print("\n")
         os._exit(0)
 
 
 def main():
-    logging.basicConfig(filename='logs/PromptProcess.log', level=logging.DEBUG, format=LOG_FORMAT)
+    logmod.setup_logging(filename='logs/PromptProcess.log', level=logging.DEBUG)
     pp_fm = PromptProcessDevice()
     print("Beginning PromptProcessDevice event loop...")
     try:
@@ -0,0 +1,236 @@
+""" Process-wide pool of broker connections for publishing.
+
+    pika's BlockingConnection is not thread safe, and every SimplePublisher
+    used to open its own. A PublisherPool holds at most a fixed number of
+    connections (each with one open channel) for a given AMQP url. A
+    connection and its channel are checked out for the duration of a single
+    publish, so any number of SimplePublishers on any number of threads
+    share the same few connections. A connection that fails is thrown away
+    and replaced with a fresh one on the next checkout.
+
+    Batches go out on a second, transactional channel of the same
+    connection: every frame is written back to back and a single
+    tx_commit confirms the whole batch in one broker round trip.
+"""
+
+import logging
+import threading
+import queue
+from contextlib import contextmanager
+import pika
+from pika.exceptions import AMQPError
+from toolsmod import L1RabbitConnectionError
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+DEFAULT_POOL_SIZE = 2
+CHECKOUT_TIMEOUT = 30.0
+PUBLISH_RETRIES = 2
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(amqp_url, size=None):
+    """ Return the pool for amqp_url, creating it on first use.
+
+        :param amqp_url: Broker url, credentials included.
+        :param size: Maximum connections for a new pool; ignored if the
+                     pool for amqp_url already exists.
+    """
+    with _pools_lock:
+        pool = _pools.get(amqp_url)
+        if pool is None:
+            pool = PublisherPool(amqp_url, size or DEFAULT_POOL_SIZE)
+            _pools[amqp_url] = pool
+        return pool
+
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+class PooledConnection:
+    """ A broker connection with its publish channel, plus a
+        transactional channel for batches opened on first use.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.channel = connection.channel()
+        self._tx_channel = None
+
+    def is_open(self):
+        return self.connection.is_open and self.channel.is_open
+
+    def tx_channel(self):
+        if self._tx_channel is None or not self._tx_channel.is_open:
+            self._tx_channel = self.connection.channel()
+            self._tx_channel.tx_select()
+        return self._tx_channel
+
+    def close(self):
+        if self.connection.is_open:
+            self.connection.close()
+
+
+class PublisherPool:
+
+    def __init__(self, amqp_url, size=DEFAULT_POOL_SIZE):
+        self._url = amqp_url
+        self._size = size
+        self._idle = queue.LifoQueue()
+        self._num_open = 0
+        self._lock = threading.Lock()
+
+
+    def open_connection(self):
+        connection = pika.BlockingConnection(pika.URLParameters(self._url))
+        LOGGER.info('Publisher pool opened connection %d of %d to %s',
+                    self._num_open, self._size, self._url)
+        return PooledConnection(connection)
+
+
+    def checkout(self, timeout=CHECKOUT_TIMEOUT):
+        """ Take an open PooledConnection out of the pool.
+            Opens a new connection if the pool is not yet full, otherwise
+            blocks until another thread hands one back.
+        """
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                pooled = None
+
+            if pooled is None:
+                with self._lock:
+                    can_open = self._num_open < self._size
+                    if can_open:
+                        self._num_open += 1
+                if can_open:
+                    try:
+                        return self.open_connection()
+                    except BaseException as e:
+                        # A socket error fails the same way; the slot is freed either way
+                        with self._lock:
+                            self._num_open -= 1
+                        if isinstance(e, (AMQPError, OSError)):
+                            raise L1RabbitConnectionError('Publisher pool cannot connect to %s: %s'
+                                                          % (self._url, e))
+                        raise
+                try:
+                    pooled = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise L1RabbitConnectionError('Timed out waiting for a publisher connection to %s'
+                                                  % self._url)
+
+            if pooled.is_open():
+                return pooled
+            self.discard(pooled)
+
+
+    def checkin(self, pooled):
+        self._idle.put(pooled)
+
+
+    def discard(self, pooled):
+        """ Drop a PooledConnection that is no longer usable.
+        """
+        with self._lock:
+            self._num_open -= 1
+        try:
+            pooled.close()
+        except (AMQPError, OSError):
+            pass
+
+
+    @contextmanager
+    def connection(self):
+        """ Check out a PooledConnection for the duration of a with block.
+            It goes back to the pool afterwards, unless the block raised
+            anything at all, in which case the connection is dropped: after
+            a socket error, or an exception part way through a batch, it is
+            in no known state.
+        """
+        pooled = self.checkout()
+        try:
+            yield pooled
+        except BaseException:
+            self.discard(pooled)
+            raise
+        else:
+            self.checkin(pooled)
+
+
+    def publish(self, exchange, route_key, body, properties=None):
+        """ Publish one already encoded message, reconnecting and retrying
+            a bounded number of times if the broker connection is lost.
+        """
+        for attempt in range(PUBLISH_RETRIES + 1):
+            try:
+                with self.connection() as pooled:
+                    pooled.channel.basic_publish(exchange=exchange, routing_key=route_key,
+                                                 body=body, properties=properties)
+                return
+            except (AMQPError, OSError) as e:
+                LOGGER.warning('Publish to %s failed (%s); reconnecting, attempt %d of %d',
+                               route_key, e, attempt + 1, PUBLISH_RETRIES + 1)
+
+        LOGGER.critical('Unable to publish to %s after %d attempts', route_key, PUBLISH_RETRIES + 1)
+        raise L1RabbitConnectionError('Unable to publish to %s' % route_key)
+
+
+    def publish_batch(self, exchange, frames, properties=None):
+        """ Publish a list of (route_key, body) pairs as one transaction.
+            A frame may also be (route_key, body, properties), overriding
+            properties for that message.
+            The frames are written without waiting and a single tx_commit
+            confirms them all. If the connection drops before the commit
+            none of the batch was delivered, so the whole batch is retried.
+            Once the commit has been written the broker may have delivered
+            the batch, so it is not retried: each message goes out at most
+            once.
+
+            :return: True if the broker confirmed every message; False if it
+                     did not, in which case some or all of the batch may
+                     still have been delivered.
+        """
+        for attempt in range(PUBLISH_RETRIES + 1):
+            committing = False
+            try:
+                with self.connection() as pooled:
+                    channel = pooled.tx_channel()
+                    for frame in frames:
+                        channel.basic_publish(exchange=exchange, routing_key=frame[0], body=frame[1],
+                                              properties=frame[2] if len(frame) > 2 else properties)
+                    committing = True
+                    channel.tx_commit()
+                return True
+            except (AMQPError, OSError) as e:
+                if committing:
+                    LOGGER.critical('Batch publish of %d messages failed during commit (%s); '
+                                    'not retrying, as the broker may have delivered it',
+                                    len(frames), e)
+                    return False
+                LOGGER.warning('Batch publish of %d messages failed (%s); reconnecting, '
+                               'attempt %d of %d', len(frames), e, attempt + 1, PUBLISH_RETRIES + 1)
+
+        LOGGER.critical('Unable to publish batch of %d messages after %d attempts',
+                        len(frames), PUBLISH_RETRIES + 1)
+        return False
+
+
+    def close(self):
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(pooled)
@@ -0,0 +1,142 @@
+""" Process-wide Redis connections for the scoreboards.
+
+    Every scoreboard used to build its own client to localhost:6379. Here a
+    single RedisConnectionFactory per process holds one connection pool per
+    DB instance, so scoreboards that share a DB share its connections and
+    concurrent handler threads each check out their own socket instead of
+    queueing on one. A thread that finds all MAX_CONNECTIONS of a pool in
+    use waits for one to be returned.
+
+    The server is read from the REDIS section of L1SystemCfg.yaml:
+
+        REDIS:
+          HOST: localhost
+          PORT: 6379
+          UNIX_SOCKET: /var/run/redis/redis.sock    # optional; replaces HOST/PORT
+          MAX_CONNECTIONS: 16
+          SOCKET_TIMEOUT: 5.0                       # optional, seconds
+
+    Without that section the defaults below are used. A command or pipeline
+    that fails with a ConnectionError is retried on a new connection up to
+    RETRIES times, sleeping min(BACKOFF_CAP, BACKOFF_BASE * 2**n) seconds
+    before each attempt.
+"""
+
+import logging
+import threading
+import redis
+import yaml
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+CFG_FILE = 'L1SystemCfg.yaml'
+DEFAULT_HOST = 'localhost'
+DEFAULT_PORT = 6379
+DEFAULT_MAX_CONNECTIONS = 16
+CHECKOUT_TIMEOUT = 30.0
+RETRIES = 3
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 1.0
+
+_factory = None
+_factory_lock = threading.Lock()
+
+
+def load_settings(cfg_file=CFG_FILE):
+    """ Return the ROOT/REDIS section of cfg_file, or {} if there is none. """
+    try:
+        with open(cfg_file) as f:
+            cdm = yaml.safe_load(f)
+    except IOError:
+        LOGGER.warning("Can't open %s; using default Redis settings", cfg_file)
+        return {}
+    return cdm.get('ROOT', {}).get('REDIS') or {}
+
+
+def configure(settings):
+    """ Replace the process factory with one built from settings, a dict
+        shaped like the REDIS cfg section. Existing pools are disconnected.
+    """
+    global _factory
+    with _factory_lock:
+        if _factory is not None:
+            _factory.close()
+        _factory = RedisConnectionFactory(settings)
+        return _factory
+
+
+def get_factory():
+    """ Return the process factory, reading L1SystemCfg.yaml on first use. """
+    global _factory
+    with _factory_lock:
+        if _factory is None:
+            _factory = RedisConnectionFactory(load_settings())
+        return _factory
+
+
+def get_client(db):
+    return get_factory().get_client(db)
+
+
+def close_all():
+    global _factory
+    with _factory_lock:
+        if _factory is not None:
+            _factory.close()
+            _factory = None
+
+
+class RedisConnectionFactory:
+    def __init__(self, settings):
+        self._settings = dict(settings)
+        self._pools = {}
+        self._lock = threading.Lock()
+
+        kwargs = {'decode_responses': True,
+                  'retry': Retry(ExponentialBackoff(cap=BACKOFF_CAP, base=BACKOFF_BASE), RETRIES),
+                  'max_connections': int(settings.get('MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS)),
+                  'timeout': CHECKOUT_TIMEOUT}
+        if settings.get('SOCKET_TIMEOUT') is not None:
+            kwargs['socket_timeout'] = float(settings['SOCKET_TIMEOUT'])
+
+        unix_socket = settings.get('UNIX_SOCKET')
+        if unix_socket:
+            kwargs['connection_class'] = redis.UnixDomainSocketConnection
+            kwargs['path'] = unix_socket
+            self.address = 'unix://%s' % unix_socket
+        else:
+            kwargs['host'] = settings.get('HOST', DEFAULT_HOST)
+            kwargs['port'] = int(settings.get('PORT', DEFAULT_PORT))
+            self.address = 'redis://%s:%d' % (kwargs['host'], kwargs['port'])
+        self._pool_kwargs = kwargs
+
+
+    def get_pool(self, db):
+        db = int(db)
+        with self._lock:
+            pool = self._pools.get(db)
+            if pool is None:
+                pool = redis.BlockingConnectionPool(db=db, **self._pool_kwargs)
+                self._pools[db] = pool
+                LOGGER.info("Created Redis connection pool for %s/%d", self.address, db)
+            return pool
+
+
+    def get_client(self, db):
+        """ A client for DB instance db. Clients are cheap; the connections
+            behind them belong to the shared pool for db.
+        """
+        return redis.StrictRedis(connection_pool=self.get_pool(db))
+
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.disconnect()
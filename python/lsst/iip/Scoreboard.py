@@ -1,8 +1,13 @@
 import toolsmod
 import time
 import redis
-from SimplePublisher import SimplePublisher
+import ScoreboardBackend
+import ScoreboardSnapshot
+from StaticFieldCache import StaticFieldCache
+from timemod import get_epoch_timestamp
+import AuditEmitter
 import sys
+import threading
 import yaml
 import logging
 import os
@@ -19,13 +24,78 @@ class Scoreboard:
 
     AUDIT_QUEUE = 'audit_consume'
 
+    # Scoreboards that keep a Redis set of rows for each value of some
+    # fields name those fields here and give the set keys a prefix; the
+    # set for STATE == IDLE is then INDEX_PREFIX + 'STATE:IDLE'.
+    INDEXED_FIELDS = ()
+    INDEX_PREFIX = ''
+
+    # Fields that only change when a row is configured are read through a
+    # per-process StaticFieldCache. Writers of these fields bump
+    # STATIC_VERSION_KEY; other processes notice within STATIC_REVALIDATE
+    # seconds.
+    STATIC_FIELDS = ()
+    STATIC_VERSION_KEY = 'static_fields_version'
+    STATIC_REVALIDATE = 5.0
+
+    SET_ATTEMPTS = 3
+
+    # Sets fields on n rows, moving each row between index sets as an
+    # indexed field changes. Each row comes with the values its k indexed
+    # fields were read with and the index sets of those values; if any has
+    # changed since, nothing is done and false is returned.
+    # KEYS: the n rows, then for each row the index sets of its k values
+    #       as read, then the index sets of the k new values
+    # ARGV: n, k, the k indexed field names, for each row its k values as
+    #       read ('' if unset), then field, value, field, value...
+    SET_INDEXED_FIELDS_SCRIPT = """
+        local n, k = tonumber(ARGV[1]), tonumber(ARGV[2])
+        for r = 1, n do
+            for j = 1, k do
+                local value = redis.call('HGET', KEYS[r], ARGV[2 + j]) or ''
+                if value ~= ARGV[2 + k + (r - 1) * k + j] then
+                    return false
+                end
+            end
+        end
+        for r = 1, n do
+            local row = KEYS[r]
+            for j = 1, k do
+                redis.call('SREM', KEYS[n + (r - 1) * k + j], row)
+                redis.call('SADD', KEYS[n + n * k + j], row)
+            end
+            for i = 3 + k + n * k, #ARGV, 2 do
+                redis.call('HSET', row, ARGV[i], ARGV[i + 1])
+            end
+        end
+        return n
+    """
+
+    @staticmethod
+    def set_indexed_fields_locally(client, keys, args):
+        n, k = int(args[0]), int(args[1])
+        fields = args[2:2 + k]
+        read = args[2 + k:2 + k + n * k]
+        pairs = args[2 + k + n * k:]
+        rows = keys[:n]
+        for r, row in enumerate(rows):
+            for j, field in enumerate(fields):
+                if (client.hget(row, field) or '') != read[r * k + j]:
+                    return None
+        for r, row in enumerate(rows):
+            for j in range(k):
+                client.srem(keys[n + r * k + j], row)
+                client.sadd(keys[n + n * k + j], row)
+            client.hset(row, mapping=dict(zip(pairs[::2], pairs[1::2])))
+        return n
+
     def __init__(self, file=None):
         if file == None:
             file = 'L1SystemCfg.yaml'
         try:
             f = open(file)
         except IOError:
-            print("Can't open %s" % file)
+            LOGGER.error("Can't open %s", file)
             raise L1Error
 
         self.cdm = yaml.safe_load(f)
@@ -40,47 +110,277 @@ class Scoreboard:
             self.audit_format = self.cdm['ROOT']['AUDIT_MSG_FORMAT']
 
         try:
-            self.audit_publisher = SimplePublisher(self.broker_url, self.audit_format)
+            self.audit_emitter = AuditEmitter.get_emitter(self.broker_url, self.audit_format,
+                                                          self.cdm['ROOT'].get('AUDIT'))
         except L1RabbitConnectionError as e:
             LOGGER.error("Scoreboard Parent Class cannot create SimplePublisher:  ", e.arg)
-            print("No Publisher for YOU")
+            LOGGER.error("No Publisher for YOU")
             raise L1Error('Cant create SimplePublisher'. e.arg)
 
 
-    def persist(self, data):
-        self.audit_publisher.publish_message(self.AUDIT_QUEUE, data)
+    def connect(self):
+        """Return a client for this scoreboard's DB_INSTANCE from the
+           configured backend (see ScoreboardBackend): by default a Redis
+           client drawing its connections from the process-wide pool for
+           that DB (see RedisPool).
+        """
+        try:
+            sconn = ScoreboardBackend.get_client(self.DB_INSTANCE)
+            sconn.ping()
+            LOGGER.info("Redis connected. Connection details are: %s", sconn)
+            return sconn
+        except Exception as e:
+            LOGGER.critical("Redis connection error: %s", e)
+            LOGGER.critical("Exiting due to Redis connection failure.")
+            sys.exit(100)
 
 
-    def persist_snapshot(self, connection, filename):
-        pass
+    def check_connection(self):
+        """Connection health is handled lazily: commands are sent without a
+           preceding PING, and the client reconnects and retries on a
+           ConnectionError (see RedisPool). This only makes sure a client
+           has been created.
         """
-        LOGGER.info('Saving Scoreboard Snapshot')
-        rdb = filename + ".rdb" 
-        self._redis.config_set("dbfilename", rdb)
-        while True: 
-            try: 
-                self._redis.bgsave()
-                break
-            except: 
-                print("Waiting for preceding persistence to complete.")
-                time.sleep(10) 
+        if getattr(self, '_redis', None) is None:
+            self.reconnect()
+        return self._redis is not None
+
+
+    def reconnect(self):
+        self._redis = self.connect()
+        return self._redis
 
 
-        while True: 
-            if rdb in os.listdir(os.getcwd()): 
-                os.rename(rdb, filename + "_" +  str(self._redis.lastsave()) + ".rdb")
+    def register_script(self, source, local):
+        """Register the Lua script source with the backend. local is the
+           same operation in Python, a function of (client, keys, args),
+           which the in-memory backend runs in place of the Lua.
+
+           :rtype callable taking keys= and args=, like redis-py's Script.
+        """
+        if isinstance(self._redis, ScoreboardBackend.MemoryBackend):
+            return self._redis.register_script(source, local)
+        return self._redis.register_script(source)
+
+
+    def index_key(self, field, value):
+        return '%s%s:%s' % (self.INDEX_PREFIX, field, value)
+
+
+    def set_indexed_fields(self, rows, params, row_list=''):
+        """Set params on each of rows (or on every row of the list named
+           row_list), keeping the index sets of INDEXED_FIELDS in step. The
+           indexed fields being set are read first and passed to the
+           script with the index sets they name, so the script declares
+           every key it touches; if a row changed in between, it is tried
+           again.
+
+           :rtype int: The number of rows set.
+        """
+        if not params or not (rows or row_list):
+            return 0
+        fields = [kee for kee in self.INDEXED_FIELDS if kee in params]
+        new_sets = [self.index_key(kee, params[kee]) for kee in fields]
+        pairs = []
+        for kee, val in params.items():
+            pairs.extend((kee, val))
+        for attempt in range(self.SET_ATTEMPTS):
+            targets = self._redis.lrange(row_list, 0, -1) if row_list else list(rows)
+            if not targets:
+                return 0
+            read = []
+            if fields:
+                pipe = self._redis.pipeline(transaction=False)
+                for row in targets:
+                    pipe.hmget(row, fields)
+                read = [value or '' for values in pipe.execute() for value in values]
+            old_sets = [self.index_key(kee, value)
+                        for kee, value in zip(fields * len(targets), read)]
+            count = self._set_indexed(keys=targets + old_sets + new_sets,
+                                      args=[len(targets), len(fields)] + fields + read + pairs)
+            if count is not None:
                 break
+        else:
+            LOGGER.warning("Could not set %s on %d rows in %d attempts",
+                           list(params), len(targets), self.SET_ATTEMPTS)
+            return 0
+        if any(kee in self.STATIC_FIELDS for kee in params):
+            pipe = self._redis.pipeline(transaction=False)
+            self.bump_static_version(pipe, None if row_list else rows)
+            pipe.execute()
+        return count
+
+
+    def static_cache(self):
+        cache = getattr(self, '_static_cache', None)
+        if cache is None or cache._redis is not self._redis:
+            cache = StaticFieldCache(self._redis, self.STATIC_FIELDS,
+                                     self.STATIC_VERSION_KEY, self.STATIC_REVALIDATE)
+            self._static_cache = cache
+        return cache
+
+
+    def get_static_field(self, row, field):
+        """Read a STATIC_FIELDS field of row, from memory once the row
+           has been read. Other fields are read from Redis as usual.
+        """
+        if field not in self.STATIC_FIELDS:
+            return self._redis.hget(row, field)
+        return self.static_cache().get(row, field)
+
+
+    def get_static_field_for_rows(self, rows, field):
+        if field not in self.STATIC_FIELDS:
+            pipe = self._redis.pipeline(transaction=False)
+            for row in rows:
+                pipe.hget(row, field)
+            return pipe.execute()
+        return self.static_cache().get_rows(rows, field)
+
+
+    def get_static_fields(self, row, fields):
+        """:rtype dict of the STATIC_FIELDS fields of row"""
+        return self.static_cache().get_fields(row, fields)
+
+
+    def bump_static_version(self, pipe, rows=None):
+        """Queue on pipe a change of STATIC_VERSION_KEY, and drop rows (all
+           rows if None) from this process's cache. Constructors call this
+           after flushdb so caches elsewhere see the rows were rebuilt.
+        """
+        pipe.set(self.STATIC_VERSION_KEY, get_epoch_timestamp())
+        self.static_cache().invalidate(rows)
+
+
+    def persist(self, data):
+        """Queue data for audit_consume and return without waiting on the
+           broker; see AuditEmitter. A record is dropped, and counted, if the
+           audit queue is full.
+        """
+        self.audit_emitter.emit(data)
+
+
+    def start_db(self):
+        """Prepare this scoreboard's DB at construction. Normally the DB
+           is flushed for a clean start. With WARM_START set in the
+           SCOREBOARD_SNAPSHOTS cfg section, what the DB holds is kept, or
+           the last snapshot is reloaded if the DB is empty. Periodic
+           snapshots are started if INTERVAL is set.
+
+           :rtype bool: True on a warm start, when the constructor should
+               reconcile the kept rows rather than create them. Also kept
+               as warm_started, for the component owning the scoreboard.
+        """
+        settings = ScoreboardSnapshot.get_settings()
+        warm = False
+        if settings.get('WARM_START'):
+            if self._redis.dbsize() > 0:
+                LOGGER.info("Warm start of %s: keeping its DB", self.DB_TYPE)
+                warm = True
+            else:
+                path = ScoreboardSnapshot.snapshot_path(self.DB_TYPE)
+                loaded = ScoreboardSnapshot.load_db(self._redis, path)
+                if loaded is not None:
+                    LOGGER.info("Warm start of %s: loaded %d keys from %s",
+                                self.DB_TYPE, loaded, path)
+                    warm = True
+        if not warm:
+            self._redis.flushdb()
+        self.warm_started = warm
+
+        interval = settings.get('INTERVAL', ScoreboardSnapshot.DEFAULT_INTERVAL)
+        if interval:
+            self.start_snapshots(interval)
+        return warm
+
+
+    def reconcile_rows(self, row_list, rows):
+        """On a warm start, bring the kept rows in line with the configured
+           ones: configured rows that are missing are added with fields,
+           rows no longer configured are dropped, and the STATIC_FIELDS of
+           the others are rewritten while their state is kept. The index
+           sets are then rebuilt from the rows.
+
+           :param str row_list: Name of the list of row names.
+           :param dict rows: Row name -> the fields a new row starts with.
+        """
+        kept = self._redis.lrange(row_list, 0, -1)
+        pipe = self._redis.pipeline()
+        for row in kept:
+            if row not in rows:
+                LOGGER.info("Dropping %s; it is no longer configured", row)
+                pipe.delete(row)
+                pipe.lrem(row_list, 0, row)
+        for row, fields in rows.items():
+            if row in kept:
+                static = dict((k, v) for k, v in fields.items() if k in self.STATIC_FIELDS)
+                if static:
+                    pipe.hset(row, mapping=static)
             else:
-                print("Waiting for current persistence to complete.")
-                time.sleep(10)
-        """ 
+                pipe.hset(row, mapping=fields)
+                pipe.lpush(row_list, row)
+        pipe.execute()
+        self.rebuild_indexes(row_list)
 
 
+    def rebuild_indexes(self, row_list):
+        if not self.INDEXED_FIELDS:
+            return
+        row_names = self._redis.lrange(row_list, 0, -1)
+        pipe = self._redis.pipeline(transaction=False)
+        for row in row_names:
+            pipe.hmget(row, self.INDEXED_FIELDS)
+        values = pipe.execute()
+        stale = list(self._redis.scan_iter(match=self.INDEX_PREFIX + '*'))
+        pipe = self._redis.pipeline()
+        if stale:
+            pipe.delete(*stale)
+        for row, row_values in zip(row_names, values):
+            for field, val in zip(self.INDEXED_FIELDS, row_values):
+                if val is not None:
+                    pipe.sadd(self.index_key(field, val), row)
+        pipe.execute()
 
 
+    def persist_snapshot(self, filename=None):
+        """Write this scoreboard's DB to filename, by default
+           <DIR>/<DB_TYPE>.json from the SCOREBOARD_SNAPSHOTS cfg section.
+        """
+        if filename is None:
+            filename = ScoreboardSnapshot.snapshot_path(self.DB_TYPE)
+        start = time.time()
+        count = ScoreboardSnapshot.dump_db(self._redis, filename)
+        LOGGER.debug("Saved %d keys of %s to %s in %.3f s", count, self.DB_TYPE,
+                     filename, time.time() - start)
+        return count
 
 
+    def start_snapshots(self, interval):
+        """Call persist_snapshot every interval seconds on a daemon thread,
+           until stop_snapshots is called.
+        """
+        snapshotter = getattr(self, '_snapshotter', None)
+        if snapshotter is not None and snapshotter.is_alive():
+            return
+        self._snapshot_stop = threading.Event()
+        self._snapshotter = threading.Thread(target=self._snapshot_loop,
+                                             args=(interval, self._snapshot_stop),
+                                             name='Thread-%s_snapshots' % self.DB_TYPE)
+        self._snapshotter.daemon = True
+        self._snapshotter.start()
 
 
+    def stop_snapshots(self):
+        snapshotter = getattr(self, '_snapshotter', None)
+        if snapshotter is not None:
+            self._snapshot_stop.set()
+            snapshotter.join()
+            self._snapshotter = None
 
 
+    def _snapshot_loop(self, interval, stop):
+        while not stop.wait(interval):
+            try:
+                self.persist_snapshot()
+            except (redis.RedisError, IOError) as e:
+                LOGGER.error("Unable to snapshot %s: %s", self.DB_TYPE, e)
@@ -0,0 +1,588 @@
+""" Storage backends for the scoreboards.
+
+    Scoreboards talk to their store through a client with the redis-py
+    interface (hset, lrange, pipeline, register_script, ...). Two backends
+    provide one:
+
+        REDIS   A redis-py client from the shared RedisPool (the default).
+        MEMORY  A MemoryBackend: a thread-safe, in-process store covering
+                the hash, list, set, sorted set, string, incr and expire
+                commands the scoreboards use. Nothing leaves the process,
+                so it suits unit tests, benchmarks and single-node
+                simulations that run every component in one process.
+
+    The backend is chosen by SCOREBOARD_BACKEND in the ROOT section of
+    L1SystemCfg.yaml, or with configure().
+
+    Lua scripts can't run in process, so a scoreboard registers each script
+    together with the same operation written in Python, a function of
+    (client, keys, args); see Scoreboard.register_script. MemoryBackend
+    runs that function while holding its lock, which makes it as atomic as
+    the script is on a Redis server.
+"""
+
+import fnmatch
+import logging
+import threading
+import time
+import yaml
+from redis.exceptions import DataError
+from redis.exceptions import ResponseError
+import RedisPool
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+CFG_FILE = 'L1SystemCfg.yaml'
+REDIS = 'REDIS'
+MEMORY = 'MEMORY'
+DEFAULT_BACKEND = REDIS
+
+WRONGTYPE = 'WRONGTYPE Operation against a key holding the wrong kind of value'
+
+_backend = None
+_memory_dbs = {}
+_lock = threading.Lock()
+
+
+def load_backend(cfg_file=CFG_FILE):
+    """ Return the ROOT/SCOREBOARD_BACKEND value of cfg_file, or the default. """
+    try:
+        with open(cfg_file) as f:
+            cdm = yaml.safe_load(f)
+    except IOError:
+        return DEFAULT_BACKEND
+    return cdm.get('ROOT', {}).get('SCOREBOARD_BACKEND') or DEFAULT_BACKEND
+
+
+def configure(backend):
+    """ Use backend (REDIS or MEMORY) for scoreboards created from now on.
+        Switching drops the in-memory DBs.
+    """
+    global _backend
+    backend = backend.upper()
+    if backend not in (REDIS, MEMORY):
+        raise ValueError("Unknown scoreboard backend %s" % backend)
+    with _lock:
+        _backend = backend
+        _memory_dbs.clear()
+    return backend
+
+
+def get_backend():
+    global _backend
+    with _lock:
+        if _backend is None:
+            _backend = load_backend().upper()
+            LOGGER.info("Scoreboards use the %s backend", _backend)
+        return _backend
+
+
+def get_client(db):
+    """ A client for scoreboard DB instance db. In-memory DBs are shared by
+        every scoreboard in the process with the same db, as Redis DBs are.
+    """
+    if get_backend() == MEMORY:
+        with _lock:
+            client = _memory_dbs.get(int(db))
+            if client is None:
+                client = MemoryBackend()
+                _memory_dbs[int(db)] = client
+            return client
+    return RedisPool.get_client(db)
+
+
+def _encode(value):
+    """ Store values as redis-py with decode_responses would read them back. """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        raise DataError("Invalid input of type: 'bool'. Convert to a str or number first.")
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    raise DataError("Invalid input of type: '%s'. Convert to a str or number first."
+                    % type(value).__name__)
+
+
+class _SortedSet(dict):
+    """ member -> score """
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._data = {}
+        self._expires = {}   # key -> epoch seconds
+        self._lock = threading.RLock()
+
+
+    ### Keys
+
+    def _live(self, key):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.time():
+            del self._expires[key]
+            self._data.pop(key, None)
+        return self._data.get(key)
+
+
+    def _get(self, key, kind):
+        value = self._live(key)
+        if value is not None and type(value) is not kind:
+            raise ResponseError(WRONGTYPE)
+        return value
+
+
+    def _get_or_create(self, key, kind):
+        value = self._get(key, kind)
+        if value is None:
+            value = kind()
+            self._data[key] = value
+        return value
+
+
+    def _drop_if_empty(self, key):
+        if not self._data.get(key):
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+
+
+    def ping(self):
+        return True
+
+
+    def exists(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._live(name) is not None)
+
+
+    def delete(self, *names):
+        with self._lock:
+            count = 0
+            for name in names:
+                if self._live(name) is not None:
+                    del self._data[name]
+                    self._expires.pop(name, None)
+                    count += 1
+            return count
+
+
+    def type(self, name):
+        kinds = {str: 'string', dict: 'hash', list: 'list', set: 'set', _SortedSet: 'zset'}
+        with self._lock:
+            value = self._live(name)
+            return 'none' if value is None else kinds[type(value)]
+
+
+    def keys(self, pattern='*'):
+        with self._lock:
+            return [key for key in list(self._data) if self._live(key) is not None
+                    and fnmatch.fnmatchcase(key, pattern)]
+
+
+    def scan_iter(self, match=None, count=None):
+        return iter(self.keys(match or '*'))
+
+
+    def dbsize(self):
+        return len(self.keys())
+
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+        return True
+
+
+    def expire(self, name, time_secs):
+        return self.pexpire(name, int(time_secs * 1000))
+
+
+    def pexpire(self, name, time_ms):
+        with self._lock:
+            if self._live(name) is None:
+                return False
+            self._expires[name] = time.time() + time_ms / 1000.0
+            return True
+
+
+    def ttl(self, name):
+        pttl = self.pttl(name)
+        return pttl if pttl < 0 else int(round(pttl / 1000.0))
+
+
+    def pttl(self, name):
+        with self._lock:
+            if self._live(name) is None:
+                return -2
+            deadline = self._expires.get(name)
+            if deadline is None:
+                return -1
+            return max(0, int((deadline - time.time()) * 1000))
+
+
+    ### Strings
+
+    def get(self, name):
+        with self._lock:
+            return self._get(name, str)
+
+
+    def set(self, name, value, ex=None, px=None, nx=False, xx=False):
+        with self._lock:
+            exists = self._live(name) is not None
+            if (nx and exists) or (xx and not exists):
+                return None
+            self._data[name] = _encode(value)
+            self._expires.pop(name, None)
+            if ex is not None:
+                self._expires[name] = time.time() + ex
+            elif px is not None:
+                self._expires[name] = time.time() + px / 1000.0
+            return True
+
+
+    def mset(self, mapping):
+        with self._lock:
+            for name, value in mapping.items():
+                self.set(name, value)
+            return True
+
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            current = self._get(name, str)
+            try:
+                value = int(current or 0) + amount
+            except ValueError:
+                raise ResponseError('value is not an integer or out of range')
+            self._data[name] = str(value)
+            return value
+
+
+    incrby = incr
+
+
+    ### Hashes
+
+    def hset(self, name, key=None, value=None, mapping=None, items=None):
+        pairs = []
+        if key is not None:
+            pairs.append((key, value))
+        if mapping:
+            pairs.extend(mapping.items())
+        if items:
+            pairs.extend(zip(items[::2], items[1::2]))
+        if not pairs:
+            raise DataError("'hset' with no key value pairs")
+        with self._lock:
+            row = self._get_or_create(name, dict)
+            added = 0
+            for field, val in pairs:
+                field = _encode(field)
+                if field not in row:
+                    added += 1
+                row[field] = _encode(val)
+            return added
+
+
+    def hsetnx(self, name, key, value):
+        with self._lock:
+            row = self._get_or_create(name, dict)
+            if key in row:
+                return False
+            row[_encode(key)] = _encode(value)
+            return True
+
+
+    def hget(self, name, key):
+        with self._lock:
+            row = self._get(name, dict)
+            return None if row is None else row.get(key)
+
+
+    def hmget(self, name, keys, *args):
+        if isinstance(keys, str):
+            keys = [keys]
+        fields = list(keys) + list(args)
+        with self._lock:
+            row = self._get(name, dict) or {}
+            return [row.get(field) for field in fields]
+
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._get(name, dict) or {})
+
+
+    def hdel(self, name, *keys):
+        with self._lock:
+            row = self._get(name, dict)
+            if row is None:
+                return 0
+            count = sum(1 for field in keys if row.pop(field, None) is not None)
+            self._drop_if_empty(name)
+            return count
+
+
+    ### Lists
+
+    def lpush(self, name, *values):
+        with self._lock:
+            items = self._get_or_create(name, list)
+            for value in values:
+                items.insert(0, _encode(value))
+            return len(items)
+
+
+    def rpush(self, name, *values):
+        with self._lock:
+            items = self._get_or_create(name, list)
+            items.extend(_encode(value) for value in values)
+            return len(items)
+
+
+    def lrange(self, name, start, end):
+        with self._lock:
+            items = self._get(name, list) or []
+            return items[self._slice(len(items), start, end)]
+
+
+    def lindex(self, name, index):
+        with self._lock:
+            items = self._get(name, list) or []
+            if -len(items) <= index < len(items):
+                return items[index]
+            return None
+
+
+    def lrem(self, name, count, value):
+        with self._lock:
+            items = self._get(name, list)
+            if items is None:
+                return 0
+            value = _encode(value)
+            order = range(len(items) - 1, -1, -1) if count < 0 else range(len(items))
+            hits = [i for i in order if items[i] == value]
+            if count:
+                hits = hits[:abs(count)]
+            for i in sorted(hits, reverse=True):
+                del items[i]
+            self._drop_if_empty(name)
+            return len(hits)
+
+
+    @staticmethod
+    def _slice(length, start, end):
+        if start < 0:
+            start = max(length + start, 0)
+        if end < 0:
+            end = length + end
+        return slice(start, end + 1)
+
+
+    ### Sets
+
+    def sadd(self, name, *values):
+        with self._lock:
+            members = self._get_or_create(name, set)
+            before = len(members)
+            members.update(_encode(value) for value in values)
+            return len(members) - before
+
+
+    def srem(self, name, *values):
+        with self._lock:
+            members = self._get(name, set)
+            if members is None:
+                return 0
+            before = len(members)
+            members.difference_update(_encode(value) for value in values)
+            self._drop_if_empty(name)
+            return before - len(members)
+
+
+    def smembers(self, name):
+        with self._lock:
+            return set(self._get(name, set) or ())
+
+
+    def scard(self, name):
+        with self._lock:
+            return len(self._get(name, set) or ())
+
+
+    def sismember(self, name, value):
+        with self._lock:
+            return _encode(value) in (self._get(name, set) or ())
+
+
+    def sinter(self, keys, *args):
+        if isinstance(keys, str):
+            keys = [keys]
+        names = list(keys) + list(args)
+        with self._lock:
+            result = None
+            for name in names:
+                members = self._get(name, set) or set()
+                result = set(members) if result is None else result & members
+            return result or set()
+
+
+    def smove(self, src, dst, value):
+        with self._lock:
+            value = _encode(value)
+            members = self._get(src, set)
+            if members is None or value not in members:
+                return False
+            self._get(dst, set)
+            members.discard(value)
+            self._drop_if_empty(src)
+            self._get_or_create(dst, set).add(value)
+            return True
+
+
+    ### Sorted sets
+
+    def zadd(self, name, mapping, nx=False, xx=False):
+        with self._lock:
+            members = self._get_or_create(name, _SortedSet)
+            added = 0
+            for member, score in mapping.items():
+                member = _encode(member)
+                exists = member in members
+                if (nx and exists) or (xx and not exists):
+                    continue
+                if not exists:
+                    added += 1
+                members[member] = float(score)
+            self._drop_if_empty(name)
+            return added
+
+
+    def zrem(self, name, *values):
+        with self._lock:
+            members = self._get(name, _SortedSet)
+            if members is None:
+                return 0
+            count = sum(1 for value in values if members.pop(_encode(value), None) is not None)
+            self._drop_if_empty(name)
+            return count
+
+
+    def zcard(self, name):
+        with self._lock:
+            return len(self._get(name, _SortedSet) or ())
+
+
+    def zscore(self, name, value):
+        with self._lock:
+            return (self._get(name, _SortedSet) or {}).get(_encode(value))
+
+
+    def _ordered(self, name):
+        members = self._get(name, _SortedSet) or {}
+        return sorted(members.items(), key=lambda item: (item[1], item[0]))
+
+
+    def zrange(self, name, start, end, withscores=False):
+        with self._lock:
+            ordered = self._ordered(name)
+            ordered = ordered[self._slice(len(ordered), start, end)]
+            return ordered if withscores else [member for member, score in ordered]
+
+
+    def zrangebyscore(self, name, min, max, start=None, num=None, withscores=False):
+        low, high = float(min), float(max)
+        with self._lock:
+            ordered = [(member, score) for member, score in self._ordered(name)
+                       if low <= score <= high]
+            if start is not None and num is not None:
+                ordered = ordered[start:start + num] if num >= 0 else ordered[start:]
+            return ordered if withscores else [member for member, score in ordered]
+
+
+    ### Pipelines and scripts
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self)
+
+
+    def register_script(self, script, local=None):
+        """ Return a callable like redis-py's Script that runs local, the
+            Python version of the Lua in script.
+        """
+        if local is None:
+            raise NotImplementedError("The in-memory scoreboard backend can't run Lua; "
+                                      "register a Python version of the script as well")
+        return MemoryScript(self, local)
+
+
+class MemoryPipeline:
+    """ Queues commands and runs them together under the backend lock, so
+        a pipeline is applied as one step, as a MULTI is on Redis.
+    """
+
+    def __init__(self, backend):
+        self._backend = backend
+        self.command_stack = []
+
+
+    def __getattr__(self, name):
+        command = getattr(self._backend, name)
+
+        def queue(*args, **kwargs):
+            self.command_stack.append((command, args, kwargs))
+            return self
+        return queue
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.reset()
+
+
+    def __len__(self):
+        return len(self.command_stack)
+
+
+    def reset(self):
+        self.command_stack = []
+
+
+    def execute(self, raise_on_error=True):
+        stack, self.command_stack = self.command_stack, []
+        results = []
+        with self._backend._lock:
+            for command, args, kwargs in stack:
+                try:
+                    results.append(command(*args, **kwargs))
+                except ResponseError as e:
+                    results.append(e)
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, ResponseError):
+                    raise result
+        return results
+
+
+class MemoryScript:
+    def __init__(self, backend, local):
+        self._backend = backend
+        self._local = local
+
+
+    def __call__(self, keys=[], args=[], client=None):
+        # Lua sees every ARGV as a string
+        args = [_encode(arg) for arg in args]
+        with self._backend._lock:
+            return self._local(self._backend, list(keys), args)
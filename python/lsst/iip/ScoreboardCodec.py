@@ -0,0 +1,50 @@
+""" Serialization of nested scoreboard values.
+
+    Redis hashes are flat, so raft lists, work schedules, NCSA pairs,
+    results and ack bodies are stored as one encoded string per field.
+    They used to be written with yaml.dump and read back with yaml.load,
+    which is slow to parse and needs a full YAML loader on every read.
+
+    dumps writes compact JSON. loads reads JSON and, when a value is not
+    JSON, falls back to YAML, so rows written by older components (or kept
+    in a Redis snapshot) are still readable. A value written by yaml.dump
+    never parses as JSON by accident: block style output of a dict or list
+    and the '...' document end marker after a scalar are not JSON, and the
+    remaining overlap (numbers, 'true', 'null', quoted strings) decodes to
+    the same value either way.
+
+    JSON has no tuples and only str keys; tuples come back as lists and
+    other keys as str. Values JSON can't represent are written with str().
+"""
+
+import json
+import logging
+import yaml
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+_encoder = json.JSONEncoder(separators=(',', ':'), default=str)
+_decoder = json.JSONDecoder()
+
+
+def dumps(value):
+    """ Encode value for storage in a scoreboard field. """
+    return _encoder.encode(value)
+
+
+def loads(text):
+    """ Decode a scoreboard field written by dumps or by yaml.dump.
+
+        :return: None if text is None (the field does not exist).
+    """
+    if text is None:
+        return None
+    try:
+        return _decoder.decode(text)
+    except ValueError:
+        pass
+    LOGGER.debug("Scoreboard value is not JSON, reading it as YAML")
+    return yaml.load(text, Loader=yaml.FullLoader)
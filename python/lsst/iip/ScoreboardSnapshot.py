@@ -0,0 +1,170 @@
+""" Snapshots of scoreboard DBs and warm restarts from them.
+
+    dump_db writes every key of one Redis DB to a compact JSON file, reading
+    the values inside a MULTI so the file is a consistent picture of the DB.
+    It writes to a temporary file first and renames it, so a crash mid-dump
+    leaves the previous snapshot intact. load_db puts such a file back.
+    Unlike BGSAVE, which forks the server to save every DB at once, this
+    saves only the scoreboard's own DB. The price of a consistent picture
+    is that Redis runs the whole MULTI as one command, so every other
+    client waits while the values are read: roughly a millisecond per
+    thousand small keys, which keeps the pause short for a scoreboard DB
+    but makes this no fit for large ones. The SCAN before it and the
+    file write after it do not hold up the server.
+
+    The SCOREBOARD_SNAPSHOTS section of L1SystemCfg.yaml controls both:
+
+        SCOREBOARD_SNAPSHOTS:
+          DIR: scoreboard_snapshots   # one <DB_TYPE>.json file per scoreboard
+          INTERVAL: 30                # seconds between snapshots; 0 turns them off
+          WARM_START: False
+
+    With WARM_START set, a scoreboard constructor keeps what its DB already
+    holds, or reloads its last snapshot if the DB is empty (Redis itself was
+    restarted), instead of flushing it. See Scoreboard.start_db.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import yaml
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+CFG_FILE = 'L1SystemCfg.yaml'
+DEFAULT_DIR = 'scoreboard_snapshots'
+DEFAULT_INTERVAL = 0
+SNAPSHOT_VERSION = 1
+
+_settings = None
+_settings_lock = threading.Lock()
+
+
+def load_settings(cfg_file=CFG_FILE):
+    """ Return the ROOT/SCOREBOARD_SNAPSHOTS section of cfg_file, or {}. """
+    try:
+        with open(cfg_file) as f:
+            cdm = yaml.safe_load(f)
+    except IOError:
+        LOGGER.warning("Can't open %s; scoreboard snapshots are off", cfg_file)
+        return {}
+    return cdm.get('ROOT', {}).get('SCOREBOARD_SNAPSHOTS') or {}
+
+
+def configure(settings):
+    """ Use settings, a dict shaped like the cfg section, from now on. """
+    global _settings
+    with _settings_lock:
+        _settings = dict(settings)
+        return _settings
+
+
+def get_settings():
+    global _settings
+    with _settings_lock:
+        if _settings is None:
+            _settings = load_settings()
+        return _settings
+
+
+def snapshot_path(db_type):
+    return os.path.join(get_settings().get('DIR', DEFAULT_DIR), '%s.json' % db_type)
+
+
+def dump_db(client, path):
+    """ Write every key of client's DB to path. The values are read in
+        one MULTI, which holds up other clients while it runs.
+
+        :return: The number of keys written.
+    """
+    keys = list(client.scan_iter(count=1000))
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.type(key)
+    types = pipe.execute()
+
+    pipe = client.pipeline(transaction=True)
+    for key, key_type in zip(keys, types):
+        if key_type == 'hash':
+            pipe.hgetall(key)
+        elif key_type == 'list':
+            pipe.lrange(key, 0, -1)
+        elif key_type == 'set':
+            pipe.smembers(key)
+        elif key_type == 'zset':
+            pipe.zrange(key, 0, -1, withscores=True)
+        else:
+            pipe.get(key)
+        pipe.pttl(key)
+    replies = pipe.execute(raise_on_error=False)
+
+    entries = []
+    for i, (key, key_type) in enumerate(zip(keys, types)):
+        value, pttl = replies[2 * i], replies[2 * i + 1]
+        if key_type == 'none' or isinstance(value, Exception):
+            # Deleted, or replaced by another type, since the SCAN
+            continue
+        if key_type == 'set':
+            value = sorted(value)
+        entries.append([key, key_type, pttl, value])
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'VERSION': SNAPSHOT_VERSION, 'TIME': time.time(), 'KEYS': entries},
+                  f, separators=(',', ':'))
+    os.replace(tmp, path)
+    return len(entries)
+
+
+def load_db(client, path):
+    """ Replace the contents of client's DB with the snapshot at path. Keys
+        that had a TTL get what is left of it, and keys whose TTL ran out
+        since the snapshot are skipped.
+
+        :return: The number of keys loaded, or None if there is no snapshot.
+    """
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except IOError:
+        return None
+    except ValueError as e:
+        LOGGER.error("Ignoring unreadable scoreboard snapshot %s: %s", path, e)
+        return None
+
+    elapsed_ms = int((time.time() - snapshot['TIME']) * 1000)
+    pipe = client.pipeline(transaction=True)
+    pipe.flushdb()
+    loaded = 0
+    for key, key_type, pttl, value in snapshot['KEYS']:
+        if pttl > 0:
+            pttl -= elapsed_ms
+            if pttl <= 0:
+                continue
+        if key_type == 'hash':
+            if value:
+                pipe.hset(key, mapping=value)
+        elif key_type == 'list':
+            if value:
+                pipe.rpush(key, *value)
+        elif key_type == 'set':
+            if value:
+                pipe.sadd(key, *value)
+        elif key_type == 'zset':
+            if value:
+                pipe.zadd(key, dict(value))
+        else:
+            pipe.set(key, value)
+        if pttl > 0:
+            pipe.pexpire(key, pttl)
+        loaded += 1
+    pipe.execute()
+    return loaded
@@ -1,4 +1,4 @@
-from toolsmod import get_timestamp
+from timemod import get_timestamp
 from const import *
 import yaml
 import os
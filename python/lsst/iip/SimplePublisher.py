@@ -6,8 +6,10 @@ import sys
 import toolsmod
 from toolsmod import L1Exception
 from toolsmod import L1MessageError
-from XMLHandler import * 
-from YamlHandler import * 
+from toolsmod import L1RabbitConnectionError
+import PublisherPool
+import MessageCodecs
+import Tracing
 
 LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
               '-35s %(lineno) -5d: %(message)s')
@@ -20,64 +22,62 @@ class SimplePublisher:
 
   def __init__(self, amqp_url, formatOptions=None):
 
-    self._connection = None
-    self._channel = None
-    self._message_number = 0
-    self._stopping = False
     self._url = amqp_url
-    self._closing = False
-    self._xml_handler = None
     self._format_options = formatOptions
+    self._pool = PublisherPool.get_pool(amqp_url)
 
-    if formatOptions == "XML":
-        self._message_handler = XMLHandler()
-    else:
-        self._message_handler = YamlHandler()
+    self._message_handler = MessageCodecs.get_handler(formatOptions)
+    self._content_type = MessageCodecs.content_type_for(formatOptions)
 
     try:
        self.connect()
-    except:
-       LOGGER.error('No channel - connection channel is None')
+    except L1RabbitConnectionError:
+       LOGGER.error('No channel - unable to open a pooled connection to %s', self._url)
        
 
   def connect(self):
-    self._connection = pika.BlockingConnection(pika.URLParameters(self._url))
-    self._channel = self._connection.channel()
-    if self._channel == None:
-      LOGGER.error('No channel - connection channel is None')
+    """ Make sure the shared pool for this url has an open connection.
+        Publishers no longer own a connection; each publish checks one
+        out of the process-wide PublisherPool.
+    """
+    with self._pool.connection() as pooled:
+      pass
+
+  def message_properties(self):
+      """ Properties for one outgoing message: its content_type, plus
+          trace headers linking it to the handler publishing it, if any.
+      """
+      return pika.BasicProperties(content_type=self._content_type,
+                                  headers=Tracing.outgoing_headers())
 
   def publish(self, route_key, msg): 
-      try: 
-          self._channel.basic_publish(exchange=self.EXCHANGE, routing_key=route_key, body=msg)
-      except pika.exceptions.ConnectionClosed: 
-          LOGGER.critical("Connection timed out. Reconnected and republish message")
-          self.connect()
-          self.publish(route_key, msg)
+      self._pool.publish(self.EXCHANGE, route_key, msg, self.message_properties())
 
   def publish_message(self, route_key, msg):
-    if self._channel == None or self._channel.is_closed == True:
-       try:
-         self.connect()
-       except AMQPError as e:
-         LOGGER.critical('Unable to create connection to rabbit server. Heading for exit...')
-         sys.exit(105)
-
     LOGGER.debug ("Sending msg to %s", route_key)
 
-    if self._format_options == "XML":
-        try:
-            xmlRoot = self._xml_handler.encodeXML(msg)
-            valid = self._xml_handler.validate(xmlRoot)
-            if valid: 
-                xmlMsg = self._xml_handler.tostring(xmlRoot)
-                self.publish(route_key, xmlMsg)
-            else: 
-                raise L1MessageError("Message is invalid XML.")
-        except L1MessageError as e:
-            raise L1MessageError("Message is invalid XML.")
-    else: 
-        #print "In Simple Publisher, route_key is %s" % str(route_key)
-        #print "In Simple Publisher, msg is %s" % str(msg)
-        yamldict = self._message_handler.encode_message(msg)
-        #print "In Simple Publisher,  fter encoding message, yamldict is %s" % str(yamldict)
-        self.publish(route_key, yamldict)
+    encoded_msg = self._message_handler.encode_message(msg)
+    try:
+        self.publish(route_key, encoded_msg)
+    except L1RabbitConnectionError as e:
+        LOGGER.critical('Unable to create connection to rabbit server. Heading for exit...')
+        sys.exit(105)
+
+  def publish_many(self, route_key_msg_list):
+    """ Publish a list of (route_key, msg) pairs in one batch. Every
+        message is encoded before anything is sent, then the frames are
+        pipelined on one channel and confirmed together.
+
+        :return: True if the broker accepted every message, else False.
+    """
+    if not route_key_msg_list:
+        return True
+    LOGGER.debug ("Sending batch of %d msgs", len(route_key_msg_list))
+
+    frames = [(route_key, self._message_handler.encode_message(msg), self.message_properties())
+              for route_key, msg in route_key_msg_list]
+    try:
+        return self._pool.publish_batch(self.EXCHANGE, frames)
+    except L1RabbitConnectionError as e:
+        LOGGER.critical('Unable to publish batch: %s', e.errormsg)
+        return False
@@ -1,15 +1,16 @@
 import redis
 import toolsmod
-from toolsmod import get_timestamp
-from toolsmod import get_epoch_timestamp
+from timemod import get_timestamp
+from timemod import get_epoch_timestamp
 from toolsmod import L1RedisError
 from toolsmod import L1RabbitConnectionError
 import yaml
+import ScoreboardCodec
 import logging
+from logmod import LazyPformat
 import time
-import subprocess
-from copy import deepcopy
 from Scoreboard import Scoreboard
+import JobIndex
 from const import *
 
 LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
@@ -24,7 +25,6 @@ LOGGER = logging.getLogger(__name__)
 
 
 class StateScoreboard(Scoreboard):
-    JOBS = 'JOBS'
     SESSIONS = 'SESSIONS'
     VISITS = 'VISITS'
     JOB_NUM = 'JOB_NUM'
@@ -47,7 +47,72 @@ class StateScoreboard(Scoreboard):
     PP = "PP"
     CU = "CU"
     AT = "AT"
+    STATIC_FIELDS = ('CONSUME_QUEUE',)
     prp = toolsmod.prp
+    DEVICES = (AR, PP, CU, AT)
+    TERMINAL_STATES = ('COMPLETE', 'SCRUBBED', 'JOB_ABORTED')
+
+    # Starts the next session: bumps the sequence, makes it current and
+    # copies the configured rafts to <session>_RAFTS, in one round trip.
+    # KEYS: SESSION_SEQUENCE_NUM, CURRENT_SESSION_ID, CURRENT_RAFT_CONFIGURATION
+    # ARGV: the RAFTS field name
+    NEXT_SESSION_SCRIPT = """
+        local id = 'Session_' .. redis.call('INCR', KEYS[1])
+        redis.call('SET', KEYS[2], id)
+        local rafts = redis.call('HGET', KEYS[3], ARGV[1])
+        if rafts then
+            redis.call('HSET', id .. '_RAFTS', ARGV[1], rafts)
+        end
+        return id
+    """
+
+    # Copies the configured rafts to another hash.
+    # KEYS: CURRENT_RAFT_CONFIGURATION, destination; ARGV: the RAFTS field
+    COPY_RAFTS_SCRIPT = """
+        local rafts = redis.call('HGET', KEYS[1], ARGV[1])
+        if rafts then
+            redis.call('HSET', KEYS[2], ARGV[1], rafts)
+        end
+        return rafts
+    """
+
+    # HGETALL of <current session>_RAFTS, or an empty list without a session.
+    # KEYS: CURRENT_SESSION_ID
+    SESSION_RAFTS_SCRIPT = """
+        local session = redis.call('GET', KEYS[1])
+        if not session then
+            return {}
+        end
+        return redis.call('HGETALL', session .. '_RAFTS')
+    """
+
+    # Python versions of the scripts above, for the in-memory backend
+
+    @staticmethod
+    def next_session_locally(client, keys, args):
+        id = 'Session_%d' % client.incr(keys[0])
+        client.set(keys[1], id)
+        rafts = client.hget(keys[2], args[0])
+        if rafts is not None:
+            client.hset(id + '_RAFTS', args[0], rafts)
+        return id
+
+    @staticmethod
+    def copy_rafts_locally(client, keys, args):
+        rafts = client.hget(keys[0], args[0])
+        if rafts is not None:
+            client.hset(keys[1], args[0], rafts)
+        return rafts
+
+    @staticmethod
+    def session_rafts_locally(client, keys, args):
+        session = client.get(keys[0])
+        if session is None:
+            return []
+        flat = []
+        for field, value in client.hgetall(session + '_RAFTS').items():
+            flat.extend((field, value))
+        return flat
   
 
     def __init__(self, db_type, db_instance, ddict, rdict):
@@ -58,88 +123,54 @@ class StateScoreboard(Scoreboard):
             Scoreboard.__init__(self)
         except L1RabbitConnectionError as e:
             LOGGER.error('Failed to make connection to Message Broker:  ', e.arg)
-            print("No Monitoring for YOU")
+            LOGGER.error("No Monitoring for YOU")
             raise L1Error('Calling super.init in StateScoreboard init caused: ', e.arg)
 
         try:
             self._redis = self.connect()
         except L1RedisError as e:
             LOGGER.error("Cannot make connection to Redis:  " , e)  
-            print("No Redis for YOU")
+            LOGGER.error("No Redis for YOU")
             raise L1Error('Calling redis connect in StateScoreboard init caused:  ', e.arg)
 
-        self._redis.flushdb()
+        warm = self.start_db()
+        self._jobs = JobIndex.JobIndex(self._redis, self.DB_TYPE)
+        self._next_session = self.register_script(self.NEXT_SESSION_SCRIPT,
+                                                  self.next_session_locally)
+        self._copy_rafts = self.register_script(self.COPY_RAFTS_SCRIPT, self.copy_rafts_locally)
+        self._session_rafts = self.register_script(self.SESSION_RAFTS_SCRIPT,
+                                                   self.session_rafts_locally)
 
-        weekday = subprocess.check_output('date +"%u"', shell=True).decode("utf-8")
+        weekday = time.localtime().tm_wday + 1    # ISO weekday, as date +%u
 
         job_num_seed = int(weekday) + 1000
-        #set up auto sequence
-        self._redis.set(self.JOB_SEQUENCE_NUM, int(job_num_seed))
-        self._redis.set(self.SESSION_SEQUENCE_NUM, 70000)
+        #set up auto sequence; a warm start carries on from the kept numbers
+        pipe = self._redis.pipeline()
+        pipe.set(self.JOB_SEQUENCE_NUM, int(job_num_seed), nx=warm)
+        pipe.set(self.SESSION_SEQUENCE_NUM, 70000, nx=warm)
+        pipe.execute()
 
-        self.init_redis(ddict)
+        self.init_redis(ddict, keep_state=warm)
 
         #self.set_current_raft_configuration(rdict)
         self.set_current_configured_rafts(rdict)
 
         dd = self.get_current_configured_rafts()
-        print("In SSCBD Init - after inserting rafts then pullin it out once again...")
-        self.prp.pprint(dd)
-        print("Done printing init rafts\n====================\n")
+        LOGGER.debug("In SSCBD Init - after inserting rafts then pullin it out once again...\n%s", LazyPformat(dd))
+        LOGGER.debug("Done printing init rafts\n====================\n")
     
 
-    def connect(self):
-        #pool = redis.ConnectionPool(host='localhost', port=6379, db=self.DB_INSTANCE)
-        #return redis.Redis(connection_pool=pool) 
-        try:
-            sconn = redis.StrictRedis(host='localhost',port='6379', \
-                                      charset='utf-8', db=self.DB_INSTANCE, \
-                                      decode_responses=True)
-            sconn.ping()
-            LOGGER.info("Redis connected. Connection details are: %s", sconn)
-            return sconn
-        except Exception as e:
-            LOGGER.critical("Redis connection error: %s", e)
-            LOGGER.critical("Exiting due to Redis connection failure.")
-            sys.exit(100)
-
-
-    def check_connection(self):
-        ok_flag = False
-        for i in range (1,4):
-            try:
-                #response = self._redis.client_list()
-                response = self._redis.ping()
-                ok_flag = True
-                break
-            except redis.ConnectionError:
-                self.connect()
-
-        if ok_flag:
-            if i == 1:
-                return True
-            else:
-                LOGGER.info('In add_job, had to reconnect to Redis - all set now')
-                return True
-        else: 
-            LOGGER.info('In add_job, could not reconnect to Redis after 3 attempts')
-            raise L1RedisError
-            return False
-
-
-    def init_redis(self, ddict):
+    def init_redis(self, ddict, keep_state=False):
         if self.check_connection():
-            self._redis.hset(self.AR, 'CONSUME_QUEUE', ddict[self.AR])
-            self.set_device_state(self.AR, 'STANDBY')
-
-            self._redis.hset(self.PP, 'CONSUME_QUEUE', ddict[self.PP])
-            self.set_device_state(self.PP, 'STANDBY')
-
-            self._redis.hset(self.CU, 'CONSUME_QUEUE', ddict[self.CU])
-            self.set_device_state(self.CU, 'STANDBY')
-
-            self._redis.hset(self.AT, 'CONSUME_QUEUE', ddict[self.AT])
-            self.set_device_state(self.AT, 'STANDBY')
+            pipe = self._redis.pipeline()
+            for device in self.DEVICES:
+                pipe.hset(device, 'CONSUME_QUEUE', ddict[device])
+                if keep_state:
+                    pipe.hsetnx(device, STATE, 'STANDBY')
+                else:
+                    pipe.hset(device, STATE, 'STANDBY')
+            self.bump_static_version(pipe)
+            pipe.execute()
 
 
 
@@ -206,35 +237,22 @@ class StateScoreboard(Scoreboard):
 
     def get_device_consume_queue(self, device):
         if self.check_connection():
-            if device == self.AR:
-                return self._redis.hget(self.AR, "CONSUME_QUEUE")
-            if device == self.PP:
-                return self._redis.hget(self.PP, "CONSUME_QUEUE")
-            if device == self.CU:
-                return self._redis.hget(self.CU, "CONSUME_QUEUE")
-            if device == self.AT:
-                return self._redis.hget(self.AT, "CONSUME_QUEUE")
+            if device in self.DEVICES:
+                return self.get_static_field(device, "CONSUME_QUEUE")
 
 
     def get_devices_by_state(self, state):
         edict = {}
-        if self.check_connection:
-            if state == None:
-                edict[self.AR] = self._redis.hget(self.AR, "CONSUME_QUEUE")
-                edict[self.PP] = self._redis.hget(self.PP, "CONSUME_QUEUE")
-                edict[self.CU] = self._redis.hget(self.CU, "CONSUME_QUEUE")
-                edict[self.AT] = self._redis.hget(self.AT, "CONSUME_QUEUE")
-            else:
-                if self.get_archive_state() == state:
-                    edict[self.AR] = self._redis.hget(self.AR, "CONSUME_QUEUE")
-                if self.get_prompt_process_state() == state:
-                    edict[self.PP] = self._redis.hget(self.PP, "CONSUME_QUEUE")
-                if self.get_catchup_archive_state() == state:
-                    edict[self.CU] = self._redis.hget(self.CU, "CONSUME_QUEUE")
-                if self.get_spectrograph_state() == state:
-                    edict[self.AT] = self._redis.hget(self.AT, "CONSUME_QUEUE")
+        if self.check_connection():
+            pipe = self._redis.pipeline(transaction=False)
+            for device in self.DEVICES:
+                pipe.hmget(device, STATE, "CONSUME_QUEUE")
+            rows = pipe.execute()
+            for device, (device_state, consume_queue) in zip(self.DEVICES, rows):
+                if state == None or device_state == state:
+                    edict[device] = consume_queue
         else:
-            print("BIG TROUBLE IN LITTLE CHINA")
+            LOGGER.error("BIG TROUBLE IN LITTLE CHINA")
         return edict
 
 
@@ -287,12 +305,10 @@ class StateScoreboard(Scoreboard):
         elif device == 'AT':
             listname = 'AT_CFG_KEYS'
 
-        list_len = self._redis.llen(listname)
-        if list_len == 0 or list_len == None:
+        list_keys = self._redis.lrange(listname, 0, -1)
+        if not list_keys:
             return True
 
-        list_keys = self._redis.lrange(listname, 0, -1)
-        #for item in range(0,list_len):
         for item in list_keys:
             if cfg_key == item:
                 return True
@@ -302,18 +318,10 @@ class StateScoreboard(Scoreboard):
 
     def get_next_session_id(self):
         if self.check_connection():
-            self._redis.incr(self.SESSION_SEQUENCE_NUM)
-            session_id = self._redis.get(self.SESSION_SEQUENCE_NUM)
-            #if device == "AR":
-            #    self._redis.hset(self.AR, 'SESSION_ID', session_id)
-            #if device == "PP":
-            #    self._redis.hset(self.PP, 'SESSION_ID', session_id)
-            #if device == "CU":
-            #    self._redis.hset(self.CU, 'SESSION_ID', session_id)
-            id = "Session_" + str(session_id)
-            self._redis.set(self.CURRENT_SESSION_ID, id)
-            print("SETTING NEW SESSION_ID")
-            self.set_rafts_for_current_session(id)
+            id = self._next_session(keys=[self.SESSION_SEQUENCE_NUM, self.CURRENT_SESSION_ID,
+                                          self.CURRENT_RAFT_CONFIGURATION],
+                                    args=[self.RAFTS])
+            LOGGER.debug("SET NEW SESSION_ID %s", id)
             return id
         else:
             LOGGER.error('Unable to increment job number due to lack of redis connection')
@@ -331,8 +339,8 @@ class StateScoreboard(Scoreboard):
     def set_rafts_for_current_session(self, session_id):
         session_raft_keyname = str(session_id) + "_RAFTS"
         if self.check_connection():
-            rafts = deepcopy(self.get_current_configured_rafts())
-            self._redis.hset(session_raft_keyname,self.RAFTS,rafts)
+            self._copy_rafts(keys=[self.CURRENT_RAFT_CONFIGURATION, session_raft_keyname],
+                             args=[self.RAFTS])
         else:
             LOGGER.error('Unable to set rafts for current session ID due to lack of redis connection')
             #RAISE exception to catch in DMCS.py
@@ -340,9 +348,8 @@ class StateScoreboard(Scoreboard):
 
     def get_rafts_for_current_session(self):
         if self.check_connection():
-            current_session = self._redis.get(self.CURRENT_SESSION_ID)
-            current_session_rafts = str(current_session) + "_RAFTS"
-            return self._redis.hgetall(current_session_rafts)
+            flat = self._session_rafts(keys=[self.CURRENT_SESSION_ID])
+            return dict(zip(flat[::2], flat[1::2]))
         else:
             LOGGER.error('Unable to retrieve current session ID due to lack of redis connection')
             #RAISE exception to catch in DMCS.py
@@ -350,13 +357,8 @@ class StateScoreboard(Scoreboard):
 
     def get_rafts_for_current_session_as_lists(self):
         if self.check_connection():
-            current_session = self._redis.get(self.CURRENT_SESSION_ID)
-            print("current_session is %s" % current_session)
-            current_session_rafts = str(current_session) + "_RAFTS"
-            print("current_session_rafts is %s" % current_session_rafts)
-            rdict = yaml.load(self._redis.hget(current_session_rafts, self.RAFTS))
-            print("The SScbd raft_dict from line 350 is: ")
-            self.prp.pprint(rdict)
+            rdict = ScoreboardCodec.loads(self.get_rafts_for_current_session()[self.RAFTS])
+            LOGGER.debug("The SScbd raft_dict from line 350 is:\n%s", LazyPformat(rdict))
             return self.raft_dict_to_lists(rdict)
         else:
             LOGGER.error('Unable to retrieve current session ID due to lack of redis connection')
@@ -365,21 +367,20 @@ class StateScoreboard(Scoreboard):
 
     def set_current_configured_rafts(self, rafts):
         if self.check_connection():
-            self._redis.hset(self.CURRENT_RAFT_CONFIGURATION, self.RAFTS, yaml.dump(rafts))
+            self._redis.hset(self.CURRENT_RAFT_CONFIGURATION, self.RAFTS, ScoreboardCodec.dumps(rafts))
         else:
             LOGGER.error('Unable to set current configured rafts due to lack of redis connection')
             
 
     def get_current_configured_rafts(self):
         if self.check_connection():
-            return yaml.load(self._redis.hget(self.CURRENT_RAFT_CONFIGURATION, self.RAFTS))
+            return ScoreboardCodec.loads(self._redis.hget(self.CURRENT_RAFT_CONFIGURATION, self.RAFTS))
         else:
             LOGGER.error('Unable to retrieve current configured rafts due to lack of redis connection')
 
 
     def raft_dict_to_lists(self, raft_dict):
-        print("The SScbd raft_dict from line 370 is: ")
-        self.prp.pprint(raft_dict)
+        LOGGER.debug("The SScbd raft_dict from line 370 is:\n%s", LazyPformat(raft_dict))
         raft_list = []
         ccd_list = []
         keez = raft_dict.keys()
@@ -410,8 +411,7 @@ class StateScoreboard(Scoreboard):
 
     def get_next_job_num(self, prefix):
         if self.check_connection():
-            self._redis.incr(self.JOB_SEQUENCE_NUM)
-            job_num_str = prefix + str( self._redis.get(self.JOB_SEQUENCE_NUM))
+            job_num_str = prefix + str(self._redis.incr(self.JOB_SEQUENCE_NUM))
             return job_num_str
         else:
             LOGGER.error('Unable to increment job number due to lack of redis connection')
@@ -423,11 +423,10 @@ class StateScoreboard(Scoreboard):
            where initial attributes are inserted.
         """
         if self.check_connection():
-            self._redis.hset(job_number, 'VISIT_ID', visit_id)
-            self._redis.lpush(self.JOBS, job_number)
-            # self.set_ccds_for_job(job_number, ccds)
-            self.set_job_state(job_number, 'NEW')
-            self.set_value_for_job(job_number, STATUS, 'ACTIVE')
+            pipe = self._redis.pipeline()
+            pipe.hset(job_number, mapping={'VISIT_ID': visit_id, STATE: 'NEW', STATUS: 'ACTIVE'})
+            self._jobs.add(pipe, job_number, visit_id)
+            pipe.execute()
         else:
             LOGGER.error('Unable to add new job; Redis connection unavailable')
             #raise exception
@@ -435,8 +434,13 @@ class StateScoreboard(Scoreboard):
 
 
     def set_job_state(self, job_number, state):
+        """Set a job's STATE; a job reaching one of TERMINAL_STATES
+           expires or is archived (see JobIndex).
+        """
         if self.check_connection():
             self._redis.hset(job_number, STATE, state)
+            if state in self.TERMINAL_STATES:
+                self._jobs.retire(str(job_number))
             #params = {}
             #params[JOB_NUM] = job_number
             #params['SUB_TYPE'] = self.JOB_STATE
@@ -445,6 +449,26 @@ class StateScoreboard(Scoreboard):
             #self.persist(self.build_monitor_data(params))
 
 
+    def get_jobs(self, since=None, until=None, offset=0, count=JobIndex.PAGE_SIZE):
+        """Job numbers added between since and until (epoch seconds,
+           inclusive, either left open), oldest first, one page at a time:
+           count of them after skipping offset.
+        """
+        if self.check_connection():
+            return self._jobs.page(since, until, offset, count)
+
+
+    def get_jobs_for_visit(self, visit_id, offset=0, count=JobIndex.PAGE_SIZE):
+        if self.check_connection():
+            return self._jobs.page_for_visit(visit_id, offset, count)
+
+
+    def get_jobs_in_state(self, state, since=None, until=None, offset=0,
+                          count=JobIndex.PAGE_SIZE):
+        if self.check_connection():
+            return self._jobs.page_in_state(state, since, until, offset, count)
+
+
     def set_value_for_job(self, job_number, kee, val):
         """Set a specific field in a job row with a key and value.
 
@@ -476,9 +500,9 @@ class StateScoreboard(Scoreboard):
                 if device == self.AT:
                     self._redis.lpush('AT_JOBS', job_number)
         except Exception as e:
-            print("EXCEPTION in SET_CURRENT_DEVICE_JOB")
-            print("Job Number is %s, Device is %s" % (job_number,device))
-            print("Exception is %s" % e)
+            LOGGER.error("EXCEPTION in SET_CURRENT_DEVICE_JOB")
+            LOGGER.debug("Job Number is %s, Device is %s", job_number, device)
+            LOGGER.error("Exception is %s", e)
 
 
     def get_current_device_job(self, device):
@@ -495,11 +519,10 @@ class StateScoreboard(Scoreboard):
     ### Deprecated
     def set_rafts_for_job(self, job_number, raft_list, raft_ccd_list):
         """Pairs is a temporary relationship between Forwarders
-           and Distributors that lasts for one job. Note the use of yaml...
+           and Distributors that lasts for one job. Note the serialization...
            Unlike python dicts, Redis is not a nested level database. For a
            field to have a dict attached to it, it is necessary to serialize
-           the dict using yaml, json, or pickle. Pyyaml is already in use
-           for conf files.
+           the dict; ScoreboardCodec writes it as JSON.
 
            :param str job_number: cast as str below just to make certain.
            :param  dict pairs: Forwarders and Distributors arranged in a
@@ -509,7 +532,7 @@ class StateScoreboard(Scoreboard):
         rafts['RAFT_LIST'] = raft_list
         rafts['RAFT_CCD_LIST'] = raft_ccd_list
         if self.check_connection():
-            self._redis.hset(str(job_number), 'RAFTS', yaml.dump(rafts))
+            self._redis.hset(str(job_number), 'RAFTS', ScoreboardCodec.dumps(rafts))
             return True
         else:
             return False
@@ -521,13 +544,13 @@ class StateScoreboard(Scoreboard):
             ccds =  self._redis.hget(str(job_number), 'CCDS')
         ### XXX FIX - Check for existence of pairs...
         if ccds:
-            return yaml.load(ccds)
+            return ScoreboardCodec.loads(ccds)
         else:
             return None
 
     def set_results_for_job(self, job_number, results):
         if self.check_connection():
-            self._redis.hset(str(job_number), 'RESULTS', yaml.dump(results))
+            self._redis.hset(str(job_number), 'RESULTS', ScoreboardCodec.dumps(results))
             return True
         else:
             return False
@@ -541,8 +564,10 @@ class StateScoreboard(Scoreboard):
         keez = list(params.keys())
         for kee in keez:
             monitor_data[kee] = params[kee]
-        monitor_data['SESSION_ID'] = self.get_current_session()
-        monitor_data['VISIT_ID'] = self.get_current_visit()
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.get(self.CURRENT_SESSION_ID)
+        pipe.lindex(self.VISIT_ID_LIST, 0)
+        monitor_data['SESSION_ID'], monitor_data['VISIT_ID'] = pipe.execute()
         monitor_data['TIME'] = get_epoch_timestamp()
         monitor_data['DATA_TYPE'] = self.DB_TYPE
         return monitor_data
@@ -551,10 +576,11 @@ class StateScoreboard(Scoreboard):
     def print_all(self):
         dump_dict = {}
         f = open("dump", 'w')
-        jobs = self._redis.lrange(self.JOBS, 0, -1)
-        for job in jobs:
-            x = self._redis.hgetall(job)
-            dump_dict[job] = x
+        # Page on the index itself: a page of expired jobs comes back empty
+        total = self._jobs.count()
+        for offset in range(0, total, JobIndex.PAGE_SIZE):
+            for job in self.get_jobs(offset=offset):
+                dump_dict[job] = self._redis.hgetall(job)
 
         f.write(yaml.dump(dump_dict))
         print(dump_dict)
@@ -0,0 +1,109 @@
+""" Per-process read-through cache for scoreboard fields that only change
+    when a row is configured, such as a forwarder's CONSUME_QUEUE or a
+    distributor's HOSTNAME and TARGET_DIR.
+
+    The first read of a row fetches its cached fields with one HMGET. After
+    that, reads are answered from memory. Writers bump a version key in the
+    same Redis DB (see Scoreboard.bump_static_version). Each cache checks
+    that key at most once every revalidate seconds, and empties itself
+    when the key has changed. A write made in this process through the
+    scoreboard also drops the affected rows at once, so only writes from
+    other processes are seen up to revalidate seconds late.
+"""
+
+import logging
+import threading
+import time
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+class StaticFieldCache:
+    def __init__(self, client, fields, version_key, revalidate):
+        """
+           :param client: Redis client for the scoreboard's DB.
+           :param tuple fields: Names of the fields to cache.
+           :param str version_key: Key writers change when a cached field changes.
+           :param float revalidate: Seconds between checks of version_key.
+        """
+        self._redis = client
+        self._fields = tuple(fields)
+        self._version_key = version_key
+        self._revalidate = revalidate
+        self._rows = {}
+        self._version = None
+        self._checked = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+
+    def get(self, row, field):
+        return self.get_rows([row], field)[0]
+
+
+    def get_fields(self, row, fields):
+        """ Return a dict of fields for row; fields must all be cached ones. """
+        values = self._lookup([row])[row]
+        return dict((field, values[field]) for field in fields)
+
+
+    def get_rows(self, rows, field):
+        """ Return field for each of rows, in order, with at most one round trip. """
+        found = self._lookup(rows)
+        return [found[row][field] for row in rows]
+
+
+    def invalidate(self, rows=None):
+        with self._lock:
+            self._generation += 1
+            if rows is None:
+                self._rows.clear()
+            else:
+                for row in rows:
+                    self._rows.pop(row, None)
+
+
+    def check_version(self):
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self._revalidate:
+            return
+        version = self._redis.get(self._version_key)
+        with self._lock:
+            if version != self._version:
+                if self._rows:
+                    LOGGER.debug("Static fields changed to version %s; clearing cache", version)
+                self._rows.clear()
+                self._generation += 1
+                self._version = version
+            self._checked = now
+
+
+    def _lookup(self, rows):
+        self.check_version()
+        with self._lock:
+            found = dict((row, self._rows.get(row)) for row in rows)
+        missing = [row for row, values in found.items() if values is None]
+        if missing:
+            found.update(self._load(missing))
+        return found
+
+
+    def _load(self, rows):
+        generation = self._generation
+        pipe = self._redis.pipeline(transaction=False)
+        for row in rows:
+            pipe.hmget(row, self._fields)
+        loaded = {}
+        for row, values in zip(rows, pipe.execute()):
+            loaded[row] = dict(zip(self._fields, values))
+        with self._lock:
+            if generation != self._generation:
+                # Invalidated while this read was in flight; don't keep it
+                return loaded
+            for row, values in loaded.items():
+                # A row that doesn't exist yet is not cached
+                if any(v is not None for v in values.values()):
+                    self._rows[row] = values
+        return loaded
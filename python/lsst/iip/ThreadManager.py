@@ -1,86 +1,188 @@
 import threading
 import logging
+import queue
+import time
 from time import sleep
 from Consumer import Consumer
+from MultiplexConsumer import MultiplexConsumer
 from SimplePublisher import SimplePublisher
 from copy import deepcopy
 
 LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
               '-35s %(lineno) -5d: %(message)s')
 LOGGER = logging.getLogger(__name__)
-logging.basicConfig(filename='logs/ThreadManager.log', level=logging.DEBUG, format=LOG_FORMAT)
 
 
 
 class ThreadManager(threading.Thread):
-    def __init__(self, name, kwargs, shutdown_event):
+    """ Starts the consumer threads described by kwargs and restarts any
+        that die. Startup waits on each consumer's ready_event, set once the
+        broker has confirmed its basic_consume, rather than sleeping a
+        fixed time per consumer. Consumers report their own exit
+        through an on_exit callback, so a dead consumer is restarted at once
+        instead of on the next poll.
+    """
+
+    STARTUP_TIMEOUT = 10.0    # Seconds to wait for all consumers to be ready
+    SHUTDOWN_CHECK = 0.25     # Seconds between shutdown_event checks
+
+    def __init__(self, name, kwargs, shutdown_event, multiplex=False):
         threading.Thread.__init__(self, group=None, target=None, name=name) 
         self.running_threads = []
         self.shutdown_event = shutdown_event
+        self._exited_threads = queue.Queue()
+        self._restart_stats = {}
 
         #self.consumer_kwargs = deepcopy(kwargs)
         self.consumer_kwargs = kwargs
+        if multiplex:
+            self.consumer_kwargs = self.multiplex_consumer_kwargs(kwargs)
 
         consumers = list(self.consumer_kwargs.keys())
         for consumer in consumers:
             x = self.setup_consumer_thread(self.consumer_kwargs[consumer])
             self.running_threads.append(x)
+            self._restart_stats[x.name] = {'RESTARTS': 0,
+                                           'LAST_EXIT_TIME': None,
+                                           'LAST_RESTART_SECONDS': None,
+                                           'STARTUP_SECONDS': None}
+
+        self.wait_for_ready(self.running_threads, self.STARTUP_TIMEOUT)
 
     def run(self):
         self.start_background_loop()
 
-    def setup_consumer_thread(self, consumer_params):
-        url = consumer_params['amqp_url']
-        q = consumer_params['queue']
-        threadname = consumer_params['name']
-        callback = consumer_params['callback']
-        format = consumer_params['format']
+    def multiplex_consumer_kwargs(self, kwargs):
+        """ Group consumer kwargs by broker url so that each url gets one
+            MultiplexConsumer serving all of its queues on one connection.
+        """
+        by_url = {}
+        for consumer in sorted(kwargs.keys()):
+            params = kwargs[consumer]
+            by_url.setdefault(params['amqp_url'], []).append(params)
+
+        multiplexed = {}
+        for i, url in enumerate(sorted(by_url.keys())):
+            md = {}
+            md['amqp_url'] = url
+            md['name'] = 'Thread-multiplex-%d' % i
+            md['queues'] = by_url[url]
+            multiplexed[md['name']] = md
+        return multiplexed
 
-        new_thread = Consumer(url, q, threadname, callback, format)
+
+    def setup_consumer_thread(self, consumer_params):
+        if 'queues' in consumer_params:
+            new_thread = MultiplexConsumer(consumer_params['amqp_url'],
+                                           consumer_params['name'],
+                                           consumer_params['queues'])
+        else:
+            url = consumer_params['amqp_url']
+            q = consumer_params['queue']
+            threadname = consumer_params['name']
+            callback = consumer_params['callback']
+            format = consumer_params['format']
+            # Optional worker-pool dispatch; see Consumer
+            workers = consumer_params.get('workers', 0)
+            prefetch = consumer_params.get('prefetch', None)
+            order_key = consumer_params.get('order_key', None)
+            shape_check_rate = consumer_params.get('shape_check_rate', None)
+
+            new_thread = Consumer(url, q, threadname, callback, format,
+                                  workers, prefetch, order_key, shape_check_rate)
+
+        new_thread.start_time = time.monotonic()
+        new_thread.add_on_exit_callback(self.on_consumer_exit)
         new_thread.start()
-        sleep(1)
         return new_thread
 
 
+    def wait_for_ready(self, threads, timeout):
+        """ Wait, up to timeout seconds in total, for every thread's
+            ready_event. The waits overlap, so startup takes as long as the
+            slowest consumer rather than the sum of all of them.
+        """
+        deadline = time.monotonic() + timeout
+        all_ready = True
+        for t in threads:
+            remaining = max(0.0, deadline - time.monotonic())
+            if t.ready_event.wait(remaining):
+                stats = self._restart_stats.get(t.name)
+                if stats is not None and stats['STARTUP_SECONDS'] is None:
+                    stats['STARTUP_SECONDS'] = time.monotonic() - t.start_time
+            else:
+                LOGGER.error("Consumer %s not ready after %s seconds" % (t.name, timeout))
+                all_ready = False
+        return all_ready
+
+
+    def on_consumer_exit(self, consumer):
+        """ Called on the consumer's own thread as its run() returns. """
+        self._exited_threads.put((consumer, time.monotonic()))
+
+
     def start_background_loop(self):
-        # Time for threads to start and quiesce
-        sleep(2)
         try:
             while 1:
                 # self.get_next_backlog_item() 
                 if self.shutdown_event.isSet():
                     self.shutdown_consumers()
                     break
-                sleep(1)
-                self.check_thread_health()
+                try:
+                    dead_thread, exit_time = self._exited_threads.get(timeout=self.SHUTDOWN_CHECK)
+                except queue.Empty:
+                    continue
+                if self.shutdown_event.isSet():
+                    continue
+                self.restart_consumer(dead_thread, exit_time)
                 # self.resolve_non-blocking_acks() 
         except KeyboardInterrupt:
             pass
 
 
     def check_thread_health(self):
-        num_threads = len(self.running_threads)
-        for i in range(0, num_threads):
-            if self.running_threads[i].is_alive():
-                continue
-            else:
-                LOGGER.critical("Thread with name %s has died. Attempting to restart..." 
-                                 % self.running_threads[i].name)
-                dead_thread_name = self.running_threads[i].name
-                del self.running_threads[i]
-                ### Restart thread...
-                new_consumer = self.setup_consumer_thread(self.consumer_kwargs[dead_thread_name])
-
-                self.running_threads.append(new_consumer)
+        """ Restart any consumer that is no longer alive. Exits are normally
+            reported through on_consumer_exit; this sweep is a fallback.
+        """
+        for t in list(self.running_threads):
+            if not t.is_alive():
+                self.restart_consumer(t, time.monotonic())
+
+
+    def restart_consumer(self, dead_thread, exit_time):
+        if dead_thread not in self.running_threads:
+            return
+        dead_thread_name = dead_thread.name
+        LOGGER.critical("Thread with name %s has died. Attempting to restart..." 
+                         % dead_thread_name)
+        self.running_threads.remove(dead_thread)
+        ### Restart thread...
+        new_consumer = self.setup_consumer_thread(self.consumer_kwargs[dead_thread_name])
+        self.running_threads.append(new_consumer)
+
+        stats = self._restart_stats[dead_thread_name]
+        stats['RESTARTS'] += 1
+        stats['LAST_EXIT_TIME'] = time.time() - (time.monotonic() - exit_time)
+        if new_consumer.ready_event.wait(self.STARTUP_TIMEOUT):
+            stats['LAST_RESTART_SECONDS'] = time.monotonic() - exit_time
+            LOGGER.info("Thread %s restarted in %.3f seconds (restart %d)"
+                        % (dead_thread_name, stats['LAST_RESTART_SECONDS'], stats['RESTARTS']))
+        else:
+            LOGGER.error("Restarted thread %s not ready after %s seconds"
+                         % (dead_thread_name, self.STARTUP_TIMEOUT))
+
+
+    def get_restart_stats(self):
+        """ Return a copy of per-consumer restart counts and timings, keyed
+            by consumer thread name.
+        """
+        return {name: dict(stats) for name, stats in self._restart_stats.items()}
 
 
     def shutdown_consumers(self):
-        num_threads = len(self.running_threads)
-        for i in range (0, num_threads):
-            LOGGER.info("Stopping rabbit connection in consumer %s" % self.running_threads[i].name)
-            self.running_threads[i].stop()
-            LOGGER.info("Shutting down consumer %s" % self.running_threads[i].name)
-            self.running_threads[i].join()
-            sleep(0.5)
-
-
+        for t in list(self.running_threads):
+            LOGGER.info("Stopping rabbit connection in consumer %s" % t.name)
+            t.stop()
+        for t in list(self.running_threads):
+            LOGGER.info("Shutting down consumer %s" % t.name)
+            t.join()
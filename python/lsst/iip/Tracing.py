@@ -0,0 +1,179 @@
+""" Correlation ids and spans for following a visit across components.
+
+    SimplePublisher stamps every message with AMQP headers naming the trace
+    it belongs to, the span that published it, when the trace started, when
+    the message was sent and how many hops it has taken. Consumer reads them
+    back and runs the handler inside a span: messages the handler publishes
+    carry the same trace id with this span as their parent, so one OCS
+    command can be followed through every component it touches. A message
+    that arrives without a trace id (from the OCS bridge, or a publisher
+    outside this package) starts a new trace.
+
+    AMQP tables have no float type, so the two times travel as integer
+    microseconds since the epoch; spans hold them as seconds again.
+
+    Each finished span is appended as one JSON line to a span file,
+    logs/spans-<pid>.jsonl by default. trace_collector.py merges the span
+    files of every component into per-visit timelines.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+LOGGER = logging.getLogger(__name__)
+
+
+TRACE_ID_HEADER = 'x-trace-id'
+PARENT_SPAN_HEADER = 'x-parent-span-id'
+TRACE_START_HEADER = 'x-trace-start'
+SENT_AT_HEADER = 'x-sent-at'
+HOP_HEADER = 'x-hop'
+
+# Message fields copied into each span, so spans can be grouped by visit
+# and matched to scoreboard entries
+SPAN_ATTRIBUTES = ('MSG_TYPE', 'JOB_NUM', 'SESSION_ID', 'VISIT_ID', 'IMAGE_ID', 'ACK_ID')
+
+SPAN_DIR = 'logs'
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_writer = None
+_writer_lock = threading.Lock()
+_enabled = True
+
+
+def configure(enabled=True, span_file=None):
+    """ Turn span recording on or off for this process, and optionally
+        choose the file spans are written to. Trace headers are added to
+        outgoing messages either way.
+    """
+    global _writer, _enabled
+    with _writer_lock:
+        _enabled = enabled
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+        if enabled and span_file is not None:
+            _writer = SpanWriter(span_file)
+
+
+def new_id():
+    return os.urandom(8).hex()
+
+
+def current_span():
+    return _current_span.get()
+
+
+def to_header_time(seconds):
+    """ Epoch seconds as integer microseconds, which pika can encode. """
+    return int(seconds * 1e6)
+
+
+def from_header_time(value, default=None):
+    if value is None:
+        return default
+    return value / 1e6
+
+
+def outgoing_headers():
+    """ Headers for a message about to be published. Inside a handler the
+        message joins the handler's trace; otherwise it starts a new one.
+    """
+    now = to_header_time(time.time())
+    span = _current_span.get()
+    if span is None:
+        return {TRACE_ID_HEADER: new_id(), TRACE_START_HEADER: now,
+                SENT_AT_HEADER: now, HOP_HEADER: 0}
+    return {TRACE_ID_HEADER: span.trace_id, PARENT_SPAN_HEADER: span.span_id,
+            TRACE_START_HEADER: to_header_time(span.trace_start), SENT_AT_HEADER: now,
+            HOP_HEADER: span.hop + 1}
+
+
+class Span:
+    """ One handler invocation for one delivered message. """
+
+    __slots__ = ('component', 'trace_id', 'span_id', 'parent_id', 'trace_start',
+                 'sent_at', 'received_at', 'hop', 'start', 'end', 'attributes')
+
+    def __init__(self, component, headers, msg, received_at):
+        headers = headers or {}
+        self.component = component
+        self.trace_id = headers.get(TRACE_ID_HEADER) or new_id()
+        self.span_id = new_id()
+        self.parent_id = headers.get(PARENT_SPAN_HEADER)
+        self.trace_start = from_header_time(headers.get(TRACE_START_HEADER), received_at)
+        self.sent_at = from_header_time(headers.get(SENT_AT_HEADER))
+        self.received_at = received_at
+        self.hop = headers.get(HOP_HEADER, 0)
+        self.start = None
+        self.end = None
+        self.attributes = {}
+        if isinstance(msg, dict):
+            for k in SPAN_ATTRIBUTES:
+                if k in msg:
+                    self.attributes[k] = msg[k]
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class SpanWriter:
+    """ Appends spans to a file, one JSON object per line. """
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, span):
+        line = json.dumps(span.to_dict(), default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self._filename, 'a', buffering=1)
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def get_writer():
+    global _writer, _enabled
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None and _enabled:
+                if not os.path.isdir(SPAN_DIR):
+                    LOGGER.warning('No %s directory; span recording disabled', SPAN_DIR)
+                    _enabled = False
+                    return None
+                _writer = SpanWriter(os.path.join(SPAN_DIR, 'spans-%d.jsonl' % os.getpid()))
+    return _writer
+
+
+def run_traced(component, received_at, fn, ch, method, properties, body):
+    """ Call a consumer callback fn(ch, method, properties, body) inside a
+        span for the message it is handling, then record the span.
+    """
+    span = Span(component, properties.headers, body, received_at)
+    token = _current_span.set(span)
+    span.start = time.time()
+    try:
+        return fn(ch, method, properties, body)
+    finally:
+        span.end = time.time()
+        _current_span.reset(token)
+        if _enabled:
+            writer = get_writer()
+            if writer is not None:
+                try:
+                    writer.write(span)
+                except (IOError, OSError) as e:
+                    LOGGER.error('Unable to record span: %s', e)
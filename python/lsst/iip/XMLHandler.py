@@ -1,21 +1,88 @@
 from lxml import etree
 from const import *
-from copy import deepcopy 
+from toolsmod import L1MessageError
+import random
+import threading
 import sys
 
+SCHEMA_FILE = "schema/relaxSchema.xml"
+
+VALIDATE_ALWAYS = "ALWAYS"
+VALIDATE_SAMPLED = "SAMPLED"
+VALIDATE_OFF = "OFF"
+VALIDATION_MODES = (VALIDATE_ALWAYS, VALIDATE_SAMPLED, VALIDATE_OFF)
+
+# Process-wide defaults, used by handlers created without explicit settings
+# (such as the shared instance MessageCodecs hands to publishers)
+_validation = {"MODE": VALIDATE_ALWAYS, "SAMPLE_RATE": 1.0}
+
+# Schema file name -> compiled RelaxNG validator. lxml validators are not
+# safe to use from several threads at once, so validate() holds _schema_lock.
+_schemas = {}
+_schema_lock = threading.Lock()
+
+
+def set_validation(mode, sample_rate=None):
+    """ Set the default validation policy for XMLHandlers in this process
+        :param mode: VALIDATE_ALWAYS, VALIDATE_SAMPLED or VALIDATE_OFF
+        :param sample_rate: fraction of messages validated when SAMPLED
+    """
+    mode = str(mode).upper()
+    if mode not in VALIDATION_MODES:
+        raise L1MessageError("Unknown XML validation mode %s" % mode)
+    _validation["MODE"] = mode
+    if sample_rate is not None:
+        _validation["SAMPLE_RATE"] = float(sample_rate)
+
+
+def get_schema(schemafile=SCHEMA_FILE):
+    """ Return the compiled RelaxNG validator for schemafile, parsing and
+        compiling it only the first time it is asked for
+    """
+    with _schema_lock:
+        schemaNG = _schemas.get(schemafile)
+        if schemaNG is None:
+            try:
+                with open(schemafile) as f:
+                    schemadoc = etree.parse(f)
+            except IOError:
+                print("Cannot open schema file")
+                sys.exit(96)
+            schemaNG = etree.RelaxNG(schemadoc)
+            _schemas[schemafile] = schemaNG
+        return schemaNG
+
 
 class XMLHandler:
-    def __init__(self, callback=None):
-        try:
-            self._schemafile = open("schema/relaxSchema.xml")
-        except IOError:
-            print("Cannot open schema file")
-            sys.exit(96)
-        self._schemadoc = etree.parse(self._schemafile)
-        self._schemaNG = etree.RelaxNG(self._schemadoc)
+    def __init__(self, callback=None, validation=None, sample_rate=None):
+        """ :param validation: VALIDATE_ALWAYS, VALIDATE_SAMPLED or VALIDATE_OFF;
+                defaults to the process-wide setting from set_validation
+            :param sample_rate: fraction of messages validated when SAMPLED
+        """
+        self._validation = validation.upper() if validation else None
+        if self._validation is not None and self._validation not in VALIDATION_MODES:
+            raise L1MessageError("Unknown XML validation mode %s" % validation)
+        self._sample_rate = sample_rate
+        if self.validation_mode() != VALIDATE_OFF:
+            # Load the schema now so a missing file fails at startup
+            get_schema()
         self._consumer_callback = callback
-    
-    def xmlcallback(self, ch, method, properties, body): 
+
+    def validation_mode(self):
+        return self._validation or _validation["MODE"]
+
+    def should_validate(self):
+        """ Decide whether the next outgoing message is validated
+        """
+        mode = self.validation_mode()
+        if mode == VALIDATE_ALWAYS:
+            return True
+        if mode == VALIDATE_OFF:
+            return False
+        rate = self._sample_rate if self._sample_rate is not None else _validation["SAMPLE_RATE"]
+        return random.random() < rate
+
+    def xmlcallback(self, ch, method, properties, body):
         """ Decode the message body before consuming
             Setting the consumer callback function
         """
@@ -23,12 +90,31 @@ class XMLHandler:
         pydict = self.decodeXML(msgTree)
         self._consumer_callback(ch, method, properties, pydict)
 
+    def encode_message(self, dictValue):
+        """ Encode python dictionary into an XML string, validated according
+            to the handler's validation mode
+            :param dictValue: python dictionary to encode XML
+            :type dictValue: dict
+        """
+        xmlRoot = self.encodeXML(dictValue)
+        if self.should_validate() and not self.validate(xmlRoot):
+            raise L1MessageError("Message is invalid XML.")
+        return self.tostring(xmlRoot)
+
+    def decode_message(self, body):
+        """ Decode an XML message string to python dictionary
+            :param body: XML string
+        """
+        return self.decodeXML(self.toTree(body))
+
     def validate(self, rootNode):
         """ Validate the XML with the schema
             :param rootNode: root Node of the XML element
             :type rootNode: lxml etree
         """
-        return self._schemaNG.validate(rootNode)
+        schemaNG = get_schema()
+        with _schema_lock:
+            return schemaNG.validate(rootNode)
 
     def encodeXML(self, dictValue):
         """ Encode python dictionary into XML
@@ -36,42 +122,32 @@ class XMLHandler:
             :param dictValue: python dictionary to encode XML
             :type dictValue: dict
         """
-        pydict = deepcopy(dictValue)
         root = etree.Element("messageDict")
-        msg = etree.Element("message", MSG_TYPE=pydict["MSG_TYPE"])
-        root.append(msg)
-        subTree = self.recursive_encodeXML(msg, pydict)
+        msg = etree.SubElement(root, "message", MSG_TYPE=dictValue["MSG_TYPE"])
+        self.recursive_encodeXML(msg, dictValue)
         return root
 
-    def recursive_encodeXML(self, node, msgDict): 
-        """ Recursively encode the XML dictionary
+    def recursive_encodeXML(self, node, msgDict):
+        """ Add an element under node for each item of msgDict, descending
+            into nested dictionaries; the input is only read, never copied
             :param node: empty XML node to add elements
             :param msgDict: python dictionary to convert values from
             :type node: lxml Element
             :type msgDict: dict
-        """ 
-        for kee, val in list(msgDict.items()): 
-            if kee != "MSG_TYPE": 
-                subNode = etree.SubElement(node, kee)
-                if type(val) != dict:
-                    if kee == "ACK_BOOL": 
-                        boolean = str(val).lower() 
-                        subNode.set("ack_bool_" + boolean, boolean)
-                    else:
-                        subNode.text = str(val)
-                else:
-                    subsubNode = self.recursive_encodeXML(subNode, val)
-        return self.get_parent(node) 
-
-    def get_parent(self, node): 
-        """ Recursively calls the parent node of current element
-            :param node: XML root node to call its parent
-            :type node: lxml Element
-        """ 
-        if node.getparent() is None: 
-            return node
-        else:
-            return self.get_parent(node.getparent())
+        """
+        SubElement = etree.SubElement
+        for kee, val in msgDict.items():
+            if kee == "MSG_TYPE":
+                continue
+            subNode = SubElement(node, kee)
+            if isinstance(val, dict):
+                self.recursive_encodeXML(subNode, val)
+            elif kee == "ACK_BOOL":
+                boolean = str(val).lower()
+                subNode.set("ack_bool_" + boolean, boolean)
+            else:
+                subNode.text = str(val)
+        return node
 
     def decodeXML(self, rootNode):
         """ Decode XML tree to python dictionary
@@ -79,30 +155,26 @@ class XMLHandler:
             :param rootNode: XML root node to conver to python dictionary
             :type rootNode: lxml etree
         """
-        pydict = {}
         message = rootNode.find("message")
-        xmlDict = self.recursive_decodeXML(rootNode, pydict)
-        xmlDict["message"]["MSG_TYPE"] = next(val for kee, val in message.attrib.items() if kee.startswith("MSG_TYPE"))
-        return xmlDict["message"]
+        pydict = self.recursive_decodeXML(message, {})
+        pydict["MSG_TYPE"] = message.get("MSG_TYPE")
+        return pydict
 
-    def recursive_decodeXML(self, rootnode, msgDict): 
+    def recursive_decodeXML(self, rootnode, msgDict):
         """ Recursively decode XML back to python dictionary
             :param rootnode: XML root node to convert to python dictionary
             :param msgDict: empty python dictionary to add elements
             :type rootnode: lxml Element
             :type msgDict: dict
         """
-        for node in rootnode:  
-            if len(node) != 0:  
-                smallDict = {} 
-                self.recursive_decodeXML(node, smallDict)
-                msgDict[node.tag] = smallDict
+        for node in rootnode:
+            if len(node):
+                msgDict[node.tag] = self.recursive_decodeXML(node, {})
+            elif node.attrib:
+                ack_bool = next(val for kee, val in node.attrib.items() if kee.startswith("ack_bool"))
+                msgDict[node.tag] = ack_bool.lower() == "true"
             else:
-                if len(node.attrib) != 0: 
-                    ack_bool = next(val for kee, val in node.attrib.items() if kee.startswith("ack_bool"))
-                    msgDict[node.tag] = True if ack_bool == "True" else False 
-                else:
-                    msgDict[node.tag] = node.text
+                msgDict[node.tag] = node.text
         return msgDict
 
     def tostring(self, rootNode):
@@ -1,9 +1,14 @@
 from const import *
-from copy import deepcopy
-from toolsmod import get_timestamp
+from timemod import get_timestamp
 import yaml
 import sys
 
+# Use the libyaml C bindings when PyYAML was built with them
+try:
+    from yaml import CLoader as Loader, CDumper as Dumper
+except ImportError:
+    from yaml import Loader, Dumper
+
 
 class YamlHandler:
     def __init__(self, callback=None):
@@ -19,13 +24,12 @@ class YamlHandler:
 
 
     def encode_message(self, dictValue):
-        pydict = deepcopy(dictValue)
-        yaml_body = yaml.dump(dictValue)
+        yaml_body = yaml.dump(dictValue, Dumper=Dumper)
         return yaml_body
 
 
     def decode_message(self, body):
-        tmpdict = yaml.load(body) 
+        tmpdict = yaml.load(body, Loader=Loader) 
         return tmpdict
 
 
@@ -0,0 +1,85 @@
+""" Microbenchmark of the message codecs registered in MessageCodecs.
+
+    Every message type in messages.yaml is turned into a sample message
+    of the same shape (placeholder values are replaced with realistic
+    ids, and *_LIST fields with lists the size of a full focal plane),
+    then encoded and decoded with each available codec.
+
+    Run from the iip directory:
+        python benchmarks/bench_codecs.py [-n ITERATIONS] [-m MSG_TYPE ...]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import toolsmod
+import MessageCodecs
+
+RAFTS = ['%d%d' % (x, y) for x in range(5) for y in range(5)][:21]
+CCDS = ['%d%d' % (x, y) for x in range(3) for y in range(3)]
+
+
+def sample_value(key, template):
+    if isinstance(template, dict):
+        return {k: sample_value(k, v) for k, v in template.items()}
+    if key == 'RAFT_CCD_LIST' or key == 'CCD_LIST':
+        return [list(CCDS) for raft in RAFTS]
+    if key.endswith('_LIST'):
+        return ['%s_%s' % (key[:-5].lower(), raft) for raft in RAFTS]
+    if key == 'ACK_BOOL':
+        return True
+    if key == 'JOB_NUM':
+        return 1234
+    if key.endswith('_ID'):
+        return '%s_000042' % key
+    return 'sample_%s' % key.lower()
+
+
+def build_messages(msg_file, msg_types=None):
+    msg_dict = toolsmod.intake_yaml_file(msg_file)['ROOT']
+    messages = {}
+    for msg_type, template in msg_dict.items():
+        if msg_types and msg_type not in msg_types:
+            continue
+        if not isinstance(template, dict):
+            continue
+        msg = sample_value(msg_type, template)
+        msg['MSG_TYPE'] = msg_type
+        messages[msg_type] = msg
+    return messages
+
+
+def bench_codec(handler, messages, iterations):
+    bodies = [handler.encode_message(m) for m in messages]
+    encode = timeit.timeit(lambda: [handler.encode_message(m) for m in messages],
+                           number=iterations)
+    decode = timeit.timeit(lambda: [handler.decode_message(b) for b in bodies],
+                           number=iterations)
+    size = sum(len(b) for b in bodies)
+    count = float(iterations * len(messages))
+    return (encode / count * 1e6, decode / count * 1e6, size / float(len(bodies)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--iterations', type=int, default=200)
+    parser.add_argument('-f', '--file', default='messages.yaml')
+    parser.add_argument('-m', '--msg-type', action='append', dest='msg_types')
+    args = parser.parse_args()
+
+    messages = list(build_messages(args.file, args.msg_types).values())
+    print("%d message shapes from %s, %d iterations" % (len(messages), args.file, args.iterations))
+    print("%-10s %14s %14s %12s" % ('CODEC', 'ENCODE us/msg', 'DECODE us/msg', 'BYTES/msg'))
+    for fmt in sorted(MessageCodecs.available_formats()):
+        if fmt == 'XML':
+            # The RelaxNG schema does not cover every message type
+            continue
+        handler = MessageCodecs.get_handler(fmt)
+        enc, dec, size = bench_codec(handler, messages, args.iterations)
+        print("%-10s %14.1f %14.1f %12.0f" % (fmt, enc, dec, size))
+
+
+if __name__ == "__main__": main()
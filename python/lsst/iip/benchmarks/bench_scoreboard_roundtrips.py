@@ -0,0 +1,232 @@
+""" Count the Redis round trips the scoreboards make for one visit.
+
+    Replays the scoreboard calls DMCS and the archive foreman make for a
+    single archive visit (target visit, next visit with health check and
+    transfer parameters, take images, header ready, end readout, take
+    images done) against a forwarder pool of --forwarders rows, and counts
+    every command sent on its own and every pipeline flush as one round
+    trip each. PINGs (check_connection used to send one per call) are
+    reported separately, as is the time per visit.
+
+    Only Redis is exercised; the scoreboards are built without their audit
+    publisher, so no message broker is needed. --fake runs against
+    fakeredis instead of a server on localhost, and --memory the in-process
+    scoreboard backend, which makes no round trips at all and so shows the
+    cost of the scoreboard code itself. --tree points at another
+    checkout of this directory (e.g. one made with git worktree) to count
+    the round trips of an earlier version; its ArchiveDevice made one call
+    per forwarder where the bulk methods are missing, and so does the replay.
+
+    Run from the iip directory:
+        python benchmarks/bench_scoreboard_roundtrips.py [--forwarders N]
+                                                         [--fake | --memory]
+                                                         [--tree DIR]
+"""
+
+import argparse
+import collections
+import os
+import sys
+import time
+
+IIP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+class RoundTripCounter:
+    """ Wraps Redis.execute_command and Pipeline.execute to count calls. """
+
+    def __init__(self, redis_module):
+        self.counts = collections.Counter()
+        client = redis_module.client
+        execute_command = client.Redis.execute_command
+        pipeline_execute = client.Pipeline.execute
+        counts = self.counts
+
+        def counted_command(conn, *args, **options):
+            counts[str(args[0]).upper()] += 1
+            return execute_command(conn, *args, **options)
+
+        def counted_pipeline(pipe, *args, **kwargs):
+            if pipe.command_stack:
+                counts['PIPELINE'] += 1
+            return pipeline_execute(pipe, *args, **kwargs)
+
+        client.Redis.execute_command = counted_command
+        client.Pipeline.execute = counted_pipeline
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def reset(self):
+        self.counts.clear()
+
+
+def use_fakeredis(redis_module):
+    import fakeredis
+    server = fakeredis.FakeServer()
+
+    def fake_strict_redis(host=None, port=None, db=0, charset=None, **kwargs):
+        return fakeredis.FakeStrictRedis(server=server, db=db, **kwargs)
+
+    redis_module.StrictRedis = fake_strict_redis
+    try:
+        import RedisPool
+    except ImportError:
+        return
+    RedisPool.get_client = lambda db: fakeredis.FakeStrictRedis(server=server, db=int(db),
+                                                                decode_responses=True)
+
+
+def build_scoreboards(num_forwarders):
+    import Scoreboard
+    from AckScoreboard import AckScoreboard
+    from ForwarderScoreboard import ForwarderScoreboard
+    from JobScoreboard import JobScoreboard
+    from StateScoreboard import StateScoreboard
+
+    # Only Redis traffic is measured; skip the audit publisher
+    Scoreboard.Scoreboard.__init__ = lambda self, file=None: None
+    try:
+        import ScoreboardSnapshot
+        ScoreboardSnapshot.configure({'INTERVAL': 0})
+    except ImportError:
+        pass
+
+    fdict = {}
+    for i in range(1, num_forwarders + 1):
+        fdict['FORWARDER_%d' % i] = {'NAME': 'FORWARDER_%d' % i, 'HOSTNAME': 'fwd%d' % i,
+                                     'IP_ADDR': '141.142.238.%d' % i,
+                                     'CONSUME_QUEUE': 'f%d_consume' % i}
+    ddict = {'AR': 'ar_foreman_consume', 'PP': 'pp_foreman_consume',
+             'CU': 'cu_foreman_consume', 'AT': 'at_foreman_consume'}
+    rdict = {'10': ['00', '01', '02'], '11': ['00', '01', '02']}
+
+    state = StateScoreboard('DMCS_STATE_SCBD', 4, ddict, rdict)
+    ack = AckScoreboard('DMCS_ACK_SCBD', 3)
+    fwd = ForwarderScoreboard('AR_FWD_SCBD', 9, fdict)
+    job = JobScoreboard('AR_JOB_SCBD', 8)
+    return state, ack, fwd, job
+
+
+def routing_keys(fwd, forwarders):
+    if hasattr(fwd, 'get_routing_keys'):
+        return fwd.get_routing_keys(forwarders)
+    return [fwd.get_value_for_forwarder(f, 'CONSUME_QUEUE') for f in forwarders]
+
+
+def replay_visit(state, ack, fwd, job, visit):
+    """ The scoreboard calls of one archive visit, in the order DMCS and
+        ArchiveDevice make them.
+    """
+    # DMCS: target visit
+    state.set_device_state('AR', 'ENABLE')
+    session_id = state.get_current_session()
+    state.set_visit_id(visit)
+    raft_list, raft_ccd_list = state.get_rafts_for_current_session_as_lists()
+    enabled = state.get_devices_by_state('ENABLE')
+    for device in enabled:
+        job_num = state.get_next_job_num(session_id)
+        state.add_job(job_num, visit, raft_list, raft_ccd_list)
+        state.set_current_device_job(job_num, device)
+        state.set_job_state(job_num, "DISPATCHED")
+        state.get_device_consume_queue(device)
+    ack.get_components_for_timed_ack('DMCS_TARGET_VISIT_ACK_%s' % visit)
+
+    # ArchiveDevice.process_next_visit
+    job_number = 'AR_%s' % visit
+    job.set_visit_id(visit, 1.0, 2.0, 3.0)
+    if hasattr(fwd, 'lease_forwarders'):
+        forwarders = fwd.lease_forwarders(None, job_number)
+    else:
+        forwarders = fwd.return_available_forwarders_list()
+    fwd.set_forwarder_params(forwarders, {"STATE": "HEALTH_CHECK", "STATUS": "UNKNOWN"})
+    routing_keys(fwd, forwarders)
+    health_ack = 'AR_FWDR_HEALTH_ACK_%s' % visit
+    for f in forwarders:
+        ack.add_timed_ack({'ACK_ID': health_ack, 'COMPONENT': f,
+                           'MSG_TYPE': 'AR_FWDR_HEALTH_CHECK_ACK', 'ACK_BOOL': True})
+    job.add_job(job_number, visit, raft_list, raft_ccd_list)
+    if not hasattr(fwd, 'get_routing_keys'):
+        job.set_value_for_job(job_number, 'VISIT_ID', visit)
+    healthy = list(ack.get_components_for_timed_ack(health_ack).keys())
+    if hasattr(fwd, 'get_routing_keys'):
+        fwd.set_forwarder_params(healthy, {'STATE': 'BUSY', 'STATUS': 'HEALTHY'})
+    else:
+        for f in healthy:
+            fwd.set_forwarder_state(f, 'BUSY')
+            fwd.set_forwarder_status(f, 'HEALTHY')
+    job.set_job_state(job_number, 'AR_NEW_ITEM_QUERY')
+    job.set_job_params(job_number, {'STATE': 'AR_NEW_ITEM_RESPONSE',
+                                    'TARGET_DIR': '/data/archive', 'XFER_LOGIN': 'ARCHIVE'})
+    schedule = {'FORWARDER_LIST': healthy, 'RAFT_LIST': [raft_list] * len(healthy),
+                'RAFT_CCD_LIST': [raft_ccd_list] * len(healthy)}
+    job.set_value_for_job(job_number, 'STATE', 'SENDING_XFER_PARAMS')
+    job.set_work_schedule_for_job(job_number, schedule)
+    work = {f: {'RAFT_LIST': raft_list, 'RAFT_CCD_LIST': raft_ccd_list} for f in healthy}
+    if hasattr(fwd, 'set_work_for_forwarders'):
+        routing_keys(fwd, healthy)
+        fwd.set_work_for_forwarders(job_number, work)
+    else:
+        for f in healthy:
+            fwd.set_work_by_job(f, job_number, work[f])
+            fwd.get_value_for_forwarder(f, "CONSUME_QUEUE")
+    job.set_value_for_job(job_number, 'STATE', 'XFER_PARAMS_SENT')
+    job.set_value_for_job(job_number, 'STATE', "JOB_ACCEPTED")
+    fwd.set_forwarder_params(healthy, {'STATE': 'AWAITING_READOUT'})
+
+    # take_images, header ready, end readout, take images done
+    for step, field, val in (('take_images', 'NUM_IMAGES', 1),
+                             ('header_ready', 'HDR_FNAME', 'hdr.fits'),
+                             ('end_readout', 'STATE', 'READOUT'),
+                             ('take_images_done', 'STATE', 'TAKE_IMAGES_DONE')):
+        job.set_value_for_job(job_number, field, val)
+        fwdrs = job.get_work_schedule_for_job(job_number)['FORWARDER_LIST']
+        routing_keys(fwd, fwdrs)
+    done_ack = 'AR_FWDR_TAKE_IMAGES_DONE_ACK_%s' % visit
+    for f in healthy:
+        ack.add_timed_ack({'ACK_ID': done_ack, 'COMPONENT': f,
+                           'MSG_TYPE': 'AR_FWDR_TAKE_IMAGES_DONE_ACK', 'ACK_BOOL': True})
+    ack.get_components_for_timed_ack(done_ack)
+    if hasattr(fwd, 'release_forwarders'):
+        fwd.release_forwarders(job_number)
+    else:
+        fwd.set_forwarder_params(healthy, {'STATE': 'IDLE'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--forwarders', type=int, default=10)
+    parser.add_argument('--visits', type=int, default=5)
+    parser.add_argument('--fake', action='store_true', help='use fakeredis')
+    parser.add_argument('--memory', action='store_true', help='use the in-memory backend')
+    parser.add_argument('--tree', default=IIP_DIR, help='iip directory to import from')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.tree))
+    import redis
+    if args.fake:
+        use_fakeredis(redis)
+    if args.memory:
+        import ScoreboardBackend
+        ScoreboardBackend.configure(ScoreboardBackend.MEMORY)
+    counter = RoundTripCounter(redis)
+
+    state, ack, fwd, job = build_scoreboards(args.forwarders)
+    print("Construction: %d round trips" % counter.total())
+    state.get_next_session_id()
+    counter.reset()
+
+    start = time.perf_counter()
+    for visit in range(args.visits):
+        replay_visit(state, ack, fwd, job, 'V%04d' % visit)
+    elapsed = (time.perf_counter() - start) / args.visits
+
+    total = counter.total() / float(args.visits)
+    pings = counter.counts['PING'] / float(args.visits)
+    print("Per visit with %d forwarders: %.1f round trips, %.1f of them PINGs, %.2f ms"
+          % (args.forwarders, total, pings, elapsed * 1000))
+    for command, count in counter.counts.most_common():
+        print("    %-12s %8.1f" % (command, count / float(args.visits)))
+
+
+if __name__ == "__main__": main()
@@ -0,0 +1,53 @@
+""" Per-call cost of the timestamp helpers, before and after timemod.
+
+    The "date" rows run the shell commands toolsmod used to fork for every
+    timestamp; the timemod rows produce the same strings in process.
+
+    Run from the iip directory:
+        python benchmarks/bench_timestamps.py [-n ITERATIONS]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import timemod
+
+
+def date_timestamp():
+    return (subprocess.check_output('date +"%Y-%m-%d %H:%M:%S.%5N"', shell=True)).decode('ascii')
+
+
+def date_epoch_timestamp():
+    return (subprocess.check_output('date +"%s%N"', shell=True)).decode('ascii')
+
+
+def per_call_us(fn, iterations):
+    return timeit.timeit(fn, number=iterations) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--iterations', type=int, default=200,
+                        help='calls per forking variant; in-process variants run 1000 times as many')
+    args = parser.parse_args()
+
+    rows = [('date get_timestamp', date_timestamp, args.iterations),
+            ('date get_epoch_timestamp', date_epoch_timestamp, args.iterations),
+            ('timemod.get_timestamp', timemod.get_timestamp, args.iterations * 1000),
+            ('timemod.get_epoch_timestamp', timemod.get_epoch_timestamp, args.iterations * 1000)]
+    results = {}
+    print("%-30s %14s" % ('FUNCTION', 'us/call'))
+    for name, fn, iterations in rows:
+        results[name] = per_call_us(fn, iterations)
+        print("%-30s %14.3f" % (name, results[name]))
+    print("get_timestamp speedup:       %.0fx" % (results['date get_timestamp'] /
+                                                 results['timemod.get_timestamp']))
+    print("get_epoch_timestamp speedup: %.0fx" % (results['date get_epoch_timestamp'] /
+                                                 results['timemod.get_epoch_timestamp']))
+
+
+if __name__ == "__main__": main()
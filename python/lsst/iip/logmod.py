@@ -0,0 +1,98 @@
+""" Logging setup shared by the L1 components.
+
+    setup_logging takes the place of logging.basicConfig in each component.
+    Loggers hand records to a QueueHandler, and a QueueListener thread
+    writes them to the log file, so a consumer callback never waits on the
+    disk. The QueueHandler merges a record's args into its message as it
+    queues it, so later changes to the args do not show in the log; the
+    level check before that, and LazyPformat, keep DEBUG records that are
+    not emitted cheap.
+
+    Records can carry structured fields, either with log_kv or with
+    extra={'kv': {...}}. They are appended to the line as key=value pairs.
+
+    LazyPformat defers pretty printing of a message or work schedule until a
+    record is actually emitted, so
+
+        LOGGER.debug("Work schedule is:\\n%s", LazyPformat(schedule))
+
+    costs only a level check when DEBUG is off.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import pprint
+import queue
+import threading
+
+LOG_FORMAT = ('%(levelname) -10s %(asctime)s %(name) -30s %(funcName) '
+              '-35s %(lineno) -5d: %(message)s')
+
+_listener = None
+_lock = threading.Lock()
+
+
+class StructuredFormatter(logging.Formatter):
+    """ LOG_FORMAT followed by any key=value fields in record.kv """
+
+    def format(self, record):
+        line = logging.Formatter.format(self, record)
+        kv = getattr(record, 'kv', None)
+        if kv:
+            line = line + ' ' + ' '.join('%s=%s' % (k, v) for k, v in kv.items())
+        return line
+
+
+class LazyPformat:
+    """ Pretty prints obj when, and only when, a log record is formatted """
+
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return pprint.pformat(self.obj, indent=4)
+
+
+def setup_logging(filename=None, level=logging.INFO, fmt=LOG_FORMAT):
+    """ Send the root logger's records through a queue to a background
+        writer for filename (stderr if None). Like basicConfig, does nothing
+        if the root logger already has handlers.
+
+        :return: The QueueListener, or None if logging was already set up.
+    """
+    global _listener
+    with _lock:
+        root = logging.getLogger()
+        if root.handlers:
+            return None
+        if filename is None:
+            handler = logging.StreamHandler()
+        else:
+            handler = logging.FileHandler(filename)
+        handler.setFormatter(StructuredFormatter(fmt))
+
+        records = queue.Queue(-1)
+        root.addHandler(logging.handlers.QueueHandler(records))
+        root.setLevel(level)
+        _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        return _listener
+
+
+def stop_logging():
+    """ Write out every queued record and stop the writer thread """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def log_kv(logger, level, msg, **kv):
+    """ Log msg with kv as structured fields, if level is enabled """
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, extra={'kv': kv}, stacklevel=2)
@@ -1,4 +1,4 @@
-from toolsmod import get_epoch_timestamp
+from timemod import get_epoch_timestamp
 from JobScoreboard import JobScoreboard
 from time import sleep
 
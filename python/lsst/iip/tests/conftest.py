@@ -0,0 +1,32 @@
+""" Fixtures shared by the scoreboard tests
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+
+sys.path.insert(0, "../iip")
+import ScoreboardBackend
+
+@pytest.fixture
+def memory_backend():
+    """ Scoreboards made during the test use the in-memory backend; the
+        backend in use before is put back afterwards.
+    """
+    previous = ScoreboardBackend.get_backend()
+    ScoreboardBackend.configure(ScoreboardBackend.MEMORY)
+    yield
+    ScoreboardBackend.configure(previous)
+
+@pytest.fixture
+def forwarder_dict():
+    """ A function returning the forwarder dict a ForwarderScoreboard is
+        made from, with one forwarder for each number given.
+    """
+    def build(*numbers):
+        fdict = {}
+        for i in numbers:
+            fdict['FORWARDER_%d' % i] = {'NAME': 'F%d' % i, 'HOSTNAME': 'fwd%d' % i,
+                                         'IP_ADDR': '141.142.238.%d' % i,
+                                         'CONSUME_QUEUE': 'f%d_consume' % i}
+        return fdict
+    return build
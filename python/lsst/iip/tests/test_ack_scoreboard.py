@@ -0,0 +1,135 @@
+""" Testing file used for AckScoreboard
+        Used with pytest as the Unit testing module """
+
+import datetime
+import pytest
+import sys
+import threading
+import time
+
+sys.path.insert(0, "../iip")
+from AckScoreboard import AckScoreboard
+
+def ack(ack_id, component):
+    return {'ACK_ID': ack_id, 'COMPONENT': component,
+            'MSG_TYPE': 'AR_FWDR_HEALTH_CHECK_ACK', 'ACK_BOOL': True}
+
+class TestAckWaiters:
+
+    @pytest.fixture
+    def acks(self, memory_backend):
+        return AckScoreboard('AR_ACK_SCBD', 3)
+
+    def test_wakes_when_last_ack_arrives(self, acks):
+        def send():
+            for component in ('F1', 'F2'):
+                time.sleep(0.05)
+                acks.add_timed_ack(ack('HEALTH_1', component))
+
+        sender = threading.Thread(target=send)
+        start = time.monotonic()
+        sender.start()
+        response = acks.wait_for_timed_acks('HEALTH_1', 2, 5.0)
+        elapsed = time.monotonic() - start
+        sender.join()
+        assert sorted(response) == ['F1', 'F2']
+        assert response['F1']['ACK_BOOL'] is True
+        assert elapsed < 1.0
+        assert acks._ack_waiters == {}
+
+    def test_counts_acks_that_arrived_before_waiting(self, acks):
+        acks.add_timed_ack(ack('HEALTH_2', 'F1'))
+        acks.add_timed_ack(ack('HEALTH_2', 'F2'))
+        start = time.monotonic()
+        assert sorted(acks.wait_for_timed_acks('HEALTH_2', 2, 5.0)) == ['F1', 'F2']
+        assert time.monotonic() - start < 0.5
+
+    def test_times_out_when_acks_missing(self, acks):
+        acks.add_timed_ack(ack('HEALTH_3', 'F1'))
+        start = time.monotonic()
+        assert acks.wait_for_timed_acks('HEALTH_3', 2, 0.2) is None
+        assert time.monotonic() - start >= 0.2
+        assert acks._ack_waiters == {}
+
+    def test_other_ack_ids_do_not_wake_waiter(self, acks):
+        results = {}
+
+        def wait():
+            results['HEALTH_4'] = acks.wait_for_timed_acks('HEALTH_4', 1, 0.3)
+
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        time.sleep(0.05)
+        acks.add_timed_ack(ack('HEALTH_5', 'F1'))
+        waiter.join()
+        assert results['HEALTH_4'] is None
+
+    def test_concurrent_waiters(self, acks):
+        results = {}
+
+        def wait(ack_id):
+            results[ack_id] = acks.wait_for_timed_acks(ack_id, 1, 5.0)
+
+        waiters = [threading.Thread(target=wait, args=('READOUT_%d' % i,)) for i in range(4)]
+        for waiter in waiters:
+            waiter.start()
+        time.sleep(0.05)
+        for i in range(4):
+            acks.add_timed_ack(ack('READOUT_%d' % i, 'F%d' % i))
+        for waiter in waiters:
+            waiter.join()
+        assert dict((ack_id, list(r)) for ack_id, r in results.items()) == \
+            dict(('READOUT_%d' % i, ['F%d' % i]) for i in range(4))
+
+class TestAckExpiry:
+
+    @pytest.fixture
+    def acks(self, memory_backend):
+        scbd = AckScoreboard('AR_ACK_SCBD', 3)
+        yield scbd
+        scbd.stop_ack_sweeper()
+
+    def test_ack_row_gets_ttl(self, acks):
+        acks.add_timed_ack(ack('HEALTH_1', 'F1'))
+        assert 0 < acks._redis.ttl('HEALTH_1') <= AckScoreboard.ACK_TTL
+
+    def test_pending_ack_scored_by_expiry(self, acks):
+        acks.add_pending_nonblock_ack({'ACK_ID': 'NB_1', 'EXPIRY_TIME': 1000.0})
+        acks.add_pending_nonblock_ack({'ACK_ID': 'NB_2', 'EXPIRY_TIME': '2000'})
+        assert acks._redis.zrange(AckScoreboard.PENDING_ACKS, 0, -1, withscores=True) == \
+            [('NB_1', 1000.0), ('NB_2', 2000.0)]
+
+    def test_time_of_day_expiry(self, acks):
+        now = datetime.datetime.now()
+        soon = (now + datetime.timedelta(minutes=5)).time()
+        assert abs(acks.expiry_epoch(soon) - (now.timestamp() + 300)) < 2
+        # A time of day long past is taken as tomorrow's
+        past = (now - datetime.timedelta(hours=13)).time()
+        assert acks.expiry_epoch(past) > now.timestamp()
+
+    def test_expired_pending_acks_resolved(self, acks):
+        acks.add_pending_nonblock_ack({'ACK_ID': 'NB_1', 'EXPIRY_TIME': 100.0})
+        acks.add_pending_nonblock_ack({'ACK_ID': 'NB_2', 'EXPIRY_TIME': 100.0})
+        acks.add_pending_nonblock_ack({'ACK_ID': 'NB_3', 'EXPIRY_TIME': 300.0})
+        acks.add_timed_ack(ack('NB_2', 'F1'))
+        assert acks._redis.zrange(AckScoreboard.PENDING_ACKS, 0, -1) == ['NB_1', 'NB_3']
+        assert acks.resolve_pending_nonblock_acks(now=200.0) == ['NB_1']
+        assert acks._redis.lrange(AckScoreboard.MISSING_NONBLOCK_ACKS, 0, -1) == ['NB_1']
+        assert acks._redis.zrange(AckScoreboard.PENDING_ACKS, 0, -1) == ['NB_3']
+
+    def test_resolve_in_batches(self, acks, monkeypatch):
+        monkeypatch.setattr(AckScoreboard, 'SWEEP_BATCH', 2)
+        for i in range(5):
+            acks.add_pending_nonblock_ack({'ACK_ID': 'NB_%d' % i, 'EXPIRY_TIME': 1.0})
+        assert sorted(acks.resolve_pending_nonblock_acks(now=2.0)) == ['NB_%d' % i for i in range(5)]
+        assert acks._redis.zcard(AckScoreboard.PENDING_ACKS) == 0
+
+    def test_sweeper(self, acks):
+        acks.add_pending_nonblock_ack({'ACK_ID': 'NB_1', 'EXPIRY_TIME': time.time() + 0.1})
+        acks.start_ack_sweeper(0.05)
+        deadline = time.monotonic() + 2
+        while not acks._redis.lrange(AckScoreboard.MISSING_NONBLOCK_ACKS, 0, -1) \
+                and time.monotonic() < deadline:
+            time.sleep(0.02)
+        acks.stop_ack_sweeper()
+        assert acks._redis.lrange(AckScoreboard.MISSING_NONBLOCK_ACKS, 0, -1) == ['NB_1']
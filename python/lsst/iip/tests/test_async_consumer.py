@@ -0,0 +1,159 @@
+""" Testing file used for AsyncConsumer and AsyncPublisher
+        Used with pytest as the Unit testing module """
+
+import asyncio
+import pytest
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, "../iip")
+import pika
+from AsyncConsumer import AsyncConsumer
+from AsyncPublisher import AsyncPublisher
+from Distributor import Distributor
+import MessageCodecs
+
+class Channel:
+    is_open = True
+
+    def __init__(self):
+        self.acked = []
+        self.callbacks = []
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+    def add_on_close_callback(self, callback):
+        pass
+
+    def add_callback(self, callback, replies, one_shot=True):
+        self.callbacks.append((callback, replies))
+
+    def basic_consume(self, callback, queue):
+        return 'ctag'
+
+class RecordingPublisher:
+    def __init__(self):
+        self.sent = []
+
+    async def publish_message(self, route_key, msg):
+        self.sent.append((route_key, msg))
+        return True
+
+def deliver(consumer, msg, delivery_tag=1):
+    """ Hand consumer a YAML delivery, as pika would """
+    body = MessageCodecs.get_handler('YAML').encode_message(msg)
+    properties = pika.BasicProperties(content_type=MessageCodecs.content_type_for('YAML'))
+    consumer.on_encoded_message(Channel(), SimpleNamespace(delivery_tag=delivery_tag),
+                                properties, body)
+
+class TestAsyncConsumer:
+
+    @pytest.fixture
+    def loop(self):
+        loop = asyncio.new_event_loop()
+        yield loop
+        loop.close()
+
+    def test_ready_on_consume_ok(self, loop):
+        consumer = AsyncConsumer('amqp://test', 'q', 'test', None, 'YAML', loop=loop)
+        consumer._ready = loop.create_future()
+        consumer.on_channel_open(Channel())
+        assert not consumer._ready.done()
+        (callback, replies), = consumer._channel.callbacks
+        assert replies == [pika.spec.Basic.ConsumeOk]
+        callback(None)
+        assert consumer._ready.result() is True
+
+    def test_tasks_kept_and_drained(self, loop):
+        handled = []
+
+        async def callback(ch, method, properties, msg):
+            await asyncio.sleep(0.01)
+            handled.append(msg['MSG_TYPE'])
+
+        consumer = AsyncConsumer('amqp://test', 'q', 'test', callback, 'YAML', loop=loop)
+
+        async def run():
+            for i in range(3):
+                deliver(consumer, {'MSG_TYPE': 'M%d' % i})
+            assert len(consumer._tasks) == 3
+            await consumer.stop(timeout=1)
+
+        loop.run_until_complete(run())
+        assert sorted(handled) == ['M0', 'M1', 'M2']
+        assert consumer._tasks == set()
+
+    def test_stop_cancels_slow_tasks(self, loop):
+        cancelled = []
+
+        async def callback(ch, method, properties, msg):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(msg['MSG_TYPE'])
+                raise
+
+        consumer = AsyncConsumer('amqp://test', 'q', 'test', callback, 'YAML', loop=loop)
+
+        async def run():
+            deliver(consumer, {'MSG_TYPE': 'SLOW'})
+            await asyncio.sleep(0)
+            await consumer.stop(timeout=0.01)
+
+        loop.run_until_complete(run())
+        assert cancelled == ['SLOW']
+        assert consumer._tasks == set()
+
+    def test_failed_callback_released(self, loop):
+        async def callback(ch, method, properties, msg):
+            raise KeyError(msg['MSG_TYPE'])
+
+        consumer = AsyncConsumer('amqp://test', 'q', 'test', callback, 'YAML', loop=loop)
+
+        async def run():
+            deliver(consumer, {'MSG_TYPE': 'BAD'})
+            await asyncio.sleep(0.01)
+
+        loop.run_until_complete(run())
+        assert consumer._tasks == set()
+
+    def test_distributor_acks_health_check(self, loop):
+        distributor = Distributor.__new__(Distributor)
+        distributor._name = 'D1'
+        distributor._loop = loop
+        distributor._msg_actions = {'DISTRIBUTOR_HEALTH_CHECK': distributor.process_health_check}
+        distributor._job_scratchpad = SimpleNamespace(set_job_value=lambda *args: None)
+        distributor._publisher = RecordingPublisher()
+        distributor._consumer = AsyncConsumer('amqp://test', 'd1_consume', 'D1',
+                                              distributor.on_message, None, loop=loop)
+
+        async def run():
+            deliver(distributor._consumer, {'MSG_TYPE': 'DISTRIBUTOR_HEALTH_CHECK',
+                                            'JOB_NUM': 'J1', 'TIMED_ACK_ID': 'ACK_1'})
+            await distributor._consumer.stop(timeout=1)
+
+        loop.run_until_complete(run())
+        (route_key, ack), = distributor._publisher.sent
+        assert route_key == 'reports'
+        assert ack['MSG_TYPE'] == 'DISTRIBUTOR_HEALTH_ACK' and ack['JOB_NUM'] == 'J1'
+        assert ack['ACK_ID'] == 'ACK_1'
+
+class TestAsyncPublisher:
+
+    def test_confirms_and_close(self):
+        loop = asyncio.new_event_loop()
+        publisher = AsyncPublisher('amqp://test', 'YAML', loop=loop)
+
+        async def run():
+            futures = {tag: loop.create_future() for tag in (1, 2, 3)}
+            publisher._pending_confirms = dict(futures)
+            ack = SimpleNamespace(NAME='Basic.Ack', multiple=True, delivery_tag=2)
+            publisher.on_delivery_confirmation(SimpleNamespace(method=ack))
+            assert futures[1].result() and futures[2].result()
+            await publisher.close()
+            assert futures[3].result() is False
+            assert publisher._pending_confirms == {}
+
+        loop.run_until_complete(run())
+        loop.close()
@@ -18,7 +18,7 @@ sys.path.insert(1, '../iip')
 sys.path.insert(1, '../')
 import DMCS
 import toolsmod
-from toolsmod import get_timestamp
+from timemod import get_timestamp
 from Consumer import Consumer
 from SimplePublisher import SimplePublisher
 from MessageAuthority import MessageAuthority
@@ -0,0 +1,85 @@
+""" Testing file used for AuditEmitter
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+import threading
+
+sys.path.insert(0, "../iip")
+import AuditEmitter
+
+class RecordingPublisher:
+    """Stands in for SimplePublisher; keeps each batch it is handed and can
+       be held so batches pile up behind it.
+    """
+    def __init__(self, accept=True):
+        self.batches = []
+        self.accept = accept
+        self.release = threading.Event()
+        self.release.set()
+
+    def publish_many(self, route_key_msg_list):
+        self.release.wait()
+        self.batches.append(list(route_key_msg_list))
+        return self.accept
+
+class TestAuditEmitter:
+
+    def test_batches_by_size(self):
+        publisher = RecordingPublisher()
+        publisher.release.clear()
+        emitter = AuditEmitter.AuditEmitter(publisher, batch_size=10, flush_interval=0.2)
+        for i in range(25):
+            assert emitter.emit({'SEQ': i})
+        publisher.release.set()
+        assert emitter.flush(timeout=10)
+        records = [msg['SEQ'] for batch in publisher.batches for route_key, msg in batch]
+        assert records == list(range(25))
+        assert all(len(batch) <= 10 for batch in publisher.batches)
+        assert all(route_key == 'audit_consume' for batch in publisher.batches for route_key, msg in batch)
+        counts = emitter.counters()
+        assert counts['PUBLISHED'] == 25 and counts['DROPPED'] == 0 and counts['QUEUED'] == 0
+        emitter.close()
+
+    def test_flushes_partial_batch_on_interval(self):
+        publisher = RecordingPublisher()
+        emitter = AuditEmitter.AuditEmitter(publisher, batch_size=100, flush_interval=0.05)
+        emitter.emit({'SEQ': 1})
+        assert emitter.flush(timeout=2)
+        assert len(publisher.batches) == 1
+        emitter.close()
+
+    @pytest.mark.parametrize("policy", ['DROP', 'BLOCK'])
+    def test_full_queue_drops(self, policy):
+        publisher = RecordingPublisher()
+        publisher.release.clear()
+        emitter = AuditEmitter.AuditEmitter(publisher, queue_size=5, batch_size=1,
+                                            flush_interval=0.01, policy=policy,
+                                            block_timeout=0.01)
+        results = [emitter.emit({'SEQ': i}) for i in range(20)]
+        assert results.count(False) == emitter.counters()['DROPPED'] > 0
+        publisher.release.set()
+        assert emitter.flush(timeout=5)
+        counts = emitter.counters()
+        assert counts['PUBLISHED'] == counts['EMITTED'] == results.count(True)
+        emitter.close()
+
+    def test_refused_batch_counts_failed(self):
+        emitter = AuditEmitter.AuditEmitter(RecordingPublisher(accept=False), flush_interval=0.01)
+        emitter.emit({'SEQ': 1})
+        emitter.emit({'SEQ': 2})
+        assert emitter.flush(timeout=2)
+        assert emitter.counters()['FAILED'] == 2
+        emitter.close()
+
+    def test_close_publishes_queued_records(self):
+        publisher = RecordingPublisher()
+        emitter = AuditEmitter.AuditEmitter(publisher, batch_size=1000, flush_interval=60)
+        for i in range(50):
+            emitter.emit({'SEQ': i})
+        emitter.close()
+        assert sum(len(batch) for batch in publisher.batches) == 50
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError):
+            AuditEmitter.AuditEmitter(RecordingPublisher(), policy='SPILL')
@@ -0,0 +1,98 @@
+""" Testing file used for ForwarderScoreboard leases
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+import threading
+
+sys.path.insert(0, "../iip")
+from ArchiveDevice import ArchiveDevice
+from ForwarderScoreboard import ForwarderScoreboard
+
+class FailingPublisher:
+    def __init__(self):
+        self.batches = []
+
+    def publish_many(self, route_key_msg_list):
+        self.batches.append(route_key_msg_list)
+        return False
+
+class TestForwarderLeases:
+
+    @pytest.fixture
+    def fwd(self, memory_backend, forwarder_dict):
+        return ForwarderScoreboard('AR_FWD_SCBD', 1, forwarder_dict(*range(1, 7)))
+
+    def test_lease_all_available(self, fwd):
+        leased = fwd.lease_forwarders(None, 'AR_1')
+        assert len(leased) == 6
+        assert fwd.get_leased_forwarders('AR_1') == sorted(leased)
+        assert fwd.lease_forwarders(None, 'AR_2') == []
+        assert all(fwd.get_value_for_forwarder(f, 'JOB_NUM') == 'AR_1' for f in leased)
+
+    def test_concurrent_leases_never_share(self, fwd):
+        results = {}
+
+        def lease(job):
+            results[job] = fwd.lease_forwarders(2, job)
+
+        threads = [threading.Thread(target=lease, args=('AR_%d' % i,)) for i in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        taken = [f for leased in results.values() for f in leased]
+        assert len(taken) == 6 and len(set(taken)) == 6
+
+    def test_lease_skips_forwarder_taken_meanwhile(self, fwd, monkeypatch):
+        stale = fwd.return_available_forwarders_list()
+        fwd.set_forwarder_params(stale[:5], {'STATE': 'BUSY'})
+        reads = iter([stale, fwd.return_available_forwarders_list()])
+        monkeypatch.setattr(fwd, 'return_available_forwarders_list', lambda: next(reads))
+        assert fwd.lease_forwarders(2, 'AR_1') == []
+        assert fwd.get_leased_forwarders('AR_1') == []
+
+    def test_failed_health_check_releases_lease(self, fwd):
+        device = ArchiveDevice.__new__(ArchiveDevice)
+        device.FWD_SCBD = fwd
+        device.AR_FOREMAN_ACK_PUBLISH = 'ar_foreman_ack_publish'
+        device._publisher = FailingPublisher()
+        with pytest.raises(SystemExit) as exit_info:
+            device.fwdr_health_check('AR_FWDR_HEALTH_ACK_1', 'AR_1')
+        assert exit_info.value.code == 105
+        assert len(device._publisher.batches[0]) == 6
+        assert fwd.get_leased_forwarders('AR_1') == []
+        assert fwd.get_forwarders_by(STATE='HEALTH_CHECK') == []
+
+    def test_release_after_state_change(self, fwd):
+        leased = fwd.lease_forwarders(3, 'AR_1')
+        fwd.set_forwarder_params(leased, {'STATE': 'HEALTH_CHECK', 'STATUS': 'HEALTHY'})
+        assert fwd.release_forwarders('AR_1', leased[:1]) == leased[:1]
+        assert fwd.get_leased_forwarders('AR_1') == sorted(leased[1:])
+        assert sorted(fwd.release_forwarders('AR_1')) == sorted(leased[1:])
+        assert fwd.get_leased_forwarders('AR_1') == []
+        assert fwd.get_forwarders_by(STATE='HEALTH_CHECK') == []
+        assert len(fwd.return_available_forwarders_list()) == 6
+
+    def test_release_leaves_forwarder_taken_by_other_job(self, fwd):
+        leased = fwd.lease_forwarders(1, 'AR_1')
+        fwd.set_forwarder_params(leased, {'JOB_NUM': 'AR_2'})
+        assert fwd.release_forwarders('AR_1') == []
+        assert fwd.get_value_for_forwarder(leased[0], 'STATE') == 'BUSY'
+        assert fwd.get_leased_forwarders('AR_1') == []
+
+    def test_set_params_refused_after_state_change(self, fwd):
+        forwarders = fwd.return_available_forwarders_list()[:2]
+        idle, down = fwd.index_key('STATE', 'IDLE'), fwd.index_key('STATE', 'DOWN')
+        # Read as IDLE, but one has been taken since
+        fwd.set_forwarder_params(forwarders[:1], {'STATE': 'BUSY'})
+        assert not fwd._set_indexed(keys=forwarders + [idle, idle, down],
+                                    args=[2, 1, 'STATE', 'IDLE', 'IDLE', 'STATE', 'DOWN'])
+        assert fwd.get_forwarders_by(STATE='DOWN') == []
+        assert fwd.get_forwarders_by(STATE='BUSY') == forwarders[:1]
+
+        fwd.set_forwarder_params(forwarders, {'STATE': 'DOWN', 'STATUS': 'UNKNOWN'})
+        assert fwd.get_forwarders_by(STATE='DOWN', STATUS='UNKNOWN') == forwarders
+        assert fwd.get_forwarders_by(STATE='BUSY') == []
+        fwd.setall_forwarder_params({'STATE': 'IDLE', 'STATUS': 'HEALTHY'})
+        assert len(fwd.return_available_forwarders_list()) == 6
@@ -0,0 +1,78 @@
+""" Testing file used for the JobScoreboard job index and retention
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+import time
+import yaml
+
+sys.path.insert(0, "../iip")
+import JobIndex
+from JobScoreboard import JobScoreboard
+
+class TestJobIndex:
+
+    @pytest.fixture
+    def jobs(self, memory_backend, tmpdir):
+        JobIndex.configure({'POLICY': 'ARCHIVE', 'TTL': 60,
+                            'ARCHIVE_DIR': str(tmpdir)})
+        scbd = JobScoreboard('AR_JOB_SCBD', 8)
+        for i in range(1, 6):
+            scbd.add_job('J%d' % i, 'V%d' % (i % 2), ['01'], [['ALL']])
+        yield scbd
+        JobIndex.configure({})
+
+    def test_pages_in_creation_order(self, jobs):
+        assert jobs.get_jobs(count=2) == ['J1', 'J2']
+        assert jobs.get_jobs(offset=2, count=2) == ['J3', 'J4']
+        assert jobs.get_jobs(offset=4, count=2) == ['J5']
+        assert jobs.get_jobs(since=float('inf')) == []
+
+    def test_pages_by_visit_and_state(self, jobs):
+        assert jobs.get_jobs_for_visit('V1') == ['J1', 'J3', 'J5']
+        assert jobs.set_job_state('J3', 'BASE_RESOURCE_QUERY')
+        assert jobs.get_jobs_in_state('BASE_RESOURCE_QUERY') == ['J3']
+        assert jobs.get_jobs_in_state('NEW', offset=1, count=2) == ['J2', 'J4']
+
+    def test_terminal_job_is_archived_and_expires(self, jobs, tmpdir):
+        assert jobs.set_job_state('J2', 'SCRUBBED', status='INACTIVE')
+        assert 0 < jobs._redis.ttl('J2') <= 60
+        assert 0 < jobs._redis.ttl('J2_TRANSITIONS') <= 60
+        assert jobs._redis.ttl('J1') == -1
+
+        archived = list(JobIndex.read_archive(JobIndex.archive_path('AR_JOB_SCBD')))
+        assert [record['JOB'] for record in archived] == ['J2']
+        assert archived[0]['ROW']['STATE'] == 'SCRUBBED'
+        assert [t['TO'] for t in archived[0]['TRANSITIONS']] == ['NEW', 'SCRUBBED']
+
+        jobs._redis.delete('J2', 'J2_TRANSITIONS')    # as when the TTL runs out
+        assert jobs.get_jobs() == ['J1', 'J3', 'J4', 'J5']
+        assert jobs._jobs.prune() == 0
+        assert jobs._jobs.prune(now=time.time() + 61) == 1
+        assert jobs._jobs.count() == 4
+        assert jobs._redis.zcard(JobIndex.RETIRED_JOBS) == 0
+
+    def test_live_jobs_at_head_do_not_stall_pruning(self, jobs):
+        # J1..J5 stay live at the head of the index; many jobs after them finish
+        for i in range(6, 6 + 2 * JobIndex.PRUNE_BATCH):
+            jobs.add_job('J%d' % i, 'V2', ['01'], [['ALL']])
+            assert jobs.set_job_state('J%d' % i, 'SCRUBBED', status='INACTIVE')
+        assert jobs._jobs.count() == 5 + 2 * JobIndex.PRUNE_BATCH
+        later = time.time() + 61
+        assert jobs._jobs.prune(now=later) == JobIndex.PRUNE_BATCH
+        assert jobs._jobs.prune(now=later) == JobIndex.PRUNE_BATCH
+        assert jobs._jobs.prune(now=later) == 0
+        assert jobs._jobs.count() == 5
+        assert jobs.get_live_jobs() == ['J1', 'J2', 'J3', 'J4', 'J5']
+
+    def test_print_all_pages_past_expired_jobs(self, jobs, tmpdir, monkeypatch):
+        monkeypatch.setattr(JobIndex, 'PAGE_SIZE', 2)
+        monkeypatch.chdir(tmpdir)
+        jobs._redis.delete('J1', 'J2')    # a whole first page of expired jobs
+        jobs.print_all()
+        assert sorted(yaml.safe_load(tmpdir.join('dump').read())) == ['J3', 'J4', 'J5']
+
+    def test_delete_job(self, jobs):
+        jobs.delete_job('J1')
+        assert jobs.get_jobs_for_visit('V1') == ['J3', 'J5']
+        assert jobs.get_job_state('J1') is None
@@ -0,0 +1,78 @@
+""" Testing file used for the JobScoreboard state machine
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+
+sys.path.insert(0, "../iip")
+import JobIndex
+from JobScoreboard import JobScoreboard
+
+AR_PATH = ['AR_NEW_ITEM_QUERY', 'AR_NEW_ITEM_RESPONSE', 'SENDING_XFER_PARAMS',
+           'XFER_PARAMS_SENT', 'JOB_ACCEPTED', 'PREPARE_READOUT', 'READOUT_STARTED',
+           'READOUT', 'TAKE_IMAGES_DONE', 'COMPLETE']
+
+class TestJobTransitions:
+
+    @pytest.fixture
+    def jobs(self, memory_backend):
+        JobIndex.configure({'POLICY': 'EXPIRE', 'TTL': 60})
+        scbd = JobScoreboard('AR_JOB_SCBD', 8)
+        scbd.add_job('J1', 'V1', ['01'], [['ALL']])
+        yield scbd
+        JobIndex.configure({})
+
+    def test_table_is_consistent(self):
+        table = JobScoreboard.transition_table()
+        known = set(JobScoreboard.JOB_TRANSITIONS) | set(JobScoreboard.TERMINAL_STATES)
+        for state, next_states in table.items():
+            assert state not in JobScoreboard.TERMINAL_STATES
+            next_states = next_states.split()
+            assert set(JobScoreboard.ABORT_STATES) <= set(next_states)
+            assert set(next_states) <= known | set(JobScoreboard.ABORT_STATES)
+
+    def test_archive_path(self, jobs):
+        for state in AR_PATH:
+            assert jobs.set_job_state('J1', state), state
+        history = [(t['FROM'], t['TO']) for t in jobs.get_job_transitions('J1')]
+        assert history == [('', 'NEW')] + list(zip(['NEW'] + AR_PATH[:-1], AR_PATH))
+        assert 0 < jobs._redis.ttl('J1') <= 60
+
+    def test_refused_transition_changes_nothing(self, jobs):
+        before = jobs.get_job_transitions('J1')
+        assert not jobs.set_job_state('J1', 'COMPLETE', status='DONE')
+        assert jobs.get_job_state('J1') == 'NEW'
+        assert jobs.get_job_transitions('J1') == before
+        assert jobs._redis.ttl('J1') == -1
+
+    def test_repeated_state_allowed(self, jobs):
+        for state in AR_PATH[:5] + ['READOUT', 'READOUT']:
+            assert jobs.set_job_state('J1', state)
+        assert [t['TO'] for t in jobs.get_job_transitions('J1')][-2:] == ['READOUT', 'READOUT']
+
+    @pytest.mark.parametrize("state", ['NEW', 'HEALTH_CHECK', 'JOB_ACCEPTED'])
+    def test_abort_from_any_live_state(self, jobs, state):
+        path = {'NEW': [], 'HEALTH_CHECK': ['HEALTH_CHECK'], 'JOB_ACCEPTED': AR_PATH[:5]}
+        for step in path[state]:
+            assert jobs.set_job_state('J1', step)
+        assert jobs.set_job_state('J1', 'JOB_ABORTED', status='INACTIVE')
+        assert jobs._redis.hmget('J1', 'STATE', 'STATUS') == ['JOB_ABORTED', 'INACTIVE']
+
+    def test_terminal_state_is_final(self, jobs):
+        assert jobs.set_job_state('J1', 'JOB_REFUSED')
+        assert jobs.set_job_state('J1', 'SCRUBBED', status='INACTIVE')
+        assert not jobs.set_job_state('J1', 'JOB_ABORTED')
+        assert not jobs.set_job_state('J1', 'NEW')
+        assert jobs.get_job_state('J1') == 'SCRUBBED'
+
+    def test_status_and_fields_set_with_state(self, jobs):
+        assert jobs.set_job_state('J1', 'AR_NEW_ITEM_QUERY', status='ACTIVE',
+                                  fields={'TARGET_LOCATION': '/data/V1'})
+        assert jobs._redis.hmget('J1', 'STATE', 'STATUS', 'TARGET_LOCATION') == \
+            ['AR_NEW_ITEM_QUERY', 'ACTIVE', '/data/V1']
+        last = jobs.get_job_transitions('J1')[-1]
+        assert (last['FROM'], last['TO'], last['STATUS']) == ('NEW', 'AR_NEW_ITEM_QUERY', 'ACTIVE')
+
+    def test_unknown_job_refused(self, jobs):
+        assert not jobs.set_job_state('J9', 'NEW')
+        assert not jobs._redis.exists('J9')
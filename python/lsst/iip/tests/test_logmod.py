@@ -0,0 +1,73 @@
+""" Testing file used for logmod
+        Used with pytest as the Unit testing module """
+
+import logging
+import logging.handlers
+import pytest
+import queue
+import sys
+
+sys.path.insert(0, "../iip")
+import logmod
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+class Schedule:
+    def __str__(self):
+        return 'schedule'
+
+class Unprintable:
+    def __str__(self):
+        raise AssertionError('formatted a record that is not emitted')
+
+class TestLogmod:
+
+    @pytest.fixture
+    def logger(self):
+        records = queue.Queue(-1)
+        handler = RecordingHandler()
+        handler.setFormatter(logmod.StructuredFormatter('%(message)s'))
+        listener = logging.handlers.QueueListener(records, handler)
+        logger = logging.getLogger('test_logmod')
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(logging.handlers.QueueHandler(records))
+        listener.start()
+        yield logger, listener, handler
+        logger.handlers = []
+
+    def test_args_logged_as_they_were(self, logger):
+        logger, listener, handler = logger
+        schedule = {'FORWARDER_LIST': ['FORWARDER_1']}
+        logger.debug("Work schedule is %s", logmod.LazyPformat(schedule))
+        schedule['FORWARDER_LIST'].append('FORWARDER_2')
+        listener.stop()
+        assert handler.lines == ["Work schedule is {'FORWARDER_LIST': ['FORWARDER_1']}"]
+
+    def test_disabled_level_not_formatted(self, logger):
+        logger, listener, handler = logger
+        logger.setLevel(logging.INFO)
+        logger.debug("Work schedule is %s", Unprintable())
+        listener.stop()
+        assert handler.lines == []
+
+    def test_listener_formats(self, logger):
+        logger, listener, handler = logger
+        logger.debug("Work schedule is %s", Schedule())
+        listener.stop()
+        assert handler.lines == ['Work schedule is schedule']
+
+    def test_kv_fields(self, logger):
+        logger, listener, handler = logger
+        logmod.log_kv(logger, logging.INFO, "Job accepted", JOB_NUM='J1')
+        listener.stop()
+        assert handler.lines == ['Job accepted JOB_NUM=J1']
+
+    def test_lazy_pformat(self):
+        assert str(logmod.LazyPformat({'A': 1})) == "{'A': 1}"
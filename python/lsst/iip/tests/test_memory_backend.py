@@ -0,0 +1,61 @@
+""" Testing file used for the in-memory scoreboard backend
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+
+sys.path.insert(0, "../iip")
+import ScoreboardBackend
+from ScoreboardBackend import MemoryBackend
+from ForwarderScoreboard import ForwarderScoreboard
+
+class TestMemoryBackend:
+
+    @pytest.fixture
+    def client(self):
+        return MemoryBackend()
+
+    @pytest.fixture
+    def fwd(self, memory_backend, forwarder_dict):
+        return ForwarderScoreboard('AR_FWD_SCBD', 1, forwarder_dict(1, 2, 3))
+
+    def test_values_read_back_as_strings(self, client):
+        client.hset('FORWARDER_1', mapping={'STATE': 'IDLE', 'NUM_IMAGES': 2})
+        assert client.hgetall('FORWARDER_1') == {'STATE': 'IDLE', 'NUM_IMAGES': '2'}
+        assert client.hmget('FORWARDER_1', ['STATE', 'MISSING']) == ['IDLE', None]
+        assert client.incr('JOB_SEQUENCE_NUM') == 1
+        assert client.get('JOB_SEQUENCE_NUM') == '1'
+
+    def test_lists_and_sorted_sets(self, client):
+        client.lpush('JOBS', 'J1', 'J2')
+        client.rpush('JOBS', 'J3')
+        assert client.lrange('JOBS', 0, -1) == ['J2', 'J1', 'J3']
+        assert client.lindex('JOBS', -1) == 'J3'
+        client.zadd('PENDING_ACKS', {'A1': 20, 'A2': 10})
+        assert client.zrangebyscore('PENDING_ACKS', '-inf', 15) == ['A2']
+        assert client.zrange('PENDING_ACKS', 0, -1, withscores=True) == [('A2', 10.0), ('A1', 20.0)]
+
+    def test_wrong_type_and_expiry(self, client):
+        client.set('CURRENT_SESSION_ID', 'Session_1')
+        with pytest.raises(ScoreboardBackend.ResponseError):
+            client.hget('CURRENT_SESSION_ID', 'STATE')
+        client.hset('ACK_1', 'FORWARDER_1', 'x')
+        client.pexpire('ACK_1', 0)
+        assert client.exists('ACK_1') == 0
+        assert client.ttl('ACK_1') == -2
+
+    def test_pipeline_results_in_order(self, client):
+        pipe = client.pipeline()
+        pipe.hset('FORWARDER_1', 'STATE', 'IDLE')
+        pipe.lpush('forwarder_rows', 'FORWARDER_1')
+        pipe.hget('FORWARDER_1', 'STATE')
+        assert pipe.execute() == [1, 1, 'IDLE']
+
+    def test_forwarder_scoreboard_leases(self, fwd):
+        assert fwd.return_available_forwarders_list() == ['FORWARDER_1', 'FORWARDER_2', 'FORWARDER_3']
+        leased = fwd.lease_forwarders(2, 'AR_7')
+        assert len(leased) == 2
+        assert fwd.lease_forwarders(2, 'AR_8') == []
+        assert fwd.get_forwarders_by(STATE='BUSY') == sorted(leased)
+        assert sorted(fwd.release_forwarders('AR_7')) == sorted(leased)
+        assert fwd.get_routing_keys(['FORWARDER_2']) == ['f2_consume']
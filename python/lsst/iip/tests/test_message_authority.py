@@ -0,0 +1,67 @@
+""" Testing file used for MessageAuthority
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+
+sys.path.insert(0, "../iip") 
+from const import * 
+
+class TestMessageAuthority: 
+
+    @pytest.fixture(scope="session")
+    def msgAuth(self): 
+        """Return a MessageAuthority instance for the test session.
+        """
+        from MessageAuthority import MessageAuthority 
+        return MessageAuthority("messages.yaml") 
+
+    @pytest.fixture
+    def pyDict(self): 
+        """AR_FWDR_XFER_PARAMS message with every key messages.yaml lists
+        """
+        pydict = {}
+        pydict[MSG_TYPE] = "AR_FWDR_XFER_PARAMS"
+        pydict[JOB_NUM] = 6
+        pydict["TARGET_LOCATION"] = "/tmp/archive"
+        pydict["SESSION_ID"] = "session_1"
+        pydict["VISIT_ID"] = "visit_1"
+        pydict["DAQ_ADDR"] = "API"
+        pydict["ACK_ID"] = "AR_FWDR_PARAMS_ACK_000012"
+        pydict["REPLY_QUEUE"] = "ar_foreman_ack_publish"
+        pydict["XFER_PARAMS"] = {"AR_FWDR": "FORWARDER_1",
+                                 "RAFT_LIST": ["01", "11"],
+                                 "RAFT_CCD_LIST": [["00", "11"], ["ALL"]]}
+        return pydict
+
+    def test_matching_shape(self, msgAuth, pyDict): 
+        assert msgAuth.check_message_shape(pyDict)
+        assert msgAuth.check_message(pyDict) == ([], [])
+
+    def test_agrees_with_dict_shape(self, msgAuth, pyDict): 
+        reference = msgAuth.MSG_DICT['ROOT'][pyDict[MSG_TYPE]]
+        del pyDict["XFER_PARAMS"]["RAFT_LIST"]
+        assert msgAuth.check_message_shape(pyDict) == msgAuth.dicts_shape_is_equal(pyDict, reference)
+
+    def test_reports_missing_and_extra(self, msgAuth, pyDict): 
+        del pyDict["VISIT_ID"]
+        del pyDict["XFER_PARAMS"]["RAFT_LIST"]
+        pyDict["XFER_PARAMS"]["EXTRA"] = 1
+        pyDict["ACK_BOOL"] = True
+        missing, extra = msgAuth.check_message(pyDict)
+        assert missing == ["VISIT_ID", "XFER_PARAMS.RAFT_LIST"]
+        assert extra == ["ACK_BOOL", "XFER_PARAMS.EXTRA"]
+
+    def test_nested_value_replaced_by_plain_value(self, msgAuth, pyDict): 
+        pyDict["XFER_PARAMS"] = "FORWARDER_1"
+        assert not msgAuth.check_message_shape(pyDict)
+        missing, extra = msgAuth.check_message(pyDict)
+        assert missing == ["XFER_PARAMS.AR_FWDR", "XFER_PARAMS.RAFT_CCD_LIST", "XFER_PARAMS.RAFT_LIST"]
+
+    def test_sample_check(self, msgAuth, pyDict): 
+        assert msgAuth.sample_check(pyDict, 1.0)
+        del pyDict["VISIT_ID"]
+        assert not msgAuth.sample_check(pyDict, 1.0)
+        assert msgAuth.sample_check(pyDict, 0.0)
+        pyDict[MSG_TYPE] = "NOT_A_MESSAGE"
+        assert not msgAuth.sample_check(pyDict, 1.0)
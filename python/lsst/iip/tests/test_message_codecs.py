@@ -0,0 +1,81 @@
+""" Testing file used for MessageCodecs
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+
+sys.path.insert(0, "../iip") 
+from const import * 
+import MessageCodecs
+from toolsmod import L1MessageError
+
+class TestMessageCodecs: 
+
+    @pytest.fixture
+    def pyDict(self): 
+        """python dictionary test case to round trip through each codec
+        """
+        pydict = {}
+        pydict[MSG_TYPE] = "AR_FWDR_XFER_PARAMS"
+        pydict[JOB_NUM] = 6
+        pydict["ACK_ID"] = "AR_FWDR_PARAMS_ACK_000012"
+        pydict["ACK_BOOL"] = False
+        pydict["XFER_PARAMS"] = {"AR_FWDR": "FORWARDER_1",
+                                 "RAFT_LIST": ["01", "11"],
+                                 "RAFT_CCD_LIST": [["00", "11"], ["ALL"]]}
+        return pydict
+
+    @pytest.mark.parametrize("fmt", ["YAML", "JSON"])
+    def test_round_trip(self, fmt, pyDict): 
+        handler = MessageCodecs.get_handler(fmt)
+        body = handler.encode_message(pyDict)
+        assert pyDict == handler.decode_message(body), "Codec %s did not round trip." % fmt
+
+    def test_content_type_selects_decoder(self, pyDict): 
+        body = MessageCodecs.get_handler("JSON").encode_message(pyDict)
+        ctype = MessageCodecs.content_type_for("JSON")
+        handler = MessageCodecs.get_handler_for_content_type(ctype, "YAML")
+        assert pyDict == handler.decode_message(body)
+
+    def test_missing_content_type_uses_default(self, pyDict): 
+        body = MessageCodecs.get_handler("YAML").encode_message(pyDict)
+        handler = MessageCodecs.get_handler_for_content_type(None, "YAML")
+        assert pyDict == handler.decode_message(body)
+
+class TestXMLValidationSettings:
+
+    @pytest.fixture
+    def XMLHandler(self):
+        XMLHandler = pytest.importorskip("XMLHandler")
+        yield XMLHandler
+        MessageCodecs.configure({})
+        XMLHandler.set_validation(XMLHandler.VALIDATE_ALWAYS, 1.0)
+
+    @pytest.fixture
+    def badDict(self):
+        """message the RelaxNG schema does not allow
+        """
+        return {MSG_TYPE: "NOT_IN_SCHEMA", JOB_NUM: "6", "ACK_BOOL": True}
+
+    def test_off(self, XMLHandler, badDict):
+        MessageCodecs.configure({'XML': {'VALIDATION': 'OFF'}})
+        handler = MessageCodecs.get_handler("XML")
+        assert handler.validation_mode() == XMLHandler.VALIDATE_OFF
+        assert handler.decode_message(handler.encode_message(badDict)) == badDict
+
+    def test_sampled(self, XMLHandler, badDict, monkeypatch):
+        MessageCodecs.configure({'XML': {'VALIDATION': 'sampled', 'SAMPLE_RATE': 0.25}})
+        handler = MessageCodecs.get_handler("XML")
+        assert handler.validation_mode() == XMLHandler.VALIDATE_SAMPLED
+        monkeypatch.setattr(XMLHandler.random, 'random', lambda: 0.5)
+        assert handler.decode_message(handler.encode_message(badDict)) == badDict
+        monkeypatch.setattr(XMLHandler.random, 'random', lambda: 0.1)
+        with pytest.raises(L1MessageError):
+            handler.encode_message(badDict)
+
+    def test_defaults_to_always(self, XMLHandler, badDict):
+        MessageCodecs.configure({})
+        handler = MessageCodecs.get_handler("XML")
+        assert handler.validation_mode() == XMLHandler.VALIDATE_ALWAYS
+        with pytest.raises(L1MessageError):
+            handler.encode_message(badDict)
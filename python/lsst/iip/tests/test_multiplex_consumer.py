@@ -0,0 +1,93 @@
+""" Testing file used for MultiplexConsumer channel handling
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+
+sys.path.insert(0, "../iip")
+import pika
+from MultiplexConsumer import MultiplexConsumer
+
+class Channel:
+    """Records what a QueueChannel asks of its pika channel"""
+    def __init__(self):
+        self.close_callbacks = []
+        self.callbacks = []
+        self.consuming = []
+
+    def add_on_close_callback(self, callback):
+        self.close_callbacks.append(callback)
+
+    def add_callback(self, callback, replies, one_shot=True):
+        self.callbacks.append((callback, replies))
+
+    def basic_qos(self, prefetch_count):
+        pass
+
+    def basic_consume(self, callback, queue):
+        self.consuming.append(queue)
+        return 'ctag-%s' % queue
+
+    def consume_ok(self):
+        for callback, replies in self.callbacks:
+            if pika.spec.Basic.ConsumeOk in replies:
+                callback(None)
+
+    def close(self, reply_code, reply_text):
+        for callback in self.close_callbacks:
+            callback(self, reply_code, reply_text)
+
+class Connection:
+    def __init__(self):
+        self.is_open = True
+        self.channels = []
+        self.timeouts = []
+
+    def channel(self, on_open_callback):
+        channel = Channel()
+        self.channels.append(channel)
+        on_open_callback(channel)
+
+    def add_timeout(self, delay, callback):
+        self.timeouts.append((delay, callback))
+
+class TestMultiplexConsumer:
+
+    @pytest.fixture
+    def consumer(self):
+        params = [{'name': 'q%d' % i, 'queue': 'queue_%d' % i,
+                   'callback': lambda *args: None, 'format': 'YAML'} for i in range(2)]
+        consumer = MultiplexConsumer('amqp://test', 'multiplex', params)
+        consumer._connection = Connection()
+        for queue_channel in consumer.queue_channels:
+            queue_channel.open_channel(consumer._connection)
+        yield consumer
+        for queue_channel in consumer.queue_channels:
+            queue_channel.shutdown()
+
+    def test_ready_on_consume_ok(self, consumer):
+        channels = consumer._connection.channels
+        assert [c.consuming for c in channels] == [['queue_0'], ['queue_1']]
+        assert not consumer.ready_event.is_set()
+        channels[0].consume_ok()
+        assert not consumer.ready_event.is_set()
+        channels[1].consume_ok()
+        assert consumer.ready_event.is_set()
+
+    def test_closed_channel_reopened(self, consumer):
+        for channel in consumer._connection.channels:
+            channel.consume_ok()
+        consumer._connection.channels[1].close(404, "NOT_FOUND - no queue 'queue_1'")
+        assert not consumer.ready_event.is_set()
+        delay, reopen = consumer._connection.timeouts[0]
+        assert delay == MultiplexConsumer.RECONNECT_DELAY
+        reopen()
+        channel = consumer._connection.channels[-1]
+        assert channel.consuming == ['queue_1']
+        channel.consume_ok()
+        assert consumer.ready_event.is_set()
+
+    def test_no_reopen_when_stopping(self, consumer):
+        consumer._closing = True
+        consumer._connection.channels[0].close(200, 'Normal shutdown')
+        assert consumer._connection.timeouts == []
@@ -0,0 +1,113 @@
+""" Testing file used for OrderedDispatcher
+        Used with pytest as the Unit testing module """
+
+import pytest
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, "../iip")
+from OrderedDispatcher import OrderedDispatcher, IoloopChannel
+
+class Ioloop:
+    def __init__(self):
+        self.callbacks = []
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.append(callback)
+
+class Channel:
+    def __init__(self):
+        self.is_open = True
+        self.acked = []
+        self.thread = threading.current_thread()
+
+    def basic_ack(self, delivery_tag, multiple):
+        assert threading.current_thread() is self.thread
+        self.acked.append(delivery_tag)
+
+class TestOrderedDispatcher:
+
+    @pytest.fixture
+    def dispatcher(self):
+        dispatcher = OrderedDispatcher(4, 'test')
+        yield dispatcher
+        dispatcher.shutdown()
+
+    def test_same_key_runs_in_order(self, dispatcher):
+        seen = dict((job, []) for job in ('J1', 'J2', 'J3'))
+        running = dict((job, 0) for job in seen)
+        overlaps = []
+
+        def handler(job, i):
+            running[job] += 1
+            if running[job] > 1:
+                overlaps.append(job)
+            time.sleep(random.random() * 0.002)
+            seen[job].append(i)
+            running[job] -= 1
+
+        for i in range(50):
+            for job in seen:
+                dispatcher.submit(job, handler, job, i)
+        dispatcher.shutdown()
+        assert overlaps == []
+        assert all(order == list(range(50)) for order in seen.values())
+
+    def test_different_keys_run_concurrently(self, dispatcher):
+        barrier = threading.Barrier(3, timeout=2)
+        passed = []
+
+        def handler(job):
+            barrier.wait()
+            passed.append(job)
+
+        for job in ('J1', 'J2', 'J3'):
+            dispatcher.submit(job, handler, job)
+        dispatcher.shutdown()
+        assert sorted(passed) == ['J1', 'J2', 'J3']
+
+    def test_slow_key_does_not_hold_up_others(self, dispatcher):
+        release = threading.Event()
+        done = []
+
+        def slow():
+            release.wait(2)
+            done.append('slow')
+
+        dispatcher.submit('J1', slow)
+        dispatcher.submit('J1', done.append, 'J1 next')
+        for i in range(3):
+            dispatcher.submit('J2', done.append, i)
+        dispatcher.submit(None, done.append, 'unkeyed')
+        deadline = time.monotonic() + 2
+        while len(done) < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sorted(done, key=str) == [0, 1, 2, 'unkeyed']
+        release.set()
+        dispatcher.shutdown()
+        assert done[-2:] == ['slow', 'J1 next']
+
+    def test_failing_handler_does_not_stall_key(self, dispatcher):
+        seen = []
+
+        def fail():
+            raise ValueError('bad message')
+
+        dispatcher.submit('J1', fail)
+        dispatcher.submit('J1', seen.append, 'after')
+        dispatcher.shutdown()
+        assert seen == ['after']
+        assert dispatcher._pending == {}
+
+    def test_ioloop_channel_acks_on_ioloop_thread(self, dispatcher):
+        channel = Channel()
+        connection = type('Connection', (), {'ioloop': Ioloop()})()
+        proxy = IoloopChannel(connection, channel)
+        dispatcher.submit('J1', proxy.basic_ack, 7)
+        dispatcher.shutdown()
+        assert channel.acked == []
+        for callback in connection.ioloop.callbacks:
+            callback()
+        assert channel.acked == [7]
@@ -0,0 +1,106 @@
+""" Testing file used for PublisherPool
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+
+sys.path.insert(0, "../iip")
+from pika.exceptions import AMQPConnectionError
+import PublisherPool
+from toolsmod import L1RabbitConnectionError
+
+class Channel:
+    is_open = True
+    # Errors raised, one per call, by the next basic_publish or tx_commit
+    publish_errors = []
+    commit_errors = []
+    committed = []
+
+    def tx_select(self):
+        self.pending = []
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        if Channel.publish_errors:
+            raise Channel.publish_errors.pop(0)
+        self.pending.append(body)
+
+    def tx_commit(self):
+        if Channel.commit_errors:
+            raise Channel.commit_errors.pop(0)
+        Channel.committed.extend(self.pending)
+
+class Connection:
+    def __init__(self):
+        self.is_open = True
+
+    def channel(self):
+        return Channel()
+
+    def close(self):
+        self.is_open = False
+
+class LocalPool(PublisherPool.PublisherPool):
+    """A pool whose connections need no broker"""
+    def __init__(self, size, fail_with=None):
+        PublisherPool.PublisherPool.__init__(self, 'amqp://test', size)
+        self.opened = 0
+        self.fail_with = fail_with
+
+    def open_connection(self):
+        if self.fail_with is not None:
+            raise self.fail_with
+        self.opened += 1
+        return PublisherPool.PooledConnection(Connection())
+
+class TestPublisherPool:
+
+    def test_connection_reused(self):
+        pool = LocalPool(1)
+        with pool.connection():
+            pass
+        with pool.connection():
+            pass
+        assert pool.opened == 1
+
+    @pytest.mark.parametrize("error", [AMQPConnectionError('gone'), OSError('reset'),
+                                       TypeError('bad body')])
+    def test_failed_block_frees_slot(self, error):
+        pool = LocalPool(1)
+        for i in range(3):
+            with pytest.raises(type(error)):
+                with pool.connection():
+                    raise error
+        # The slot is free again: checkout opens a new connection at once
+        with pool.connection():
+            pass
+        assert pool.opened == 4
+        assert pool._num_open == 1
+
+    @pytest.fixture
+    def channel(self, monkeypatch):
+        monkeypatch.setattr(Channel, 'publish_errors', [])
+        monkeypatch.setattr(Channel, 'commit_errors', [])
+        monkeypatch.setattr(Channel, 'committed', [])
+        return Channel
+
+    def test_batch_retried_when_publish_fails(self, channel):
+        pool = LocalPool(1)
+        channel.publish_errors.append(AMQPConnectionError('gone'))
+        assert pool.publish_batch('', [('q', 'm1'), ('q', 'm2')])
+        assert channel.committed == ['m1', 'm2']
+        assert pool.opened == 2
+
+    def test_batch_not_retried_once_committing(self, channel):
+        pool = LocalPool(1)
+        channel.commit_errors.append(AMQPConnectionError('gone'))
+        assert not pool.publish_batch('', [('q', 'm1'), ('q', 'm2')])
+        assert pool.opened == 1
+        assert pool._num_open == 0
+
+    def test_failed_open_frees_slot(self):
+        pool = LocalPool(1, fail_with=OSError('refused'))
+        with pytest.raises(L1RabbitConnectionError):
+            pool.checkout(timeout=0.1)
+        assert pool._num_open == 0
+        pool.fail_with = None
+        pool.checkin(pool.checkout(timeout=0.1))
@@ -0,0 +1,44 @@
+""" Testing file used for RedisPool
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+
+sys.path.insert(0, "../iip")
+import redis
+import RedisPool
+
+class TestRedisPool:
+
+    def test_one_pool_per_db(self):
+        factory = RedisPool.RedisConnectionFactory({'HOST': 'redis.example', 'PORT': 6380})
+        assert factory.get_pool(3) is factory.get_pool('3')
+        assert factory.get_pool(3) is not factory.get_pool(4)
+        assert factory.get_client(3).connection_pool is factory.get_pool(3)
+        assert factory.get_pool(3).connection_kwargs['host'] == 'redis.example'
+        assert factory.get_pool(3).connection_kwargs['port'] == 6380
+        assert factory.get_pool(3).connection_kwargs['db'] == 3
+
+    def test_unix_socket_replaces_host(self):
+        factory = RedisPool.RedisConnectionFactory({'HOST': 'ignored', 'UNIX_SOCKET': '/tmp/redis.sock'})
+        pool = factory.get_pool(0)
+        assert pool.connection_class is redis.UnixDomainSocketConnection
+        assert pool.connection_kwargs['path'] == '/tmp/redis.sock'
+        assert 'host' not in pool.connection_kwargs
+        assert factory.address == 'unix:///tmp/redis.sock'
+
+    def test_defaults_without_cfg_section(self):
+        assert RedisPool.load_settings('no_such_cfg.yaml') == {}
+        pool = RedisPool.RedisConnectionFactory({}).get_pool(1)
+        assert pool.connection_kwargs['host'] == RedisPool.DEFAULT_HOST
+        assert pool.connection_kwargs['port'] == RedisPool.DEFAULT_PORT
+        assert pool.max_connections == RedisPool.DEFAULT_MAX_CONNECTIONS
+        assert pool.connection_kwargs['decode_responses']
+
+    def test_configure_replaces_factory(self):
+        first = RedisPool.configure({'MAX_CONNECTIONS': 2})
+        assert RedisPool.get_factory() is first
+        second = RedisPool.configure({'MAX_CONNECTIONS': 3})
+        assert RedisPool.get_factory() is second
+        assert second.get_pool(0).max_connections == 3
+        RedisPool.close_all()
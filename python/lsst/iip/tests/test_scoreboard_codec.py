@@ -0,0 +1,32 @@
+""" Testing file used for ScoreboardCodec
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+import yaml
+
+sys.path.insert(0, "../iip")
+import ScoreboardCodec
+
+class TestScoreboardCodec:
+
+    @pytest.fixture
+    def schedule(self):
+        """work schedule of the shape ArchiveDevice stores for a job
+        """
+        return {'FORWARDER_LIST': ['FORWARDER_1', 'FORWARDER_2'],
+                'RAFT_LIST': [['01', '11'], ['22']],
+                'RAFT_CCD_LIST': [[['00', '11'], ['ALL']], [['ALL']]]}
+
+    def test_round_trip(self, schedule):
+        text = ScoreboardCodec.dumps(schedule)
+        assert ' ' not in text
+        assert ScoreboardCodec.loads(text) == schedule
+
+    @pytest.mark.parametrize("value", [{'ACK_BOOL': True, 'COMPONENT': 'FORWARDER_1'},
+                                       ['10', '11'], 'AR_FWDR_HEALTH_CHECK_ACK', 17, None])
+    def test_reads_yaml_values(self, value):
+        assert ScoreboardCodec.loads(yaml.dump(value)) == value
+
+    def test_missing_field(self):
+        assert ScoreboardCodec.loads(None) is None
@@ -0,0 +1,138 @@
+""" Testing file used for ThreadManager
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+import threading
+import time
+
+sys.path.insert(0, "../iip")
+import pika
+import ThreadManager
+from Consumer import Consumer
+
+class FakeConsumer(threading.Thread):
+    """Stands in for Consumer: ready after READY_DELAY seconds, then runs
+       until stopped or told to die.
+    """
+    READY_DELAY = 0.05
+    started = []
+
+    def __init__(self, url, queue, name, callback, format, *args):
+        threading.Thread.__init__(self, name=name)
+        self.ready_event = threading.Event()
+        self.stopping = threading.Event()
+        self.die = threading.Event()
+        self._on_exit_callback = None
+        FakeConsumer.started.append(self)
+
+    def add_on_exit_callback(self, callback):
+        self._on_exit_callback = callback
+
+    def run(self):
+        try:
+            time.sleep(self.READY_DELAY)
+            self.ready_event.set()
+            while not (self.stopping.is_set() or self.die.is_set()):
+                time.sleep(0.01)
+        finally:
+            self._on_exit_callback(self)
+
+    def stop(self):
+        self.stopping.set()
+
+class SlowConsumer(FakeConsumer):
+    READY_DELAY = 0.5
+
+class Channel:
+    def __init__(self):
+        self.callbacks = []
+
+    def add_on_cancel_callback(self, callback):
+        pass
+
+    def add_callback(self, callback, replies, one_shot=True):
+        self.callbacks.append((callback, replies))
+
+    def basic_consume(self, callback, queue):
+        return 'ctag'
+
+def consumer_kwargs(n):
+    kwargs = {}
+    for i in range(n):
+        name = 'Thread-q%d' % i
+        kwargs[name] = {'amqp_url': 'amqp://test', 'name': name, 'queue': 'q%d' % i,
+                        'callback': None, 'format': 'YAML'}
+    return kwargs
+
+class TestThreadManager:
+
+    @pytest.fixture
+    def manager(self, monkeypatch):
+        monkeypatch.setattr(ThreadManager, 'Consumer', FakeConsumer)
+        FakeConsumer.started = []
+        shutdown_event = threading.Event()
+        start = time.monotonic()
+        manager = ThreadManager.ThreadManager('manager', consumer_kwargs(4), shutdown_event)
+        manager.startup_time = time.monotonic() - start
+        manager.start()
+        yield manager
+        shutdown_event.set()
+        manager.join(5)
+
+    def test_startup_waits_for_ready_events(self, manager):
+        assert all(t.ready_event.is_set() for t in manager.running_threads)
+        # The waits overlap: about one READY_DELAY, not one per consumer
+        assert manager.startup_time < 4 * FakeConsumer.READY_DELAY
+        stats = manager.get_restart_stats()
+        assert all(s['STARTUP_SECONDS'] is not None and s['RESTARTS'] == 0
+                   for s in stats.values())
+
+    def test_dead_consumer_restarted(self, manager):
+        dead = manager.running_threads[1]
+        dead.die.set()
+        deadline = time.monotonic() + 2
+        # The dead thread is dropped before its replacement is added
+        while (dead in manager.running_threads or len(FakeConsumer.started) < 5
+               or FakeConsumer.started[-1] not in manager.running_threads) \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert dead not in manager.running_threads
+        replacement = FakeConsumer.started[-1]
+        assert replacement.name == dead.name and replacement in manager.running_threads
+        assert replacement.ready_event.wait(2)
+        while manager.get_restart_stats()[dead.name]['LAST_RESTART_SECONDS'] is None \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stats = manager.get_restart_stats()[dead.name]
+        assert stats['RESTARTS'] == 1
+        assert stats['LAST_RESTART_SECONDS'] < 1.0
+
+    def test_shutdown_stops_consumers(self, manager):
+        threads = list(manager.running_threads)
+        manager.shutdown_event.set()
+        manager.join(5)
+        assert not manager.is_alive()
+        assert all(t.stopping.is_set() and not t.is_alive() for t in threads)
+        assert len(FakeConsumer.started) == 4
+
+    def test_ready_timeout(self, monkeypatch):
+        monkeypatch.setattr(ThreadManager, 'Consumer', SlowConsumer)
+        monkeypatch.setattr(ThreadManager.ThreadManager, 'STARTUP_TIMEOUT', 0.1)
+        manager = ThreadManager.ThreadManager('manager', consumer_kwargs(1), threading.Event())
+        assert not manager.running_threads[0].ready_event.is_set()
+        assert manager.get_restart_stats()['Thread-q0']['STARTUP_SECONDS'] is None
+        manager.running_threads[0].stop()
+        manager.running_threads[0].join()
+
+class TestConsumerReady:
+
+    def test_ready_on_consume_ok(self):
+        consumer = Consumer('amqp://test', 'q0', 'Thread-q0', lambda *args: None, 'YAML')
+        consumer._channel = Channel()
+        consumer.start_consuming()
+        assert not consumer.ready_event.is_set()
+        (callback, replies), = consumer._channel.callbacks
+        assert replies == [pika.spec.Basic.ConsumeOk]
+        callback(None)
+        assert consumer.ready_event.is_set()
@@ -0,0 +1,21 @@
+""" Testing file used for timemod
+        Used with pytest as the Unit testing module """
+
+import pytest
+import subprocess
+import sys
+
+sys.path.insert(0, "../iip") 
+import timemod
+
+class TestTimemod: 
+
+    def test_matches_date_format(self): 
+        ns = 1520000000123456789
+        expected = subprocess.check_output('date -d @1520000000.123456789 +"%Y-%m-%d %H:%M:%S.%5N"',
+                                           shell=True).decode('ascii').strip()
+        assert timemod.format_timestamp(ns) == expected
+
+    def test_epoch_timestamp(self): 
+        stamp = timemod.get_epoch_timestamp()
+        assert stamp.isdigit() and len(stamp) == 19
@@ -0,0 +1,78 @@
+""" Testing file used for Tracing
+        Used with pytest as the Unit testing module """
+
+import pika
+import pytest
+import sys
+
+sys.path.insert(0, "../iip") 
+import Tracing
+
+class Properties: 
+    def __init__(self, headers): 
+        self.headers = headers
+
+class TestTracing: 
+
+    @pytest.fixture(autouse=True)
+    def noSpanFile(self): 
+        Tracing.configure(enabled=False)
+        yield
+        Tracing.configure(enabled=True)
+
+    def test_new_trace_outside_handler(self): 
+        headers = Tracing.outgoing_headers()
+        assert headers[Tracing.HOP_HEADER] == 0
+        assert Tracing.PARENT_SPAN_HEADER not in headers
+
+    def test_handler_propagates_trace(self): 
+        incoming = Tracing.outgoing_headers()
+        published = []
+
+        def handler(ch, method, properties, body): 
+            published.append(Tracing.outgoing_headers())
+
+        Tracing.run_traced("test", 0.0, handler, None, None, Properties(incoming), {"MSG_TYPE": "X"})
+        outgoing = published[0]
+        assert outgoing[Tracing.TRACE_ID_HEADER] == incoming[Tracing.TRACE_ID_HEADER]
+        assert outgoing[Tracing.TRACE_START_HEADER] == incoming[Tracing.TRACE_START_HEADER]
+        assert outgoing[Tracing.HOP_HEADER] == 1
+        assert outgoing[Tracing.PARENT_SPAN_HEADER] is not None
+        assert Tracing.current_span() is None
+
+    def test_headers_encode_as_amqp_table(self): 
+        incoming = Tracing.outgoing_headers()
+        published = []
+
+        def handler(ch, method, properties, body): 
+            published.append(Tracing.outgoing_headers())
+
+        Tracing.run_traced("test", 0.0, handler, None, None, Properties(incoming), {"MSG_TYPE": "X"})
+        for headers in (incoming, published[0]):
+            properties = pika.BasicProperties(content_type="text/yaml", headers=headers)
+            decoded = pika.BasicProperties()
+            decoded.decode(b"".join(properties.encode()))
+            assert decoded.headers[Tracing.TRACE_ID_HEADER] == headers[Tracing.TRACE_ID_HEADER]
+            assert decoded.headers[Tracing.SENT_AT_HEADER] == headers[Tracing.SENT_AT_HEADER]
+
+    def test_span_times_in_seconds(self): 
+        incoming = Tracing.outgoing_headers()
+        spans = []
+
+        def handler(ch, method, properties, body): 
+            spans.append(Tracing.current_span())
+
+        Tracing.run_traced("test", 0.0, handler, None, None, Properties(incoming), {"MSG_TYPE": "X"})
+        assert abs(spans[0].sent_at - Tracing.from_header_time(incoming[Tracing.SENT_AT_HEADER])) < 1e-9
+        assert abs(spans[0].trace_start - spans[0].start) < 60
+
+    def test_message_without_headers_starts_trace(self): 
+        spans = []
+
+        def handler(ch, method, properties, body): 
+            spans.append(Tracing.current_span())
+
+        Tracing.run_traced("test", 0.0, handler, None, None, Properties(None),
+                           {"MSG_TYPE": "X", "VISIT_ID": "v1"})
+        assert spans[0].trace_id and spans[0].parent_id is None
+        assert spans[0].attributes == {"MSG_TYPE": "X", "VISIT_ID": "v1"}
@@ -0,0 +1,129 @@
+""" Testing file used for scoreboard snapshots and warm starts
+        Used with pytest as the Unit testing module """
+
+import pytest
+import sys
+import time
+
+sys.path.insert(0, "../iip")
+import ScoreboardBackend
+import ScoreboardSnapshot
+import JobIndex
+from ArchiveDevice import ArchiveDevice
+from ForwarderScoreboard import ForwarderScoreboard
+
+class AckScoreboard:
+    def __init__(self, answering):
+        self.answering = answering
+
+    def get_components_for_timed_ack(self, ack_id):
+        return dict((f, {'ACK_BOOL': True}) for f in self.answering) or None
+
+    def wait_for_timed_acks(self, ack_id, expected_replies, seconds):
+        self.waited = (ack_id, expected_replies)
+        response = self.get_components_for_timed_ack(ack_id)
+        if response is None or len(response) < expected_replies:
+            return None
+        return response
+
+class JobScoreboard:
+    def __init__(self, live):
+        self.live = live
+
+    def get_live_jobs(self):
+        return list(self.live)
+
+class Publisher:
+    def __init__(self):
+        self.batches = []
+
+    def publish_many(self, route_key_msg_list):
+        self.batches.append(route_key_msg_list)
+        return True
+
+class TestWarmStart:
+
+    @pytest.fixture(autouse=True)
+    def memory(self, memory_backend):
+        yield
+        ScoreboardSnapshot.configure({'INTERVAL': 0})
+
+    def settings(self, tmp_path, warm):
+        ScoreboardSnapshot.configure({'DIR': str(tmp_path), 'INTERVAL': 0, 'WARM_START': warm})
+
+    def test_cold_start_flushes(self, tmp_path, forwarder_dict):
+        self.settings(tmp_path, False)
+        fwd = ForwarderScoreboard('AR_FWD_SCBD', 1, forwarder_dict(1, 2, 3))
+        fwd.lease_forwarders(2, 'AR_1')
+        fwd = ForwarderScoreboard('AR_FWD_SCBD', 1, forwarder_dict(1, 2, 3))
+        assert not fwd.warm_started
+        assert fwd.get_lease_jobs() == []
+        assert len(fwd.return_available_forwarders_list()) == 3
+
+    def test_warm_start_keeps_state_and_reconciles_rows(self, tmp_path, forwarder_dict):
+        self.settings(tmp_path, True)
+        fwd = ForwarderScoreboard('AR_FWD_SCBD', 1, forwarder_dict(1, 2, 3))
+        leased = fwd.lease_forwarders(2, 'AR_1')
+        fwd = ForwarderScoreboard('AR_FWD_SCBD', 1, forwarder_dict(1, 2, 4))
+        assert fwd.warm_started
+        assert sorted(fwd.return_forwarders_list()) == ['FORWARDER_1', 'FORWARDER_2', 'FORWARDER_4']
+        assert fwd.get_leased_forwarders('AR_1') == sorted(f for f in leased if f != 'FORWARDER_3')
+        assert 'FORWARDER_4' in fwd.return_available_forwarders_list()
+
+    def test_stale_leases_cleared(self, tmp_path, forwarder_dict):
+        self.settings(tmp_path, True)
+        fwd = ForwarderScoreboard('AR_FWD_SCBD', 1, forwarder_dict(1, 2, 3, 4))
+        dead = fwd.lease_forwarders(2, 'AR_1')
+        live = fwd.lease_forwarders(2, 'AR_2')
+        fwd = ForwarderScoreboard('AR_FWD_SCBD', 1, forwarder_dict(1, 2, 3, 4))
+        assert sorted(fwd.clear_stale_leases(['AR_2'])) == sorted(dead)
+        assert fwd.get_lease_jobs() == ['AR_2']
+        assert fwd.get_leased_forwarders('AR_2') == sorted(live)
+        assert fwd.return_available_forwarders_list() == sorted(dead)
+
+    def test_snapshot_round_trip(self, tmp_path, forwarder_dict):
+        self.settings(tmp_path, True)
+        fwd = ForwarderScoreboard('AR_FWD_SCBD', 1, forwarder_dict(1, 2, 3))
+        leased = fwd.lease_forwarders(1, 'AR_1')
+        fwd._redis.set('EXPIRING', 'x', ex=60)
+        assert fwd.persist_snapshot() > 0
+        # Redis itself restarted: the DB is empty, so the snapshot is loaded
+        fwd._redis.flushdb()
+        fwd = ForwarderScoreboard('AR_FWD_SCBD', 1, forwarder_dict(1, 2, 3))
+        assert fwd.warm_started
+        assert fwd.get_leased_forwarders('AR_1') == leased
+        assert fwd.get_value_for_forwarder(leased[0], 'STATE') == 'BUSY'
+        assert fwd.get_forwarders_by(STATE='BUSY') == leased
+        assert 0 < fwd._redis.ttl('EXPIRING') <= 60
+
+    def test_live_jobs(self):
+        client = ScoreboardBackend.get_client(2)
+        client.flushdb()
+        index = JobIndex.JobIndex(client, 'AR_JOB_SCBD')
+        for job, state in (('J1', 'COMPLETE'), ('J2', 'AWAITING_READOUT'), ('J3', 'NEW')):
+            pipe = client.pipeline()
+            index.add(pipe, job, None)
+            pipe.hset(job, 'STATE', state)
+            pipe.execute()
+        client.zadd(JobIndex.JOB_INDEX, {'EXPIRED': time.time()})
+        assert index.live(('COMPLETE', 'SCRUBBED', 'JOB_ABORTED')) == ['J2', 'J3']
+
+    def test_reconcile_forwarders(self, tmp_path, forwarder_dict):
+        self.settings(tmp_path, True)
+        fwd = ForwarderScoreboard('AR_FWD_SCBD', 1, forwarder_dict(1, 2, 3, 4))
+        dead = fwd.lease_forwarders(1, 'AR_1')
+        live = fwd.lease_forwarders(1, 'AR_2')
+        idle = fwd.return_available_forwarders_list()
+        device = ArchiveDevice.__new__(ArchiveDevice)
+        device.FWD_SCBD = ForwarderScoreboard('AR_FWD_SCBD', 1, forwarder_dict(1, 2, 3, 4))
+        device.JOB_SCBD = JobScoreboard(['AR_2'])
+        device.ACK_SCBD = AckScoreboard(dead + idle[:1])
+        device._publisher = Publisher()
+        device._next_timed_ack_id = 0
+
+        assert device.reconcile_forwarders() == sorted(dead + idle[:1])
+        assert device.ACK_SCBD.waited[1] == 3
+        assert len(device._publisher.batches[0]) == 3
+        assert fwd.get_lease_jobs() == ['AR_2']
+        assert fwd.return_available_forwarders_list() == sorted(dead + idle[:1])
+        assert fwd.get_forwarders_by(STATUS='UNKNOWN') == idle[1:]
@@ -60,3 +60,35 @@ class TestXMLHandler:
         xml = etree.fromstring(xmlString) 
         result = xmlH.decodeXML(xml) 
         assert pyDict == result, "Resulting python dictionary is not valid."
+
+    @pytest.fixture
+    def validDict(self):
+        """message that satisfies the RelaxNG schema, with string values so
+           that it survives a round trip unchanged
+        """
+        return {MSG_TYPE: "NCSA_READOUT_ACK", JOB_NUM: "6",
+                "COMPONENT_NAME": "NCSA", "ACK_ID": "ack_sequence",
+                "ACK_BOOL": True}
+
+    def test_ack_bool_true_round_trip(self, xmlH, validDict):
+        result = xmlH.decode_message(xmlH.encode_message(validDict))
+        assert result == validDict, "ACK_BOOL True did not survive a round trip."
+
+    def test_encode_does_not_modify_input(self, xmlH, pyDict):
+        original = dict(pyDict)
+        xmlH.encodeXML(pyDict)
+        assert pyDict == original, "encodeXML changed its input dictionary."
+
+    def test_validation_off_skips_schema(self, validDict):
+        from XMLHandler import XMLHandler, VALIDATE_OFF
+        handler = XMLHandler(validation=VALIDATE_OFF)
+        validDict[MSG_TYPE] = "NOT_IN_SCHEMA"
+        assert handler.decode_message(handler.encode_message(validDict)) == validDict
+
+    def test_invalid_message_rejected_when_validating(self, validDict):
+        from XMLHandler import XMLHandler, VALIDATE_ALWAYS
+        from toolsmod import L1MessageError
+        handler = XMLHandler(validation=VALIDATE_ALWAYS)
+        validDict[MSG_TYPE] = "NOT_IN_SCHEMA"
+        with pytest.raises(L1MessageError):
+            handler.encode_message(validDict)
@@ -0,0 +1,54 @@
+""" In-process timestamps.
+
+    get_timestamp and get_epoch_timestamp used to run `date` in a shell on
+    every call. These produce the same strings from the system clock
+    directly:
+
+        get_timestamp()        local time, "%Y-%m-%d %H:%M:%S.%5N" as date
+                               formats it, e.g. 2018-03-02 14:07:55.04216
+        get_epoch_timestamp()  nanoseconds since the epoch, "%s%N"
+
+    Neither carries the trailing newline that `date` printed.
+    wall_ns and monotonic_ns give the raw integer clocks, and
+    elapsed_ms measures intervals on the monotonic one.
+"""
+
+import time
+
+# Seconds value and formatted "%Y-%m-%d %H:%M:%S" prefix of the most recent
+# call; strftime only runs when the second changes. Replaced as one tuple,
+# so concurrent callers always see a matching pair.
+_last_second = (None, None)
+
+
+def wall_ns():
+    return time.time_ns()
+
+
+def monotonic_ns():
+    return time.monotonic_ns()
+
+
+def elapsed_ms(start_ns):
+    """ Milliseconds since start_ns, a value returned by monotonic_ns. """
+    return (time.monotonic_ns() - start_ns) / 1e6
+
+
+def format_timestamp(ns):
+    """ Format nanoseconds since the epoch as "%Y-%m-%d %H:%M:%S.%5N". """
+    global _last_second
+    seconds, frac = divmod(ns, 1000000000)
+    cached_seconds, prefix = _last_second
+    if seconds != cached_seconds:
+        prefix = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seconds))
+        _last_second = (seconds, prefix)
+    # %5N keeps the first five digits of the nanoseconds, truncated
+    return "%s.%05d" % (prefix, frac // 10000)
+
+
+def get_timestamp():
+    return format_timestamp(time.time_ns())
+
+
+def get_epoch_timestamp():
+    return str(time.time_ns())
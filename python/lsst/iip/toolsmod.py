@@ -1,12 +1,10 @@
-import subprocess
 import yaml
 import pprint
+import timemod
 
-def get_timestamp():
-    return (subprocess.check_output('date +"%Y-%m-%d %H:%M:%S.%5N"', shell=True)).decode('ascii')
-
-def get_epoch_timestamp():
-    return (subprocess.check_output('date +"%s%N"', shell=True)).decode('ascii')
+# Kept for existing imports; new code should use timemod directly
+get_timestamp = timemod.get_timestamp
+get_epoch_timestamp = timemod.get_epoch_timestamp
 
 def singleton(object, instantiated=[]):
     assert object.__class__ not in instantiated, \
@@ -15,6 +13,8 @@ def singleton(object, instantiated=[]):
 
 
 prp = pprint.PrettyPrinter(indent=4)
+# Debug printing for the test scripts. Components log their debug output
+# at DEBUG level instead; see logmod.
 #DP = False  #Set to true for Debug Printing
 DP = True  #Set to true for Debug Printing
 
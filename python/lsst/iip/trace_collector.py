@@ -0,0 +1,156 @@
+""" Rebuild per-visit timelines from the span files written by Tracing.
+
+    Every component appends its spans to logs/spans-<pid>.jsonl. This tool
+    reads any number of those files (gathered from each host), joins spans
+    into traces by trace id, and groups traces by the VISIT_ID found on any
+    of their spans, so the DMCS fan-out, the foremen, the forwarders, the
+    archive controller and the readout acks of one visit appear on one
+    timeline. Traces that never mention a visit are reported on their own.
+
+    For each span the timeline shows, in milliseconds:
+        OFFSET   time from the start of the visit's first trace
+        TRANSIT  from publish to delivery at the consumer
+        QUEUED   from delivery until the handler started (worker pools)
+        HANDLER  time spent in the handler
+
+    Usage:
+        python trace_collector.py [SPAN_FILE ...] [--visit VISIT_ID]
+                                  [--json OUT.json] [--chrome OUT.json]
+
+    --chrome writes Trace Event Format, which chrome://tracing and Perfetto
+    load directly.
+"""
+
+import argparse
+import glob
+import json
+import sys
+
+
+def load_spans(filenames):
+    spans = []
+    for filename in filenames:
+        with open(filename) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    print("Skipping malformed span in %s" % filename, file=sys.stderr)
+    return spans
+
+
+def group_by_visit(spans):
+    """ Return {group name: [span, ...]}, spans sorted by start time. A
+        group is every trace sharing a VISIT_ID, or a single trace with none.
+    """
+    traces = {}
+    for span in spans:
+        traces.setdefault(span['trace_id'], []).append(span)
+
+    groups = {}
+    for trace_id, trace_spans in traces.items():
+        visit = None
+        for span in trace_spans:
+            visit = span.get('attributes', {}).get('VISIT_ID')
+            if visit:
+                break
+        name = ('visit %s' % visit) if visit else ('trace %s' % trace_id)
+        groups.setdefault(name, []).extend(trace_spans)
+
+    for group in groups.values():
+        group.sort(key=lambda s: s['start'])
+    return groups
+
+
+def hop_latencies(span, origin):
+    """ Millisecond offsets and latencies for one span. """
+    ms = lambda seconds: round(seconds * 1000.0, 3)
+    sent_at = span.get('sent_at')
+    return {'OFFSET': ms(span['start'] - origin),
+            'TRANSIT': ms(span['received_at'] - sent_at) if sent_at is not None else None,
+            'QUEUED': ms(span['start'] - span['received_at']),
+            'HANDLER': ms(span['end'] - span['start'])}
+
+
+def build_timelines(groups):
+    timelines = {}
+    for name, group in groups.items():
+        origin = min(min(s['trace_start'] for s in group), group[0]['start'])
+        entries = []
+        for span in group:
+            entry = dict(span)
+            entry.update(hop_latencies(span, origin))
+            entries.append(entry)
+        timelines[name] = {'START': origin,
+                           'DURATION': round((max(s['end'] for s in group) - origin) * 1000.0, 3),
+                           'SPANS': entries}
+    return timelines
+
+
+def print_timelines(timelines):
+    fmt = "%10s %10s %10s %10s  %-4s %-30s %-32s %s"
+    for name in sorted(timelines, key=lambda n: timelines[n]['START']):
+        timeline = timelines[name]
+        print("%s: %d spans over %.3f ms" % (name, len(timeline['SPANS']), timeline['DURATION']))
+        print(fmt % ('OFFSET', 'TRANSIT', 'QUEUED', 'HANDLER', 'HOP', 'COMPONENT', 'MSG_TYPE', 'ACK_ID'))
+        for entry in timeline['SPANS']:
+            attributes = entry.get('attributes', {})
+            print(fmt % (entry['OFFSET'], entry['TRANSIT'], entry['QUEUED'], entry['HANDLER'],
+                         entry['hop'], entry['component'], attributes.get('MSG_TYPE', ''),
+                         attributes.get('ACK_ID', '')))
+        print("")
+
+
+def chrome_trace(timelines):
+    """ Trace Event Format: one process per visit, one thread per
+        component, a complete event for each handler and for each transit.
+    """
+    events = []
+    for pid, name in enumerate(sorted(timelines, key=lambda n: timelines[n]['START'])):
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': name}})
+        for entry in timelines[name]['SPANS']:
+            attributes = entry.get('attributes', {})
+            label = attributes.get('MSG_TYPE', entry['component'])
+            events.append({'name': label, 'cat': 'handler', 'ph': 'X', 'pid': pid,
+                           'tid': entry['component'], 'ts': entry['start'] * 1e6,
+                           'dur': (entry['end'] - entry['start']) * 1e6,
+                           'args': dict(attributes, trace_id=entry['trace_id'],
+                                        span_id=entry['span_id'], parent_id=entry['parent_id'])})
+            if entry.get('sent_at') is not None:
+                events.append({'name': 'transit ' + label, 'cat': 'transit', 'ph': 'X', 'pid': pid,
+                               'tid': entry['component'], 'ts': entry['sent_at'] * 1e6,
+                               'dur': (entry['received_at'] - entry['sent_at']) * 1e6})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('files', nargs='*', help='span files; default logs/spans-*.jsonl')
+    parser.add_argument('--visit', help='only report this VISIT_ID')
+    parser.add_argument('--json', dest='json_file', help='write the timelines as JSON')
+    parser.add_argument('--chrome', dest='chrome_file', help='write a Trace Event Format file')
+    args = parser.parse_args()
+
+    filenames = args.files or sorted(glob.glob('logs/spans-*.jsonl'))
+    if not filenames:
+        print("No span files found", file=sys.stderr)
+        sys.exit(1)
+
+    groups = group_by_visit(load_spans(filenames))
+    if args.visit:
+        groups = {k: v for k, v in groups.items() if k == 'visit %s' % args.visit}
+    timelines = build_timelines(groups)
+
+    print_timelines(timelines)
+    if args.json_file:
+        with open(args.json_file, 'w') as f:
+            json.dump(timelines, f, indent=2, default=str)
+    if args.chrome_file:
+        with open(args.chrome_file, 'w') as f:
+            json.dump(chrome_trace(timelines), f)
+
+
+if __name__ == "__main__": main()